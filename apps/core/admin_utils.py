@@ -0,0 +1,117 @@
+"""
+Admin performance helpers for FlexiFinance
+Estimated-count pagination and shared settings for changelists over large tables
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+logger = logging.getLogger(__name__)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids COUNT(*) on large PostgreSQL tables
+    Unfiltered changelists use pg_class.reltuples, filtered ones the planner's
+    row estimate; small results (below the threshold) are still counted exactly
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = getattr(settings, 'ADMIN_CONFIG', {}).get('ESTIMATED_COUNT_THRESHOLD', 100000)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+
+        try:
+            estimate = self._estimate(queryset, connection)
+        except Exception as e:
+            logger.warning(f"Row estimate failed for {queryset.model.__name__}: {e}")
+            return super().count
+
+        if estimate is None or estimate < self.threshold:
+            return super().count
+        return estimate
+
+    def _estimate(self, queryset, connection):
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+                # reltuples is -1 until the table has been analyzed
+                return int(row[0]) if row and row[0] >= 0 else None
+
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+
+def is_changelist_request(request):
+    """True when the admin request is for a model's changelist page"""
+    match = getattr(request, 'resolver_match', None)
+    return bool(match and match.url_name and match.url_name.endswith('_changelist'))
+
+
+class LargeTableAdminMixin:
+    """
+    ModelAdmin defaults for tables with millions of rows: estimated page counts,
+    no second unfiltered COUNT(*) for the "N total" link, and heavy columns
+    (``list_defer``) left out of changelist rows
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+    list_defer = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.list_defer and is_changelist_request(request):
+            queryset = queryset.defer(*self.list_defer)
+        return queryset
+
+
+class BulkActionAdminMixin:
+    """
+    ModelAdmin helper for set-based bulk actions: small selections are applied
+    inline, large ones are handed to a background job whose progress is shown
+    on the Bulk Action Jobs admin page
+    """
+
+    def run_bulk_action(self, request, queryset, action, verb, params=None):
+        from apps.loans.services.bulk_action_service import bulk_action_service
+
+        result = bulk_action_service.submit(action, queryset, user=request.user, params=params)
+        noun = self.model._meta.verbose_name_plural.lower()
+        job = result.get('job')
+        if job:
+            url = reverse('admin:loans_bulkactionjob_change', args=[job.id])
+            self.message_user(request, format_html(
+                '{} {} are being processed in the background. <a href="{}">Track progress</a>.',
+                job.total, noun, url
+            ), messages.INFO)
+            return
+
+        message = f"Successfully {verb} {result['updated']} {noun}."
+        if result['skipped']:
+            message += f" {result['skipped']} skipped (not in a valid state)."
+        self.message_user(request, message)
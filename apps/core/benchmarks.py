@@ -0,0 +1,371 @@
+"""
+Benchmark suite for FlexiFinance
+Repeatable load scenarios for core flows over a seeded dataset, with local Daraja and Resend stubs
+"""
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from apps.core.factories import SCALES, ScaleDataFactory
+from apps.loans.models import Loan, RepaymentSchedule
+from apps.notifications.models import Notification, NotificationQueue
+from apps.notifications.services.notification_service import notification_service
+from apps.payments.daraja_stub import DarajaStub
+from apps.payments.models import MpesaCallbackArchive, MpesaTransaction, Payment
+from apps.payments.resend_stub import ResendStub
+
+SCENARIOS = ['loan_application', 'dashboard', 'payment_history', 'mpesa_callback_burst', 'notification_drain']
+
+
+class QueryCounter:
+    """DB execute wrapper counting statements"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def summarize(samples):
+    """
+    Latency percentiles, throughput and queries for (ms, queries, items) samples
+
+    Requests run one after another, so throughput is items over the time
+    spent inside measured calls (setup and cleanup are left out)
+
+    Returns:
+        dict: Scenario result
+    """
+    latencies = [ms for ms, _, _ in samples]
+    items = sum(count for _, _, count in samples)
+    seconds = sum(latencies) / 1000
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(samples),
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput_per_s': round(items / seconds, 1) if seconds else 0,
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_per_request': round(sum(queries for _, queries, _ in samples) / len(samples), 2),
+    }
+
+
+def git_revision():
+    """Current commit (with -dirty for uncommitted changes), or 'unknown' outside a checkout"""
+    try:
+        sha = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                             cwd=settings.BASE_DIR).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=settings.BASE_DIR).stdout.strip()
+        return f'{sha}-dirty' if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class BenchmarkSuite:
+    """
+    Benchmark Suite
+    Seeds (or reuses) a deterministic dataset, then drives each scenario
+    in-process through the Django test client or the service it exercises,
+    with Daraja and Resend replaced by local stubs. Every request is timed
+    and its queries counted; scenario data created along the way is removed
+    afterwards, so repeated runs see the same dataset and results from
+    different commits can be compared
+
+    Args:
+        scale (str): Dataset size from factories.SCALES
+        seed (int): Dataset and scenario seed
+        requests (int): Measured requests per scenario
+        warmup (int): Unmeasured requests per scenario before measuring
+        stub_latency (float): Seconds the stubs add to each response
+    """
+
+    def __init__(self, scale='small', seed=42, requests=200, warmup=20, stub_latency=0.0):
+        config = getattr(settings, 'BENCHMARK_CONFIG', {})
+        self.scale = scale
+        self.seed = seed
+        self.requests = requests
+        self.warmup = warmup
+        self.stub_latency = stub_latency
+        self.factory = ScaleDataFactory(
+            seed=seed, prefix=config.get('PREFIX', 'bench'), loans_per_user=SCALES[scale]['loans_per_user'],
+            block_size=config.get('BLOCK_SIZE', 500)
+        )
+        self.users = -(-SCALES[scale]['users'] // self.factory.block_size) * self.factory.block_size
+        self.random = random.Random(seed)
+
+    def prepare_dataset(self, reseed=False, progress=None):
+        """
+        Make sure the generated dataset for this scale and seed is in place
+
+        Returns:
+            bool: True if rows were generated, False if the existing ones were reused
+        """
+        if not reseed and self.factory.users_queryset().count() == self.users:
+            return False
+        self.factory.purge()
+        self.factory.generate(self.users, progress=progress)
+        return True
+
+    def dataset_counts(self):
+        users = self.factory.users_queryset()
+        return {
+            'users': users.count(),
+            'loans': Loan.objects.filter(user__in=users).count(),
+            'repayment_schedules': RepaymentSchedule.objects.filter(loan__user__in=users).count(),
+            'payments': Payment.objects.filter(user__in=users).count(),
+            'mpesa_transactions': MpesaTransaction.objects.filter(user__in=users).count(),
+        }
+
+    def sample_users(self, count):
+        """Generated users picked the same way on every run"""
+        numbers = [self.random.randrange(self.users) for _ in range(count)]
+        by_username = {
+            user.username: user
+            for user in self.factory.users_queryset().filter(
+                username__in=[f'{self.factory.prefix}-{number:07d}' for number in numbers]
+            )
+        }
+        return [by_username[f'{self.factory.prefix}-{number:07d}'] for number in numbers]
+
+    def run(self, scenarios=None):
+        """
+        Run scenarios against local stubs
+
+        Returns:
+            dict: Run metadata and a result per scenario
+        """
+        results = {}
+        with ExitStack() as stack:
+            daraja = DarajaStub(port=0, latency=self.stub_latency, callback_delay=0).start()
+            resend = ResendStub(port=0, latency=self.stub_latency, seed=self.seed).start()
+            stack.callback(daraja.stop)
+            stack.callback(resend.stop)
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                MPESA_CONFIG={**settings.MPESA_CONFIG, 'BASE_URL': daraja.url},
+                RESEND_API_URL=resend.url,
+            ))
+            email_service = notification_service.email_service
+            original_url = email_service.base_url
+            email_service.base_url = f'{resend.url}/emails'
+            stack.callback(setattr, email_service, 'base_url', original_url)
+
+            for name in scenarios or SCENARIOS:
+                # Same inputs for a scenario whichever others run before it
+                self.random = random.Random(f'{self.seed}:{name}')
+                results[name] = summarize(getattr(self, f'scenario_{name}')())
+
+        return {
+            'revision': git_revision(),
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'dataset': {'scale': self.scale, 'seed': self.seed, **self.dataset_counts()},
+            'settings': {'requests': self.requests, 'warmup': self.warmup, 'stub_latency': self.stub_latency},
+            'scenarios': results,
+        }
+
+    def _measure(self, call, expect=None):
+        """
+        Time one call and count its queries
+
+        Args:
+            call (callable): The request or service call
+            expect (int): Required response status (any below 400 when None)
+
+        Returns:
+            tuple: (ms, queries, result)
+        """
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            started = time.perf_counter()
+            result = call()
+            elapsed = (time.perf_counter() - started) * 1000
+        status = getattr(result, 'status_code', None)
+        if status is not None and (status != expect if expect else status >= 400):
+            raise RuntimeError(f'Benchmark request answered {status}')
+        return elapsed, counter.count, result
+
+    def _client_scenario(self, request, expect=None):
+        """Warm up, then measure request(client, user) once per sampled user"""
+        users = self.sample_users(self.warmup + self.requests)
+        client = Client()
+        samples = []
+        for position, user in enumerate(users):
+            client.force_login(user)
+            elapsed, queries, _ = self._measure(lambda: request(client, user), expect)
+            if position >= self.warmup:
+                samples.append((elapsed, queries, 1))
+        return samples
+
+    def scenario_loan_application(self):
+        url = reverse('loans:loan_application')
+        started = datetime.now(dt_timezone.utc)
+        try:
+            return self._client_scenario(lambda client, user: client.post(url, {
+                'loan_type': 'PERSONAL',
+                'principal_amount': self.random.randrange(5000, 100000, 500),
+                'loan_tenure': self.random.choice([3, 6, 12]),
+                'interest_rate': '14.0',
+                'purpose': 'Benchmark application',
+                'description': '',
+            }), expect=302)
+        finally:
+            Loan.objects.filter(
+                user__in=self.factory.users_queryset(), purpose='Benchmark application', created_at__gte=started
+            ).delete()
+
+    def scenario_dashboard(self):
+        url = reverse('dashboard:dashboard')
+        return self._client_scenario(lambda client, user: client.get(url))
+
+    def scenario_payment_history(self):
+        url = reverse('dashboard:payment_history')
+        return self._client_scenario(lambda client, user: client.get(url))
+
+    def scenario_mpesa_callback_burst(self):
+        """STK result callbacks for freshly initiated transactions, back to back"""
+        url = reverse('payments:mpesa-callback')
+        users = self.sample_users(self.warmup + self.requests)
+        now = datetime.now(dt_timezone.utc)
+        transactions, payments = [], []
+        for user in users:
+            amount = Decimal(self.random.randrange(100, 20000, 50))
+            transaction = MpesaTransaction(
+                id=uuid.UUID(int=self.random.getrandbits(128), version=4), user=user, transaction_type='REPAYMENT',
+                amount=amount, phone_number=user.phone_number, status='PROCESSING',
+                checkout_request_id=f'ws_CO_bench_{uuid.UUID(int=self.random.getrandbits(128)).hex}',
+                merchant_request_id=f'bench-{uuid.UUID(int=self.random.getrandbits(128)).hex}', initiated_at=now,
+            )
+            transactions.append(transaction)
+            payments.append(Payment(
+                user=user, payment_type='REPAYMENT', amount=amount, status='PROCESSING',
+                mpesa_transaction=transaction, phone_number=user.phone_number,
+                reference_number=f'BENCH-{transaction.id.hex[:20]}',
+            ))
+        MpesaTransaction.objects.bulk_create(transactions)
+        Payment.objects.bulk_create(payments)
+
+        client = Client()
+        samples = []
+        try:
+            for position, transaction in enumerate(transactions):
+                body = {'Body': {'stkCallback': {
+                    'MerchantRequestID': transaction.merchant_request_id,
+                    'CheckoutRequestID': transaction.checkout_request_id,
+                    'ResultCode': 0,
+                    'ResultDesc': 'The service request is processed successfully.',
+                    'CallbackMetadata': {'Item': [
+                        {'Name': 'Amount', 'Value': float(transaction.amount)},
+                        {'Name': 'MpesaReceiptNumber', 'Value': f'B{transaction.id.hex[:9].upper()}'},
+                        {'Name': 'PhoneNumber', 'Value': transaction.phone_number},
+                    ]},
+                }}}
+                elapsed, queries, _ = self._measure(lambda: client.post(url, body, content_type='application/json'))
+                if position >= self.warmup:
+                    samples.append((elapsed, queries, 1))
+        finally:
+            ids = [transaction.pk for transaction in transactions]
+            MpesaCallbackArchive.objects.filter(transaction_id__in=ids).delete()
+            Payment.objects.filter(mpesa_transaction_id__in=ids).delete()
+            MpesaTransaction.objects.filter(pk__in=ids).delete()
+        return samples
+
+    def scenario_notification_drain(self, batch_size=50):
+        """Queue email notifications, then time process_queue batches (via the Resend stub) until empty"""
+        users = self.sample_users(self.warmup + self.requests)
+        now = datetime.now(dt_timezone.utc) - timedelta(seconds=1)
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                recipient=user, channel='EMAIL', subject='Benchmark notification',
+                message=f'Your repayment of KES {self.random.randrange(500, 20000, 50)} was received.',
+                metadata={'benchmark': True}, scheduled_at=now,
+            )
+            for user in users
+        ])
+        NotificationQueue.objects.bulk_create([
+            NotificationQueue(notification=notification, scheduled_for=now) for notification in notifications
+        ])
+        samples = []
+        try:
+            notification_service.process_queue(batch_size=self.warmup)
+            while True:
+                elapsed, queries, processed = self._measure(lambda: notification_service.process_queue(batch_size=batch_size))
+                if not processed:
+                    break
+                samples.append((elapsed, queries, processed))
+        finally:
+            Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).delete()
+        return samples
+
+
+def save_result(result, directory):
+    """Write a run to <directory>/<timestamp>-<revision>.json; returns the path"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.fromisoformat(result['timestamp']).strftime('%Y%m%dT%H%M%S')
+    path = directory / f"{stamp}-{result['revision'][:12]}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def load_baseline(reference, directory, exclude=None):
+    """
+    A saved run to compare with
+
+    Args:
+        reference (str): A result file path, or 'latest' for the newest run in directory
+        directory (str): Results directory
+        exclude (Path): A file to skip (the run just saved)
+
+    Returns:
+        dict: The saved run, or None if there is none
+    """
+    if reference != 'latest':
+        return json.loads(Path(reference).read_text())
+    runs = sorted(path for path in Path(directory).glob('*.json') if path != exclude)
+    return json.loads(runs[-1].read_text()) if runs else None
+
+
+def compare(result, baseline):
+    """
+    Per-scenario changes against a baseline run
+
+    Returns:
+        list: (scenario, metric, before, after, change %) for p50/p95/p99, throughput and queries
+    """
+    rows = []
+    for name, current in result['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s', 'queries_per_request'):
+            change = (current[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            rows.append((name, metric, before[metric], current[metric], round(change, 1)))
+    return rows
@@ -0,0 +1,152 @@
+"""
+Raw bulk inserts for FlexiFinance
+Writes unsaved model instances as plain rows (COPY on PostgreSQL, multi-row INSERT elsewhere) without save(), signals or per-object ORM work
+"""
+import io
+import json
+
+from django.core.management.color import no_style
+from django.db import connections
+
+# Rows per INSERT statement on backends without COPY (SQLite caps bound parameters)
+INSERT_BATCH_ROWS = 500
+
+# Field types whose Python values every backend takes as they are
+PLAIN_FIELD_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'BigIntegerField', 'BooleanField', 'CharField',
+    'IntegerField', 'PositiveBigIntegerField', 'PositiveIntegerField', 'PositiveSmallIntegerField',
+    'SlugField', 'SmallIntegerField', 'TextField',
+}
+# Further types COPY can take as text without the backend's adaptation
+COPY_TEXT_FIELD_TYPES = {'DateField', 'DateTimeField', 'DecimalField', 'UUIDField'}
+
+
+def _converter(field, connection):
+    """The prep step a field's values need on this connection, or None to pass them through"""
+    target = field.target_field if field.is_relation else field
+    internal_type = target.get_internal_type()
+    if internal_type in PLAIN_FIELD_TYPES:
+        return None
+    if connection.vendor == 'postgresql' and internal_type in COPY_TEXT_FIELD_TYPES:
+        return None
+    return lambda value: field.get_db_prep_save(value, connection)
+
+
+def table_rows(model, instances, connection, timestamp):
+    """
+    Column names and row tuples for unsaved instances
+
+    Field values are taken as they are on the instance: nothing in save()
+    or pre_save() runs, so derived fields must already be filled in. Auto
+    primary keys left empty are omitted (the database assigns them), and
+    empty auto_now / auto_now_add fields get the given timestamp
+
+    Args:
+        model: Model class
+        instances (list): Unsaved instances of the model
+        connection: Database connection the rows are for
+        timestamp (datetime): Value for empty auto_now / auto_now_add fields
+
+    Returns:
+        tuple: (columns, rows) with values prepared for the connection
+    """
+    connection = connections[connection.alias]  # not the thread-local proxy, which is slow per lookup
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and field.db_returning and instances and getattr(instances[0], field.attname) is None)
+    ]
+    columns = [
+        (
+            field.attname,
+            timestamp if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False) else None,
+            _converter(field, connection),
+        )
+        for field in fields
+    ]
+    rows = []
+    for instance in instances:
+        values = instance.__dict__
+        row = []
+        for attname, default, convert in columns:
+            value = values[attname]
+            if value is None:
+                value = default
+            row.append(value if convert is None or value is None else convert(value))
+        rows.append(tuple(row))
+    return [field.column for field in fields], rows
+
+
+# Backslash escapes for COPY text format (backslash first)
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_value(value):
+    """A prepared value as a COPY text-format field (\\N for NULL)"""
+    if value is None:
+        return '\\N'
+    adapted = getattr(value, 'adapted', getattr(value, 'obj', value))  # psycopg Json / Jsonb wrappers
+    if isinstance(adapted, (dict, list)):
+        adapted = json.dumps(adapted)
+    return str(adapted).translate(_COPY_ESCAPES)
+
+
+def insert_rows(model, columns, rows, using='default'):
+    """
+    Insert prepared rows into a model's table
+
+    Uses COPY ... FROM STDIN on PostgreSQL (psycopg2 copy_expert or psycopg
+    copy) and batched multi-row INSERTs on other backends. Runs in the
+    caller's transaction
+
+    Returns:
+        int: Rows written
+    """
+    if not rows:
+        return 0
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column_list = ', '.join(quote(column) for column in columns)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            buffer.writelines('\t'.join([copy_value(value) for value in row]) + '\n' for row in rows)
+            buffer.seek(0)
+            statement = f'COPY {table} ({column_list}) FROM STDIN'
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(statement, buffer)
+            else:
+                with raw.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+            return len(rows)
+
+        batch = max(1, min(INSERT_BATCH_ROWS, connection.features.max_query_params // len(columns)))
+        placeholders = f"({', '.join(['%s'] * len(columns))})"
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            cursor.execute(
+                f"INSERT INTO {table} ({column_list}) VALUES {', '.join([placeholders] * len(chunk))}",
+                [value for row in chunk for value in row]
+            )
+    return len(rows)
+
+
+def reset_sequences(models, using='default'):
+    """Move auto primary key sequences past explicitly inserted ids (no-op where not needed)"""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def analyze(models, using='default'):
+    """Refresh planner statistics after a large load"""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {quote(model._meta.db_table)}')
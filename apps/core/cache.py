@@ -0,0 +1,40 @@
+"""
+Cache backends for FlexiFinance
+Django cache backends that report hits and misses to the metrics service
+"""
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from apps.core.services.metrics_service import metrics_service
+
+_missing = object()
+
+
+class CacheMetricsMixin:
+    """
+    Cache Metrics Mixin
+    Counts get/get_many lookups as hits or misses (get_or_set goes through
+    get). Mix into any backend, e.g. for Redis:
+    class MetricsRedisCache(CacheMetricsMixin, RedisCache)
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version=version)
+        if value is _missing:
+            metrics_service.record_cache(0, 1)
+            return default
+        metrics_service.record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        if super().get_many.__func__ is BaseCache.get_many:
+            # The generic get_many calls get per key, which already counts
+            return super().get_many(keys, version=version)
+        keys = list(keys)
+        found = super().get_many(keys, version=version)
+        metrics_service.record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class MetricsLocMemCache(CacheMetricsMixin, LocMemCache):
+    """Local-memory cache with hit/miss metrics"""
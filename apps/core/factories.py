@@ -0,0 +1,466 @@
+"""
+Bulk data factories for FlexiFinance
+Deterministic builders for users, loans, repayment schedules, payments, M-Pesa transactions, notifications and documents at benchmark scale
+"""
+import random
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from apps.core.bulk_insert import insert_rows, table_rows
+from apps.documents.models import Document
+from apps.loans.models import Loan, RepaymentSchedule
+from apps.notifications.models import Notification, UserNotificationPreference
+from apps.payments.models import MpesaTransaction, Payment
+from apps.users.models import User
+
+CENT = Decimal('0.01')
+
+# Dataset sizes: users, and the mean number of loans per user. Loans get about
+# 10 installments and 4 payments on average, so 'full' is about 100k users,
+# 500k loans, 5M installments and 2M payments (plus one M-Pesa transaction per payment)
+SCALES = {
+    'tiny': {'users': 200, 'loans_per_user': 5},
+    'small': {'users': 5000, 'loans_per_user': 5},
+    'medium': {'users': 20000, 'loans_per_user': 5},
+    'full': {'users': 100000, 'loans_per_user': 5},
+}
+
+# Dates are generated relative to a fixed day so a seed always yields the same rows
+ANCHOR = datetime(2025, 6, 30, 12, 0, tzinfo=dt_timezone.utc)
+
+COUNTIES = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Kiambu', 'Machakos', 'Uasin Gishu', 'Kakamega', 'Nyeri', 'Meru']
+OCCUPATIONS = ['Teacher', 'Trader', 'Nurse', 'Driver', 'Accountant', 'Farmer', 'Engineer', 'Technician', 'Sales Agent']
+LOAN_TYPES = [('QUICK_CASH', 0.35, 2000, 20000), ('PERSONAL', 0.30, 10000, 150000),
+              ('BUSINESS', 0.15, 50000, 500000), ('EMERGENCY', 0.12, 1000, 15000), ('EDUCATION', 0.08, 20000, 200000)]
+# Tenures (months), weighted so that with 78% of loans disbursed there are about 10 installments per loan
+TENURES = [(3, 0.05), (6, 0.15), (12, 0.50), (18, 0.15), (24, 0.15)]
+# Loan statuses; only disbursed loans (ACTIVE, COMPLETED, DEFAULTED) have schedules and payments
+LOAN_STATUSES = [('COMPLETED', 0.40), ('ACTIVE', 0.33), ('DEFAULTED', 0.05), ('SUBMITTED', 0.07),
+                 ('APPROVED', 0.03), ('REJECTED', 0.10), ('CANCELLED', 0.02)]
+RISK_BY_SCORE = [(700, 'LOW'), (580, 'MEDIUM'), (0, 'HIGH')]
+# Delivery outcomes of notifications sent before the anchor
+DELIVERY_OUTCOMES = [('DELIVERED', 0.92), ('FAILED', 0.05), ('SENT', 0.03)]
+# Documents uploaded besides the national ID, by KYC stage
+EXTRA_DOCUMENTS = ['Employment Letter', 'Salary Slip', 'Bank Statement', 'Utility Bill', 'Passport']
+DOCUMENT_FILES = [('pdf', 0.6), ('jpg', 0.3), ('png', 0.1)]
+
+
+def money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def weighted(rng, options):
+    """Pick the first element of a (value, weight, ...) option"""
+    return rng.choices(options, weights=[option[1] for option in options])[0]
+
+
+class ScaleDataFactory:
+    """
+    Scale Data Factory
+    Builds the rows for a block of users (their loans, installments,
+    payments, M-Pesa transactions and optionally notifications and
+    documents) from a seed and the block number alone, so any block can be
+    rebuilt identically in any process. Derived fields that save() and
+    post_save handlers would fill in (loan reference, totals, installment
+    status, user loan counters, notification preferences, document
+    auto-approval) are computed here, because rows are written with
+    bulk_create or raw inserts and no per-row logic runs
+
+    Args:
+        seed (int): Dataset seed
+        prefix (str): Username prefix marking the generated users
+        loans_per_user (float): Mean loans per user
+        block_size (int): Users per block
+        first_user_id (int): Give user number n the id first_user_id + n
+            (required for raw inserts, which cannot read ids back)
+        notifications (bool): Also build the notifications users were sent
+        document_types (dict): Document type name -> (id, auto_approve);
+            documents are built for the types given
+        templates (dict): Notification type -> template id to link
+    """
+
+    def __init__(self, seed=42, prefix='bench', loans_per_user=5, block_size=500, first_user_id=None,
+                 notifications=False, document_types=None, templates=None):
+        self.seed = seed
+        self.prefix = prefix
+        self.loans_per_user = loans_per_user
+        self.block_size = block_size
+        self.first_user_id = first_user_id
+        self.notifications = notifications
+        self.document_types = document_types or {}
+        self.templates = templates or {}
+        self.password = make_password(f'{prefix}-password', salt=f'{prefix}{seed}')
+        # Keeps phone numbers and national ids of datasets with different prefixes apart
+        self.namespace = zlib.crc32(prefix.encode()) % 100
+
+    def users_queryset(self):
+        return User.objects.filter(username__startswith=f'{self.prefix}-')
+
+    def build_block(self, block):
+        """
+        Unsaved rows for one block of users
+
+        Args:
+            block (int): Block number; users block * block_size onwards
+
+        Returns:
+            dict: Model class -> list of instances, in insert order
+        """
+        rng = random.Random(f'{self.prefix}:{self.seed}:{block}')
+        rows = {User: [], UserNotificationPreference: [], Loan: [], RepaymentSchedule: [], MpesaTransaction: [], Payment: [],
+                Notification: [], Document: []}
+        first = block * self.block_size
+        for number in range(first, first + self.block_size):
+            self._build_user(rng, number, rows)
+        return rows
+
+    def _uuid(self, rng):
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    def _build_user(self, rng, number, rows):
+        joined = ANCHOR - timedelta(days=rng.randint(30, 1500), seconds=rng.randint(0, 86399))
+        credit_score = max(300, min(850, int(rng.gauss(640, 90))))
+        phone = f'2547{self.namespace:02d}{number:07d}'
+        user = User(
+            id=self.first_user_id + number if self.first_user_id is not None else None,
+            username=f'{self.prefix}-{number:07d}',
+            email=f'{self.prefix}{number}@example.com',
+            password=self.password,
+            first_name=f'User{number}',
+            last_name=rng.choice(['Otieno', 'Wanjiku', 'Mwangi', 'Achieng', 'Kamau', 'Njeri', 'Mutua', 'Chebet']),
+            phone_number=phone,
+            national_id=f'{self.namespace:02d}{number:08d}',
+            date_of_birth=(ANCHOR - timedelta(days=rng.randint(20 * 365, 60 * 365))).date(),
+            city=rng.choice(COUNTIES),
+            county=rng.choice(COUNTIES),
+            occupation=rng.choice(OCCUPATIONS),
+            employer_name=f'Employer {rng.randint(1, 2000)}',
+            monthly_income=money(rng.lognormvariate(10.6, 0.5)),
+            employment_duration=rng.randint(1, 240),
+            is_verified=rng.random() < 0.9,
+            kyc_status=weighted(rng, [('APPROVED', 0.85), ('PENDING', 0.10), ('REJECTED', 0.05)])[0],
+            credit_score=credit_score,
+            credit_score_updated=ANCHOR - timedelta(days=rng.randint(0, 30)),
+            date_joined=joined,
+            email_verification_token=f'{number:x}{rng.getrandbits(64):016x}',
+            email_verification_sent_at=joined,
+        )
+        user.verification_date = joined if user.is_verified else None
+        rows[User].append(user)
+        rows[UserNotificationPreference].append(UserNotificationPreference(
+            id=self._uuid(rng), user=user, sms_phone_number=phone, created_at=joined, updated_at=joined
+        ))
+        self._notify(rng, user, 'WELCOME_EMAIL', 'EMAIL', 'Welcome to FlexiFinance',
+                     f'Hi {user.first_name}, your FlexiFinance account is ready.', joined, rows)
+        if self.document_types:
+            self._build_documents(rng, user, number, rows)
+
+        loans = [self._build_loan(rng, user, credit_score, rows) for _ in range(rng.randint(1, 2 * self.loans_per_user - 1))]
+        user.total_loans_taken = len(loans)
+        user.active_loans_count = sum(1 for loan in loans if loan.status in ('APPROVED', 'ACTIVE'))
+
+    def _build_loan(self, rng, user, credit_score, rows):
+        loan_type, _, low, high = weighted(rng, LOAN_TYPES)
+        status = weighted(rng, LOAN_STATUSES)[0]
+        tenure = weighted(rng, TENURES)[0]
+        principal = money(round(rng.uniform(low, high), -2))
+        rate = money(rng.uniform(10, 18))
+        fee = money(principal * Decimal('0.02'))
+        interest = money(principal * rate * tenure / Decimal(1200))
+        total = principal + interest + fee
+        if status in ('SUBMITTED', 'APPROVED'):
+            # Awaiting a decision or disbursement
+            applied = ANCHOR - timedelta(days=rng.randint(3, 14))
+        elif status in ('ACTIVE', 'DEFAULTED'):
+            # Still running: disbursed within the last tenure
+            applied = ANCHOR - timedelta(days=rng.randint(15, max(16, tenure * 30 - 5)))
+        else:
+            applied = ANCHOR - timedelta(days=rng.randint(tenure * 30, tenure * 30 + 720))
+        applied = max(applied, user.date_joined + timedelta(hours=1))
+        if status == 'COMPLETED' and applied + timedelta(days=30 * tenure + 5) > ANCHOR:
+            # Joined too recently to have repaid the whole tenure
+            status = 'ACTIVE'
+        decided = applied + timedelta(hours=rng.randint(1, 72))
+
+        loan = Loan(
+            id=self._uuid(rng),
+            user=user,
+            loan_type=loan_type,
+            principal_amount=principal,
+            interest_rate=rate,
+            loan_tenure=tenure,
+            processing_fee=fee,
+            total_amount=total,
+            monthly_payment=money(total / tenure),
+            remaining_balance=total,
+            loan_reference=f'BL{uuid.UUID(int=rng.getrandbits(128)).hex[:16].upper()}',
+            status=status,
+            purpose=f'{loan_type.replace("_", " ").title()} financing',
+            risk_category=next(category for floor, category in RISK_BY_SCORE if credit_score >= floor),
+            credit_score_assigned=credit_score,
+            application_date=applied,
+            created_at=applied,
+        )
+        if status in ('APPROVED', 'ACTIVE', 'COMPLETED', 'DEFAULTED'):
+            loan.approval_date = decided
+        if status == 'REJECTED':
+            loan.rejected_reason = 'Credit score below product minimum'
+            self._notify(rng, user, 'LOAN_REJECTION', 'EMAIL', 'Loan Application Update',
+                         f'Your application {loan.loan_reference} was not approved.', decided, rows)
+        elif loan.approval_date:
+            self._notify(rng, user, 'LOAN_APPROVAL', 'SMS', 'Loan Approved',
+                         f'Your loan {loan.loan_reference} of KES {principal} has been approved.', decided, rows)
+        rows[Loan].append(loan)
+
+        if status in ('ACTIVE', 'COMPLETED', 'DEFAULTED'):
+            loan.disbursement_date = decided + timedelta(hours=rng.randint(1, 24))
+            loan.due_date = loan.disbursement_date + timedelta(days=30 * tenure)
+            self._build_schedule(rng, loan, interest, rows)
+        return loan
+
+    def _build_schedule(self, rng, loan, interest, rows):
+        tenure = loan.loan_tenure
+        installment_total = loan.monthly_payment
+        due_dates = [(loan.disbursement_date + timedelta(days=30 * n)).date() for n in range(1, tenure + 1)]
+        if loan.status == 'COMPLETED':
+            paid_count = tenure
+        else:
+            elapsed = sum(1 for due in due_dates if due <= ANCHOR.date())
+            paid_count = elapsed if loan.status == 'ACTIVE' and rng.random() < 0.8 else rng.randint(0, elapsed)
+
+        # Repayments each cover a run of installments (customers often pay several at once)
+        repayments = min(paid_count, rng.randint(2, 8)) if paid_count else 0
+        cover = [paid_count // repayments + (1 if n < paid_count % repayments else 0) for n in range(repayments)]
+        paid_dates = []
+        outstanding = Decimal('0')
+        for number, due in enumerate(due_dates, start=1):
+            paid = installment_total if number <= paid_count else Decimal('0')
+            if number == paid_count + 1 and loan.status == 'ACTIVE' and rng.random() < 0.2:
+                paid = money(installment_total * Decimal(rng.uniform(0.1, 0.9)))
+            paid_date = None
+            if paid:
+                paid_date = min(ANCHOR, datetime.combine(due, datetime.min.time(), dt_timezone.utc) - timedelta(days=rng.randint(0, 5)))
+                paid_dates.append(paid_date)
+            remaining = installment_total - paid
+            outstanding += remaining
+            if paid >= installment_total:
+                status = 'PAID'
+            elif paid > 0:
+                status = 'PARTIAL'
+            elif due < ANCHOR.date():
+                status = 'OVERDUE'
+            else:
+                status = 'PENDING'
+            rows[RepaymentSchedule].append(RepaymentSchedule(
+                loan=loan,
+                installment_number=number,
+                due_date=due,
+                principal_amount=money(loan.principal_amount / tenure),
+                interest_amount=money(interest / tenure),
+                total_amount=installment_total,
+                paid_amount=paid,
+                remaining_amount=remaining,
+                status=status,
+                paid_date=paid_date,
+                created_at=loan.disbursement_date,
+                updated_at=paid_date or loan.disbursement_date,
+            ))
+        loan.remaining_balance = outstanding
+        if loan.status == 'COMPLETED':
+            loan.completion_date = paid_dates[-1] if paid_dates else loan.due_date
+
+        self._build_payment(rng, loan, 'DISBURSEMENT', loan.principal_amount, loan.disbursement_date, rows)
+        position = 0
+        for count in cover:
+            position += count
+            self._build_payment(rng, loan, 'REPAYMENT', installment_total * count, paid_dates[position - 1], rows)
+
+    def _build_payment(self, rng, loan, payment_type, amount, at, rows):
+        receipt = uuid.UUID(int=rng.getrandbits(128)).hex[:10].upper()
+        mpesa = MpesaTransaction(
+            id=self._uuid(rng),
+            user=loan.user,
+            transaction_type=payment_type,
+            amount=amount,
+            phone_number=loan.user.phone_number,
+            mpesa_receipt=receipt,
+            checkout_request_id=f'ws_CO_{uuid.UUID(int=rng.getrandbits(128)).hex}',
+            merchant_request_id=uuid.UUID(int=rng.getrandbits(128)).hex,
+            status='COMPLETED',
+            result_code='0',
+            result_desc='The service request is processed successfully.',
+            callback_received=True,
+            callback_received_at=at,
+            initiated_at=at - timedelta(seconds=rng.randint(5, 60)),
+            completed_at=at,
+            updated_at=at,
+        )
+        rows[MpesaTransaction].append(mpesa)
+        rows[Payment].append(Payment(
+            id=self._uuid(rng),
+            user=loan.user,
+            loan=loan,
+            payment_type=payment_type,
+            amount=amount,
+            reference_number=f'{payment_type[:3]}-{receipt}',
+            description=f'{payment_type.title()} for {loan.loan_reference}',
+            status='COMPLETED',
+            mpesa_transaction=mpesa,
+            phone_number=loan.user.phone_number,
+            receipt_number=receipt,
+            created_at=at,
+            updated_at=at,
+            completed_at=at,
+        ))
+        if payment_type == 'REPAYMENT':
+            self._notify(rng, loan.user, 'PAYMENT_CONFIRMATION', 'SMS', 'Payment Received',
+                         f'KES {amount} received for {loan.loan_reference}. Receipt {receipt}.', at, rows)
+
+    def _notify(self, rng, user, notification_type, channel, subject, message, at, rows):
+        if not self.notifications:
+            return
+        status = weighted(rng, DELIVERY_OUTCOMES)[0]
+        sent = at + timedelta(seconds=rng.randint(1, 120))
+        notification = Notification(
+            id=self._uuid(rng),
+            template_id=self.templates.get(notification_type),
+            recipient=user,
+            subject=subject,
+            message=message,
+            channel=channel,
+            priority='HIGH' if notification_type in ('LOAN_APPROVAL', 'LOAN_REJECTION') else 'NORMAL',
+            status=status,
+            scheduled_at=at,
+            sent_at=sent,
+            provider_id=uuid.UUID(int=rng.getrandbits(128)).hex,
+            metadata={'notification_type': notification_type},
+            created_at=at,
+            updated_at=sent,
+        )
+        if status == 'DELIVERED':
+            notification.delivered_at = sent + timedelta(seconds=rng.randint(1, 30))
+        elif status == 'FAILED':
+            notification.failed_at = sent
+            notification.retry_count = notification.max_retries
+        rows[Notification].append(notification)
+
+    def _build_documents(self, rng, user, number, rows):
+        """KYC uploads: a national ID for most users, plus supporting documents"""
+        names = ['National ID'] + rng.sample(EXTRA_DOCUMENTS, rng.randint(0, 3))
+        for name in names:
+            if name not in self.document_types or (name == 'National ID' and rng.random() < 0.05):
+                continue
+            type_id, auto_approve = self.document_types[name]
+            uploaded = user.date_joined + timedelta(days=rng.randint(0, 10), seconds=rng.randint(0, 86399))
+            extension = weighted(rng, DOCUMENT_FILES)[0]
+            filename = f"{name.lower().replace(' ', '_')}.{extension}"
+            if user.kyc_status == 'REJECTED' and name == 'National ID':
+                status = 'REJECTED'
+            elif user.kyc_status == 'PENDING':
+                status = 'AUTO_APPROVED' if auto_approve else 'PENDING'
+            else:
+                status = 'AUTO_APPROVED' if auto_approve else 'APPROVED'
+            document = Document(
+                user=user,
+                document_type_id=type_id,
+                file=f"documents/{user.id or number}/{uploaded:%Y/%m/%d}/{filename}",
+                original_filename=filename,
+                file_size=int(rng.lognormvariate(12.5, 0.8)),
+                status=status,
+                uploaded_at=uploaded,
+                content_hash=f'{rng.getrandbits(256):064x}',
+                processing_status='COMPLETED',
+                processed_at=uploaded + timedelta(seconds=rng.randint(2, 300)),
+            )
+            if status != 'PENDING':
+                document.verified_at = uploaded + timedelta(hours=rng.randint(0 if auto_approve else 1, 48))
+            if status == 'REJECTED':
+                document.rejection_reason = 'Image unreadable'
+            rows[Document].append(document)
+
+    def write_block(self, block, batch_size=2000):
+        """
+        Build and insert one block in a single transaction
+
+        Returns:
+            dict: Model name -> rows inserted
+        """
+        rows = self.build_block(block)
+        with transaction.atomic():
+            # Parents first: bulk_create fills in each child's foreign key from
+            # the parent instance once the parent has its primary key
+            for model, instances in rows.items():
+                model.objects.bulk_create(instances, batch_size=batch_size)
+        return {model.__name__: len(instances) for model, instances in rows.items()}
+
+    def block_rows(self, block, using='default'):
+        """
+        One block as raw rows for insert_block (can be built in another process)
+
+        Returns:
+            list: (model, columns, rows) in insert order
+        """
+        if self.first_user_id is None:
+            raise ValueError('Raw rows need explicit user ids; set first_user_id')
+        connection = connections[using]
+        return [
+            (model, *table_rows(model, instances, connection, ANCHOR))
+            for model, instances in self.build_block(block).items()
+        ]
+
+    @staticmethod
+    def insert_block(block_rows, using='default'):
+        """
+        Write rows from block_rows in a single transaction, bypassing the ORM
+
+        Returns:
+            dict: Model name -> rows inserted
+        """
+        with transaction.atomic(using=using):
+            return {
+                model.__name__: insert_rows(model, columns, rows, using=using)
+                for model, columns, rows in block_rows
+            }
+
+    def generate(self, users, progress=None):
+        """
+        Insert blocks until the dataset has the given number of users
+
+        Args:
+            users (int): Users to generate (rounded up to whole blocks)
+            progress (callable): Called with (block, totals) after each block
+
+        Returns:
+            dict: Model name -> rows inserted
+        """
+        totals = {}
+        for block in range(-(-users // self.block_size)):
+            for name, count in self.write_block(block).items():
+                totals[name] = totals.get(name, 0) + count
+            if progress:
+                progress(block, totals)
+        return totals
+
+    def purge(self):
+        """
+        Delete every generated user and what hangs off them
+
+        Returns:
+            int: Rows deleted
+        """
+        users = self.users_queryset()
+        querysets = [
+            Document.objects.filter(user__in=users),
+            Notification.objects.filter(recipient__in=users),
+            Payment.objects.filter(user__in=users),
+            MpesaTransaction.objects.filter(user__in=users),
+            RepaymentSchedule.objects.filter(loan__user__in=users),
+            Loan.objects.filter(user__in=users),
+            users,
+        ]
+        return sum(queryset.delete()[0] for queryset in querysets)
@@ -11,4 +11,6 @@ app_name = 'health'
 urlpatterns = [
     # Health check endpoints
     path('', views.health_check, name='check'),
+    path('live/', views.liveness_check, name='live'),
+    path('ready/', views.readiness_check, name='ready'),
 ]
\ No newline at end of file
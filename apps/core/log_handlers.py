@@ -0,0 +1,228 @@
+"""
+Logging handlers for FlexiFinance
+Non-blocking structured logging: request ids, debug sampling, redaction and JSON lines written off the request thread
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+# Attributes every LogRecord has; anything else was passed through extra= and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+
+# Kenyan mobile numbers (2547..., +2541..., 07..., 01...): keep the prefix and last three digits
+_PHONE = re.compile(r'(?<!\d)(\+?254|0)([17]\d{5})(\d{3})(?!\d)')
+_AUTH_HEADER = re.compile(r'\b(Bearer|Basic)\s+[A-Za-z0-9._~+/=-]+')
+_SECRET_NAMES = (
+    'access_token|refresh_token|token|password|passkey|secret|api_key|apikey|securitycredential|consumer_secret'
+)
+_SECRET_FIELD = re.compile(
+    rf'''(["']?\b(?:{_SECRET_NAMES})\b["']?\s*[:=]\s*["']?)[^"'\s,}}&]+''',
+    re.IGNORECASE
+)
+_SECRET_KEY = re.compile(rf'^(?:{_SECRET_NAMES})$', re.IGNORECASE)
+# One-time tokens in email verification and password reset links (.../<uidb64>/<token>/)
+_URL_TOKEN = re.compile(r'(/(?:verify-email|reset)/[^/\s]+/)[^/\s?#"\']+')
+
+
+def redact(text):
+    """Mask phone numbers, auth headers, link tokens and secret-looking fields in a log line"""
+    text = _PHONE.sub(lambda m: f"{m.group(1)}{'*' * len(m.group(2))}{m.group(3)}", text)
+    text = _AUTH_HEADER.sub(r'\1 [REDACTED]', text)
+    text = _URL_TOKEN.sub(r'\1[REDACTED]', text)
+    return _SECRET_FIELD.sub(r'\1[REDACTED]', text)
+
+
+def redact_value(value):
+    """Redact an extra= field: text as a log line, values under secret-named keys entirely"""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        text = redact(str(value))  # phone numbers passed as integers
+        return value if text == str(value) else text
+    if isinstance(value, dict):
+        return {
+            key: '[REDACTED]' if isinstance(key, str) and _SECRET_KEY.match(key) else redact_value(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple, set)):
+        return [redact_value(item) for item in value]
+    return value
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the id of the request being served (set by RequestIdMiddleware)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Sampling Filter
+    Keeps only a fraction of records at or below a level, so high-volume
+    debug logging can stay on in production. Records above the level
+    always pass
+
+    Args:
+        rate (float): Fraction of low-level records kept (0.0 - 1.0)
+        level (str|int): Highest level that is sampled
+    """
+
+    def __init__(self, rate=1.0, level='DEBUG'):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging._checkLevel(level)
+
+    def filter(self, record):
+        return record.levelno > self.level or self.rate >= 1.0 or random.random() < self.rate
+
+
+class RedactingFilter(logging.Filter):
+    """Redact the message, traceback and extra= fields of a record (runs on the listener thread)"""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS:
+                setattr(record, key, '[REDACTED]' if _SECRET_KEY.match(key) else redact_value(value))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request id and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the request id, for local consoles"""
+
+    def __init__(self):
+        super().__init__('{levelname} {asctime} [{request_id}] {name} {message}', style='{')
+
+    def format(self, record):
+        record.request_id = getattr(record, 'request_id', '-')
+        return super().format(record)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Queue Log Handler
+    The only handler loggers write to. emit() formats the message and puts
+    the record on a bounded queue; a QueueListener thread redacts it and
+    writes JSON lines to a file and to the console. When the queue is full
+    records are dropped and counted rather than blocking the request. The
+    listener is restarted in forked workers and drained at exit
+
+    Every worker process appends to the same file, so none of them rotates
+    it: rotation is left to logrotate (or the platform), and the file is
+    reopened when it has been moved away. On hosted platforms leave the
+    file out and log JSON to the console
+
+    Args:
+        filename (str): Log file path, or None for console only
+        file_level (str): Lowest level written to the file
+        console (bool): Also write to stderr
+        console_format (str): 'json' or 'text'
+        console_level (str): Lowest level written to the console
+        queue_size (int): Records buffered before new ones are dropped
+    """
+
+    def __init__(self, filename=None, file_level='INFO', console=True, console_format='text',
+                 console_level='DEBUG', queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        targets = []
+
+        if filename:
+            # O_APPEND writes from many processes; reopened after logrotate moves the file
+            file_handler = WatchedFileHandler(filename, encoding='utf-8', delay=True)
+            file_handler.setLevel(file_level)
+            file_handler.setFormatter(JsonFormatter())
+            targets.append(file_handler)
+
+        if console:
+            console_handler = logging.StreamHandler(sys.stderr)
+            console_handler.setLevel(console_level)
+            console_handler.setFormatter(JsonFormatter() if console_format == 'json' else TextFormatter())
+            targets.append(console_handler)
+
+        for target in targets:
+            target.addFilter(RedactingFilter())
+        self.listener = QueueListener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self._stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_listener)
+
+    def _stop_listener(self):
+        """Write out whatever is still queued"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def _restart_listener(self):
+        """The listener thread does not survive fork(); start a fresh one in the child"""
+        self.listener._thread = None
+        self.listener.start()
+
+    def prepare(self, record):
+        """
+        Freeze the message on the calling thread but leave formatting to the listener
+
+        The arguments are rendered now because they may change after the
+        call returns; the traceback is rendered to text because the frames
+        it references do not outlive the call
+        """
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                sys.stderr.write(f'Log queue full, {self.dropped} records dropped so far\n')
@@ -0,0 +1,84 @@
+"""
+Management command to run the benchmark suite and compare it with earlier runs
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.benchmarks import SCENARIOS, BenchmarkSuite, compare, load_baseline, save_result
+from apps.core.factories import SCALES
+
+# Metrics where a higher value is a regression (throughput is the other way round)
+LOWER_IS_BETTER = {'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'}
+
+
+class Command(BaseCommand):
+    help = 'Seed a deterministic dataset, run load scenarios against local stubs and report p50/p95/p99 latency, throughput and queries per request'
+
+    def add_arguments(self, parser):
+        config = settings.BENCHMARK_CONFIG
+        parser.add_argument('--scale', choices=sorted(SCALES), default=config.get('SCALE', 'small'))
+        parser.add_argument('--seed', type=int, default=config.get('SEED', 42))
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Run only these scenarios (repeatable)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--stub-latency', type=float, default=0.0, help='Seconds the Daraja and Resend stubs add')
+        parser.add_argument('--reseed', action='store_true', help='Regenerate the dataset even if it is in place')
+        parser.add_argument('--seed-only', action='store_true', help='Prepare the dataset and stop')
+        parser.add_argument('--compare', metavar='RESULT', help="Result file to compare with, or 'latest'")
+        parser.add_argument('--max-regression', type=float,
+                            help='Fail when a latency or queries metric is this many percent worse than the baseline')
+        parser.add_argument('--no-save', action='store_true', help='Do not write a result file')
+
+    def handle(self, *args, **options):
+        suite = BenchmarkSuite(
+            scale=options['scale'],
+            seed=options['seed'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            stub_latency=options['stub_latency']
+        )
+        seeded = suite.prepare_dataset(reseed=options['reseed'], progress=self._progress)
+        counts = suite.dataset_counts()
+        self.stdout.write(
+            f"{'Generated' if seeded else 'Reusing'} '{options['scale']}' dataset (seed {options['seed']}): "
+            + ', '.join(f'{count} {name}' for name, count in counts.items())
+        )
+        if options['seed_only']:
+            return
+
+        result = suite.run(options['scenario'])
+        self.stdout.write(f"Revision {result['revision']}, {result['database']}, DEBUG={result['debug']}")
+        self.stdout.write(f"{'scenario':<22}{'reqs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>10}{'queries':>9}")
+        for name, scenario in result['scenarios'].items():
+            self.stdout.write(
+                f"{name:<22}{scenario['requests']:>6}{scenario['p50_ms']:>10.2f}{scenario['p95_ms']:>10.2f}"
+                f"{scenario['p99_ms']:>10.2f}{scenario['throughput_per_s']:>10.1f}{scenario['queries_per_request']:>9.1f}"
+            )
+
+        results_dir = settings.BENCHMARK_CONFIG['RESULTS_DIR']
+        path = None
+        if not options['no_save']:
+            path = save_result(result, results_dir)
+            self.stdout.write(self.style.SUCCESS(f'Saved {path}'))
+
+        if options['compare']:
+            self._compare(result, load_baseline(options['compare'], results_dir, exclude=path), options['max_regression'])
+
+    def _progress(self, block, totals):
+        self.stdout.write(f"  block {block + 1}: {sum(totals.values())} rows")
+
+    def _compare(self, result, baseline, max_regression):
+        if baseline is None:
+            self.stdout.write(self.style.WARNING('No earlier run to compare with'))
+            return
+        if baseline['dataset'] != result['dataset']:
+            self.stdout.write(self.style.WARNING('Baseline used a different dataset; differences include that'))
+        self.stdout.write(f"Against {baseline['revision']} ({baseline['timestamp']}):")
+        regressions = []
+        for name, metric, before, after, change in compare(result, baseline):
+            worse = change > 0 if metric in LOWER_IS_BETTER else change < 0
+            line = f'  {name:<22}{metric:<22}{before:>10}{after:>10}{change:>+8.1f}%'
+            self.stdout.write(self.style.ERROR(line) if worse and abs(change) >= 10 else line)
+            if max_regression is not None and worse and abs(change) > max_regression and metric in LOWER_IS_BETTER:
+                regressions.append(f'{name} {metric} {change:+.1f}%')
+        if regressions:
+            raise CommandError(f"Regressions beyond {max_regression}%: {', '.join(regressions)}")
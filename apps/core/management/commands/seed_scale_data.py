@@ -0,0 +1,149 @@
+"""
+Management command to generate a large synthetic dataset
+"""
+import io
+import multiprocessing
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+
+from apps.core.bulk_insert import analyze, reset_sequences
+from apps.core.factories import ScaleDataFactory
+from apps.documents.models import Document, DocumentType
+from apps.loans.models import Loan, RepaymentSchedule
+from apps.notifications.models import Notification, NotificationTemplate, UserNotificationPreference
+from apps.payments.models import MpesaTransaction, Payment
+from apps.users.models import User
+from apps.users.signals import users_changed
+
+GENERATED_MODELS = [User, UserNotificationPreference, Loan, RepaymentSchedule, MpesaTransaction, Payment,
+                    Notification, Document]
+
+# Factories are built once per worker process (hashing the shared password is slow)
+_worker_factory = None
+
+
+def _init_worker(factory_options):
+    global _worker_factory
+    if not apps.ready:  # spawned rather than forked
+        import django
+        django.setup()
+    _worker_factory = ScaleDataFactory(**factory_options)
+
+
+def _build_block(block):
+    return _worker_factory.block_rows(block)
+
+
+def _load_block(block):
+    return ScaleDataFactory.insert_block(_worker_factory.block_rows(block))
+
+
+class Command(BaseCommand):
+    help = 'Generate millions of realistic users, loans, schedules, payments, M-Pesa transactions, notifications and documents with raw bulk inserts in parallel workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Users to generate (rounded up to whole blocks)')
+        parser.add_argument('--loans-per-user', type=int, default=5, help='Mean loans per user')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='scale', help='Username prefix of the generated users')
+        parser.add_argument('--block-size', type=int, default=500, help='Users per block (one transaction each)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--no-notifications', action='store_true', help='Skip notification history')
+        parser.add_argument('--no-documents', action='store_true', help='Skip KYC documents')
+        parser.add_argument('--purge', action='store_true', help='Delete users generated with this prefix first')
+        parser.add_argument('--refresh-offers', action='store_true',
+                            help='Send users_changed for the new users so loan offers are computed')
+        parser.add_argument('--force', action='store_true', help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to generate synthetic data with DEBUG off; pass --force if this is intended')
+
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}-')
+        if options['purge']:
+            deleted = ScaleDataFactory(prefix=prefix).purge()
+            self.stdout.write(f'Deleted {deleted} rows generated with prefix {prefix!r}')
+        elif existing.exists():
+            raise CommandError(f"Users with prefix {prefix!r} already exist; pass --purge or choose another --prefix")
+
+        factory_options = {
+            'seed': options['seed'],
+            'prefix': prefix,
+            'loans_per_user': options['loans_per_user'],
+            'block_size': options['block_size'],
+            # Ids are assigned up front: COPY cannot return them, and parallel
+            # workers have to agree on them without talking to each other
+            'first_user_id': (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+            'notifications': not options['no_notifications'],
+            'document_types': {} if options['no_documents'] else self._document_types(),
+            'templates': dict(
+                NotificationTemplate.objects.filter(is_active=True).values_list('notification_type', 'id')
+            ),
+        }
+        blocks = range(-(-options['users'] // options['block_size']))
+        workers = max(1, min(options['workers'], len(blocks)))
+        # SQLite has a single writer: workers only build rows and this process inserts them
+        parallel_writes = connections['default'].vendor == 'postgresql'
+
+        self.stdout.write(
+            f"Generating {len(blocks) * options['block_size']} users in {len(blocks)} blocks with {workers} "
+            f"worker(s), {'parallel COPY' if parallel_writes else 'inserts from this process'}"
+        )
+        totals = {}
+        started = time.perf_counter()
+        if workers == 1:
+            _init_worker(factory_options)
+            results = (_load_block(block) for block in blocks)
+            self._collect(results, totals, started)
+        else:
+            # Forked workers must not share this process's database connections
+            connections.close_all()
+            context = multiprocessing.get_context()
+            with context.Pool(workers, initializer=_init_worker, initargs=(factory_options,)) as pool:
+                if parallel_writes:
+                    results = pool.imap_unordered(_load_block, blocks)
+                else:
+                    results = (ScaleDataFactory.insert_block(rows) for rows in pool.imap(_build_block, blocks))
+                self._collect(results, totals, started)
+        elapsed = time.perf_counter() - started
+
+        reset_sequences([User, RepaymentSchedule, Document])
+        if parallel_writes:
+            analyze(GENERATED_MODELS)
+
+        rows = sum(totals.values())
+        for name, count in totals.items():
+            self.stdout.write(f'  {name:<28}{count:>12}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {rows} rows in {elapsed:.1f}s ({rows / elapsed * 60:,.0f} rows/minute)'
+        ))
+
+        if options['refresh_offers']:
+            user_ids = list(User.objects.filter(username__startswith=f'{prefix}-').values_list('id', flat=True))
+            for start in range(0, len(user_ids), options['block_size']):
+                users_changed.send(sender=User, user_ids=user_ids[start:start + options['block_size']], fields=[])
+            self.stdout.write(self.style.SUCCESS(f'Refreshed loan offers for {len(user_ids)} users'))
+        else:
+            self.stdout.write('Loan offers were not computed for the new users (see --refresh-offers)')
+
+    def _document_types(self):
+        # Idempotent; makes sure the standard KYC types the factory uploads exist
+        call_command('populate_document_types', stdout=io.StringIO())
+        return {name: (type_id, auto_approve) for type_id, name, auto_approve in
+                DocumentType.objects.values_list('id', 'name', 'auto_approve')}
+
+    def _collect(self, results, totals, started):
+        for done, counts in enumerate(results, start=1):
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            if done % 10 == 0:
+                rows = sum(totals.values())
+                self.stdout.write(f'  {done} blocks, {rows} rows, {rows / (time.perf_counter() - started) * 60:,.0f} rows/minute')
@@ -0,0 +1,73 @@
+"""
+Middleware for FlexiFinance
+Request ids for logging and request-level performance instrumentation
+"""
+import re
+import uuid
+from contextlib import ExitStack
+
+from django.db import connections
+
+from apps.core.log_handlers import request_id_var
+from apps.core.services.metrics_service import QueryRecorder, metrics_service
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+
+class RequestIdMiddleware:
+    """
+    Request Id Middleware
+    Takes the caller's X-Request-ID (when it looks like an id) or makes one,
+    exposes it as request.request_id and on every log record written while
+    the request is served, and echoes it in the response
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id_var.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Request Metrics Middleware
+    Times each request and wraps every database connection's execute for
+    its duration, then records latency, query count and time, cache lookups
+    and outbound HTTP time under the resolved URL name. Listed near the top
+    of MIDDLEWARE so the time spent in the other middleware is included
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_service.enabled:
+            return self.get_response(request)
+
+        stats, token = metrics_service.begin_request()
+        status = 500
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(QueryRecorder(stats)))
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics_service.finish_request(stats, token, self._route(request), request.method, status, request.path)
+
+    def _route(self, request):
+        """URL name of the matched view; unnamed views fall back to their route pattern"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route or 'unnamed'
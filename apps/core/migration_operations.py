@@ -0,0 +1,54 @@
+"""
+Migration operations for FlexiFinance
+Index changes that do not lock busy tables on PostgreSQL
+
+Django's own AddIndexConcurrently (django.contrib.postgres) refuses other
+databases; these build the index CONCURRENTLY on PostgreSQL and fall back to a
+plain CREATE/DROP INDEX elsewhere (e.g. SQLite in development). Migrations using
+them must set ``atomic = False``.
+"""
+from django.db import migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Create an index without blocking writes (PostgreSQL)"""
+
+    def describe(self):
+        return f"Concurrently create index {self.index.name} on {self.model_name}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **_concurrently(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **_concurrently(schema_editor))
+
+
+class RemoveIndexConcurrently(migrations.RemoveIndex):
+    """Drop an index without blocking writes (PostgreSQL)"""
+
+    def describe(self):
+        return f"Concurrently remove index {self.name} from {self.model_name}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, **_concurrently(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.add_index(model, index, **_concurrently(schema_editor))
+
+
+def _concurrently(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return {}
+    if schema_editor.connection.in_atomic_block:
+        raise ValueError('Concurrent index operations need a migration with atomic = False')
+    return {'concurrently': True}
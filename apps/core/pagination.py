@@ -0,0 +1,188 @@
+"""
+Keyset pagination for FlexiFinance
+Cursor-based pages over (timestamp, id) so deep pages cost the same as the first
+"""
+import base64
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor or pagination parameter cannot be used"""
+
+
+def pagination_config():
+    return getattr(settings, 'PAGINATION_CONFIG', {})
+
+
+def encode_cursor(timestamp, pk):
+    """Opaque cursor for a (timestamp, id) position"""
+    payload = json.dumps([timestamp.isoformat(), str(pk)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        tuple: (datetime, id string)
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, pk = json.loads(payload)
+        parsed = parse_datetime(timestamp)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if parsed is None:
+        raise InvalidCursor('Invalid cursor')
+    return parsed, pk
+
+
+def parse_page_size(value, default=None):
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]"""
+    config = pagination_config()
+    default = default or config.get('DEFAULT_PAGE_SIZE', 20)
+    if value in (None, ''):
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Page size must be an integer')
+    return max(1, min(size, config.get('MAX_PAGE_SIZE', 100)))
+
+
+def parse_fields(value, allowed):
+    """
+    Parse a comma-separated ``fields=`` projection
+
+    Args:
+        value (str): Raw query parameter (None or '' selects every allowed field)
+        allowed (list): Fields clients may request
+
+    Returns:
+        list: Requested fields in the order given
+    """
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise InvalidCursor(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def cached_count(queryset, timeout=None):
+    """
+    COUNT(*) for a queryset, cached separately from the pages
+
+    The cache key is derived from the compiled SQL, so each user/filter
+    combination has its own entry
+    """
+    timeout = timeout if timeout is not None else pagination_config().get('TOTAL_COUNT_CACHE_TIMEOUT', 300)
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params}".encode()).hexdigest()
+    key = f"count:{queryset.model._meta.label_lower}:{digest}"
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, timeout)
+    return total
+
+
+class KeysetPage:
+    """One page of keyset results"""
+
+    def __init__(self, items, page_size, next_cursor, previous_cursor):
+        self.items = items
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+class KeysetPaginator:
+    """
+    Newest-first keyset paginator over (timestamp_field, id)
+
+    Pages are fetched with ``WHERE (ts, id) < cursor ORDER BY ts DESC, id DESC
+    LIMIT n + 1``, which an index on (user, ts, id) answers without scanning
+    skipped rows
+    """
+
+    def __init__(self, queryset, page_size=None, timestamp_field='created_at'):
+        self.queryset = queryset
+        self.page_size = page_size or pagination_config().get('DEFAULT_PAGE_SIZE', 20)
+        self.timestamp_field = timestamp_field
+
+    def page(self, after=None, before=None, fields=None):
+        """
+        Fetch the page after (older than) or before (newer than) a cursor
+
+        Args:
+            after (str): Cursor of the last row on the previous page
+            before (str): Cursor of the first row on the next page
+            fields (list): Return dicts with only these fields (via .values());
+                model instances otherwise
+
+        Returns:
+            KeysetPage: Items plus cursors for the neighbouring pages
+        """
+        ts = self.timestamp_field
+        queryset = self.queryset
+        if before:
+            timestamp, pk = decode_cursor(before)
+            queryset = queryset.filter(Q(**{f'{ts}__gt': timestamp}) | Q(**{ts: timestamp, 'pk__gt': pk}))
+            queryset = queryset.order_by(ts, 'pk')
+        else:
+            if after:
+                timestamp, pk = decode_cursor(after)
+                queryset = queryset.filter(Q(**{f'{ts}__lt': timestamp}) | Q(**{ts: timestamp, 'pk__lt': pk}))
+            queryset = queryset.order_by(f'-{ts}', '-pk')
+
+        if fields is not None:
+            # The key columns are always selected so cursors can be built
+            queryset = queryset.values(*dict.fromkeys(list(fields) + [ts, 'pk']))
+
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if before:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if more or before:
+                next_cursor = self._cursor(rows[-1])
+            if after or (before and more):
+                previous_cursor = self._cursor(rows[0])
+        return KeysetPage(rows, self.page_size, next_cursor, previous_cursor)
+
+    def _cursor(self, row):
+        if isinstance(row, dict):
+            return encode_cursor(row[self.timestamp_field], row['pk'])
+        return encode_cursor(getattr(row, self.timestamp_field), row.pk)
@@ -0,0 +1,64 @@
+"""
+Admin search indexes for FlexiFinance
+PostgreSQL trigram and prefix indexes matching the SQL Django emits for admin search
+
+Django compiles ``icontains``/``istartswith`` to ``UPPER(col::text) LIKE UPPER(%s)``,
+so the indexes are built on that exact expression. Other databases skip them.
+"""
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+
+def _create_indexes(indexes):
+    def forwards(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+
+        with connection.cursor() as cursor:
+            trigram_available = True
+            try:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            except Exception as e:
+                # Needs CREATE privilege on the database; prefix indexes still apply
+                logger.warning(f"pg_trgm unavailable, skipping trigram indexes: {e}")
+                trigram_available = False
+
+            for name, table, column, kind in indexes:
+                if kind == 'trigram':
+                    if not trigram_available:
+                        continue
+                    method, opclass = 'gin', 'gin_trgm_ops'
+                else:
+                    method, opclass = 'btree', 'text_pattern_ops'
+                cursor.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" '
+                    f'USING {method} (UPPER("{column}"::text) {opclass})'
+                )
+    return forwards
+
+
+def _drop_indexes(indexes):
+    def backwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for name, _, _, _ in indexes:
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    return backwards
+
+
+def search_index_operations(indexes):
+    """
+    Migration operations creating admin search indexes
+
+    Args:
+        indexes (list): (index name, table, column, 'trigram' | 'prefix') tuples
+
+    Returns:
+        list: Operations for a non-atomic migration (indexes are built CONCURRENTLY)
+    """
+    return [migrations.RunPython(_create_indexes(indexes), _drop_indexes(indexes))]
@@ -0,0 +1,233 @@
+"""
+Health Service for FlexiFinance
+Background dependency probes with cached results for liveness, readiness and health endpoints
+"""
+import logging
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+
+class HealthService:
+    """
+    Health Service
+    Probes every dependency from one background thread each INTERVAL_SECONDS
+    and keeps the outcome, so health endpoints only read a prepared
+    snapshot. The one exception is a worker's first health request, which
+    runs the first round itself before the loop takes over.
+    Readiness depends on the CRITICAL probes; the others are reported as
+    degraded without taking the instance out of rotation
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'HEALTH_CONFIG', {})
+        self.interval = config.get('INTERVAL_SECONDS', 15)
+        self.probe_timeout = config.get('PROBE_TIMEOUT_SECONDS', 3)
+        self.stale_after = config.get('STALE_AFTER_SECONDS', self.interval * 4)
+        self.critical = set(config.get('CRITICAL', ['database', 'cache']))
+        self.window = config.get('LATENCY_WINDOW', 100)
+        self.probes = {
+            'database': self.probe_database,
+            'cache': self.probe_cache,
+            'resend': self.probe_resend,
+            'daraja': self.probe_daraja,
+            'supabase': self.probe_supabase,
+            'storage': self.probe_storage,
+        }
+        self._latencies = {name: deque(maxlen=self.window) for name in self.probes}
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._first_round = threading.Lock()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix='health-probe')
+
+    def probe_database(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        finally:
+            # Probe threads are reused; do not hold a connection between rounds
+            connections.close_all()
+
+    def probe_cache(self):
+        key = f'health:{uuid.uuid4().hex}'
+        cache.set(key, '1', 10)
+        if cache.get(key) != '1':
+            raise RuntimeError('Cache did not return the value just written')
+        cache.delete(key)
+
+    def probe_resend(self):
+        if not settings.RESEND_API_KEY:
+            return 'not_configured'
+        response = requests.get(
+            f"{getattr(settings, 'RESEND_API_URL', 'https://api.resend.com').rstrip('/')}/domains",
+            headers={'Authorization': f'Bearer {settings.RESEND_API_KEY}'},
+            timeout=self.probe_timeout
+        )
+        # 401 still shows the API is reachable
+        if response.status_code not in (200, 401):
+            raise RuntimeError(f'Resend answered {response.status_code}')
+
+    def probe_daraja(self):
+        mpesa_config = getattr(settings, 'MPESA_CONFIG', {})
+        if not (mpesa_config.get('CONSUMER_KEY') and mpesa_config.get('CONSUMER_SECRET')):
+            return 'not_configured'
+        from apps.payments.services.mpesa_service import MpesaService
+
+        # Reachability only: an unauthenticated OAuth call is refused without minting a token
+        response = requests.get(MpesaService().oauth_url, timeout=self.probe_timeout)
+        if response.status_code >= 500:
+            raise RuntimeError(f'Daraja answered {response.status_code}')
+
+    def probe_supabase(self):
+        if not settings.SUPABASE_URL:
+            return 'not_configured'
+        from apps.payments.services.supabase_service import SupabaseService
+
+        if not SupabaseService().health_check():
+            raise RuntimeError('Supabase health check failed')
+
+    def probe_storage(self):
+        name = default_storage.save(f'health/{uuid.uuid4().hex}.txt', ContentFile(b'ok'))
+        default_storage.delete(name)
+
+    def run_probes(self):
+        """
+        Run every probe once (in parallel, each bounded by PROBE_TIMEOUT_SECONDS) and publish the results
+
+        Returns:
+            dict: The new snapshot
+        """
+        futures = {name: self._executor.submit(self._timed, probe) for name, probe in self.probes.items()}
+        wait(futures.values(), timeout=self.probe_timeout)
+
+        previous = (self._snapshot or {}).get('checks', {})
+        checks = {}
+        for name, future in futures.items():
+            if future.done():
+                status, error, elapsed = future.result()
+            else:
+                status, error, elapsed = 'down', f'No answer within {self.probe_timeout}s', self.probe_timeout
+            if status != 'not_configured':
+                self._latencies[name].append(elapsed * 1000)
+            checks[name] = {
+                'status': status,
+                'critical': name in self.critical,
+                'latency_ms': round(elapsed * 1000, 2),
+                **self._percentiles(name),
+            }
+            if error:
+                checks[name]['error'] = error
+            # Log changes only, not every failing round
+            if status != previous.get(name, {}).get('status', 'up'):
+                log = logger.warning if status == 'down' else logger.info
+                log(f"Health probe {name} is {status}{f': {error}' if error else ''}")
+
+        snapshot = {
+            'checked_at': datetime.now(dt_timezone.utc).isoformat(),
+            'checks': checks,
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+        return snapshot
+
+    def _timed(self, probe):
+        """Run one probe: (status, error, seconds)"""
+        started = time.perf_counter()
+        try:
+            status, error = probe() or 'up', ''
+        except Exception as e:
+            status, error = 'down', str(e)
+        return status, error, time.perf_counter() - started
+
+    def _percentiles(self, name):
+        samples = list(self._latencies[name])
+        if len(samples) < 2:
+            value = round(samples[0], 2) if samples else None
+            return {'p50_ms': value, 'p95_ms': value, 'p99_ms': value}
+        cuts = statistics.quantiles(samples, n=100)
+        return {'p50_ms': round(cuts[49], 2), 'p95_ms': round(cuts[94], 2), 'p99_ms': round(cuts[98], 2)}
+
+    def start(self):
+        """Start the background probe loop once per process"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='health-probes', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        # The first round already ran in the request that started the loop
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_probes()
+            except Exception as e:
+                logger.error(f"Health probe round failed: {e}")
+
+    def _ensure_snapshot(self):
+        """Run the first probe round in the calling request, once per process"""
+        if self._snapshot is not None:
+            return
+        with self._first_round:
+            if self._snapshot is not None:
+                return
+            try:
+                self.run_probes()
+            except Exception as e:
+                logger.error(f"Health probe round failed: {e}")
+
+    def report(self):
+        """
+        Cached health of every dependency
+
+        Returns:
+            tuple: (ready, body) where ready is False while a critical
+                dependency is down, results are stale or none exist yet
+        """
+        # A fresh worker probes once before answering rather than reporting
+        # 'starting' until the background loop gets round to it
+        self._ensure_snapshot()
+        self.start()
+        snapshot, age = self._snapshot, time.monotonic() - self._checked_at
+        if snapshot is None:
+            return False, {'status': 'starting', 'checks': {}}
+        critical_down = [
+            name for name, check in snapshot['checks'].items()
+            if check['critical'] and check['status'] == 'down'
+        ]
+        degraded = [name for name, check in snapshot['checks'].items() if check['status'] == 'down']
+        if age > self.stale_after:
+            status = 'stale'
+        elif critical_down:
+            status = 'unhealthy'
+        elif degraded:
+            status = 'degraded'
+        else:
+            status = 'healthy'
+        return status in ('healthy', 'degraded'), {
+            'status': status,
+            'age_seconds': round(age, 1),
+            **snapshot,
+        }
+
+
+# Global service instance
+health_service = HealthService()
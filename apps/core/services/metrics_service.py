@@ -0,0 +1,420 @@
+"""
+Metrics Service for FlexiFinance
+Per-route latency, query, cache and outbound HTTP metrics in the Prometheus text format
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Route label for work done outside a request (commands, background threads)
+NO_ROUTE = 'background'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    """
+    Request Stats
+    What one request spent its time on; filled in by the query recorder, the
+    cache backend and external_call while the request is being served
+    """
+
+    def __init__(self, max_queries):
+        self.started = time.perf_counter()
+        self.max_queries = max_queries
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.external_seconds = 0.0
+        self.external_calls = []
+
+
+class QueryRecorder:
+    """
+    DB execute wrapper
+    Counts and times every statement of the current request and keeps the
+    first MAX_CAPTURED_QUERIES of them for slow-request samples
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stats.query_count += 1
+            self.stats.query_seconds += elapsed
+            if len(self.stats.queries) < self.stats.max_queries:
+                self.stats.queries.append((sql, elapsed))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+
+    def merge(self, labels, counts, total):
+        """Add another process's series (ignored if it used other buckets)"""
+        if len(counts) != len(self.buckets) + 1:
+            return
+        mine, my_total = self.series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        for index, count in enumerate(counts):
+            mine[index] += count
+        my_total[0] += total
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, (None, None))
+        if counts is None:
+            counts, total = [0] * (len(self.buckets) + 1), [0.0]
+            self.series[labels] = (counts, total)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+
+class MetricsService:
+    """
+    Metrics Service
+    Collects request latency and query histograms, cache hit/miss counts and
+    outbound HTTP timings labelled by URL name, and renders them for a
+    Prometheus scrape. Requests slower than SLOW_REQUEST_MS are sampled with
+    their SQL and external calls.
+
+    Series are collected in memory per process. With MULTIPROCESS_DIR set
+    (needed under a prefork server, where a scrape reaches a random worker)
+    every process also writes its series to a file of its own there at most
+    every FLUSH_SECONDS, and a scrape sums the files of all processes, as
+    prometheus_client's multiprocess mode does. Files of exited workers are
+    kept so counters never go backwards; empty the directory when the
+    server (not a worker) starts
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'METRICS_CONFIG', {})
+        self.enabled = config.get('ENABLED', True)
+        self.slow_request_seconds = config.get('SLOW_REQUEST_MS', 500) / 1000
+        self.slow_sample_rate = config.get('SLOW_SAMPLE_RATE', 1.0)
+        self.max_queries = config.get('MAX_CAPTURED_QUERIES', 200)
+        self.latency = Histogram(config.get(
+            'LATENCY_BUCKETS', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        ))
+        self.query_counts = Histogram(config.get('QUERY_BUCKETS', (0, 1, 2, 5, 10, 20, 50, 100, 200)))
+        self.external_latency = Histogram(config.get(
+            'EXTERNAL_LATENCY_BUCKETS', (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+        ))
+        self.counters = {}
+        self.slow_samples = deque(maxlen=config.get('SLOW_SAMPLE_SIZE', 50))
+        self._lock = threading.Lock()
+        self.multiprocess_dir = config.get('MULTIPROCESS_DIR') or None
+        self.flush_seconds = config.get('FLUSH_SECONDS', 5)
+        self._flushed_at = 0.0
+        self._process_file = None
+        if self.multiprocess_dir:
+            os.makedirs(self.multiprocess_dir, exist_ok=True)
+            self._process_file = self._new_process_file()
+            atexit.register(self.flush)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._forked)
+
+    def _new_process_file(self):
+        # The pid alone could be reused by a later worker and overwrite an exited one's totals
+        return os.path.join(self.multiprocess_dir, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+
+    def _forked(self):
+        """A new worker starts from nothing: its parent's series are in the parent's file"""
+        self._lock = threading.Lock()
+        for histogram in self._histograms().values():
+            histogram.series.clear()
+        self.counters.clear()
+        self.slow_samples.clear()
+        self._flushed_at = 0.0
+        self._process_file = self._new_process_file()
+
+    def _histograms(self):
+        return {'latency': self.latency, 'query_counts': self.query_counts, 'external_latency': self.external_latency}
+
+    def flush(self, force=True):
+        """
+        Write this process's series to its file in MULTIPROCESS_DIR
+
+        Args:
+            force (bool): Write even if the last write is under FLUSH_SECONDS old
+        """
+        if not self.multiprocess_dir or not os.path.isdir(self.multiprocess_dir):
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_seconds:
+            return
+        with self._lock:
+            self._flushed_at = now
+            state = {
+                'histograms': {
+                    name: [[list(labels), counts, total[0]] for labels, (counts, total) in histogram.series.items()]
+                    for name, histogram in self._histograms().items()
+                },
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'slow_samples': list(self.slow_samples),
+            }
+        path = self._process_file
+        try:
+            with open(f'{path}.tmp', 'w') as handle:
+                json.dump(state, handle, separators=(',', ':'))
+            # Readers only ever see a complete file
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            logger.error(f"Could not write metrics to {path}: {e}")
+
+    def _process_states(self):
+        """The saved series of every process, this one's freshly written"""
+        self.flush()
+        states = []
+        for entry in os.scandir(self.multiprocess_dir):
+            if not (entry.name.startswith('metrics-') and entry.name.endswith('.json')):
+                continue
+            try:
+                with open(entry.path) as handle:
+                    states.append(json.load(handle))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics file {entry.path}: {e}")
+        return states
+
+    def _merged(self):
+        """(histograms, counters) summed over every process"""
+        histograms = {name: Histogram(histogram.buckets) for name, histogram in self._histograms().items()}
+        counters = {}
+        for state in self._process_states():
+            for name, series in state.get('histograms', {}).items():
+                if name in histograms:
+                    for labels, counts, total in series:
+                        histograms[name].merge(tuple(labels), counts, total)
+            for name, labels, value in state.get('counters', []):
+                key = (name, tuple(labels))
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def _inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def begin_request(self):
+        """
+        Start collecting for the request being served on this thread
+
+        Returns:
+            tuple: (RequestStats, token to pass to finish_request)
+        """
+        stats = RequestStats(self.max_queries)
+        return stats, _current.set(stats)
+
+    def finish_request(self, stats, token, route, method, status, path):
+        """
+        Record a served request
+
+        Args:
+            stats (RequestStats): From begin_request
+            token: From begin_request
+            route (str): URL name (namespace:name) or a placeholder
+            method (str): HTTP method
+            status (int): Response status code
+            path (str): Request path, kept only in slow samples
+        """
+        _current.reset(token)
+        elapsed = time.perf_counter() - stats.started
+        with self._lock:
+            self.latency.observe((route, method), elapsed)
+            self.query_counts.observe((route,), stats.query_count)
+            self._inc('flexifinance_http_requests_total', (route, method, str(status)))
+            self._inc('flexifinance_db_queries_total', (route,), stats.query_count)
+            self._inc('flexifinance_db_query_seconds_total', (route,), stats.query_seconds)
+            self._inc('flexifinance_http_request_external_seconds_total', (route,), stats.external_seconds)
+            self._count_cache(route, stats.cache_hits, stats.cache_misses)
+            if elapsed >= self.slow_request_seconds:
+                self._inc('flexifinance_slow_requests_total', (route,))
+
+        if elapsed >= self.slow_request_seconds and random.random() < self.slow_sample_rate:
+            self._sample(stats, elapsed, route, method, status, path)
+        self.flush(force=False)
+
+    def _sample(self, stats, elapsed, route, method, status, path):
+        """Keep a slow request with its statements, slowest first"""
+        queries = sorted(stats.queries, key=lambda query: query[1], reverse=True)
+        sample = {
+            'at': datetime.now(dt_timezone.utc).isoformat(),
+            'route': route,
+            'method': method,
+            'path': path,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 2),
+            'query_count': stats.query_count,
+            'query_ms': round(stats.query_seconds * 1000, 2),
+            'queries': [{'sql': sql, 'ms': round(seconds * 1000, 3)} for sql, seconds in queries],
+            'queries_truncated': stats.query_count > len(stats.queries),
+            'external_ms': round(stats.external_seconds * 1000, 2),
+            'external_calls': stats.external_calls,
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+        }
+        self.slow_samples.append(sample)
+        logger.warning(
+            f"Slow request {method} {path} ({route}): {sample['duration_ms']}ms, "
+            f"{stats.query_count} queries in {sample['query_ms']}ms, {sample['external_ms']}ms external"
+        )
+
+    def record_cache(self, hits, misses):
+        """Count cache lookups; inside a request they are labelled with its route when it finishes"""
+        stats = _current.get()
+        if stats is not None:
+            stats.cache_hits += hits
+            stats.cache_misses += misses
+            return
+        with self._lock:
+            self._count_cache(NO_ROUTE, hits, misses)
+
+    def _count_cache(self, route, hits, misses):
+        if hits:
+            self._inc('flexifinance_cache_requests_total', (route, 'hit'), hits)
+        if misses:
+            self._inc('flexifinance_cache_requests_total', (route, 'miss'), misses)
+
+    @contextmanager
+    def external_call(self, service, operation):
+        """
+        Time an outbound HTTP call
+
+        Args:
+            service (str): 'mpesa', 'resend', 'supabase', ...
+            operation (str): What the call does, e.g. 'stk_push'
+        """
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = _current.get()
+            if stats is not None:
+                stats.external_seconds += elapsed
+                stats.external_calls.append({
+                    'service': service, 'operation': operation,
+                    'ms': round(elapsed * 1000, 2), 'outcome': outcome,
+                })
+            with self._lock:
+                self.external_latency.observe((service, operation), elapsed)
+                self._inc('flexifinance_external_requests_total', (service, operation, outcome))
+
+    def render(self):
+        """
+        Every metric in the Prometheus text exposition format
+
+        Returns:
+            str: Exposition text
+        """
+        if self.multiprocess_dir:
+            histograms, counters = self._merged()
+            return self._render(histograms, counters)
+        with self._lock:
+            return self._render(self._histograms(), self.counters)
+
+    def _render(self, histograms, counters):
+        lines = []
+        self._render_histogram(
+            lines, 'flexifinance_http_request_duration_seconds',
+            'Request latency by URL name', ('route', 'method'), histograms['latency']
+        )
+        self._render_histogram(
+            lines, 'flexifinance_http_request_queries',
+            'Database queries per request by URL name', ('route',), histograms['query_counts']
+        )
+        self._render_histogram(
+            lines, 'flexifinance_external_request_duration_seconds',
+            'Outbound HTTP call latency', ('service', 'operation'), histograms['external_latency']
+        )
+        for name, (help_text, label_names) in COUNTERS.items():
+            series = [(labels, value) for (counter, labels), value in counters.items() if counter == name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(series):
+                lines.append(f'{name}{{{_labels(label_names, labels)}}} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, lines, name, help_text, label_names, histogram):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, (counts, total) in sorted(histogram.series.items()):
+            label_text = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{_number(bound)}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {_number(total[0])}')
+            lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+
+    def slow_requests(self):
+        """Sampled slow requests (of every process with MULTIPROCESS_DIR), newest first"""
+        if not self.multiprocess_dir:
+            return list(reversed(self.slow_samples))
+        samples = [sample for state in self._process_states() for sample in state.get('slow_samples', [])]
+        return sorted(samples, key=lambda sample: sample['at'], reverse=True)[:self.slow_samples.maxlen]
+
+    def reset(self):
+        """Drop this process's series and samples (used between benchmark runs)"""
+        with self._lock:
+            for histogram in self._histograms().values():
+                histogram.series.clear()
+            self.counters.clear()
+            self.slow_samples.clear()
+        self.flush()
+
+
+# Counter name -> (help, label names)
+COUNTERS = {
+    'flexifinance_http_requests_total': ('Requests served by URL name and status', ('route', 'method', 'status')),
+    'flexifinance_db_queries_total': ('Database queries by URL name', ('route',)),
+    'flexifinance_db_query_seconds_total': ('Time spent in database queries by URL name', ('route',)),
+    'flexifinance_http_request_external_seconds_total': ('Time spent in outbound HTTP calls by URL name', ('route',)),
+    'flexifinance_slow_requests_total': ('Requests slower than SLOW_REQUEST_MS by URL name', ('route',)),
+    'flexifinance_cache_requests_total': ('Cache lookups by URL name and result', ('route', 'result')),
+    'flexifinance_external_requests_total': ('Outbound HTTP calls by outcome', ('service', 'operation', 'outcome')),
+}
+
+
+def _labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Global service instance
+metrics_service = MetricsService()
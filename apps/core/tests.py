@@ -0,0 +1,98 @@
+"""
+Tests for the core app
+"""
+import json
+import logging
+import tempfile
+from collections import deque
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from apps.core.log_handlers import JsonFormatter, RedactingFilter, redact
+from apps.core.services.health_service import HealthService
+from apps.core.services.metrics_service import MetricsService
+from apps.core.views import metrics
+
+
+class RedactionTests(SimpleTestCase):
+    def render(self, **extra):
+        record = logging.LogRecord('apps.payments', logging.INFO, __file__, 1, 'STK push to %s', ('254712345678',), None)
+        record.__dict__.update(extra)
+        RedactingFilter().filter(record)
+        return json.loads(JsonFormatter().format(record))
+
+    def test_message_is_redacted(self):
+        self.assertEqual(self.render()['message'], 'STK push to 254******678')
+
+    def test_link_tokens_are_redacted(self):
+        self.assertEqual(
+            redact('GET http://127.0.0.1:8000/verify-email/MTI/c3k9ab-0f1e2d3c4b5a/ 200'),
+            'GET http://127.0.0.1:8000/verify-email/MTI/[REDACTED]/ 200'
+        )
+        self.assertEqual(redact('/accounts/reset/MTI/c3k9ab-0f1e2d/'), '/accounts/reset/MTI/[REDACTED]/')
+
+    def test_extra_fields_are_redacted(self):
+        entry = self.render(
+            phone='0712345678', access_token='abc', payload={'PassKey': 'xyz', 'PhoneNumber': 254712345678}
+        )
+        self.assertEqual(entry['phone'], '0******678')
+        self.assertEqual(entry['access_token'], '[REDACTED]')
+        self.assertEqual(entry['payload'], {'PassKey': '[REDACTED]', 'PhoneNumber': '254******678'})
+
+
+class HealthReportTests(SimpleTestCase):
+    def setUp(self):
+        self.service = HealthService()
+        self.service.probes = {'database': lambda: None, 'cache': lambda: None}
+        self.service._latencies = {name: deque() for name in self.service.probes}
+        patcher = mock.patch.object(self.service, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_report_probes_instead_of_starting(self):
+        ready, body = self.service.report()
+        self.assertTrue(ready)
+        self.assertEqual(body['status'], 'healthy')
+
+    @override_settings(MPESA_CONFIG={'CONSUMER_KEY': '', 'CONSUMER_SECRET': ''})
+    def test_daraja_is_not_probed_without_credentials(self):
+        with mock.patch('apps.core.services.health_service.requests.get') as get:
+            self.assertEqual(self.service.probe_daraja(), 'not_configured')
+        get.assert_not_called()
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.settings_override = override_settings(
+            METRICS_CONFIG={'MULTIPROCESS_DIR': metrics_dir.name, 'FLUSH_SECONDS': 0}
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def serve(self, worker, route):
+        stats, token = worker.begin_request()
+        stats.query_count = 2
+        worker.finish_request(stats, token, route, 'GET', 200, '/')
+
+    def test_scrape_sums_every_worker(self):
+        first, second = MetricsService(), MetricsService()
+        self.serve(first, 'dashboard:home')
+        self.serve(second, 'dashboard:home')
+        self.serve(second, 'dashboard:home')
+
+        text = first.render()
+        self.assertIn('flexifinance_http_requests_total{route="dashboard:home",method="GET",status="200"} 3', text)
+        self.assertIn('flexifinance_db_queries_total{route="dashboard:home"} 6', text)
+        self.assertIn('flexifinance_http_request_queries_count{route="dashboard:home"} 3', text)
+
+
+class MetricsAccessTests(SimpleTestCase):
+    @override_settings(DEBUG=True, METRICS_CONFIG={'TOKEN': ''})
+    def test_debug_does_not_open_metrics(self):
+        request = RequestFactory().get('/metrics/')
+        request.user = AnonymousUser()
+        self.assertEqual(metrics(request).status_code, 403)
@@ -11,14 +11,18 @@ from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 from django.contrib import messages
 from django.conf import settings
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
+import hmac
 import json
 import logging
 from datetime import datetime
 
 # Import services
-from apps.payments.services.resend_email_service import ResendEmailService
+from apps.core.services.health_service import health_service
+from apps.core.services.metrics_service import metrics_service
+from apps.notifications.services.outbox_service import outbox_service
 from apps.loans.models import Loan, LoanProduct
 from apps.users.models import User
 
@@ -174,25 +178,24 @@ class ContactView(TemplateView):
                 contact.source = 'website_contact_page'
                 contact.ip_address = request.META.get('REMOTE_ADDR', '')
                 contact.user_agent = request.META.get('HTTP_USER_AGENT', '')
-                contact.save()
                 
-                # Send email notification
-                try:
-                    resend_service = ResendEmailService()
-                    contact_data = {
+                # Email and Supabase deliveries go out from the outbox dispatcher
+                with transaction.atomic():
+                    contact.save()
+                    outbox_service.enqueue('CONTACT', contact.pk, {
                         'name': contact.name,
                         'email': contact.email,
                         'phone': contact.phone,
                         'message': contact.message,
                         'subject': contact.subject,
                         'source': contact.source,
-                    }
-                    resend_service.send_contact_notification(contact_data)
-                except Exception as e:
-                    logger.warning(f"Email notification failed: {str(e)}")
+                        'created_at': contact.created_at.isoformat(),
+                        'ip_address': contact.ip_address,
+                        'user_agent': contact.user_agent,
+                    })
                 
                 messages.success(request, 'Thank you for your message! We will get back to you within 24 hours.')
-                return redirect('contact')
+                return redirect('core:contact')
             except Exception as e:
                 logger.error(f"Error saving contact form: {str(e)}")
                 messages.error(request, 'Sorry, there was an error processing your message. Please try again.')
@@ -276,26 +279,26 @@ class SupportView(TemplateView):
                 # Save support form
                 contact = form.save(commit=False)
                 contact.source = 'website_support_page'
-                contact.subject = f"[{contact.issue_type}] {contact.subject}"
+                priority = form.cleaned_data['priority']
+                contact.subject = f"[{form.cleaned_data['issue_type']}] {contact.subject}"
                 contact.ip_address = request.META.get('REMOTE_ADDR', '')
                 contact.user_agent = request.META.get('HTTP_USER_AGENT', '')
-                contact.save()
                 
-                # Send email notification with higher priority
-                try:
-                    resend_service = ResendEmailService()
-                    contact_data = {
+                # Email and Supabase deliveries go out from the outbox dispatcher
+                with transaction.atomic():
+                    contact.save()
+                    outbox_service.enqueue('SUPPORT', contact.pk, {
                         'name': contact.name,
                         'email': contact.email,
                         'phone': contact.phone,
-                        'message': f"Priority: {contact.priority}\n\n{contact.message}",
-                        'subject': f"[{contact.issue_type}] {contact.subject}",
+                        'message': f"Priority: {priority}\n\n{contact.message}",
+                        'subject': contact.subject,
                         'source': contact.source,
-                        'priority': contact.priority,
-                    }
-                    resend_service.send_contact_notification(contact_data)
-                except Exception as e:
-                    logger.warning(f"Email notification failed: {str(e)}")
+                        'priority': priority,
+                        'created_at': contact.created_at.isoformat(),
+                        'ip_address': contact.ip_address,
+                        'user_agent': contact.user_agent,
+                    })
                 
                 messages.success(request, 'Your support request has been submitted successfully! Our team will respond within 24 hours.')
                 return redirect('support')
@@ -670,7 +673,7 @@ class LoanApplicationView(ProductHelperMixin, TemplateView):
                     description=f"Loan application from {data.get('first_name', '')} {data.get('last_name', '')}. Purpose: {data.get('loan_purpose', '')}",
                     status='SUBMITTED',
                     processing_fee=0,  # Set based on your business logic
-                    risk_category='MEDIUM'  # Set based on risk assessment logic
+                    risk_category='MEDIUM'  # Provisional; reassigned by automated decisioning (decide_loans)
                 )
                 
                 logger.info(f"Created loan application: {loan.loan_reference} for user {email}")
@@ -839,48 +842,35 @@ def submit_contact_form(request):
             'user_agent': request.META.get('HTTP_USER_AGENT', ''),
         }
         
-        # Store contact form data in local database
-        # You can create a Contact model for this, for now we'll log it
+        # Store the submission; email and Supabase deliveries go out from the outbox dispatcher
         try:
             from apps.core.models import Contact
-            contact = Contact.objects.create(
-                name=contact_data['name'],
-                email=contact_data['email'],
-                phone=contact_data.get('phone', ''),
-                message=contact_data['message'],
-                subject=contact_data['subject'],
-                source=contact_data['source'],
-                ip_address=contact_data['ip_address'],
-                user_agent=contact_data['user_agent'],
-            )
+            with transaction.atomic():
+                contact = Contact.objects.create(
+                    name=contact_data['name'],
+                    email=contact_data['email'],
+                    phone=contact_data.get('phone', ''),
+                    message=contact_data['message'],
+                    subject=contact_data['subject'],
+                    source=contact_data['source'],
+                    ip_address=contact_data['ip_address'] or None,
+                    user_agent=contact_data['user_agent'],
+                )
+                outbox_service.enqueue('CONTACT', contact.pk, contact_data)
             logger.info(f"Contact form saved to database with ID: {contact.id}")
-            db_success = True
-        except ImportError:
-            # If Contact model doesn't exist, just log the data
-            logger.info(f"Contact form data (model not found): {contact_data}")
-            db_success = False
         except Exception as e:
-            logger.warning(f"Database contact form storage failed: {str(e)}")
-            db_success = False
-        
-        # Try to send email notification, but continue even if it fails
-        email_success = False
-        try:
-            resend_service = ResendEmailService()
-            email_result = resend_service.send_contact_notification(contact_data)
-            email_success = email_result if isinstance(email_result, bool) else True
-        except Exception as e:
-            logger.warning(f"Email notification failed: {str(e)}")
-        
-        # Always return success since we've captured the data
-        logger.info(f"Contact form processed for {contact_data['email']} (Database: {db_success}, Email: {email_success})")
+            logger.error(f"Contact form storage failed: {str(e)}")
+            return JsonResponse({
+                'success': False,
+                'error': 'An unexpected error occurred. Please try again.'
+            }, status=500)
         
         response_data = {
             'success': True,
             'message': 'Thank you for your message. We will get back to you within 24 hours.',
             'data': {
                 'submitted_at': contact_data['created_at'],
-                'reference_id': f'CF-{int(datetime.now().timestamp())}'  # Simple reference ID
+                'reference_id': f'CF-{contact.id}'
             }
         }
         logger.info(f"Sending success response: {response_data}")  # Debug logging
@@ -901,41 +891,49 @@ def submit_contact_form(request):
 
 @require_http_methods(["GET"])
 def health_check(request):
-    """Health check endpoint for monitoring"""
-    try:
-        # Check database connection
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        
-        # Check email service
-        email_status = False
-        try:
-            resend_service = ResendEmailService()
-            email_status = resend_service.health_check()
-        except Exception as e:
-            logger.warning(f"Email service health check failed: {str(e)}")
-        
-        health_data = {
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'services': {
-                'database': 'connected',
-                'email': 'connected' if email_status else 'disconnected',
-            },
-            'version': '1.0.0',
-            'environment': getattr(settings, 'RAILWAY_ENVIRONMENT', 'development')
-        }
-        
-        return JsonResponse(health_data)
-        
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return JsonResponse({
-            'status': 'unhealthy',
-            'timestamp': datetime.now().isoformat(),
-            'error': str(e)
-        }, status=503)
+    """Health of every dependency, from the background probes' cached results"""
+    ready, report = health_service.report()
+    report.update({
+        'timestamp': datetime.now().isoformat(),
+        'version': '1.0.0',
+        'environment': getattr(settings, 'RAILWAY_ENVIRONMENT', 'development')
+    })
+    return JsonResponse(report, status=200 if ready else 503)
+
+@require_http_methods(["GET"])
+def liveness_check(request):
+    """Liveness probe: the process is serving requests (no dependency checks)"""
+    return JsonResponse({'status': 'alive'})
+
+@require_http_methods(["GET"])
+def readiness_check(request):
+    """Readiness probe: critical dependencies were up at the last background probe"""
+    ready, report = health_service.report()
+    return JsonResponse({
+        'status': report['status'],
+        'checks': {name: check['status'] for name, check in report['checks'].items()}
+    }, status=200 if ready else 503)
+
+def _metrics_authorized(request):
+    """METRICS_CONFIG['TOKEN'] as a bearer token when set, otherwise staff users (DEBUG included)"""
+    token = settings.METRICS_CONFIG.get('TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return request.user.is_staff
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Request, query, cache and outbound HTTP metrics for Prometheus"""
+    if not _metrics_authorized(request):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_service.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_http_methods(["GET"])
+def slow_requests(request):
+    """Sampled slow requests with their queries and external calls"""
+    if not _metrics_authorized(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse({'slow_requests': metrics_service.slow_requests()})
 
 @require_http_methods(["GET"])
 def get_public_config(request):
@@ -995,38 +993,28 @@ def newsletter_subscribe(request):
                     subscription.interests = interests
                     subscription.ip_address = request.META.get('REMOTE_ADDR', '')
                     subscription.user_agent = request.META.get('HTTP_USER_AGENT', '')
-                    subscription.save()
+                    with transaction.atomic():
+                        subscription.save()
+                        outbox_service.enqueue('NEWSLETTER', subscription.pk, {'email': email, 'source': subscription.source})
                     
                     logger.info(f"Reactivated newsletter subscription: {email}")
                     
             except NewsletterSubscription.DoesNotExist:
                 # Create new subscription
-                subscription = NewsletterSubscription.objects.create(
-                    email=email,
-                    first_name=first_name,
-                    last_name=last_name,
-                    interests=interests,
-                    source='website_footer',
-                    ip_address=request.META.get('REMOTE_ADDR', ''),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')
-                )
+                with transaction.atomic():
+                    subscription = NewsletterSubscription.objects.create(
+                        email=email,
+                        first_name=first_name,
+                        last_name=last_name,
+                        interests=interests,
+                        source='website_footer',
+                        ip_address=request.META.get('REMOTE_ADDR', ''),
+                        user_agent=request.META.get('HTTP_USER_AGENT', '')
+                    )
+                    outbox_service.enqueue('NEWSLETTER', subscription.pk, {'email': email, 'source': subscription.source})
                 
                 logger.info(f"New newsletter subscription: {email}")
             
-            # Send welcome email (optional)
-            try:
-                resend_service = ResendEmailService()
-                welcome_data = {
-                    'email': email,
-                    'first_name': first_name,
-                    'interests': interests,
-                    'subscription_date': subscription.subscribed_at.isoformat()
-                }
-                # You can implement a welcome email function here
-                # resend_service.send_welcome_email(welcome_data)
-            except Exception as e:
-                logger.warning(f"Welcome email failed: {str(e)}")
-            
             return JsonResponse({
                 'success': True,
                 'message': 'Thank you for subscribing to our newsletter!',
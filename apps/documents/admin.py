@@ -7,9 +7,15 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.http import HttpResponse
+from django.conf import settings
+from django.utils import timezone
+from apps.core.admin_utils import LargeTableAdminMixin, is_changelist_request
 import csv
 from datetime import datetime, timedelta
-from .models import DocumentType, Document, DocumentVerification, DocumentAccessLog
+from .models import (
+    DocumentType, Document, DocumentVerification, DocumentAccessLog, DocumentAccessLogArchive,
+    DocumentUploadSession
+)
 
 
 @admin.register(DocumentType)
@@ -60,7 +66,7 @@ class DocumentTypeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Main admin interface for documents"""
     list_display = [
         'user_display',
@@ -75,7 +81,8 @@ class DocumentAdmin(admin.ModelAdmin):
         'document_type', 
         'uploaded_at',
         'verified_at',
-        'document_type__required_for'
+        'document_type__required_for',
+        'processing_status'
     ]
     search_fields = [
         'user__email', 
@@ -84,13 +91,20 @@ class DocumentAdmin(admin.ModelAdmin):
         'original_filename',
         'user__phone_number'
     ]
+    list_select_related = ['user', 'document_type', 'verified_by']
+    list_defer = ['metadata']
     readonly_fields = [
         'file_size',
         'uploaded_at',
         'verified_at',
         'download_count',
         'last_accessed',
-        'file_url'
+        'file_url',
+        'content_hash',
+        'processing_status',
+        'processed_at',
+        'thumbnail',
+        'preview'
     ]
     
     fieldsets = (
@@ -127,6 +141,11 @@ class DocumentAdmin(admin.ModelAdmin):
         ('Technical Details', {
             'fields': (
                 'metadata',
+                'content_hash',
+                'processing_status',
+                'processed_at',
+                'thumbnail',
+                'preview',
                 'download_count',
                 'last_accessed'
             ),
@@ -150,7 +169,7 @@ class DocumentAdmin(admin.ModelAdmin):
     
     def user_display(self, obj):
         """Display user information with link"""
-        url = reverse('admin:users_user_change', args=[obj.user.id])
+        url = reverse('admin:users_user_change', args=[obj.user_id])
         return format_html(
             '<a href="{}">{}</a><br><small>{}</small>',
             url,
@@ -182,10 +201,10 @@ class DocumentAdmin(admin.ModelAdmin):
         size_kb = obj.file_size / 1024 if obj.file_size else 0
         extension = obj.get_file_extension()
         return format_html(
-            '{}<br><small>{} ({:.1f} KB)</small>',
+            '{}<br><small>{} ({} KB)</small>',
             obj.original_filename,
             extension,
-            size_kb
+            f"{size_kb:.1f}"
         )
     file_info.short_description = 'File'
     
@@ -232,7 +251,8 @@ class DocumentAdmin(admin.ModelAdmin):
             status='REJECTED',
             rejection_reason='Bulk rejection from admin',
             verified_by=request.user,
-            verified_at=timezone.now()
+            verified_at=timezone.now(),
+            updated_at=timezone.now()
         )
         self.message_user(request, f'{rejected} documents rejected.')
     reject_documents.short_description = 'Reject selected documents'
@@ -243,7 +263,7 @@ class DocumentAdmin(admin.ModelAdmin):
             status__in=['APPROVED', 'AUTO_APPROVED'],
             expires_at__isnull=False,
             expires_at__lt=timezone.now()
-        ).update(status='EXPIRED')
+        ).update(status='EXPIRED', updated_at=timezone.now())
         self.message_user(request, f'{updated} documents marked as expired.')
     mark_as_expired.short_description = 'Mark selected documents as expired'
     
@@ -255,7 +275,8 @@ class DocumentAdmin(admin.ModelAdmin):
         ).update(
             status='AUTO_APPROVED',
             verified_by=request.user,
-            verified_at=timezone.now()
+            verified_at=timezone.now(),
+            updated_at=timezone.now()
         )
         self.message_user(request, f'{updated} documents marked as auto-approved.')
     mark_as_auto_approved.short_description = 'Mark as auto-approved'
@@ -291,7 +312,7 @@ class DocumentAdmin(admin.ModelAdmin):
 
 
 @admin.register(DocumentVerification)
-class DocumentVerificationAdmin(admin.ModelAdmin):
+class DocumentVerificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin interface for document verifications"""
     list_display = [
         'document_link',
@@ -314,6 +335,8 @@ class DocumentVerificationAdmin(admin.ModelAdmin):
         'notes'
     ]
     readonly_fields = ['verification_date']
+    list_select_related = ['document__document_type', 'document__user', 'verifier']
+    list_defer = ['ai_analysis_result', 'verification_metadata']
     
     fieldsets = (
         ('Document Information', {
@@ -341,7 +364,7 @@ class DocumentVerificationAdmin(admin.ModelAdmin):
     
     def document_link(self, obj):
         """Display document link"""
-        url = reverse('admin:documents_document_change', args=[obj.document.id])
+        url = reverse('admin:documents_document_change', args=[obj.document_id])
         return format_html(
             '<a href="{}">{}</a><br><small>{}</small>',
             url,
@@ -376,7 +399,7 @@ class DocumentVerificationAdmin(admin.ModelAdmin):
 
 
 @admin.register(DocumentAccessLog)
-class DocumentAccessLogAdmin(admin.ModelAdmin):
+class DocumentAccessLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """Admin interface for document access logs"""
     list_display = [
         'document_link',
@@ -397,10 +420,20 @@ class DocumentAccessLogAdmin(admin.ModelAdmin):
         'session_id'
     ]
     readonly_fields = ['timestamp']
+    date_hierarchy = 'timestamp'
+    list_select_related = ['document__document_type', 'document__user', 'user']
+    
+    def get_queryset(self, request):
+        """Limit the changelist to the recent window unless a date filter is chosen"""
+        queryset = super().get_queryset(request)
+        if is_changelist_request(request) and not any(key.startswith('timestamp') for key in request.GET):
+            days = getattr(settings, 'DOCUMENT_CONFIG', {}).get('ACCESS_LOG_QUERY_DAYS', 30)
+            queryset = queryset.filter(timestamp__gte=timezone.now() - timedelta(days=days))
+        return queryset
     
     def document_link(self, obj):
         """Display document link"""
-        url = reverse('admin:documents_document_change', args=[obj.document.id])
+        url = reverse('admin:documents_document_change', args=[obj.document_id])
         return format_html(
             '<a href="{}">{}</a><br><small>{}</small>',
             url,
@@ -438,4 +471,33 @@ class DocumentAccessLogAdmin(admin.ModelAdmin):
 # Custom admin site configuration
 admin.site.site_header = "FlexiFinance Document Management"
 admin.site.site_title = "Documents Admin"
-admin.site.index_title = "Document Management Dashboard"
\ No newline at end of file
+admin.site.index_title = "Document Management Dashboard"
+
+@admin.register(DocumentUploadSession)
+class DocumentUploadSessionAdmin(admin.ModelAdmin):
+    """Admin interface for resumable upload sessions"""
+    list_display = [
+        'original_filename',
+        'user',
+        'document_type',
+        'status',
+        'received_bytes',
+        'total_size',
+        'created_at',
+        'expires_at'
+    ]
+    list_filter = ['status', 'document_type', 'created_at']
+    search_fields = ['user__email', 'original_filename']
+    list_select_related = ['user', 'document_type']
+    readonly_fields = ['id', 'received_bytes', 'document', 'created_at', 'updated_at']
+    raw_id_fields = ['user', 'document']
+
+
+@admin.register(DocumentAccessLogArchive)
+class DocumentAccessLogArchiveAdmin(admin.ModelAdmin):
+    """Admin interface for archived access log months"""
+    list_display = ['month', 'row_count', 'file_size', 'file_path', 'created_at']
+    readonly_fields = ['month', 'file_path', 'row_count', 'file_size', 'sha256', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
@@ -13,6 +13,11 @@ urlpatterns = [
     path('status/', views.document_status_api, name='api_status'),
     path('upload/', views.api_document_upload, name='api_upload'),
     
+    # Resumable chunked uploads
+    path('uploads/', views.upload_session_create, name='upload_session_create'),
+    path('uploads/<uuid:upload_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_session_complete, name='upload_session_complete'),
+    
     # Root API endpoint
     path('', views.document_status_api, name='api_root'),
 ]
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DocumentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.documents'
+    verbose_name = 'Document Management'
+
+    def ready(self):
+        """Import signals when Django starts"""
+        import apps.documents.signals
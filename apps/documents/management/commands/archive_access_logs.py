@@ -0,0 +1,33 @@
+"""
+Management command to roll old document access logs into compressed monthly archives
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.documents.services.access_service import access_log_archiver
+
+
+class Command(BaseCommand):
+    help = 'Archive document access logs older than the retention window to gzip CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Archive a single month (YYYY-MM) regardless of retention')
+        parser.add_argument('--retention-months', type=int, help='Override DOCUMENT_CONFIG ACCESS_LOG_RETENTION_MONTHS')
+
+    def handle(self, *args, **options):
+        if options['retention_months'] is not None:
+            access_log_archiver.retention_months = options['retention_months']
+
+        if options['month']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must be in YYYY-MM format')
+            archive = access_log_archiver.archive_month(month)
+            archives = [archive] if archive else []
+        else:
+            archives = access_log_archiver.archive_expired()
+
+        for archive in archives:
+            self.stdout.write(f'{archive.month:%Y-%m}: {archive.row_count} rows -> {archive.file_path}')
+        self.stdout.write(self.style.SUCCESS(f'Archived {len(archives)} month(s)'))
@@ -0,0 +1,13 @@
+"""
+Management command to expire abandoned resumable document uploads
+"""
+from django.core.management.base import BaseCommand
+from apps.documents.services.upload_service import upload_service
+
+
+class Command(BaseCommand):
+    help = 'Expire stale document upload sessions and delete their partial files'
+
+    def handle(self, *args, **options):
+        expired = upload_service.cleanup_expired()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} upload session(s)'))
@@ -0,0 +1,16 @@
+"""
+Management command to materialize daily document analytics summaries
+"""
+from django.core.management.base import BaseCommand
+from apps.documents.services.analytics_service import document_analytics_service
+
+
+class Command(BaseCommand):
+    help = 'Materialize per-day document statistics for closed days (run daily after midnight)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild all summaries from scratch')
+
+    def handle(self, *args, **options):
+        days = document_analytics_service.materialize(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Materialized {days} day(s) of document analytics'))
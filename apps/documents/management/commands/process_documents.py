@@ -0,0 +1,31 @@
+"""
+Management command to generate document previews and extract metadata
+"""
+from django.core.management.base import BaseCommand
+from apps.documents.services.processing_service import processing_service
+
+
+class Command(BaseCommand):
+    help = 'Process documents still waiting for previews, text extraction and analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Documents per batch')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry documents that failed')
+
+    def handle(self, *args, **options):
+        statuses = ('PENDING', 'FAILED') if options['retry_failed'] else ('PENDING',)
+        processed = failed = 0
+
+        try:
+            while True:
+                result = processing_service.process_pending(options['batch_size'], statuses=statuses)
+                processed += result['processed']
+                failed += result['failed']
+                if result['processed'] + result['failed'] < options['batch_size']:
+                    break
+                # Failed documents are picked up again only on the next run
+                statuses = ('PENDING',)
+        finally:
+            processing_service.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} document(s), {failed} failed'))
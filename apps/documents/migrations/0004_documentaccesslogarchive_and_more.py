@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:55
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_document_preview_document_processed_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentAccessLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month', unique=True)),
+                ('file_path', models.CharField(max_length=500)),
+                ('row_count', models.IntegerField(default=0)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document Access Log Archive',
+                'verbose_name_plural': 'Document Access Log Archives',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='documentaccesslog',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='documentaccesslog',
+            index=models.Index(fields=['action', 'timestamp'], name='documents_d_action_7b4afa_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_documentaccesslogarchive_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('uploads', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('auto_approved', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+                ('reviewed', models.IntegerField(default=0)),
+                ('turnaround_histogram', models.JSONField(blank=True, default=list, help_text='Manual review turnaround counts per hour bucket')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('document_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='documents.documenttype')),
+            ],
+            options={
+                'verbose_name': 'Document Daily Summary',
+                'verbose_name_plural': 'Document Daily Summaries',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'document_type')},
+            },
+        ),
+    ]
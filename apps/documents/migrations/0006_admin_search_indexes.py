@@ -0,0 +1,19 @@
+# Trigram/prefix indexes backing admin search_fields (PostgreSQL only)
+
+from django.db import migrations
+
+from apps.core.search_indexes import search_index_operations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("documents", "0005_documentdailysummary"),
+    ]
+
+    operations = search_index_operations([
+        ('documents_filename_trgm', 'documents_document', 'original_filename', 'trigram'),
+    ])
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_admin_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', 'uploaded_at', 'id'], name='documents_d_user_id_4ec2e7_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentuploadsession',
+            name='status',
+            field=models.CharField(choices=[('UPLOADING', 'Uploading'), ('COMPLETING', 'Completing'), ('COMPLETED', 'Completed'), ('ABORTED', 'Aborted'), ('EXPIRED', 'Expired')], default='UPLOADING', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_upload_session_completing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
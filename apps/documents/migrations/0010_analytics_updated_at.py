@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:46
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_processing_started_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='documentdailysummary',
+            name='stale',
+            field=models.BooleanField(default=False, help_text='A document of this day was deleted since'),
+        ),
+        migrations.AlterField(
+            model_name='documentdailysummary',
+            name='computed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Built without locking the documents table on PostgreSQL
+
+from django.db import migrations, models
+
+from apps.core.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('documents', '0010_analytics_updated_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='document',
+            index=models.Index(fields=['updated_at'], name='documents_d_updated_00a831_idx'),
+        ),
+    ]
@@ -8,6 +8,7 @@ from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import os
+import uuid
 
 User = get_user_model()
 
@@ -81,6 +82,13 @@ class Document(models.Model):
         ('AUTO_APPROVED', 'Auto-Approved'),
     ]
     
+    PROCESSING_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE)
     file = models.FileField(
@@ -95,6 +103,8 @@ class Document(models.Model):
     rejection_reason = models.TextField(blank=True)
     admin_notes = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by review and status changes (analytics re-materializes the upload day)
+    updated_at = models.DateTimeField(auto_now=True)
     verified_at = models.DateTimeField(null=True, blank=True)
     verified_by = models.ForeignKey(
         User, 
@@ -105,8 +115,26 @@ class Document(models.Model):
     )
     expires_at = models.DateTimeField(null=True, blank=True)
     metadata = models.JSONField(default=dict, blank=True)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the file content (content-addressed storage key)"
+    )
     download_count = models.IntegerField(default=0)
     last_accessed = models.DateTimeField(null=True, blank=True)
+    
+    # Background processing output (previews, extracted text/metadata)
+    processing_status = models.CharField(
+        max_length=20,
+        choices=PROCESSING_STATUS_CHOICES,
+        default='PENDING',
+        db_index=True
+    )
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    thumbnail = models.FileField(upload_to='documents/previews/', blank=True)
+    preview = models.FileField(upload_to='documents/previews/', blank=True)
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.document_type.name} ({self.get_status_display()})"
@@ -162,6 +190,20 @@ class Document(models.Model):
         self.last_accessed = timezone.now()
         self.save(update_fields=['download_count', 'last_accessed'])
 
+    def is_file_shared(self):
+        """Check if other documents reference the same stored file (deduplicated content)"""
+        if not self.file:
+            return False
+        return Document.objects.filter(file=self.file.name).exclude(pk=self.pk).exists()
+
+    def delete_stored_files(self):
+        """Delete the file and its previews unless another document shares them"""
+        if self.is_file_shared():
+            return
+        for field_file in (self.file, self.thumbnail, self.preview):
+            if field_file:
+                field_file.delete(save=False)
+
     class Meta:
         verbose_name = "Document"
         verbose_name_plural = "Documents"
@@ -170,6 +212,59 @@ class Document(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['document_type', 'status']),
             models.Index(fields=['uploaded_at']),
+            # Keyset pagination of a user's documents (newest first)
+            models.Index(fields=['user', 'uploaded_at', 'id']),
+            # Incremental analytics materialization
+            models.Index(fields=['updated_at']),
+        ]
+
+
+class DocumentUploadSession(models.Model):
+    """Resumable chunked upload in progress"""
+    STATUS_CHOICES = [
+        ('UPLOADING', 'Uploading'),
+        ('COMPLETING', 'Completing'),
+        ('COMPLETED', 'Completed'),
+        ('ABORTED', 'Aborted'),
+        ('EXPIRED', 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_uploads')
+    document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE)
+    original_filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    chunk_size = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='UPLOADING')
+    document = models.OneToOneField(
+        Document,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='upload_session'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.original_filename} ({self.received_bytes}/{self.total_size} bytes)"
+
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+
+    @property
+    def is_expired(self):
+        return timezone.now() > self.expires_at
+
+    class Meta:
+        verbose_name = "Document Upload Session"
+        verbose_name_plural = "Document Upload Sessions"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
         ]
 
 
@@ -233,7 +328,8 @@ class DocumentAccessLog(models.Model):
     action = models.CharField(max_length=50)  # VIEW, DOWNLOAD, DELETE, etc.
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Event time, set when the access happens rather than when the buffered row is flushed
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     session_id = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
@@ -246,4 +342,53 @@ class DocumentAccessLog(models.Model):
         indexes = [
             models.Index(fields=['document', 'timestamp']),
             models.Index(fields=['user', 'timestamp']),
-        ]
\ No newline at end of file
+            models.Index(fields=['action', 'timestamp']),
+        ]
+
+
+class DocumentDailySummary(models.Model):
+    """Materialized per-day, per-type document statistics (by upload date)"""
+    date = models.DateField()
+    document_type = models.ForeignKey(DocumentType, on_delete=models.CASCADE, related_name='daily_summaries')
+    uploads = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    approved = models.IntegerField(default=0)
+    auto_approved = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+    reviewed = models.IntegerField(default=0)
+    turnaround_histogram = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Manual review turnaround counts per hour bucket"
+    )
+    # Start of the run that computed the row; documents updated since are re-materialized
+    computed_at = models.DateTimeField(default=timezone.now)
+    stale = models.BooleanField(default=False, help_text="A document of this day was deleted since")
+
+    def __str__(self):
+        return f"{self.date} - {self.document_type.name}: {self.uploads} uploads"
+
+    class Meta:
+        verbose_name = "Document Daily Summary"
+        verbose_name_plural = "Document Daily Summaries"
+        ordering = ['-date']
+        unique_together = ['date', 'document_type']
+
+
+class DocumentAccessLogArchive(models.Model):
+    """A month of access logs rolled out of the database into a compressed file"""
+    month = models.DateField(unique=True, help_text="First day of the archived month")
+    file_path = models.CharField(max_length=500)
+    row_count = models.IntegerField(default=0)
+    file_size = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Access logs {self.month:%Y-%m} ({self.row_count} rows)"
+
+    class Meta:
+        verbose_name = "Document Access Log Archive"
+        verbose_name_plural = "Document Access Log Archives"
+        ordering = ['-month']
\ No newline at end of file
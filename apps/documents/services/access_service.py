@@ -0,0 +1,379 @@
+"""
+Document Access Service for FlexiFinance
+Buffers document access counters and audit log events and flushes them to the database in batches
+"""
+import atexit
+import csv
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """
+    Base class for in-memory buffers drained by a background thread
+    Subclasses implement _take_batch, _write and _restore
+    """
+
+    thread_name = 'document-buffered-writer'
+
+    def __init__(self, flush_interval=None, max_pending=None):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.flush_interval = flush_interval or config.get('ACCESS_FLUSH_INTERVAL', 5)
+        self.max_pending = max_pending or config.get('ACCESS_FLUSH_THRESHOLD', 500)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Write everything buffered so far to the database
+
+        Returns:
+            int: Number of rows written or updated
+        """
+        with self._lock:
+            batch = self._take_batch()
+        if not batch:
+            return 0
+
+        try:
+            return self._write(batch)
+        except Exception as e:
+            logger.error(f"Failed to flush {self.thread_name}: {e}")
+            # Put the batch back so it is retried on the next flush
+            with self._lock:
+                self._restore(batch)
+            return 0
+
+    def _notify(self, pending):
+        """Start the worker if needed and wake it once the buffer is full"""
+        self._ensure_worker()
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        """Start the background flush thread on first use"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Flush loop executed by the background thread"""
+        from django.db import close_old_connections
+
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+    def _take_batch(self):
+        raise NotImplementedError
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _restore(self, batch):
+        raise NotImplementedError
+
+
+class DownloadCounter(BufferedWriter):
+    """
+    Batched download counter
+    Collects download counts in memory and writes them with a single UPDATE
+    per flush instead of one save() per download
+    """
+
+    thread_name = 'document-download-counter'
+
+    def __init__(self, flush_interval=None, max_pending=None):
+        self._pending = {}
+        super().__init__(flush_interval, max_pending)
+
+    def record(self, document_id, accessed_at=None):
+        """
+        Record one download of a document
+
+        Args:
+            document_id (int): Document primary key
+            accessed_at (datetime): Access time (defaults to now)
+        """
+        accessed_at = accessed_at or timezone.now()
+        with self._lock:
+            count, last_accessed = self._pending.get(document_id, (0, accessed_at))
+            self._pending[document_id] = (count + 1, max(last_accessed, accessed_at))
+            pending = len(self._pending)
+
+        self._notify(pending)
+
+    def pending_count(self, document_id):
+        """Return downloads recorded for a document but not yet flushed"""
+        with self._lock:
+            return self._pending.get(document_id, (0, None))[0]
+
+    def _take_batch(self):
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _write(self, batch):
+        from apps.documents.models import Document
+
+        return Document.objects.filter(id__in=batch.keys()).update(
+            download_count=F('download_count') + Case(
+                *[When(id=doc_id, then=count) for doc_id, (count, _) in batch.items()],
+                default=0,
+                output_field=models.IntegerField()
+            ),
+            last_accessed=Case(
+                *[When(id=doc_id, then=accessed) for doc_id, (_, accessed) in batch.items()],
+                default=F('last_accessed'),
+                output_field=models.DateTimeField()
+            )
+        )
+
+    def _restore(self, batch):
+        for doc_id, (count, accessed) in batch.items():
+            pending_count, pending_accessed = self._pending.get(doc_id, (0, accessed))
+            self._pending[doc_id] = (pending_count + count, max(pending_accessed, accessed))
+
+
+class AccessLogWriter(BufferedWriter):
+    """
+    Batched DocumentAccessLog writer
+    Audit events are kept in memory and inserted with bulk_create, so a page
+    view or download no longer costs a synchronous INSERT
+    """
+
+    thread_name = 'document-access-log'
+
+    def __init__(self, flush_interval=None, max_pending=None, max_buffer=None):
+        self._pending = []
+        super().__init__(flush_interval, max_pending)
+        # Hard cap so a database outage cannot grow the buffer without bound
+        self.max_buffer = max_buffer or self.max_pending * 20
+
+    def record(self, document_id, user_id, action, ip_address=None, user_agent='', session_id='', timestamp=None):
+        """
+        Buffer one access event
+
+        Args:
+            document_id (int): Document primary key
+            user_id (int): Acting user primary key
+            action (str): VIEW, DOWNLOAD, UPLOAD, DELETE, VERIFY_*
+        """
+        entry = {
+            'document_id': document_id,
+            'user_id': user_id,
+            'action': action,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'session_id': session_id,
+            'timestamp': timestamp or timezone.now(),
+        }
+        with self._lock:
+            self._pending.append(entry)
+            dropped = len(self._pending) - self.max_buffer
+            if dropped > 0:
+                del self._pending[:dropped]
+            pending = len(self._pending)
+
+        if dropped > 0:
+            logger.error(f"Access log buffer full, dropped {dropped} oldest event(s)")
+        self._notify(pending)
+
+    def _take_batch(self):
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _write(self, batch):
+        from apps.documents.models import Document, DocumentAccessLog
+
+        # Events for documents deleted since they were recorded cannot be inserted
+        existing = set(
+            Document.objects.filter(id__in={entry['document_id'] for entry in batch}).values_list('id', flat=True)
+        )
+        rows = [DocumentAccessLog(**entry) for entry in batch if entry['document_id'] in existing]
+        DocumentAccessLog.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    def _restore(self, batch):
+        self._pending[:0] = batch[-self.max_buffer:]
+        del self._pending[self.max_buffer:]
+
+
+class AccessLogArchiveService:
+    """
+    Monthly rollover of DocumentAccessLog
+    Months older than the retention window are exported to gzip-compressed
+    CSV files and removed from the table in small batches
+    """
+
+    COLUMNS = ['id', 'timestamp', 'document_id', 'user_id', 'action', 'ip_address', 'session_id', 'user_agent']
+
+    def __init__(self):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.archive_dir = config.get('ACCESS_LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'access_logs'))
+        self.retention_months = config.get('ACCESS_LOG_RETENTION_MONTHS', 6)
+        self.delete_batch_size = config.get('ACCESS_LOG_DELETE_BATCH', 5000)
+
+    def month_bounds(self, month):
+        """Return aware [start, end) datetimes for the month containing ``month``"""
+        first = date(month.year, month.month, 1)
+        following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+        tz = timezone.get_current_timezone()
+        return (
+            timezone.make_aware(datetime.combine(first, datetime.min.time()), tz),
+            timezone.make_aware(datetime.combine(following, datetime.min.time()), tz),
+        )
+
+    def archive_expired(self, now=None):
+        """
+        Archive every whole month older than the retention window
+
+        Returns:
+            list: Archive records created
+        """
+        from apps.documents.models import DocumentAccessLog
+
+        today = timezone.localdate(now or timezone.now())
+        month_index = today.year * 12 + (today.month - 1) - self.retention_months
+        cutoff = date(month_index // 12, month_index % 12 + 1, 1)
+        cutoff_start, _ = self.month_bounds(cutoff)
+
+        archives = []
+        oldest = DocumentAccessLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        while oldest is not None and oldest < cutoff_start:
+            archive = self.archive_month(timezone.localdate(oldest))
+            if archive:
+                archives.append(archive)
+            oldest = DocumentAccessLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        return archives
+
+    def archive_month(self, month):
+        """
+        Export one month to ``YYYY-MM.csv.gz`` and delete its rows
+
+        Args:
+            month (date): Any day in the month to archive
+
+        Returns:
+            DocumentAccessLogArchive: Archive record (None if the month had no rows)
+        """
+        from apps.documents.models import DocumentAccessLog, DocumentAccessLogArchive
+
+        start, end = self.month_bounds(month)
+        queryset = DocumentAccessLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        if not queryset.exists():
+            return None
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        label = start.strftime('%Y-%m')
+        path = os.path.join(self.archive_dir, f"{label}.csv.gz")
+        existing = DocumentAccessLogArchive.objects.filter(month=start.date()).first()
+        # Rows that arrived after the month was archived (late flush) are merged
+        # into a rewritten file, which replaces the old one atomically
+        previous = existing.file_path if existing and os.path.exists(existing.file_path) else None
+
+        row_count, carried, max_id = self._export(queryset, path, previous)
+        digest = self._file_digest(path)
+
+        deleted = 0
+        batch = queryset.filter(id__lte=max_id)
+        while True:
+            ids = list(batch.values_list('id', flat=True)[:self.delete_batch_size])
+            if not ids:
+                break
+            deleted += DocumentAccessLog.objects.filter(id__in=ids).delete()[0]
+
+        if existing:
+            existing.file_path = path
+            existing.row_count = carried + row_count
+            existing.file_size = os.path.getsize(path)
+            existing.sha256 = digest
+            existing.save(update_fields=['file_path', 'row_count', 'file_size', 'sha256'])
+            archive = existing
+            if previous and previous != path:
+                os.remove(previous)
+        else:
+            archive = DocumentAccessLogArchive.objects.create(
+                month=start.date(),
+                file_path=path,
+                row_count=row_count,
+                file_size=os.path.getsize(path),
+                sha256=digest
+            )
+        logger.info(f"Archived {row_count} access log rows for {label} to {path} ({deleted} deleted)")
+        return archive
+
+    def _export(self, queryset, path, previous=None):
+        """
+        Stream rows into a gzip CSV, writing to a temp file that then replaces ``path``
+
+        Args:
+            queryset: Access log rows to export
+            path (str): Archive file to (re)write
+            previous (str): Earlier archive of the month whose rows are carried over first
+
+        Returns:
+            tuple: (rows exported, rows carried over, highest exported id)
+        """
+        temp_path = f"{path}.tmp"
+        row_count = carried = max_id = 0
+        with gzip.open(temp_path, 'wt', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(self.COLUMNS)
+            if previous:
+                with gzip.open(previous, 'rt', newline='', encoding='utf-8') as old:
+                    reader = csv.reader(old)
+                    next(reader, None)
+                    for old_row in reader:
+                        writer.writerow(old_row)
+                        carried += 1
+            for row in queryset.order_by('id').values_list(*self.COLUMNS).iterator(chunk_size=2000):
+                writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+                row_count += 1
+                max_id = row[0]
+        os.replace(temp_path, path)
+        return row_count, carried, max_id
+
+    def _file_digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(64 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+def recent_access_logs(days=None):
+    """
+    Access logs limited to the recent window admin and analytics pages use
+
+    Args:
+        days (int): Window size (defaults to DOCUMENT_CONFIG ACCESS_LOG_QUERY_DAYS)
+    """
+    from apps.documents.models import DocumentAccessLog
+
+    days = days or getattr(settings, 'DOCUMENT_CONFIG', {}).get('ACCESS_LOG_QUERY_DAYS', 30)
+    return DocumentAccessLog.objects.filter(timestamp__gte=timezone.now() - timedelta(days=days))
+
+
+# Global counter and writer instances
+download_counter = DownloadCounter()
+access_log_writer = AccessLogWriter()
+access_log_archiver = AccessLogArchiveService()
@@ -0,0 +1,273 @@
+"""
+Document Analytics Service for FlexiFinance
+Single-pass document aggregation materialized into daily summaries
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, Max, Q, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentDailySummary, DocumentType
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (hours) of the review turnaround histogram; the last bucket is open-ended
+TURNAROUND_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336]
+
+STATUS_FIELDS = {
+    'PENDING': 'pending',
+    'APPROVED': 'approved',
+    'AUTO_APPROVED': 'auto_approved',
+    'REJECTED': 'rejected',
+    'EXPIRED': 'expired',
+}
+
+
+class DocumentAnalyticsService:
+    """
+    Document Analytics Service
+    One grouped query per window yields status, type, volume and turnaround
+    figures; closed days are stored in DocumentDailySummary and only the
+    days since the last materialization are aggregated live. The headline
+    status counts are always counted live (a document from a closed day can
+    be reviewed at any time)
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.window_days = config.get('ANALYTICS_WINDOW_DAYS', 30)
+
+    def aggregate(self, start=None, end=None, days=None):
+        """
+        Aggregate documents uploaded in [start, end) with one grouped query
+
+        Args:
+            start (datetime): Window start (inclusive), None for no lower bound
+            end (datetime): Window end (exclusive), None for no upper bound
+            days (set): Additional upload days to include regardless of start
+
+        Returns:
+            dict: {(date, document_type_id): summary dict}
+        """
+        queryset = Document.objects.annotate(day=TruncDate('uploaded_at'))
+        if start is not None:
+            window = Q(uploaded_at__gte=start)
+            if days:
+                window |= Q(day__in=days)
+            queryset = queryset.filter(window)
+        if end is not None:
+            queryset = queryset.filter(uploaded_at__lt=end)
+
+        turnaround = ExpressionWrapper(F('verified_at') - F('uploaded_at'), output_field=models.DurationField())
+        bucket = Case(
+            *[When(turnaround__lt=timedelta(hours=hours), then=index) for index, hours in enumerate(TURNAROUND_BUCKETS)],
+            default=len(TURNAROUND_BUCKETS),
+            output_field=models.IntegerField()
+        )
+        rows = (
+            queryset
+            .alias(turnaround=turnaround)
+            .annotate(
+                bucket=Case(
+                    # Only manual reviews have a meaningful turnaround
+                    When(Q(verified_at__isnull=False) & Q(status__in=['APPROVED', 'REJECTED']), then=bucket),
+                    default=None,
+                    output_field=models.IntegerField()
+                )
+            )
+            .values('day', 'document_type_id', 'status', 'bucket')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+        summaries = {}
+        for row in rows:
+            key = (row['day'], row['document_type_id'])
+            summary = summaries.get(key)
+            if summary is None:
+                summary = summaries[key] = self._empty_summary()
+            summary['uploads'] += row['count']
+            summary[STATUS_FIELDS.get(row['status'], 'pending')] += row['count']
+            if row['bucket'] is not None:
+                summary['reviewed'] += row['count']
+                summary['turnaround_histogram'][row['bucket']] += row['count']
+        return summaries
+
+    def materialize(self, full=False):
+        """
+        Store summaries for closed days (before today)
+
+        Only days that are not yet materialized, days with documents updated
+        (reviewed, expired, ...) since the last run started, and days marked
+        stale by a deletion are recomputed
+
+        Args:
+            full (bool): Recompute every day from scratch
+
+        Returns:
+            int: Number of days materialized
+        """
+        started = timezone.now()
+        today_start = self._day_start(timezone.localdate())
+        last = DocumentDailySummary.objects.aggregate(run=Max('computed_at'), day=Max('date'))
+
+        if full or last['day'] is None:
+            summaries = self.aggregate(end=today_start)
+            stale = DocumentDailySummary.objects.all()
+        else:
+            new_from = last['day'] + timedelta(days=1)
+            changed_days = set(
+                Document.objects.filter(updated_at__gte=last['run'], uploaded_at__lt=self._day_start(new_from))
+                .annotate(day=TruncDate('uploaded_at')).values_list('day', flat=True).distinct()
+            )
+            changed_days.update(DocumentDailySummary.objects.filter(stale=True).values_list('date', flat=True))
+            if self._day_start(new_from) >= today_start and not changed_days:
+                return 0
+            summaries = self.aggregate(start=self._day_start(new_from), end=today_start, days=changed_days)
+            stale = DocumentDailySummary.objects.filter(Q(date__gte=new_from) | Q(date__in=changed_days))
+
+        with transaction.atomic():
+            stale.delete()
+            DocumentDailySummary.objects.bulk_create([
+                DocumentDailySummary(date=day, document_type_id=type_id, computed_at=started, **summary)
+                for (day, type_id), summary in summaries.items()
+            ], batch_size=500)
+
+        materialized = len({key[0] for key in summaries})
+        logger.info(f"Materialized document analytics for {materialized} day(s)")
+        return materialized
+
+    def get_dashboard(self, window_days=None):
+        """
+        Dashboard figures: current status counts plus a recent window
+
+        Returns:
+            dict: Template context for the analytics page
+        """
+        window_days = window_days or self.window_days
+        today = timezone.localdate()
+        window_start = today - timedelta(days=window_days - 1)
+
+        # Live delta: everything uploaded after the last materialized day
+        last_day = DocumentDailySummary.objects.aggregate(last=Max('date'))['last']
+        live_start = self._day_start(last_day + timedelta(days=1)) if last_day else None
+        live = self.aggregate(start=live_start)
+
+        # One grouped count on the status index: summaries of closed days
+        # keep the status a document had when they were materialized
+        status_fields = list(STATUS_FIELDS.values())
+        totals = dict.fromkeys(['uploads'] + status_fields, 0)
+        status_counts = Document.objects.values('status').annotate(count=Count('id')).order_by()
+        for status, count in status_counts.values_list('status', 'count'):
+            totals['uploads'] += count
+            totals[STATUS_FIELDS.get(status, 'pending')] += count
+
+        # Window: materialized rows plus live rows that fall inside it
+        window = defaultdict(self._empty_summary)
+        for row in DocumentDailySummary.objects.filter(date__gte=window_start).values(
+            'date', 'document_type_id', 'uploads', 'reviewed', 'turnaround_histogram', *status_fields
+        ):
+            self._merge(window[(row['date'], row['document_type_id'])], row)
+        for key, summary in live.items():
+            if key[0] >= window_start:
+                self._merge(window[key], summary)
+
+        daily_volume = defaultdict(int)
+        by_type = defaultdict(int)
+        window_totals = self._empty_summary()
+        for (day, type_id), summary in window.items():
+            daily_volume[day] += summary['uploads']
+            by_type[type_id] += summary['uploads']
+            self._merge(window_totals, summary)
+
+        type_names = dict(DocumentType.objects.filter(id__in=by_type).values_list('id', 'name'))
+        window_uploads = sum(by_type.values())
+        documents_by_type = sorted(
+            [{'document_type__name': type_names.get(type_id, 'Unknown'), 'count': count,
+              'percentage': round(count * 100 / window_uploads, 1) if window_uploads else 0}
+             for type_id, count in by_type.items()],
+            key=lambda item: -item['count']
+        )
+
+        total = totals['uploads']
+        decided = window_totals['approved'] + window_totals['auto_approved'] + window_totals['rejected']
+        histogram = window_totals['turnaround_histogram']
+
+        return {
+            'total_documents': total,
+            'pending_documents': totals['pending'],
+            'approved_documents': totals['approved'] + totals['auto_approved'],
+            'rejected_documents': totals['rejected'],
+            'expired_documents': totals['expired'],
+            'status_percentages': {
+                field: round(totals[field] * 100 / total, 1) if total else 0
+                for field in status_fields
+            },
+            'approved_percentage': round(
+                (totals['approved'] + totals['auto_approved']) * 100 / total, 1
+            ) if total else 0,
+            'documents_by_type': documents_by_type,
+            'daily_volume': [
+                {'date': window_start + timedelta(days=offset),
+                 'count': daily_volume.get(window_start + timedelta(days=offset), 0)}
+                for offset in range(window_days)
+            ],
+            'window_days': window_days,
+            'window_uploads': window_totals['uploads'],
+            'turnaround': {
+                'p50': self.percentile(histogram, 50),
+                'p90': self.percentile(histogram, 90),
+                'p95': self.percentile(histogram, 95),
+                'reviewed': window_totals['reviewed'],
+            },
+            'verification_rate': round(
+                (window_totals['approved'] + window_totals['auto_approved']) * 100 / decided, 1
+            ) if decided else None,
+            'materialized_through': last_day,
+        }
+
+    def percentile(self, histogram, pct):
+        """
+        Approximate percentile (hours) from a turnaround histogram, interpolating
+        linearly inside the bucket; the open-ended bucket reports its lower bound
+        """
+        total = sum(histogram)
+        if not total:
+            return None
+        target = total * pct / 100
+        cumulative = 0
+        for index, count in enumerate(histogram):
+            if count and cumulative + count >= target:
+                lower = TURNAROUND_BUCKETS[index - 1] if index else 0
+                if index >= len(TURNAROUND_BUCKETS):
+                    return lower
+                upper = TURNAROUND_BUCKETS[index]
+                return round(lower + (upper - lower) * (target - cumulative) / count, 2)
+            cumulative += count
+        return TURNAROUND_BUCKETS[-1]
+
+    def _empty_summary(self):
+        return {
+            'uploads': 0,
+            'reviewed': 0,
+            'turnaround_histogram': [0] * (len(TURNAROUND_BUCKETS) + 1),
+            **{field: 0 for field in STATUS_FIELDS.values()},
+        }
+
+    def _merge(self, target, source):
+        for field in ['uploads', 'reviewed'] + list(STATUS_FIELDS.values()):
+            target[field] += source[field]
+        for index, count in enumerate(source['turnaround_histogram']):
+            target['turnaround_histogram'][index] += count
+
+    def _day_start(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+# Global service instance
+document_analytics_service = DocumentAnalyticsService()
@@ -0,0 +1,183 @@
+"""
+Document Download Service for FlexiFinance
+Builds download responses with conditional GET, HTTP Range support and
+optional hand-off of the transfer to the front web server
+"""
+import logging
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class DocumentDownloadService:
+    """
+    Document Download Service
+    Serves authorized document downloads either through Django (streamed,
+    range-aware) or via X-Accel-Redirect / X-Sendfile offload
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.backend = config.get('DOWNLOAD_BACKEND', 'django')
+        self.protected_prefix = config.get('PROTECTED_MEDIA_PREFIX', '/protected/')
+        self.chunk_size = config.get('DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+
+    def build_response(self, request, document):
+        """
+        Build the download response for an already authorized request
+
+        Args:
+            request (HttpRequest): Incoming request
+            document (Document): Document to serve
+
+        Returns:
+            HttpResponse: 200/206/304/412/416 response
+        """
+        etag = self.get_etag(document)
+        last_modified = int(document.uploaded_at.timestamp()) if document.uploaded_at else None
+
+        conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if conditional is not None:
+            return conditional
+
+        if self.backend in ('nginx', 'apache'):
+            response = self._offload_response(document)
+        else:
+            response = self._streaming_response(request, document, etag, last_modified)
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Content-Disposition'] = content_disposition_header(
+            as_attachment=True, filename=document.original_filename
+        )
+        response['Cache-Control'] = 'private, no-transform'
+        return response
+
+    def counts_as_download(self, request, response, document):
+        """
+        Whether a response is a new download: a full 200, or a range that
+        starts at byte 0. Resumed and parallel range requests for later
+        bytes belong to a download already counted
+        """
+        if response.status_code == 206:
+            return response.get('Content-Range', '').startswith('bytes 0-')
+        if response.status_code != 200:
+            return False
+        if response.has_header('X-Accel-Redirect') or response.has_header('X-Sendfile'):
+            # The web server applies the Range header itself
+            etag = self.get_etag(document)
+            last_modified = int(document.uploaded_at.timestamp()) if document.uploaded_at else None
+            if self._if_range_matches(request, etag, last_modified):
+                byte_range = self.parse_range(request.META.get('HTTP_RANGE', ''), document.file_size)
+                return byte_range is None or byte_range[0] == 0
+        return True
+
+    def get_etag(self, document):
+        """Strong validator derived from immutable document attributes"""
+        uploaded = int(document.uploaded_at.timestamp()) if document.uploaded_at else 0
+        return quote_etag(f"{document.id}-{document.file_size}-{uploaded}")
+
+    def get_content_type(self, document):
+        """Guess content type from the stored file name"""
+        return mimetypes.guess_type(document.file.name)[0] or 'application/octet-stream'
+
+    def _offload_response(self, document):
+        """
+        Let the front web server transfer the file
+        Nginx/Apache handle Range requests themselves once they own the transfer
+        """
+        response = HttpResponse(content_type=self.get_content_type(document))
+        if self.backend == 'nginx':
+            response['X-Accel-Redirect'] = f"{self.protected_prefix.rstrip('/')}/{quote(document.file.name)}"
+        else:
+            response['X-Sendfile'] = document.file.path
+        return response
+
+    def _streaming_response(self, request, document, etag, last_modified):
+        """Stream the file from storage, honouring a single byte range"""
+        size = document.file.size
+        content_type = self.get_content_type(document)
+
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and self._if_range_matches(request, etag, last_modified):
+            byte_range = self.parse_range(range_header, size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        response = StreamingHttpResponse(
+            self._iter_file(document.file, start, length),
+            status=206 if byte_range else 200,
+            content_type=content_type
+        )
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+
+    def parse_range(self, header, size):
+        """
+        Parse a single-range ``Range`` header
+
+        Returns:
+            tuple or None: (start, end) inclusive, or None if unsatisfiable
+        """
+        match = RANGE_RE.match(header.strip())
+        if not match or size == 0:
+            return None
+
+        first, last = match.groups()
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # Suffix range: last N bytes
+            suffix = int(last)
+            if suffix == 0:
+                return None
+            return max(size - suffix, 0), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+        if start >= size or end < start:
+            return None
+        return start, min(end, size - 1)
+
+    def _if_range_matches(self, request, etag, last_modified):
+        """A stale If-Range means the client must get the full entity"""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        return bool(last_modified) and if_range == http_date(last_modified)
+
+    def _iter_file(self, field_file, start, length):
+        """Yield ``length`` bytes from ``start`` without loading the file"""
+        handle = field_file.open('rb')
+        try:
+            handle.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = handle.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
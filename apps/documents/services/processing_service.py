@@ -0,0 +1,234 @@
+"""
+Document Processing Service for FlexiFinance
+Generates previews and extracts text/metadata for uploaded documents in a process pool
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentVerification
+from apps.documents.services import processing_worker
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_VERSION = 1
+
+
+class DocumentProcessingService:
+    """
+    Document Processing Service
+    Rendering and text extraction run in a spawned process pool so request
+    workers only enqueue; results are written back by the parent process.
+    A document is claimed by stamping processing_started_at; a claim older
+    than the lease (its process died) is picked up again by process_pending
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.enabled = config.get('PROCESSING_ENABLED', True)
+        self.max_workers = config.get('PROCESSING_WORKERS', 2)
+        self.lease = timedelta(seconds=config.get('PROCESSING_LEASE_SECONDS', 900))
+        self.options = {
+            'thumbnail_size': config.get('THUMBNAIL_SIZE', (256, 256)),
+            'preview_size': config.get('PREVIEW_SIZE', (1024, 1024)),
+            'text_limit': config.get('TEXT_EXCERPT_LENGTH', 2000),
+            'jpeg_quality': config.get('PREVIEW_JPEG_QUALITY', 80),
+        }
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, document):
+        """
+        Schedule background processing once the current transaction commits
+
+        Args:
+            document (Document): Newly uploaded document
+        """
+        if not self.enabled:
+            return
+        transaction.on_commit(lambda: self._submit(document.id))
+
+    def process_now(self, document):
+        """
+        Process a document synchronously in the pool and wait for the result
+
+        Returns:
+            dict: {'success': True/False, ...}
+        """
+        if self._reuse_sibling(document):
+            return {'success': True, 'reused': True}
+        try:
+            result = self._get_executor().submit(*self._job_args(document)).result()
+        except Exception as e:
+            self._mark_failed(document.id, e)
+            return {'success': False, 'error': str(e)}
+        self._apply_result(document.id, result)
+        return {'success': True, 'reused': False}
+
+    def process_pending(self, batch_size=50, statuses=('PENDING',)):
+        """
+        Process documents still waiting for previews (e.g. after a restart),
+        including documents whose processing claim has outlived the lease
+
+        Args:
+            batch_size (int): Maximum documents to process
+            statuses (tuple): Processing statuses to pick up, add 'FAILED' to retry
+
+        Returns:
+            dict: Counts of processed and failed documents
+        """
+        claimable = Q(processing_status__in=statuses) | Q(
+            processing_status='PROCESSING', processing_started_at__lt=timezone.now() - self.lease
+        )
+        documents = list(
+            Document.objects.filter(claimable)
+            .exclude(file='')
+            .select_related('document_type')
+            .order_by('uploaded_at')[:batch_size]
+        )
+        processed = failed = 0
+        futures = []
+        for document in documents:
+            if self._reuse_sibling(document):
+                processed += 1
+                continue
+            # Conditional, so a concurrent run does not claim the same document
+            if not self._claim(document.id, claimable):
+                continue
+            try:
+                futures.append((document.id, self._get_executor().submit(*self._job_args(document))))
+            except Exception as e:
+                self._mark_failed(document.id, e)
+                failed += 1
+
+        for document_id, future in futures:
+            try:
+                self._apply_result(document_id, future.result())
+                processed += 1
+            except Exception as e:
+                self._mark_failed(document_id, e)
+                failed += 1
+        return {'processed': processed, 'failed': failed}
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _submit(self, document_id):
+        try:
+            document = Document.objects.select_related('document_type').get(id=document_id)
+        except Document.DoesNotExist:
+            return
+        if not document.file or self._reuse_sibling(document):
+            return
+
+        self._claim(document_id)
+        try:
+            future = self._get_executor().submit(*self._job_args(document))
+        except Exception as e:
+            self._mark_failed(document_id, e)
+            return
+        future.add_done_callback(lambda done: self._on_done(document_id, done))
+
+    def _on_done(self, document_id, future):
+        """Runs on the pool's result thread: persist the outcome"""
+        try:
+            self._apply_result(document_id, future.result())
+        except Exception as e:
+            self._mark_failed(document_id, e)
+        finally:
+            close_old_connections()
+
+    def _claim(self, document_id, condition=None):
+        """Mark a document PROCESSING from now (only if it still matches ``condition``)"""
+        documents = Document.objects.filter(id=document_id)
+        if condition is not None:
+            documents = documents.filter(condition)
+        return documents.update(processing_status='PROCESSING', processing_started_at=timezone.now())
+
+    def _job_args(self, document):
+        # Read through the storage API rather than .path, which only local storage has
+        with document.file.open('rb') as handle:
+            content = handle.read()
+        return processing_worker.process_file, content, document.get_file_extension(), self.options
+
+    def _get_executor(self):
+        """Create the pool lazily; 'spawn' keeps workers clear of forked DB connections and threads"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _reuse_sibling(self, document):
+        """Copy results from an already processed document sharing the same stored file"""
+        if not document.content_hash:
+            return False
+        sibling = Document.objects.filter(
+            file=document.file.name, processing_status='COMPLETED'
+        ).exclude(id=document.id).first()
+        if sibling is None:
+            return False
+
+        Document.objects.filter(id=document.id).update(
+            processing_status='COMPLETED',
+            processed_at=timezone.now(),
+            thumbnail=sibling.thumbnail.name,
+            preview=sibling.preview.name,
+            metadata={**document.metadata, **sibling.metadata}
+        )
+        sibling_analysis = DocumentVerification.objects.filter(document=sibling).values_list(
+            'ai_analysis_result', flat=True
+        ).first()
+        if sibling_analysis:
+            DocumentVerification.objects.filter(document=document).update(ai_analysis_result=sibling_analysis)
+        return True
+
+    def _apply_result(self, document_id, result):
+        document = Document.objects.get(id=document_id)
+
+        metadata = {**document.metadata, **result['metadata']}
+        if document.content_hash:
+            metadata['file_hash'] = document.content_hash
+
+        if result['thumbnail']:
+            document.thumbnail.save(f"{document.id}_thumb.jpg", ContentFile(result['thumbnail']), save=False)
+        if result['preview']:
+            document.preview.save(f"{document.id}_preview.jpg", ContentFile(result['preview']), save=False)
+
+        Document.objects.filter(id=document_id).update(
+            processing_status='COMPLETED',
+            processed_at=timezone.now(),
+            thumbnail=document.thumbnail.name or '',
+            preview=document.preview.name or '',
+            metadata=metadata
+        )
+
+        analysis = {
+            'version': ANALYSIS_VERSION,
+            'analyzed_at': timezone.now().isoformat(),
+            **result['analysis'],
+        }
+        DocumentVerification.objects.filter(document_id=document_id).update(ai_analysis_result=analysis)
+        logger.info(f"Document {document_id} processed (flags: {', '.join(analysis['flags']) or 'none'})")
+
+    def _mark_failed(self, document_id, error):
+        logger.error(f"Document processing failed for {document_id}: {error}")
+        Document.objects.filter(id=document_id).update(processing_status='FAILED')
+
+
+# Global service instance
+processing_service = DocumentProcessingService()
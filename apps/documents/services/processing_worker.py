@@ -0,0 +1,169 @@
+"""
+Document Processing Worker for FlexiFinance
+CPU-bound preview rendering and text/metadata extraction run in pool processes
+
+This module must stay free of Django imports: it is imported by freshly
+spawned worker processes that never load the project settings.
+"""
+import io
+import re
+
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # PDF previews/text need pypdfium2; metadata still works without it
+    pdfium = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PDF_PAGE_RE = re.compile(rb'/Type\s*/Page(?!s)')
+
+
+def process_file(content, extension, options):
+    """
+    Render previews and extract metadata for one stored file
+
+    Args:
+        content (bytes): File content (read by the parent, so any storage backend works)
+        extension (str): Lower-case file extension including the dot
+        options (dict): thumbnail_size, preview_size, text_limit, jpeg_quality
+
+    Returns:
+        dict: {'metadata': {...}, 'analysis': {...}, 'thumbnail': bytes|None, 'preview': bytes|None}
+    """
+    if extension in IMAGE_EXTENSIONS:
+        return _process_image(content, options)
+    if extension == '.pdf':
+        return _process_pdf(content, options)
+    return {'metadata': {}, 'analysis': {'checks': {}, 'flags': ['unsupported_type']},
+            'thumbnail': None, 'preview': None}
+
+
+def _process_image(content, options):
+    with Image.open(io.BytesIO(content)) as original:
+        image_format = original.format
+        exif = original.getexif()
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    metadata = {
+        'kind': 'image',
+        'format': image_format,
+        'width': image.width,
+        'height': image.height,
+        'mode': image.mode,
+        'has_exif': bool(exif),
+    }
+    if exif:
+        # DateTime (306), Make (271), Model (272)
+        metadata['exif'] = {name: str(exif[tag]) for tag, name in ((306, 'datetime'), (271, 'make'), (272, 'model'))
+                            if tag in exif}
+
+    analysis = _analyse_image(image)
+    thumbnail, preview = _render_previews(image, options)
+    return {'metadata': metadata, 'analysis': analysis, 'thumbnail': thumbnail, 'preview': preview}
+
+
+def _process_pdf(content, options):
+    metadata = {'kind': 'pdf'}
+    analysis = {'checks': {}, 'flags': []}
+    thumbnail = preview = None
+
+    if pdfium is None:
+        metadata['page_count'] = len(PDF_PAGE_RE.findall(content))
+        analysis['flags'].append('pdf_renderer_unavailable')
+        return {'metadata': metadata, 'analysis': analysis, 'thumbnail': None, 'preview': None}
+
+    pdf = pdfium.PdfDocument(content)
+    try:
+        metadata['page_count'] = len(pdf)
+        info = {key.lower(): value for key, value in pdf.get_metadata_dict(skip_empty=True).items()}
+        metadata['pdf_info'] = {key: info[key] for key in ('title', 'author', 'creator', 'producer', 'creationdate')
+                                if key in info}
+
+        text_limit = options.get('text_limit', 2000)
+        text_parts, text_length = [], 0
+        for index in range(len(pdf)):
+            if text_length >= text_limit:
+                break
+            page = pdf[index]
+            text_page = page.get_textpage()
+            text = text_page.get_text_range()
+            text_page.close()
+            page.close()
+            text_parts.append(text)
+            text_length += len(text)
+        text = ' '.join(' '.join(text_parts).split())
+        metadata['text_excerpt'] = text[:text_limit]
+        metadata['has_text_layer'] = bool(text)
+
+        if len(pdf):
+            page = pdf[0]
+            width, height = page.get_size()
+            # Render at the scale needed for the preview box, never upscaled past 2x
+            scale = min(max(options['preview_size']) / max(width, height, 1), 2.0)
+            image = page.render(scale=scale).to_pil()
+            page.close()
+            analysis = _analyse_image(image)
+            thumbnail, preview = _render_previews(image, options)
+    finally:
+        pdf.close()
+
+    if not metadata.get('has_text_layer'):
+        analysis['flags'].append('no_text_layer')
+    return {'metadata': metadata, 'analysis': analysis, 'thumbnail': thumbnail, 'preview': preview}
+
+
+def _analyse_image(image):
+    """Cheap quality checks used to pre-screen documents for reviewers"""
+    grey = image.convert('L')
+    grey.thumbnail((800, 800))
+    brightness = ImageStat.Stat(grey).mean[0]
+    # Variance of the edge image: low values mean a blurred or blank scan
+    sharpness = ImageStat.Stat(grey.filter(ImageFilter.FIND_EDGES)).var[0]
+
+    flags = []
+    if min(image.width, image.height) < 600:
+        flags.append('low_resolution')
+    if sharpness < 100:
+        flags.append('blurry')
+    if brightness < 40:
+        flags.append('too_dark')
+    elif brightness > 235:
+        flags.append('overexposed')
+
+    return {
+        'checks': {
+            'brightness': round(brightness, 1),
+            'sharpness': round(sharpness, 1),
+            'perceptual_hash': _average_hash(grey),
+        },
+        'flags': flags,
+    }
+
+
+def _average_hash(grey):
+    """64-bit average hash, handy for spotting the same photo uploaded twice"""
+    small = grey.resize((8, 8))
+    pixels = list(small.getdata())
+    mean = sum(pixels) / len(pixels)
+    bits = ''.join('1' if pixel > mean else '0' for pixel in pixels)
+    return f"{int(bits, 2):016x}"
+
+
+def _render_previews(image, options):
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    return (
+        _encode_jpeg(image, options['thumbnail_size'], options),
+        _encode_jpeg(image, options['preview_size'], options),
+    )
+
+
+def _encode_jpeg(image, size, options):
+    copy = image.copy()
+    copy.thumbnail(tuple(size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, format='JPEG', quality=options.get('jpeg_quality', 80), optimize=True)
+    return buffer.getvalue()
+
@@ -0,0 +1,394 @@
+"""
+Document Upload Service for FlexiFinance
+Resumable chunked uploads and content-addressed (SHA-256) document storage
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentUploadSession, DocumentVerification
+from apps.documents.services.processing_service import processing_service
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadOffsetMismatch(ValidationError):
+    """Raised when a chunk does not start where the stored upload ends"""
+
+    def __init__(self, expected_offset):
+        self.expected_offset = expected_offset
+        super().__init__(f"Chunk must start at byte {expected_offset}")
+
+
+class UploadCompleting(ValidationError):
+    """Raised when another request is already completing the upload"""
+
+    def __init__(self):
+        super().__init__("Upload is already being completed")
+
+
+def validate_file_meta(filename, size, document_type):
+    """
+    Validate file name and size against the document type rules
+
+    Raises:
+        ValidationError: If the file is not acceptable
+    """
+    if size > document_type.max_file_size:
+        raise ValidationError(f"File size cannot exceed {document_type.max_file_size / (1024*1024):.1f}MB")
+
+    file_ext = filename.split('.')[-1].lower() if '.' in filename else ''
+    allowed_extensions = document_type.get_allowed_extensions_list()
+
+    if file_ext not in allowed_extensions:
+        raise ValidationError(f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}")
+
+    # Additional security checks
+    if size < 1024:  # Less than 1KB
+        raise ValidationError("File is too small")
+
+    if size > 50 * 1024 * 1024:  # More than 50MB
+        raise ValidationError("File is too large")
+
+
+class ContentStore:
+    """
+    Content-addressed document storage
+    Files are stored once under their SHA-256, so identical re-uploads
+    share a single stored object and never collide on names
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+        self.prefix = getattr(settings, 'DOCUMENT_CONFIG', {}).get('CONTENT_STORE_PREFIX', 'documents/sha256')
+
+    def path_for(self, sha256, filename):
+        """Storage name for a digest, e.g. documents/sha256/ab/cd/abcd...ef.pdf"""
+        extension = os.path.splitext(filename)[1].lower()
+        return f"{self.prefix}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+    def hash_file(self, file_obj):
+        """Compute SHA-256 of a file object by streaming its blocks"""
+        digest = hashlib.sha256()
+        if hasattr(file_obj, 'chunks'):
+            for block in file_obj.chunks(READ_BLOCK_SIZE):
+                digest.update(block)
+        else:
+            for block in iter(lambda: file_obj.read(READ_BLOCK_SIZE), b''):
+                digest.update(block)
+        file_obj.seek(0)
+        return digest.hexdigest()
+
+    def store(self, file_obj, filename, sha256=None):
+        """
+        Store file content unless an identical object already exists
+
+        Args:
+            file_obj: File-like object positioned at the start
+            filename (str): Original filename (used for the extension)
+            sha256 (str): Precomputed digest, if known
+
+        Returns:
+            tuple: (storage name, sha256, deduplicated)
+        """
+        sha256 = sha256 or self.hash_file(file_obj)
+        name = self.path_for(sha256, filename)
+
+        if self.storage.exists(name):
+            return name, sha256, True
+
+        saved_name = self.storage.save(name, File(file_obj, name=os.path.basename(name)))
+        if saved_name != name:
+            # Another request stored the same content concurrently; keep the canonical copy
+            self.storage.delete(saved_name)
+            return name, sha256, True
+        return name, sha256, False
+
+
+class ChunkedUploadService:
+    """
+    Resumable chunked upload service
+    Chunks are appended to a part file on local disk as they stream in;
+    the Document row is only created when the upload is completed
+    """
+
+    def __init__(self, content_store=None):
+        config = getattr(settings, 'DOCUMENT_CONFIG', {})
+        self.content_store = content_store or ContentStore()
+        self.chunk_size = config.get('UPLOAD_CHUNK_SIZE', 1024 * 1024)
+        self.session_ttl = timedelta(hours=config.get('UPLOAD_SESSION_TTL_HOURS', 24))
+        self.temp_dir = config.get('UPLOAD_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads', 'parts'))
+        # Running SHA-256 state per session, kept by the process that received the chunks
+        self._hashers = OrderedDict()
+        self._hashers_lock = threading.Lock()
+        self._max_hashers = config.get('UPLOAD_HASHER_CACHE_SIZE', 256)
+
+    def create_session(self, user, document_type, filename, total_size):
+        """
+        Start a resumable upload
+
+        Returns:
+            DocumentUploadSession: New session
+        """
+        validate_file_meta(filename, total_size, document_type)
+
+        upload = DocumentUploadSession.objects.create(
+            user=user,
+            document_type=document_type,
+            original_filename=filename,
+            total_size=total_size,
+            chunk_size=self.chunk_size,
+            expires_at=timezone.now() + self.session_ttl
+        )
+        os.makedirs(self.temp_dir, exist_ok=True)
+        open(self.part_path(upload), 'wb').close()
+        self._set_hasher(upload.id, hashlib.sha256(), 0)
+
+        logger.info(f"Upload session {upload.id} started: {filename} ({total_size} bytes)")
+        return upload
+
+    def part_path(self, upload):
+        """Local path of the partially uploaded file"""
+        return os.path.join(self.temp_dir, f"{upload.id}.part")
+
+    def write_chunk(self, upload, stream, start, length):
+        """
+        Append one chunk read from ``stream`` without buffering it in memory
+
+        The session row stays locked while the chunk is written, so a second
+        request for the same offset waits and then gets an offset mismatch
+        instead of writing into the part file at the same time
+
+        Args:
+            upload (DocumentUploadSession): Active session
+            stream: Readable object (e.g. the raw request)
+            start (int): Byte offset of the chunk
+            length (int): Chunk length in bytes
+
+        Returns:
+            int: New received byte count
+        """
+        self._ensure_active(upload)
+
+        with transaction.atomic():
+            locked = DocumentUploadSession.objects.select_for_update().get(id=upload.id)
+            upload.status, upload.received_bytes = locked.status, locked.received_bytes
+            if upload.status != 'UPLOADING':
+                raise ValidationError(f"Upload is {upload.get_status_display().lower()}")
+
+            if start != upload.received_bytes:
+                raise UploadOffsetMismatch(upload.received_bytes)
+            if length <= 0 or start + length > upload.total_size:
+                raise ValidationError("Chunk exceeds declared file size")
+
+            # Hash into a copy: the cached hasher must keep covering exactly
+            # ``start`` bytes until this chunk has been stored in full
+            hasher = self._get_hasher(upload.id, start)
+            if hasher is not None:
+                hasher = hasher.copy()
+            path = self.part_path(upload)
+            written = 0
+
+            with open(path, 'r+b') as part:
+                # Truncate any bytes left behind by an interrupted chunk
+                part.truncate(start)
+                part.seek(start)
+                while written < length:
+                    try:
+                        block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                    except OSError as e:
+                        # Client disconnects surface as UnreadablePostError (an OSError)
+                        raise ValidationError(f"Chunk interrupted after {written} bytes: {e}")
+                    if not block:
+                        break
+                    part.write(block)
+                    if hasher is not None:
+                        hasher.update(block)
+                    written += len(block)
+
+            if written != length:
+                # Incomplete chunk: the client will resume from the stored offset
+                raise ValidationError(f"Chunk truncated: expected {length} bytes, received {written}")
+
+            DocumentUploadSession.objects.filter(id=upload.id).update(
+                received_bytes=F('received_bytes') + length, updated_at=timezone.now()
+            )
+
+        upload.received_bytes = start + length
+        if hasher is not None:
+            self._set_hasher(upload.id, hasher, upload.received_bytes)
+        return upload.received_bytes
+
+    def complete(self, upload, expires_at=None, expected_sha256=None):
+        """
+        Finish an upload: verify size and digest, store the content once and
+        create the Document
+
+        The session is claimed UPLOADING -> COMPLETING with a conditional
+        update, so of two concurrent requests only one stores the content;
+        the other gets the finished document, or UploadCompleting while the
+        first is still working
+
+        Returns:
+            tuple: (Document, deduplicated)
+        """
+        if upload.status == 'COMPLETED' and upload.document_id:
+            return upload.document, False
+        self._ensure_active(upload)
+        if not upload.is_complete:
+            raise ValidationError(
+                f"Upload incomplete: {upload.received_bytes} of {upload.total_size} bytes received"
+            )
+
+        claimed = DocumentUploadSession.objects.filter(
+            id=upload.id, status='UPLOADING', received_bytes=upload.total_size
+        ).update(status='COMPLETING', updated_at=timezone.now())
+        if not claimed:
+            upload.refresh_from_db(fields=['status', 'document', 'received_bytes'])
+            if upload.status == 'COMPLETED' and upload.document_id:
+                return upload.document, False
+            if upload.status == 'COMPLETING':
+                raise UploadCompleting()
+            raise ValidationError(f"Upload is {upload.get_status_display().lower()}")
+        upload.status = 'COMPLETING'
+
+        path = self.part_path(upload)
+        hasher = self._get_hasher(upload.id, upload.total_size)
+        self._drop_hasher(upload.id)
+
+        try:
+            with open(path, 'rb') as part:
+                sha256 = hasher.hexdigest() if hasher is not None else self.content_store.hash_file(part)
+                if expected_sha256 and expected_sha256.lower() != sha256:
+                    raise ValidationError("Checksum mismatch: uploaded content does not match sha256")
+                file_name, sha256, deduplicated = self.content_store.store(part, upload.original_filename, sha256)
+        except Exception:
+            # Hand the session back so the client can retry
+            DocumentUploadSession.objects.filter(id=upload.id, status='COMPLETING').update(
+                status='UPLOADING', updated_at=timezone.now()
+            )
+            upload.status = 'UPLOADING'
+            raise
+
+        with transaction.atomic():
+            document = create_document(
+                user=upload.user,
+                document_type=upload.document_type,
+                file_name=file_name,
+                original_filename=upload.original_filename,
+                file_size=upload.total_size,
+                content_hash=sha256,
+                expires_at=expires_at,
+                metadata={'chunked_upload': True}
+            )
+            upload.status = 'COMPLETED'
+            upload.document = document
+            upload.save(update_fields=['status', 'document', 'updated_at'])
+
+        self._remove_part(path)
+        logger.info(f"Upload session {upload.id} completed as document {document.id} (deduplicated: {deduplicated})")
+        return document, deduplicated
+
+    def abort(self, upload, status='ABORTED'):
+        """Cancel an upload and discard its part file"""
+        upload.status = status
+        upload.save(update_fields=['status', 'updated_at'])
+        self._drop_hasher(upload.id)
+        self._remove_part(self.part_path(upload))
+
+    def cleanup_expired(self):
+        """
+        Expire stale sessions and delete their part files
+
+        Returns:
+            int: Number of sessions expired
+        """
+        # A session left COMPLETING past its expiry belongs to a request that died
+        expired = DocumentUploadSession.objects.filter(
+            status__in=['UPLOADING', 'COMPLETING'], expires_at__lt=timezone.now()
+        )
+        count = 0
+        for upload in expired.iterator():
+            self.abort(upload, status='EXPIRED')
+            count += 1
+        return count
+
+    def _ensure_active(self, upload):
+        if upload.status != 'UPLOADING':
+            raise ValidationError(f"Upload is {upload.get_status_display().lower()}")
+        if upload.is_expired:
+            self.abort(upload, status='EXPIRED')
+            raise ValidationError("Upload session has expired")
+
+    def _remove_part(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _get_hasher(self, upload_id, offset):
+        """Return the running hasher if it covers exactly ``offset`` bytes"""
+        with self._hashers_lock:
+            entry = self._hashers.get(upload_id)
+            if entry is None or entry[1] != offset:
+                return None
+            self._hashers.move_to_end(upload_id)
+            return entry[0]
+
+    def _set_hasher(self, upload_id, hasher, offset):
+        with self._hashers_lock:
+            self._hashers[upload_id] = (hasher, offset)
+            self._hashers.move_to_end(upload_id)
+            while len(self._hashers) > self._max_hashers:
+                self._hashers.popitem(last=False)
+
+    def _drop_hasher(self, upload_id):
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+
+
+def create_document(user, document_type, file_name, original_filename, file_size,
+                    content_hash='', expires_at=None, metadata=None):
+    """
+    Create a Document for already stored content, plus its verification record
+    when the document type requires manual review, and queue its processing
+    """
+    document = Document.objects.create(
+        user=user,
+        document_type=document_type,
+        file=file_name,
+        original_filename=original_filename,
+        file_size=file_size,
+        content_hash=content_hash,
+        expires_at=expires_at,
+        metadata=metadata or {}
+    )
+
+    if document_type.verification_required:
+        DocumentVerification.objects.create(
+            document=document,
+            verifier=user,  # Self-upload
+            verification_type='MANUAL'
+        )
+
+    # Previews and text extraction run in the background after commit
+    processing_service.enqueue(document)
+    return document
+
+
+# Global service instances
+content_store = ContentStore()
+upload_service = ChunkedUploadService(content_store)
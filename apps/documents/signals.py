@@ -0,0 +1,17 @@
+"""
+Document signals for FlexiFinance
+Keep the materialized daily analytics honest when documents are deleted
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentDailySummary
+
+
+@receiver(post_delete, sender=Document)
+def mark_summary_stale(sender, instance, **kwargs):
+    """A deleted document leaves no updated_at behind, so flag its day for re-materialization"""
+    DocumentDailySummary.objects.filter(
+        date=timezone.localdate(instance.uploaded_at), document_type_id=instance.document_type_id
+    ).update(stale=True)
@@ -0,0 +1,244 @@
+"""
+Tests for the documents app
+"""
+import gzip
+import hashlib
+import io
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from apps.documents.models import (
+    Document, DocumentAccessLog, DocumentDailySummary, DocumentType, DocumentUploadSession
+)
+from apps.documents.services.access_service import AccessLogArchiveService
+from apps.documents.services.analytics_service import DocumentAnalyticsService
+from apps.documents.services.download_service import DocumentDownloadService
+from apps.documents.services.processing_service import DocumentProcessingService
+from apps.documents.services.upload_service import (
+    ChunkedUploadService, ContentStore, UploadCompleting, UploadOffsetMismatch
+)
+from apps.users.models import User
+
+CONTENT = b'%PDF-1.4 ' + b'x' * 4096
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.service = ChunkedUploadService(ContentStore(FileSystemStorage(location=temp_dir.name)))
+        self.service.temp_dir = temp_dir.name
+        user = User.objects.create_user(username='uploader', email='uploader@example.com', password='x')
+        document_type = DocumentType.objects.create(name='Test ID', description='Test', allowed_extensions='pdf')
+        self.upload = self.service.create_session(user, document_type, 'id.pdf', len(CONTENT))
+
+    def send(self, start, end):
+        return self.service.write_chunk(self.upload, io.BytesIO(CONTENT[start:end]), start, end - start)
+
+    def test_stale_offset_is_rejected(self):
+        self.send(0, 1024)
+        stale = DocumentUploadSession.objects.get(pk=self.upload.pk)
+        stale.received_bytes = 0
+
+        with self.assertRaises(UploadOffsetMismatch) as raised:
+            self.service.write_chunk(stale, io.BytesIO(CONTENT[:1024]), 0, 1024)
+        self.assertEqual(raised.exception.expected_offset, 1024)
+
+    def test_interrupted_chunk_leaves_the_digest_intact(self):
+        self.send(0, 1024)
+        broken = mock.Mock()
+        broken.read.side_effect = [CONTENT[1024:2048], OSError('client disconnected')]
+
+        with self.assertRaises(ValidationError):
+            self.service.write_chunk(self.upload, broken, 1024, len(CONTENT) - 1024)
+        self.send(1024, len(CONTENT))
+
+        document, _ = self.service.complete(self.upload)
+        self.assertEqual(document.content_hash, hashlib.sha256(CONTENT).hexdigest())
+
+    def test_second_completion_gets_the_same_document(self):
+        self.send(0, len(CONTENT))
+        late = DocumentUploadSession.objects.get(pk=self.upload.pk)
+
+        document, _ = self.service.complete(self.upload)
+        again, deduplicated = self.service.complete(late)
+
+        self.assertEqual(again, document)
+        self.assertFalse(deduplicated)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_completion_in_progress_is_not_repeated(self):
+        self.send(0, len(CONTENT))
+        DocumentUploadSession.objects.filter(pk=self.upload.pk).update(status='COMPLETING')
+
+        with self.assertRaises(UploadCompleting):
+            self.service.complete(self.upload)
+        self.assertFalse(Document.objects.exists())
+
+    def test_failed_completion_hands_the_session_back(self):
+        self.send(0, len(CONTENT))
+
+        with self.assertRaises(ValidationError):
+            self.service.complete(self.upload, expected_sha256='0' * 64)
+        self.assertEqual(DocumentUploadSession.objects.get(pk=self.upload.pk).status, 'UPLOADING')
+
+
+class ProcessingLeaseTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.service = DocumentProcessingService()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        patcher = mock.patch.object(self.service, '_get_executor', return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='x')
+        self.document_type = DocumentType.objects.create(name='Photo ID', description='Test')
+        image = io.BytesIO()
+        Image.new('RGB', (64, 48), 'white').save(image, 'PNG')
+        self.content = image.getvalue()
+
+    def document(self, started_minutes_ago):
+        document = Document(
+            user=self.user, document_type=self.document_type, original_filename='id.png',
+            file_size=len(self.content), processing_status='PROCESSING',
+            processing_started_at=timezone.now() - timedelta(minutes=started_minutes_ago)
+        )
+        document.file.save('id.png', ContentFile(self.content))
+        return document
+
+    def test_expired_claims_are_reclaimed(self):
+        stuck = self.document(started_minutes_ago=60)
+        running = self.document(started_minutes_ago=1)
+
+        self.assertEqual(self.service.process_pending(), {'processed': 1, 'failed': 0})
+        stuck.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stuck.processing_status, 'COMPLETED')
+        self.assertEqual(running.processing_status, 'PROCESSING')
+
+
+class AccessLogArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        with override_settings(DOCUMENT_CONFIG={'ACCESS_LOG_ARCHIVE_DIR': archive_dir.name}):
+            self.service = AccessLogArchiveService()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        document_type = DocumentType.objects.create(name='Payslip', description='Test')
+        self.document = Document.objects.create(
+            user=self.user, document_type=document_type, file='payslip.pdf', original_filename='payslip.pdf', file_size=1
+        )
+        self.month = timezone.now() - timedelta(days=400)
+
+    def log(self, count):
+        for _ in range(count):
+            DocumentAccessLog.objects.create(document=self.document, user=self.user, action='VIEW', timestamp=self.month)
+
+    def test_rearchiving_a_month_rewrites_one_file_and_its_record(self):
+        self.log(2)
+        first = self.service.archive_month(self.month)
+        self.log(3)  # late flush
+        archive = self.service.archive_month(self.month)
+
+        self.assertEqual(archive.pk, first.pk)
+        with gzip.open(archive.file_path, 'rt') as handle:
+            self.assertEqual(len(handle.read().splitlines()), 1 + 5)
+        with open(archive.file_path, 'rb') as handle:
+            self.assertEqual(archive.sha256, hashlib.sha256(handle.read()).hexdigest())
+        self.assertEqual(archive.row_count, 5)
+        self.assertFalse(DocumentAccessLog.objects.exists())
+
+
+class AnalyticsMaterializationTests(TestCase):
+    def setUp(self):
+        self.service = DocumentAnalyticsService()
+        self.user = User.objects.create_user(username='applicant', email='applicant@example.com', password='x')
+        self.document_type = DocumentType.objects.create(name='Utility bill', description='Test')
+        self.day = timezone.localdate() - timedelta(days=3)
+        self.documents = [self.upload() for _ in range(2)]
+        self.service.materialize()
+
+    def upload(self):
+        document = Document.objects.create(
+            user=self.user, document_type=self.document_type, file='bill.pdf', original_filename='bill.pdf', file_size=1
+        )
+        Document.objects.filter(pk=document.pk).update(uploaded_at=timezone.now() - timedelta(days=3))
+        document.refresh_from_db()
+        return document
+
+    def summary(self):
+        return DocumentDailySummary.objects.get(date=self.day)
+
+    def test_review_of_a_materialized_day_is_picked_up(self):
+        self.documents[0].approve(self.user)
+
+        self.assertEqual(self.service.materialize(), 1)
+        self.assertEqual((self.summary().approved, self.summary().pending), (1, 1))
+
+    def test_deleted_document_is_taken_out_of_its_day(self):
+        self.documents[0].delete()
+        self.assertTrue(self.summary().stale)
+
+        self.assertEqual(self.service.materialize(), 1)
+        summary = self.summary()
+        self.assertEqual(summary.uploads, 1)
+        self.assertFalse(summary.stale)
+
+    def test_review_of_a_materialized_day_counts_at_once(self):
+        Document.objects.filter(pk=self.documents[0].pk).update(status='APPROVED')
+
+        dashboard = self.service.get_dashboard()
+        self.assertEqual((dashboard['approved_documents'], dashboard['pending_documents']), (1, 1))
+        self.assertEqual(dashboard['total_documents'], 2)
+
+    def test_nothing_changed_materializes_nothing(self):
+        self.assertEqual(self.service.materialize(), 0)
+
+
+class DownloadCountingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(username='downloader', email='downloader@example.com', password='x')
+        document_type = DocumentType.objects.create(name='Bank statement', description='Test')
+        self.document = Document(user=user, document_type=document_type, original_filename='s.pdf', file_size=len(CONTENT))
+        self.document.file.save('s.pdf', ContentFile(CONTENT))
+        self.service = DocumentDownloadService()
+
+    def counts(self, **headers):
+        request = RequestFactory().get('/download/', headers=headers)
+        response = self.service.build_response(request, self.document)
+        return response.status_code, self.service.counts_as_download(request, response, self.document)
+
+    def test_full_and_first_range_requests_count(self):
+        self.assertEqual(self.counts(), (200, True))
+        self.assertEqual(self.counts(range='bytes=0-1023'), (206, True))
+
+    def test_later_ranges_and_revalidations_do_not_count(self):
+        self.assertEqual(self.counts(range='bytes=1024-2047'), (206, False))
+        self.assertEqual(self.counts(if_none_match=self.service.get_etag(self.document)), (304, False))
+
+    def test_offloaded_range_requests_are_judged_by_the_requested_range(self):
+        self.service.backend = 'nginx'
+        self.assertEqual(self.counts(range='bytes=1024-'), (200, False))
+        self.assertEqual(self.counts(range='bytes=0-'), (200, True))
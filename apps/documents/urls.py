@@ -17,6 +17,7 @@ urlpatterns = [
     path('list/', views.document_list, name='list'),
     path('detail/<int:document_id>/', views.document_detail, name='detail'),
     path('download/<int:document_id>/', views.document_download, name='download'),
+    path('preview/<int:document_id>/<str:size>/', views.document_preview, name='preview'),
     path('delete/<int:document_id>/', views.document_delete, name='delete'),
     
     # Document Verification for Staff
@@ -28,6 +29,9 @@ urlpatterns = [
     # API Endpoints
     path('api/status/', views.document_status_api, name='api_status'),
     path('api/upload/', views.api_document_upload, name='api_upload'),
+    path('api/uploads/', views.upload_session_create, name='upload_session_create'),
+    path('api/uploads/<uuid:upload_id>/', views.upload_session_detail, name='upload_session_detail'),
+    path('api/uploads/<uuid:upload_id>/complete/', views.upload_session_complete, name='upload_session_complete'),
     
     # Additional utility paths
     path('api/', views.document_status_api, name='api_root'),
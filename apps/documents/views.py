@@ -3,24 +3,33 @@ Document management views for FlexiFinance
 Comprehensive document upload, verification, and management functionality
 """
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, FileResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, FileResponse, Http404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import ValidationError, PermissionDenied
-from django.core.paginator import Paginator
 from django.utils import timezone
 from django.conf import settings
+from django.db import models
 import json
 import logging
+import re
 from datetime import datetime, timedelta
-import mimetypes
 
-from .models import Document, DocumentType, DocumentVerification, DocumentAccessLog
+from .models import Document, DocumentType, DocumentUploadSession
+from .services.access_service import access_log_writer, download_counter, recent_access_logs
+from .services.analytics_service import document_analytics_service
+from .services.download_service import DocumentDownloadService
+from .services.upload_service import (
+    UploadCompleting, UploadOffsetMismatch, content_store, create_document, upload_service, validate_file_meta
+)
+from apps.core.pagination import InvalidCursor, KeysetPaginator
 from apps.users.models import User
 
 logger = logging.getLogger(__name__)
 
+download_service = DocumentDownloadService()
+
 
 @login_required
 def document_upload(request):
@@ -58,11 +67,10 @@ def render_upload_form(request):
 
 def handle_document_upload(request):
     """Handle document upload POST request"""
-    logger.info(f"=== DOCUMENT UPLOAD START ===")
-    logger.info(f"User: {request.user.email if hasattr(request.user, 'email') else 'Anonymous'}")
-    logger.info(f"Method: {request.method}")
-    logger.info(f"POST keys: {list(request.POST.keys())}")
-    logger.info(f"FILES keys: {list(request.FILES.keys())}")
+    logger.debug(
+        "Document upload by user %s: fields %s, files %s",
+        request.user.pk, list(request.POST.keys()), list(request.FILES.keys())
+    )
     
     try:
         # Validate required fields
@@ -74,10 +82,9 @@ def handle_document_upload(request):
         document_type = get_object_or_404(DocumentType, id=document_type_id)
         
         # Check if user can upload this document type
-        if not request.user.is_staff:
-            allowed_types = ['KYC', 'LOAN_APPLICATION', 'INCOME_PROOF', 'ADDRESS_PROOF', 'EMPLOYMENT_PROOF']
-            if document_type.required_for not in allowed_types:
-                return JsonResponse({'error': 'Invalid document type'}, status=400)
+        upload_error = check_upload_allowed(request.user, document_type)
+        if upload_error:
+            return JsonResponse({'error': upload_error}, status=400)
         
         # Get uploaded file
         uploaded_file = request.FILES.get('document')
@@ -87,40 +94,22 @@ def handle_document_upload(request):
         # Validate file
         validate_uploaded_file(uploaded_file, document_type)
         
-        # Check for existing documents of same type
-        existing_docs = Document.objects.filter(
-            user=request.user,
-            document_type=document_type,
-            status__in=['PENDING', 'APPROVED', 'AUTO_APPROVED']
-        )
-        
-        if existing_docs.exists() and not request.user.is_staff:
-            return JsonResponse({
-                'error': f'You already have a {document_type.name} document. Please wait for approval or contact support.'
-            }, status=400)
-        
-        # Create document record
-        document = Document.objects.create(
+        # Store content once per SHA-256 and create document record
+        file_name, content_hash, deduplicated = content_store.store(uploaded_file, uploaded_file.name)
+        document = create_document(
             user=request.user,
             document_type=document_type,
-            file=uploaded_file,
+            file_name=file_name,
             original_filename=uploaded_file.name,
             file_size=uploaded_file.size,
+            content_hash=content_hash,
             expires_at=get_expiry_date(document_type)
         )
         
         # Log access
         log_document_access(request, document, 'UPLOAD')
         
-        # Create verification record if manual verification required
-        if document_type.verification_required:
-            DocumentVerification.objects.create(
-                document=document,
-                verifier=request.user,  # Self-upload
-                verification_type='MANUAL'
-            )
-        
-        logger.info(f"Document uploaded: {document} by {request.user.email}")
+        logger.info("Document %s uploaded by user %s", document.id, request.user.pk)
         
         return JsonResponse({
             'success': True,
@@ -152,10 +141,12 @@ def document_list(request):
     if type_filter:
         documents = documents.filter(document_type_id=type_filter)
     
-    # Pagination
-    paginator = Paginator(documents, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination, newest first
+    paginator = KeysetPaginator(documents, timestamp_field='uploaded_at')
+    try:
+        page_obj = paginator.page(after=request.GET.get('cursor'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page_obj = paginator.page()
     
     # Get document types for filter dropdown
     document_types = DocumentType.objects.all()
@@ -203,18 +194,19 @@ def document_download(request, document_id):
         return HttpResponseForbidden("Document has expired")
     
     try:
-        # Increment download count
-        document.increment_download_count()
-        
-        # Log access
-        log_document_access(request, document, 'DOWNLOAD')
+        # Serve file (streamed with Range support, or offloaded to the web server)
+        response = download_service.build_response(request, document)
         
-        # Serve file
-        response = FileResponse(document.file.open('rb'))
-        response['Content-Type'] = mimetypes.guess_type(document.file.name)[0] or 'application/octet-stream'
-        response['Content-Disposition'] = f'attachment; filename="{document.original_filename}"'
-        
-        logger.info(f"Document downloaded: {document} by {request.user.email}")
+        # Conditional (304/412), unsatisfiable (416) and follow-up range
+        # responses are not new downloads
+        if download_service.counts_as_download(request, response, document):
+            # Count the download in the batched counter instead of saving the row
+            download_counter.record(document.id)
+            
+            # Log access
+            log_document_access(request, document, 'DOWNLOAD')
+            
+            logger.info(f"Document downloaded: {document} by {request.user.email}")
         return response
         
     except Exception as e:
@@ -222,6 +214,28 @@ def document_download(request, document_id):
         return HttpResponse("File not found", status=404)
 
 
+@login_required
+def document_preview(request, document_id, size):
+    """Serve the small rendered preview (``thumbnail`` or ``preview``) of a document"""
+    document = get_object_or_404(Document, id=document_id)
+    
+    # Check permission
+    if document.user != request.user and not request.user.is_staff:
+        raise PermissionDenied("You don't have permission to view this document")
+    
+    if size not in ('thumbnail', 'preview'):
+        raise Http404("Unknown preview size")
+    
+    field_file = getattr(document, size)
+    if not field_file:
+        raise Http404("Preview not available")
+    
+    response = FileResponse(field_file.open('rb'), content_type='image/jpeg')
+    # Previews never change for a given document; let the browser keep them
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
 @login_required
 @require_http_methods(["POST"])
 def document_delete(request, document_id):
@@ -241,8 +255,8 @@ def document_delete(request, document_id):
     # Log access
     log_document_access(request, document, 'DELETE')
     
-    # Delete file and record
-    document.file.delete(save=False)
+    # Delete record, and the stored files unless another document shares its content
+    document.delete_stored_files()
     document.delete()
     
     logger.info(f"Document deleted: {document} by {request.user.email}")
@@ -353,58 +367,44 @@ def document_analytics(request):
     if not request.user.is_staff:
         raise PermissionDenied("Staff access required")
     
-    # Get date range
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=30)
-    
-    # Get statistics
-    total_documents = Document.objects.count()
-    pending_documents = Document.objects.filter(status='PENDING').count()
-    approved_documents = Document.objects.filter(status__in=['APPROVED', 'AUTO_APPROVED']).count()
-    rejected_documents = Document.objects.filter(status='REJECTED').count()
+    # Materialized daily summaries plus a live aggregate of today's uploads
+    context = document_analytics_service.get_dashboard()
     
     # Get recent activity
-    recent_documents = Document.objects.select_related('user', 'document_type').order_by('-uploaded_at')[:10]
+    context['recent_documents'] = Document.objects.select_related('user', 'document_type').order_by('-uploaded_at')[:10]
     
-    # Get documents by type
-    documents_by_type = Document.objects.values('document_type__name').annotate(
+    # Access activity, limited to the reporting window
+    context['access_by_action'] = recent_access_logs(days=30).values('action').annotate(
         count=models.Count('id')
     ).order_by('-count')
     
-    return render(request, 'documents/analytics.html', {
-        'total_documents': total_documents,
-        'pending_documents': pending_documents,
-        'approved_documents': approved_documents,
-        'rejected_documents': rejected_documents,
-        'recent_documents': recent_documents,
-        'documents_by_type': documents_by_type,
-        'date_range': {
-            'start': start_date,
-            'end': end_date
-        }
-    })
+    return render(request, 'documents/analytics.html', context)
 
 
 # Utility functions
 def validate_uploaded_file(file_obj, document_type):
     """Validate uploaded file"""
-    # Check file size
-    if file_obj.size > document_type.max_file_size:
-        raise ValidationError(f"File size cannot exceed {document_type.max_file_size / (1024*1024):.1f}MB")
-    
-    # Check file extension
-    file_ext = file_obj.name.split('.')[-1].lower() if '.' in file_obj.name else ''
-    allowed_extensions = document_type.get_allowed_extensions_list()
-    
-    if file_ext not in allowed_extensions:
-        raise ValidationError(f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}")
+    validate_file_meta(file_obj.name, file_obj.size, document_type)
+
+
+def check_upload_allowed(user, document_type):
+    """Return an error message if the user may not upload this document type"""
+    if user.is_staff:
+        return None
     
-    # Additional security checks
-    if file_obj.size < 1024:  # Less than 1KB
-        raise ValidationError("File is too small")
+    allowed_types = ['KYC', 'LOAN_APPLICATION', 'INCOME_PROOF', 'ADDRESS_PROOF', 'EMPLOYMENT_PROOF']
+    if document_type.required_for not in allowed_types:
+        return 'Invalid document type'
     
-    if file_obj.size > 50 * 1024 * 1024:  # More than 50MB
-        raise ValidationError("File is too large")
+    # Check for existing documents of same type
+    existing_docs = Document.objects.filter(
+        user=user,
+        document_type=document_type,
+        status__in=['PENDING', 'APPROVED', 'AUTO_APPROVED']
+    )
+    if existing_docs.exists():
+        return f'You already have a {document_type.name} document. Please wait for approval or contact support.'
+    return None
 
 
 def get_expiry_date(document_type):
@@ -420,10 +420,10 @@ def get_expiry_date(document_type):
 
 
 def log_document_access(request, document, action):
-    """Log document access for security and audit"""
-    DocumentAccessLog.objects.create(
-        document=document,
-        user=request.user,
+    """Log document access for security and audit (buffered, written in batches)"""
+    access_log_writer.record(
+        document_id=document.id,
+        user_id=request.user.id,
         action=action,
         ip_address=get_client_ip(request),
         user_agent=request.META.get('HTTP_USER_AGENT', ''),
@@ -479,4 +479,120 @@ def api_document_upload(request):
         
     except Exception as e:
         logger.error(f"API upload error: {str(e)}")
-        return JsonResponse({'error': 'Upload failed'}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': 'Upload failed'}, status=500)
+
+# Resumable chunked uploads
+@login_required
+@require_http_methods(["POST"])
+def upload_session_create(request):
+    """Start a resumable upload: {document_type, filename, size}"""
+    try:
+        data = json.loads(request.body)
+        document_type = get_object_or_404(DocumentType, id=data.get('document_type'))
+        
+        upload_error = check_upload_allowed(request.user, document_type)
+        if upload_error:
+            return JsonResponse({'error': upload_error}, status=400)
+        
+        upload = upload_service.create_session(
+            user=request.user,
+            document_type=document_type,
+            filename=data.get('filename', ''),
+            total_size=int(data.get('size', 0))
+        )
+        return JsonResponse({
+            'success': True,
+            'upload_id': str(upload.id),
+            'chunk_size': upload.chunk_size,
+            'offset': upload.received_bytes,
+            'expires_at': upload.expires_at.isoformat()
+        }, status=201)
+        
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid upload request'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+
+
+@login_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def upload_session_detail(request, upload_id):
+    """
+    GET: report the resume offset
+    PUT: append a chunk (raw body, ``Content-Range: bytes start-end/total``)
+    DELETE: abort the upload
+    """
+    upload = get_object_or_404(DocumentUploadSession, id=upload_id, user=request.user)
+    
+    if request.method == 'DELETE':
+        if upload.status == 'UPLOADING':
+            upload_service.abort(upload)
+        return JsonResponse({'success': True, 'status': upload.status})
+    
+    if request.method == 'PUT':
+        byte_range = parse_content_range(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if byte_range is None:
+            return JsonResponse({'error': 'Content-Range header required'}, status=400)
+        start, end, total = byte_range
+        if total != upload.total_size:
+            return JsonResponse({'error': 'Content-Range total does not match upload size'}, status=400)
+        
+        try:
+            upload_service.write_chunk(upload, request, start, end - start + 1)
+        except UploadOffsetMismatch as e:
+            return JsonResponse({'error': e.message, 'offset': e.expected_offset}, status=409)
+        except ValidationError as e:
+            return JsonResponse({'error': ' '.join(e.messages), 'offset': upload.received_bytes}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'upload_id': str(upload.id),
+        'status': upload.status,
+        'offset': upload.received_bytes,
+        'size': upload.total_size,
+        'document_id': upload.document_id
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def upload_session_complete(request, upload_id):
+    """Finish an upload, optionally verifying a client-side sha256"""
+    upload = get_object_or_404(DocumentUploadSession, id=upload_id, user=request.user)
+    
+    try:
+        data = json.loads(request.body) if request.body else {}
+        document, deduplicated = upload_service.complete(
+            upload,
+            expires_at=get_expiry_date(upload.document_type),
+            expected_sha256=data.get('sha256')
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except UploadCompleting as e:
+        return JsonResponse({'error': e.message}, status=409)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages), 'offset': upload.received_bytes}, status=400)
+    
+    log_document_access(request, document, 'UPLOAD')
+    logger.info(f"Document uploaded: {document} by {request.user.email}")
+    
+    return JsonResponse({
+        'success': True,
+        'document_id': document.id,
+        'message': f'{upload.document_type.name} uploaded successfully',
+        'status': document.get_status_display(),
+        'auto_approved': upload.document_type.auto_approve,
+        'deduplicated': deduplicated
+    })
+
+
+def parse_content_range(header):
+    """Parse ``bytes start-end/total`` into integers, or None"""
+    match = re.match(r'^bytes (\d+)-(\d+)/(\d+)$', header.strip())
+    if not match:
+        return None
+    start, end, total = (int(value) for value in match.groups())
+    if end < start or end >= total:
+        return None
+    return start, end, total
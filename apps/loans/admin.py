@@ -3,13 +3,14 @@ Django admin configuration for Loans app
 """
 
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Loan, LoanProduct, RepaymentSchedule
+from apps.core.admin_utils import BulkActionAdminMixin, LargeTableAdminMixin
+from .models import BulkActionJob, Loan, LoanDecision, LoanOffer, LoanProduct, RepaymentSchedule
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for Loan model
     """
@@ -31,14 +32,17 @@ class LoanAdmin(admin.ModelAdmin):
         'approval_date'
     ]
     
+    # '^' fields are prefix searches (btree), the rest use trigram indexes on PostgreSQL
     search_fields = [
-        'loan_reference', 
+        '^loan_reference', 
         'user__first_name', 
         'user__last_name', 
         'user__email',
         'user__phone_number'
     ]
     
+    list_select_related = ['user']
+    
     readonly_fields = [
         'loan_reference', 
         'created_at', 
@@ -103,9 +107,10 @@ class LoanAdmin(admin.ModelAdmin):
     
     def user_name(self, obj):
         """Display user name with link to user admin"""
-        url = reverse('admin:users_user_change', args=[obj.user.id])
+        url = reverse('admin:users_user_change', args=[obj.user_id])
         return format_html('<a href="{}">{}</a>', url, obj.user.get_full_name())
     user_name.short_description = 'User'
+    user_name.admin_order_field = 'user__last_name'
     
     def remaining_balance_display(self, obj):
         """Display remaining balance with color coding"""
@@ -132,32 +137,18 @@ class LoanAdmin(admin.ModelAdmin):
     
     def approve_selected_loans(self, request, queryset):
         """Bulk action to approve loans"""
-        updated = 0
-        for loan in queryset:
-            if loan.status == 'SUBMITTED' or loan.status == 'UNDER_REVIEW':
-                loan.approve()
-                updated += 1
-        self.message_user(request, f'Successfully approved {updated} loans.')
+        self.run_bulk_action(request, queryset, 'approve_loans', 'approved')
     approve_selected_loans.short_description = 'Approve selected loans'
     
     def reject_selected_loans(self, request, queryset):
         """Bulk action to reject loans"""
-        updated = 0
-        for loan in queryset:
-            if loan.status in ['SUBMITTED', 'UNDER_REVIEW']:
-                loan.reject('Bulk rejection from admin')
-                updated += 1
-        self.message_user(request, f'Successfully rejected {updated} loans.')
+        self.run_bulk_action(request, queryset, 'reject_loans', 'rejected',
+                             params={'reason': 'Bulk rejection from admin'})
     reject_selected_loans.short_description = 'Reject selected loans'
     
     def mark_as_disbursed(self, request, queryset):
         """Bulk action to mark loans as disbursed"""
-        updated = 0
-        for loan in queryset:
-            if loan.status == 'APPROVED':
-                loan.disburse()
-                updated += 1
-        self.message_user(request, f'Successfully marked {updated} loans as disbursed.')
+        self.run_bulk_action(request, queryset, 'disburse_loans', 'marked as disbursed')
     mark_as_disbursed.short_description = 'Mark as disbursed'
 
 @admin.register(LoanProduct)
@@ -235,7 +226,7 @@ class LoanProductAdmin(admin.ModelAdmin):
     )
 
 @admin.register(RepaymentSchedule)
-class RepaymentScheduleAdmin(admin.ModelAdmin):
+class RepaymentScheduleAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for RepaymentSchedule model
     """
@@ -257,12 +248,14 @@ class RepaymentScheduleAdmin(admin.ModelAdmin):
     ]
     
     search_fields = [
-        'loan__loan_reference',
+        '^loan__loan_reference',
         'loan__user__first_name',
         'loan__user__last_name',
         'loan__user__email'
     ]
     
+    list_select_related = ['loan']
+    
     readonly_fields = [
         'remaining_amount',
         'created_at'
@@ -272,18 +265,149 @@ class RepaymentScheduleAdmin(admin.ModelAdmin):
     
     def loan_reference(self, obj):
         """Display loan reference with link"""
-        url = reverse('admin:loans_loan_change', args=[obj.loan.id])
+        url = reverse('admin:loans_loan_change', args=[obj.loan_id])
         return format_html('<a href="{}">{}</a>', url, obj.loan.loan_reference)
     loan_reference.short_description = 'Loan Reference'
+    loan_reference.admin_order_field = 'loan__loan_reference'
     
     def mark_as_paid(self, request, queryset):
         """Bulk action to mark installments as paid"""
-        updated = 0
-        for schedule in queryset:
-            if schedule.status != 'PAID':
-                remaining = schedule.total_amount - schedule.paid_amount
-                if remaining > 0:
-                    schedule.record_payment(remaining)
-                    updated += 1
-        self.message_user(request, f'Successfully marked {updated} installments as paid.')
-    mark_as_paid.short_description = 'Mark selected installments as paid'
\ No newline at end of file
+        self.run_bulk_action(request, queryset, 'mark_installments_paid', 'marked as paid')
+    mark_as_paid.short_description = 'Mark selected installments as paid'
+
+
+@admin.register(LoanOffer)
+class LoanOfferAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """
+    Admin interface for LoanOffer model (maintained by the eligibility service)
+    """
+    list_display = ['user', 'product', 'created_at']
+    
+    list_filter = ['product', 'created_at']
+    
+    search_fields = ['^user__username', 'user__email', '^user__phone_number']
+    
+    list_select_related = ['user', 'product']
+    
+    raw_id_fields = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LoanDecision)
+class LoanDecisionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """
+    Admin interface for LoanDecision model (read-only decision trace)
+    """
+    list_display = [
+        'loan_reference',
+        'outcome',
+        'risk_category',
+        'credit_score',
+        'rule_set_version',
+        'decision_seconds',
+        'sla_met',
+        'created_at'
+    ]
+    
+    list_filter = ['outcome', 'risk_category', 'sla_met', 'created_at']
+    
+    search_fields = ['^loan__loan_reference']
+    
+    list_select_related = ['loan']
+    
+    list_defer = ['trace']
+    
+    readonly_fields = [
+        'loan',
+        'outcome',
+        'risk_category',
+        'credit_score',
+        'rule_set_version',
+        'trace_display',
+        'decision_seconds',
+        'sla_met',
+        'created_at'
+    ]
+    
+    exclude = ['trace']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def loan_reference(self, obj):
+        """Display loan reference with link"""
+        url = reverse('admin:loans_loan_change', args=[obj.loan_id])
+        return format_html('<a href="{}">{}</a>', url, obj.loan.loan_reference)
+    loan_reference.short_description = 'Loan Reference'
+    loan_reference.admin_order_field = 'loan__loan_reference'
+    
+    def trace_display(self, obj):
+        """Display each rule result on its own line"""
+        return format_html_join(
+            mark_safe('<br>'), '<strong>{}</strong>: {} &mdash; {}',
+            ((step['rule'], step['result'], step['detail']) for step in obj.trace)
+        )
+    trace_display.short_description = 'Decision Trace'
+
+
+@admin.register(BulkActionJob)
+class BulkActionJobAdmin(admin.ModelAdmin):
+    """
+    Admin interface for BulkActionJob model (read-only progress view)
+    """
+    list_display = [
+        'action',
+        'status',
+        'progress_display',
+        'updated',
+        'total',
+        'created_by',
+        'created_at',
+        'completed_at'
+    ]
+    
+    list_filter = ['status', 'action', 'created_at']
+    
+    list_select_related = ['created_by']
+    
+    exclude = ['object_ids']
+    
+    readonly_fields = [
+        'action',
+        'params',
+        'status',
+        'progress_display',
+        'total',
+        'processed',
+        'updated',
+        'error_message',
+        'created_by',
+        'created_at',
+        'started_at',
+        'completed_at'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def progress_display(self, obj):
+        """Display progress bar"""
+        color = {'FAILED': '#dc3545', 'COMPLETED': '#28a745'}.get(obj.status, '#007bff')
+        return format_html(
+            '<div style="width: 120px; background: #e9ecef; border-radius: 4px;">'
+            '<div style="width: {}%; background: {}; height: 8px; border-radius: 4px;"></div></div>'
+            '<small>{} / {} ({}%)</small>',
+            obj.progress, color, obj.processed, obj.total, obj.progress
+        )
+    progress_display.short_description = 'Progress'
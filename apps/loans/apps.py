@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class LoansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.loans'
-    verbose_name = 'Loan Management'
\ No newline at end of file
+    verbose_name = 'Loan Management'
+
+    def ready(self):
+        """Import signals when Django starts"""
+        import apps.loans.signals
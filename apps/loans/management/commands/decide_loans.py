@@ -0,0 +1,33 @@
+"""
+Management command to run automated decisioning on submitted loan applications
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.loans.services.decision_service import decision_service
+
+
+class Command(BaseCommand):
+    help = 'Decide submitted loan applications in batches (approve, reject or refer to manual review)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new applications')
+        parser.add_argument(
+            '--interval', type=int,
+            default=getattr(settings, 'DECISION_CONFIG', {}).get('POLL_INTERVAL_SECONDS', 10),
+            help='Seconds between polls with --loop'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = decision_service.decide_pending()
+            if result['decided'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Decided {result['decided']} loans: {result['approved']} approved, "
+                    f"{result['rejected']} rejected, {result['referred']} referred "
+                    f"({result['sla_breaches']} past SLA)"
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
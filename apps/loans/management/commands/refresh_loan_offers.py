@@ -0,0 +1,26 @@
+"""
+Management command to rebuild pre-approved loan offers
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.loans.models import LoanProduct
+from apps.loans.services.eligibility_service import eligibility_service
+
+
+class Command(BaseCommand):
+    help = 'Refresh the loan_offers table from each product\'s eligibility rules (one query per product)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', help='Only refresh this product code')
+
+    def handle(self, *args, **options):
+        if options['product']:
+            try:
+                product = LoanProduct.objects.get(product_code=options['product'])
+            except LoanProduct.DoesNotExist:
+                raise CommandError(f"Loan product {options['product']} does not exist")
+            result = eligibility_service.refresh_product(product)
+        else:
+            result = eligibility_service.refresh_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Loan offers refreshed: {result['created']} created, {result['deleted']} withdrawn"
+        ))
@@ -0,0 +1,13 @@
+"""
+Management command to run pending bulk admin action jobs
+"""
+from django.core.management.base import BaseCommand
+from apps.loans.services.bulk_action_service import bulk_action_service
+
+
+class Command(BaseCommand):
+    help = 'Run bulk action jobs left pending or interrupted (e.g. by a restart)'
+
+    def handle(self, *args, **options):
+        count = bulk_action_service.run_pending()
+        self.stdout.write(self.style.SUCCESS(f'Ran {count} bulk action job(s)'))
@@ -0,0 +1,19 @@
+# Trigram/prefix indexes backing admin search_fields (PostgreSQL only)
+
+from django.db import migrations
+
+from apps.core.search_indexes import search_index_operations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("loans", "0005_auto_20251213_0056"),
+    ]
+
+    operations = search_index_operations([
+        ('loans_reference_prefix', 'loans', 'loan_reference', 'prefix'),
+    ])
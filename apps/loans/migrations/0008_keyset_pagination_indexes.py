@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_bulk_action_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='loans_user_id_605262_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repaymentschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['updated_at'], name='loans_updated_4fd1f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repaymentschedule',
+            index=models.Index(fields=['updated_at'], name='repayment_s_updated_a4df89_idx'),
+        ),
+    ]
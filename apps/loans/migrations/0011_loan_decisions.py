@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0010_loan_offers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('outcome', models.CharField(choices=[('APPROVE', 'Approve'), ('REJECT', 'Reject'), ('REFER', 'Refer to manual review')], max_length=10)),
+                ('risk_category', models.CharField(choices=[('LOW', 'Low Risk'), ('MEDIUM', 'Medium Risk'), ('HIGH', 'High Risk')], max_length=10)),
+                ('credit_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('rule_set_version', models.CharField(max_length=100)),
+                ('trace', models.JSONField(default=list, help_text='Result of each rule in evaluation order')),
+                ('decision_seconds', models.FloatField(help_text='Time from application to decision')),
+                ('sla_met', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='decisions', to='loans.loan')),
+            ],
+            options={
+                'verbose_name': 'Loan Decision',
+                'verbose_name_plural': 'Loan Decisions',
+                'db_table': 'loan_decisions',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['outcome', 'created_at'], name='loan_decisi_outcome_7d9643_idx')],
+            },
+        ),
+    ]
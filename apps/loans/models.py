@@ -97,6 +97,10 @@ class Loan(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['loan_reference']),
             models.Index(fields=['status', 'application_date']),
+            # Keyset pagination of a user's loans (newest first)
+            models.Index(fields=['user', 'created_at', 'id']),
+            # Incremental finance exports
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
@@ -320,6 +324,7 @@ class RepaymentSchedule(models.Model):
     # Dates
     paid_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'repayment_schedules'
@@ -327,6 +332,10 @@ class RepaymentSchedule(models.Model):
         verbose_name_plural = 'Repayment Schedules'
         unique_together = ['loan', 'installment_number']
         ordering = ['due_date']
+        indexes = [
+            # Incremental finance exports
+            models.Index(fields=['updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.loan.loan_reference} - Installment {self.installment_number} - KES {self.total_amount}"
@@ -373,8 +382,123 @@ class RepaymentSchedule(models.Model):
         # Check if loan is fully paid
         if self.loan.remaining_balance <= 0:
             self.loan.complete()
+
+        from django.db import transaction
+        from apps.loans.signals import installments_paid
+        transaction.on_commit(lambda: installments_paid.send(
+            sender=RepaymentSchedule, schedule_ids=[self.pk], loan_ids=[self.loan_id], actor=None
+        ))
     
     @property
     def is_overdue(self):
         from django.utils import timezone
-        return timezone.now().date() > self.due_date and self.status != 'PAID'
\ No newline at end of file
+        return timezone.now().date() > self.due_date and self.status != 'PAID'
+
+class LoanOffer(models.Model):
+    """
+    Pre-approved loan offer
+    One row per (user, product) pair that currently passes the product's
+    eligibility rules; maintained by the eligibility service
+    """
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='loan_offers')
+    product = models.ForeignKey(LoanProduct, on_delete=models.CASCADE, related_name='offers')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'loan_offers'
+        verbose_name = 'Loan Offer'
+        verbose_name_plural = 'Loan Offers'
+        ordering = ['-created_at']
+        unique_together = ['user', 'product']
+        indexes = [
+            # Campaign exports list a product's offers newest first
+            models.Index(fields=['product', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} offer for {self.user}"
+
+class LoanDecision(models.Model):
+    """
+    Automated decision on a loan application
+    Records the outcome, the rule set version used and each rule's result
+    """
+    
+    OUTCOMES = [
+        ('APPROVE', 'Approve'),
+        ('REJECT', 'Reject'),
+        ('REFER', 'Refer to manual review'),
+    ]
+    
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='decisions')
+    outcome = models.CharField(max_length=10, choices=OUTCOMES)
+    risk_category = models.CharField(max_length=10, choices=Loan.RISK_CATEGORIES)
+    credit_score = models.PositiveIntegerField(null=True, blank=True)
+    rule_set_version = models.CharField(max_length=100)
+    trace = models.JSONField(default=list, help_text="Result of each rule in evaluation order")
+    decision_seconds = models.FloatField(help_text="Time from application to decision")
+    sla_met = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'loan_decisions'
+        verbose_name = 'Loan Decision'
+        verbose_name_plural = 'Loan Decisions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['outcome', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.loan.loan_reference}: {self.outcome}"
+
+class BulkActionJob(models.Model):
+    """
+    Background bulk admin action
+    Large admin selections are applied in batches by a worker thread;
+    the job row records the selection and progress
+    """
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    action = models.CharField(max_length=50)
+    object_ids = models.JSONField(default=list, help_text="Primary keys selected in the admin")
+    params = models.JSONField(default=dict, blank=True)
+    
+    # Progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='bulk_action_jobs')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'bulk_action_jobs'
+        verbose_name = 'Bulk Action Job'
+        verbose_name_plural = 'Bulk Action Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.action} ({self.processed}/{self.total})"
+    
+    @property
+    def progress(self):
+        """Percentage of selected objects processed"""
+        if not self.total:
+            return 100 if self.status == 'COMPLETED' else 0
+        return round(self.processed * 100 / self.total, 1)
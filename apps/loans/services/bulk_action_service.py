@@ -0,0 +1,293 @@
+"""
+Bulk Action Service for FlexiFinance
+Set-based status transitions for admin bulk actions, run inline or as background jobs
+"""
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.loans.models import BulkActionJob, Loan, RepaymentSchedule
+from apps.loans.signals import installments_paid, loans_transitioned
+from apps.payments.models import PaymentSchedule
+
+logger = logging.getLogger(__name__)
+
+# Target loan status -> statuses it may be reached from
+LOAN_TRANSITIONS = {
+    'UNDER_REVIEW': ['SUBMITTED'],
+    'APPROVED': ['SUBMITTED', 'UNDER_REVIEW'],
+    'REJECTED': ['SUBMITTED', 'UNDER_REVIEW'],
+    'DISBURSED': ['APPROVED'],
+}
+
+# Days until a disbursed loan without a due date falls due (matches Loan.disburse)
+DEFAULT_DUE_DAYS = 30
+
+
+class BulkActionService:
+    """
+    Bulk Action Service
+    Each batch is validated and applied in SQL with one conditional UPDATE per
+    target state instead of one save() per row, and downstream receivers get
+    one event per batch. Selections above the sync limit become a
+    BulkActionJob processed by a background thread
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'ADMIN_CONFIG', {})
+        self.batch_size = config.get('BULK_ACTION_BATCH_SIZE', 1000)
+        self.sync_limit = config.get('BULK_ACTION_SYNC_LIMIT', 500)
+        self.actions = {
+            'approve_loans': lambda ids, actor, params: self.transition_loans(ids, 'APPROVED', actor=actor),
+            'reject_loans': lambda ids, actor, params: self.transition_loans(
+                ids, 'REJECTED', reason=params.get('reason', ''), actor=actor
+            ),
+            'disburse_loans': lambda ids, actor, params: self.transition_loans(ids, 'DISBURSED', actor=actor),
+            'mark_installments_paid': lambda ids, actor, params: self.mark_installments_paid(ids, actor=actor),
+            'mark_payment_schedules_paid': lambda ids, actor, params: self.mark_payment_schedules_paid(ids),
+            'mark_payment_schedules_overdue': lambda ids, actor, params: self.mark_payment_schedules_overdue(ids),
+        }
+
+    def submit(self, action, queryset, user=None, params=None):
+        """
+        Apply an action to an admin selection
+
+        Small selections run inline; larger ones are stored as a job and
+        processed in the background once the transaction commits
+
+        Args:
+            action (str): Key of self.actions
+            queryset (QuerySet): Admin selection
+            user (User): Acting staff user
+            params (dict): Action parameters (e.g. rejection reason)
+
+        Returns:
+            dict: {'success': True, 'updated': n, 'skipped': n} or {'success': True, 'job': BulkActionJob}
+        """
+        if action not in self.actions:
+            raise ValueError(f"Unknown bulk action: {action}")
+        params = params or {}
+
+        ids = list(queryset.order_by().values_list('pk', flat=True))
+        if len(ids) <= self.sync_limit:
+            updated = self.actions[action](ids, user, params)
+            return {'success': True, 'updated': updated, 'skipped': len(ids) - updated}
+
+        job = BulkActionJob.objects.create(
+            action=action,
+            object_ids=[str(pk) for pk in ids],
+            params=params,
+            total=len(ids),
+            created_by=user
+        )
+        transaction.on_commit(lambda: self._start(job.id))
+        logger.info(f"Queued bulk action {action} for {len(ids)} objects as job {job.id}")
+        return {'success': True, 'job': job}
+
+    def run_job(self, job):
+        """
+        Process a job batch by batch, recording progress after each batch
+
+        Args:
+            job (BulkActionJob): Job to run (resumes from job.processed)
+
+        Returns:
+            BulkActionJob: The finished job
+        """
+        claimed = BulkActionJob.objects.filter(id=job.id, status__in=['PENDING', 'RUNNING']).update(
+            status='RUNNING', started_at=Coalesce(F('started_at'), Value(timezone.now()))
+        )
+        if not claimed:
+            return job
+        job.refresh_from_db()
+
+        handler = self.actions[job.action]
+        try:
+            while job.processed < job.total:
+                batch = job.object_ids[job.processed:job.processed + self.batch_size]
+                updated = handler(batch, job.created_by, job.params)
+                BulkActionJob.objects.filter(id=job.id).update(
+                    processed=F('processed') + len(batch),
+                    updated=F('updated') + updated
+                )
+                job.processed += len(batch)
+                job.updated += updated
+        except Exception as e:
+            logger.error(f"Bulk action job {job.id} failed after {job.processed} objects: {e}")
+            job.status = 'FAILED'
+            job.error_message = str(e)
+        else:
+            job.status = 'COMPLETED'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'error_message', 'completed_at'])
+        logger.info(f"Bulk action job {job.id} {job.status.lower()}: {job.updated}/{job.total} updated")
+        return job
+
+    def run_pending(self):
+        """
+        Run jobs left pending or interrupted (e.g. by a restart)
+
+        Returns:
+            int: Number of jobs run
+        """
+        jobs = list(BulkActionJob.objects.filter(status__in=['PENDING', 'RUNNING']).order_by('created_at'))
+        for job in jobs:
+            self.run_job(job)
+        return len(jobs)
+
+    def transition_loans(self, ids, target, reason='', actor=None):
+        """
+        Move loans to a new status with one conditional UPDATE
+
+        Rows whose current status does not allow the transition are left
+        untouched by the WHERE clause
+
+        Args:
+            ids (list): Loan primary keys
+            target (str): UNDER_REVIEW, APPROVED, REJECTED or DISBURSED
+            reason (str): Rejection reason
+            actor (User): Acting staff user
+
+        Returns:
+            int: Number of loans transitioned
+        """
+        if target not in LOAN_TRANSITIONS:
+            raise ValueError(f"Unsupported loan transition: {target}")
+
+        stamp = timezone.now()
+        values = {'status': target, 'updated_at': stamp}
+        if target == 'REJECTED':
+            values['rejected_reason'] = reason
+        elif target != 'UNDER_REVIEW':
+            # Loan.save() only fills the balance in memory; approve()/disburse() never persisted it
+            values['remaining_balance'] = Case(
+                When(remaining_balance=0, then=F('total_amount')),
+                default=F('remaining_balance')
+            )
+        if target == 'APPROVED':
+            values['approval_date'] = stamp
+        elif target == 'DISBURSED':
+            values['disbursement_date'] = stamp
+            values['due_date'] = Coalesce(F('due_date'), Value(stamp + timedelta(days=DEFAULT_DUE_DAYS)))
+
+        with transaction.atomic():
+            updated = Loan.objects.filter(pk__in=ids, status__in=LOAN_TRANSITIONS[target]).update(**values)
+            # updated_at carries this statement's timestamp, which identifies the rows it changed
+            changed = list(
+                Loan.objects.filter(pk__in=ids, status=target, updated_at=stamp).values_list('id', flat=True)
+            ) if updated else []
+            if changed:
+                transaction.on_commit(lambda: loans_transitioned.send(
+                    sender=Loan, status=target, loan_ids=changed, actor=actor, reason=reason
+                ))
+        return updated
+
+    def mark_installments_paid(self, ids, actor=None):
+        """
+        Settle repayment installments in full and reduce loan balances set-wise
+
+        Args:
+            ids (list): RepaymentSchedule primary keys
+            actor (User): Acting staff user
+
+        Returns:
+            int: Number of installments marked paid
+        """
+        stamp = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                RepaymentSchedule.objects.select_for_update()
+                .filter(pk__in=ids, total_amount__gt=F('paid_amount'))
+                .exclude(status='PAID')
+                .values_list('id', 'loan_id', 'total_amount', 'paid_amount')
+            )
+            if not rows:
+                return 0
+
+            schedule_ids = [row[0] for row in rows]
+            by_loan = {}
+            for _, loan_id, total_amount, paid_amount in rows:
+                by_loan[loan_id] = by_loan.get(loan_id, Decimal('0.00')) + (total_amount - paid_amount)
+
+            RepaymentSchedule.objects.filter(pk__in=schedule_ids).update(
+                paid_amount=F('total_amount'),
+                remaining_amount=0,
+                status='PAID',
+                paid_date=Coalesce(F('paid_date'), Value(stamp)),
+                updated_at=stamp
+            )
+            Loan.objects.filter(pk__in=by_loan).update(
+                remaining_balance=F('remaining_balance') - Case(
+                    *[When(pk=loan_id, then=Value(amount)) for loan_id, amount in by_loan.items()],
+                    default=Value(Decimal('0.00')),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2)
+                ),
+                updated_at=stamp
+            )
+
+            settled = Loan.objects.filter(pk__in=by_loan, remaining_balance__lte=0).exclude(status='COMPLETED')
+            completed = list(settled.values_list('id', flat=True))
+            if completed:
+                Loan.objects.filter(pk__in=completed).update(
+                    status='COMPLETED', completion_date=stamp, remaining_balance=0, updated_at=stamp
+                )
+
+            loan_ids = list(by_loan)
+            transaction.on_commit(lambda: installments_paid.send(
+                sender=RepaymentSchedule, schedule_ids=schedule_ids, loan_ids=loan_ids, actor=actor
+            ))
+            if completed:
+                transaction.on_commit(lambda: loans_transitioned.send(
+                    sender=Loan, status='COMPLETED', loan_ids=completed, actor=actor, reason=''
+                ))
+        return len(schedule_ids)
+
+    def mark_payment_schedules_paid(self, ids):
+        """
+        Settle payment schedule items in full
+
+        Returns:
+            int: Number of items marked paid
+        """
+        return (
+            PaymentSchedule.objects.filter(pk__in=ids, amount_due__gt=F('amount_paid'))
+            .exclude(status='PAID')
+            .update(amount_paid=F('amount_due'), status='PAID')
+        )
+
+    def mark_payment_schedules_overdue(self, ids):
+        """
+        Flag unpaid payment schedule items past their due date as overdue
+
+        Returns:
+            int: Number of items marked overdue
+        """
+        return (
+            PaymentSchedule.objects.filter(pk__in=ids, due_date__lt=timezone.localdate())
+            .exclude(status__in=['PAID', 'OVERDUE'])
+            .update(status='OVERDUE')
+        )
+
+    def _start(self, job_id):
+        thread = threading.Thread(target=self._run_in_thread, args=(job_id,), name='bulk-action-job', daemon=True)
+        thread.start()
+
+    def _run_in_thread(self, job_id):
+        try:
+            job = BulkActionJob.objects.select_related('created_by').get(id=job_id)
+            self.run_job(job)
+        except Exception as e:
+            logger.error(f"Bulk action job {job_id} could not run: {e}")
+        finally:
+            close_old_connections()
+
+
+# Global service instance
+bulk_action_service = BulkActionService()
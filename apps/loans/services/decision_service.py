@@ -0,0 +1,324 @@
+"""
+Loan Decision Service for FlexiFinance
+Batch evaluation of submitted applications against per-product rule sets
+"""
+import logging
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from apps.documents.models import Document, DocumentType
+from apps.loans.models import Loan, LoanDecision, LoanProduct
+from apps.loans.services.bulk_action_service import bulk_action_service
+
+logger = logging.getLogger(__name__)
+
+# Rule results, in increasing severity
+PASS, REFER, REJECT = 'PASS', 'REFER', 'REJECT'
+
+# Loans counted as existing debt (as in User.get_outstanding_balance)
+OUTSTANDING_STATUSES = ['APPROVED', 'ACTIVE']
+
+# Rejection reason shown to the applicant per failed rule (details stay in the trace,
+# so rejected loans share a handful of reasons and are transitioned together)
+REJECTION_REASONS = {
+    'product_limits': 'Requested amount or tenure is outside the product limits',
+    'credit_score': 'Credit score is below the minimum for this product',
+    'debt_to_income': 'Income does not support the requested amount',
+}
+
+# Documents that satisfy a requirement
+ACCEPTED_DOCUMENT_STATUSES = ['APPROVED', 'AUTO_APPROVED']
+
+
+class CompiledRuleSet:
+    """Rules for one product version with their thresholds bound"""
+
+    def __init__(self, version, rules):
+        self.version = version
+        self.rules = rules
+
+    def evaluate(self, facts):
+        """
+        Run every rule against an application's facts
+
+        Returns:
+            tuple: (outcome, trace) where outcome is APPROVE, REJECT or REFER
+        """
+        trace = []
+        worst = PASS
+        for name, rule in self.rules:
+            result, detail = rule(facts)
+            trace.append({'rule': name, 'result': result, 'detail': detail})
+            if result == REJECT or (result == REFER and worst == PASS):
+                worst = result
+        return {PASS: 'APPROVE', REFER: 'REFER', REJECT: 'REJECT'}[worst], trace
+
+
+class DecisionService:
+    """
+    Loan Decision Service
+    Submitted applications are claimed in batches; everything the rules need
+    (applicant, outstanding debt, approved documents) is loaded with one query
+    per kind for the whole batch. Rule sets are compiled once per product
+    version (product id + updated_at) and reused until the product changes.
+    Outcomes go through the bulk transition path, so notifications, credit
+    scores and offers update exactly as for admin decisions
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DECISION_CONFIG', {})
+        risk_config = getattr(settings, 'RISK_CONFIG', {})
+        self.batch_size = config.get('BATCH_SIZE', 500)
+        self.sla_seconds = config.get('SLA_SECONDS', 300)
+        self.auto_approve_max = Decimal(str(config.get('AUTO_APPROVE_MAX_AMOUNT', 100000)))
+        self.document_purposes = config.get('REQUIRED_DOCUMENT_PURPOSES', ['KYC'])
+        self.rule_names = config.get('RULES', [
+            'kyc', 'product_limits', 'credit_score', 'debt_to_income', 'documents', 'auto_approve_limit',
+        ])
+        self.min_credit_score = risk_config.get('MIN_CREDIT_SCORE', 600)
+        self.max_dti = Decimal(str(risk_config.get('MAX_DEBT_TO_INCOME_RATIO', 0.4)))
+        self.risk_categories = sorted(
+            risk_config.get('RISK_CATEGORIES', {}).items(), key=lambda item: -item[1]['min_score']
+        )
+        self._compiled = {}
+
+    def product_for_loan_type(self, products, loan_type):
+        """Active product for a loan type (product codes are prefixed with the type)"""
+        for product in products:
+            if product.product_code == loan_type or product.product_code.startswith(f'{loan_type}_'):
+                return product
+        return None
+
+    def compile_rules(self, product, loan_type):
+        """
+        Compiled rule set for a product version, from cache when unchanged
+
+        Args:
+            product (LoanProduct): Product matching the loan type, or None
+            loan_type (str): Loan type (keys the rule set when there is no product)
+        """
+        key = product.pk if product else f'type:{loan_type}'
+        version = f'{product.product_code}@{product.updated_at.isoformat()}' if product else f'{loan_type}@default'
+        cached = self._compiled.get(key)
+        if cached is None or cached.version != version:
+            builders = {
+                'kyc': self._kyc_rule,
+                'product_limits': self._product_limits_rule,
+                'credit_score': self._credit_score_rule,
+                'debt_to_income': self._dti_rule,
+                'documents': self._documents_rule,
+                'auto_approve_limit': self._auto_approve_limit_rule,
+            }
+            cached = CompiledRuleSet(version, [(name, builders[name](product)) for name in self.rule_names])
+            self._compiled[key] = cached
+        return cached
+
+    def risk_category(self, credit_score):
+        """RISK_CONFIG category for a score (HIGH when unscored or below every band)"""
+        if credit_score is not None:
+            for category, band in self.risk_categories:
+                if credit_score >= band['min_score']:
+                    return category
+        return 'HIGH'
+
+    def decide_batch(self, limit=None):
+        """
+        Claim and decide up to one batch of submitted applications
+
+        Returns:
+            dict: {'decided': n, 'approved': n, 'rejected': n, 'referred': n, 'sla_breaches': n}
+        """
+        limit = limit or self.batch_size
+        started = time.perf_counter()
+        with transaction.atomic():
+            loans = list(
+                Loan.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('user')
+                .filter(status='SUBMITTED')
+                .order_by('application_date')[:limit]
+            )
+            if not loans:
+                return {'decided': 0, 'approved': 0, 'rejected': 0, 'referred': 0, 'sla_breaches': 0}
+            result = self._decide(loans)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Decided {result['decided']} loans in {elapsed:.2f}s: {result['approved']} approved, "
+            f"{result['rejected']} rejected, {result['referred']} referred, {result['sla_breaches']} past SLA"
+        )
+        return result
+
+    def decide_pending(self):
+        """
+        Decide batches until no submitted applications are left
+
+        Returns:
+            dict: Totals across batches
+        """
+        totals = {'decided': 0, 'approved': 0, 'rejected': 0, 'referred': 0, 'sla_breaches': 0}
+        while True:
+            result = self.decide_batch()
+            if not result['decided']:
+                return totals
+            for key in totals:
+                totals[key] += result[key]
+
+    def _decide(self, loans):
+        now = timezone.now()
+        user_ids = {loan.user_id for loan in loans}
+        products = list(LoanProduct.objects.filter(is_active=True).order_by('product_code'))
+
+        outstanding = dict(
+            Loan.objects.filter(user_id__in=user_ids, status__in=OUTSTANDING_STATUSES)
+            .values('user_id').annotate(total=Sum('remaining_balance')).order_by()
+            .values_list('user_id', 'total')
+        )
+        required_types = set(
+            DocumentType.objects.filter(is_required=True, required_for__in=self.document_purposes)
+            .values_list('id', flat=True)
+        )
+        approved_types = {}
+        if required_types:
+            for user_id, type_id in (
+                Document.objects.filter(
+                    user_id__in=user_ids, document_type_id__in=required_types,
+                    status__in=ACCEPTED_DOCUMENT_STATUSES
+                ).filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+                .values_list('user_id', 'document_type_id').distinct()
+            ):
+                approved_types.setdefault(user_id, set()).add(type_id)
+
+        decisions = []
+        by_outcome = {'APPROVE': [], 'REFER': []}
+        rejections = {}
+        for loan in loans:
+            user = loan.user
+            product = self.product_for_loan_type(products, loan.loan_type)
+            rule_set = self.compile_rules(product, loan.loan_type)
+            facts = {
+                'amount': loan.principal_amount,
+                'tenure': loan.loan_tenure,
+                'total_amount': loan.total_amount or loan.principal_amount,
+                'credit_score': user.credit_score,
+                'monthly_income': user.monthly_income,
+                'outstanding': outstanding.get(user.pk) or Decimal('0.00'),
+                'kyc_status': user.kyc_status,
+                'missing_documents': len(required_types - approved_types.get(user.pk, set())),
+            }
+            outcome, trace = rule_set.evaluate(facts)
+            seconds = (now - loan.application_date).total_seconds()
+
+            loan.risk_category = self.risk_category(user.credit_score)
+            loan.credit_score_assigned = user.credit_score
+            decisions.append(LoanDecision(
+                loan=loan,
+                outcome=outcome,
+                risk_category=loan.risk_category,
+                credit_score=user.credit_score,
+                rule_set_version=rule_set.version,
+                trace=trace,
+                decision_seconds=seconds,
+                sla_met=seconds <= self.sla_seconds,
+                created_at=now
+            ))
+            if outcome == 'REJECT':
+                reason = '; '.join(
+                    REJECTION_REASONS.get(step['rule'], step['detail']) for step in trace if step['result'] == REJECT
+                )
+                rejections.setdefault(reason, []).append(loan.pk)
+            else:
+                by_outcome[outcome].append(loan.pk)
+
+        Loan.objects.bulk_update(loans, ['risk_category', 'credit_score_assigned'], batch_size=self.batch_size)
+        LoanDecision.objects.bulk_create(decisions, batch_size=self.batch_size)
+        if by_outcome['APPROVE']:
+            bulk_action_service.transition_loans(by_outcome['APPROVE'], 'APPROVED')
+        for reason, ids in rejections.items():
+            bulk_action_service.transition_loans(ids, 'REJECTED', reason=reason)
+        if by_outcome['REFER']:
+            bulk_action_service.transition_loans(by_outcome['REFER'], 'UNDER_REVIEW')
+
+        return {
+            'decided': len(loans),
+            'approved': len(by_outcome['APPROVE']),
+            'rejected': sum(len(ids) for ids in rejections.values()),
+            'referred': len(by_outcome['REFER']),
+            'sla_breaches': sum(1 for decision in decisions if not decision.sla_met),
+        }
+
+    # Rule builders: each returns a function of the application facts that
+    # yields (result, detail), with product thresholds resolved up front
+
+    def _kyc_rule(self, product):
+        def rule(facts):
+            if facts['kyc_status'] == 'APPROVED':
+                return PASS, 'KYC approved'
+            return REFER, f"KYC status {facts['kyc_status']}"
+        return rule
+
+    def _product_limits_rule(self, product):
+        if product is None:
+            return lambda facts: (REFER, 'No active product for this loan type')
+        min_amount, max_amount = product.min_amount, product.max_amount
+        min_tenure, max_tenure = product.min_tenure, product.max_tenure
+
+        def rule(facts):
+            if not min_amount <= facts['amount'] <= max_amount:
+                return REJECT, f"Amount {facts['amount']} outside {min_amount}-{max_amount}"
+            if not min_tenure <= facts['tenure'] <= max_tenure:
+                return REJECT, f"Tenure {facts['tenure']} outside {min_tenure}-{max_tenure} months"
+            return PASS, 'Within product limits'
+        return rule
+
+    def _credit_score_rule(self, product):
+        minimum = max(self.min_credit_score, product.min_credit_score if product else 0)
+
+        def rule(facts):
+            score = facts['credit_score']
+            if score is None:
+                return REFER, 'No credit score'
+            if score < minimum:
+                return REJECT, f"Credit score {score} below {minimum}"
+            return PASS, f"Credit score {score}"
+        return rule
+
+    def _dti_rule(self, product):
+        max_dti = self.max_dti
+        min_income = product.min_income if product else Decimal('0')
+
+        def rule(facts):
+            income = facts['monthly_income']
+            if not income:
+                return REFER, 'No declared income'
+            if income < min_income:
+                return REJECT, f"Income {income} below {min_income}"
+            # User.get_debt_to_income_ratio, with this application added to the debt
+            ratio = (facts['outstanding'] + facts['total_amount']) / (income * 12)
+            if ratio > max_dti:
+                return REJECT, f"Debt-to-income {ratio:.2f} above {max_dti}"
+            return PASS, f"Debt-to-income {ratio:.2f}"
+        return rule
+
+    def _documents_rule(self, product):
+        def rule(facts):
+            if facts['missing_documents']:
+                return REFER, f"{facts['missing_documents']} required document(s) missing"
+            return PASS, 'Documents complete'
+        return rule
+
+    def _auto_approve_limit_rule(self, product):
+        limit = self.auto_approve_max
+
+        def rule(facts):
+            if facts['amount'] > limit:
+                return REFER, f"Amount above auto-approval limit {limit}"
+            return PASS, 'Within auto-approval limit'
+        return rule
+
+
+# Global service instance
+decision_service = DecisionService()
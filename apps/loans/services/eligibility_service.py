@@ -0,0 +1,149 @@
+"""
+Eligibility Service for FlexiFinance
+Translates LoanProduct requirements into queryset filters and maintains pre-approved offers
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from apps.loans.models import Loan, LoanOffer, LoanProduct
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Loans counted against MAX_ACTIVE_LOANS (as in User.can_apply_for_loan)
+ACTIVE_LOAN_STATUSES = ['APPROVED', 'ACTIVE']
+
+# User fields read by the eligibility rules; saves touching none of them skip the refresh
+ELIGIBILITY_FIELDS = {
+    'is_verified', 'kyc_status', 'is_active', 'is_staff',
+    'monthly_income', 'employment_duration', 'credit_score',
+}
+
+
+class EligibilityService:
+    """
+    Eligibility Service
+    Each product's rules become one WHERE clause over the users table, so the
+    eligible set for a product is a single query instead of one
+    LoanProduct.is_user_eligible call per user. The loan_offers table holds
+    the result and is refreshed by difference: only offers that appear or
+    disappear are written
+    """
+
+    def __init__(self):
+        self.max_active_loans = getattr(settings, 'FLEXIFINANCE_CONFIG', {}).get('MAX_ACTIVE_LOANS', 3)
+        self.batch_size = getattr(settings, 'ADMIN_CONFIG', {}).get('BULK_ACTION_BATCH_SIZE', 1000)
+
+    def product_filter(self, product):
+        """
+        Q object equivalent to product.is_user_eligible(user)
+
+        Missing (NULL or zero) income, employment duration and credit score
+        pass, exactly as the per-user check treats them
+        """
+        return (
+            Q(is_verified=True, kyc_status='APPROVED', is_active=True, is_staff=False)
+            & (Q(monthly_income__isnull=True) | Q(monthly_income=0) | Q(monthly_income__gte=product.min_income))
+            & (Q(employment_duration__isnull=True) | Q(employment_duration=0)
+               | Q(employment_duration__gte=product.min_employment_duration))
+            & (Q(credit_score__isnull=True) | Q(credit_score=0) | Q(credit_score__gte=product.min_credit_score))
+        )
+
+    def eligible_users(self, product, user_ids=None):
+        """
+        Users eligible for a product, including the active loan limit
+
+        Args:
+            product (LoanProduct): Product whose rules apply
+            user_ids (iterable): Restrict the check to these users
+
+        Returns:
+            QuerySet: Eligible users
+        """
+        active_loans = (
+            Loan.objects.filter(user=OuterRef('pk'), status__in=ACTIVE_LOAN_STATUSES)
+            .order_by().values('user').annotate(count=Count('pk')).values('count')
+        )
+        queryset = User.objects.filter(self.product_filter(product))
+        if user_ids is not None:
+            queryset = queryset.filter(pk__in=user_ids)
+        return queryset.alias(
+            active_loans=Coalesce(Subquery(active_loans, output_field=IntegerField()), Value(0))
+        ).filter(active_loans__lt=self.max_active_loans)
+
+    def refresh_product(self, product):
+        """
+        Full refresh of one product's offers
+
+        Returns:
+            dict: {'created': n, 'deleted': n}
+        """
+        return self._refresh(product)
+
+    def refresh_users(self, user_ids):
+        """
+        Incremental refresh: re-check a set of users against every product
+
+        Returns:
+            dict: {'created': n, 'deleted': n}
+        """
+        user_ids = list(set(user_ids))
+        totals = {'created': 0, 'deleted': 0}
+        if not user_ids:
+            return totals
+        for product in LoanProduct.objects.all():
+            result = self._refresh(product, user_ids)
+            totals['created'] += result['created']
+            totals['deleted'] += result['deleted']
+        return totals
+
+    def refresh_all(self):
+        """
+        Refresh offers for every product
+
+        Returns:
+            dict: Totals across products
+        """
+        totals = {'created': 0, 'deleted': 0}
+        for product in LoanProduct.objects.all():
+            result = self._refresh(product)
+            totals['created'] += result['created']
+            totals['deleted'] += result['deleted']
+        logger.info(f"Loan offers refreshed: {totals['created']} created, {totals['deleted']} withdrawn")
+        return totals
+
+    def _refresh(self, product, user_ids=None):
+        offers = LoanOffer.objects.filter(product=product)
+        if user_ids is not None:
+            offers = offers.filter(user_id__in=user_ids)
+
+        with transaction.atomic():
+            if not product.is_active:
+                deleted, _ = offers.delete()
+                return {'created': 0, 'deleted': deleted}
+
+            eligible = self.eligible_users(product, user_ids)
+            deleted, _ = offers.exclude(user_id__in=eligible.values('pk')).delete()
+
+            missing = eligible.exclude(
+                Exists(LoanOffer.objects.filter(product=product, user=OuterRef('pk')))
+            ).values_list('pk', flat=True)
+            created = 0
+            batch = []
+            for user_id in missing.iterator(chunk_size=self.batch_size):
+                batch.append(LoanOffer(user_id=user_id, product=product))
+                if len(batch) >= self.batch_size:
+                    created += len(LoanOffer.objects.bulk_create(batch, ignore_conflicts=True))
+                    batch = []
+            if batch:
+                created += len(LoanOffer.objects.bulk_create(batch, ignore_conflicts=True))
+        return {'created': created, 'deleted': deleted}
+
+
+# Global service instance
+eligibility_service = EligibilityService()
@@ -0,0 +1,90 @@
+"""
+Loan domain events for FlexiFinance
+Sent once per batch by bulk transitions so receivers can work set-wise;
+the receivers below rescore affected borrowers and refresh their offers
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from apps.users.signals import users_changed
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Sent with sender=Loan, status (new status), loan_ids (list), actor (User or None), reason (str)
+loans_transitioned = Signal()
+
+# Sent with sender=RepaymentSchedule, schedule_ids (list), loan_ids (list), actor (User or None)
+installments_paid = Signal()
+
+# Loan statuses whose transition changes a borrower's credit score inputs
+SCORE_AFFECTING_STATUSES = ['APPROVED', 'DISBURSED', 'COMPLETED', 'DEFAULTED']
+
+
+def _recompute_credit_scores(loan_ids):
+    from apps.loans.models import Loan
+    from apps.loans.services.credit_scoring_service import credit_scoring_service
+
+    user_ids = set(Loan.objects.filter(pk__in=loan_ids).values_list('user_id', flat=True))
+    try:
+        credit_scoring_service.score_users(user_ids)
+    except Exception as e:
+        logger.error(f"Credit score recompute failed for {len(user_ids)} users: {e}")
+
+
+@receiver(installments_paid)
+def rescore_after_repayment(sender, loan_ids, **kwargs):
+    """Incrementally recompute the scores of borrowers who just repaid"""
+    _recompute_credit_scores(loan_ids)
+
+
+@receiver(loans_transitioned)
+def rescore_after_transition(sender, status, loan_ids, **kwargs):
+    """Recompute scores when a loan starts or stops counting as debt"""
+    if status in SCORE_AFFECTING_STATUSES:
+        _recompute_credit_scores(loan_ids)
+
+
+def _refresh_offers(user_ids):
+    from apps.loans.services.eligibility_service import eligibility_service
+
+    try:
+        eligibility_service.refresh_users(user_ids)
+    except Exception as e:
+        logger.error(f"Loan offer refresh failed for {len(user_ids)} users: {e}")
+
+
+@receiver(post_save, sender=User)
+def refresh_offers_on_user_save(sender, instance, update_fields=None, **kwargs):
+    """Re-check a user's offers when an eligibility input may have changed"""
+    from apps.loans.services.eligibility_service import ELIGIBILITY_FIELDS
+
+    if update_fields is not None and not ELIGIBILITY_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: _refresh_offers([instance.pk]))
+
+
+@receiver(users_changed)
+def refresh_offers_on_users_changed(sender, user_ids, **kwargs):
+    """Re-check offers after set-wise user updates (admin actions, scoring batches)"""
+    _refresh_offers(user_ids)
+
+
+@receiver(loans_transitioned)
+def refresh_offers_after_transition(sender, loan_ids, **kwargs):
+    """Active loan counts changed, so the borrowers' offers may have too"""
+    from apps.loans.models import Loan
+
+    _refresh_offers(set(Loan.objects.filter(pk__in=loan_ids).values_list('user_id', flat=True)))
+
+
+@receiver(post_save, sender='loans.LoanProduct')
+def refresh_offers_on_product_save(sender, instance, **kwargs):
+    """Rebuild a product's offers when its rules change"""
+    from apps.loans.services.eligibility_service import eligibility_service
+
+    transaction.on_commit(lambda: eligibility_service.refresh_product(instance))
@@ -0,0 +1,139 @@
+"""
+Tests for the loans app
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.loans.models import Loan, LoanOffer, LoanProduct
+from apps.loans.services.bulk_action_service import BulkActionService
+from apps.loans.services.eligibility_service import EligibilityService
+from apps.loans.signals import loans_transitioned
+from apps.users.models import User
+
+
+def make_user(username, **fields):
+    return User.objects.create_user(username=username, email=f'{username}@example.com', password='x', **fields)
+
+
+def make_loan(user, status='SUBMITTED', principal='10000.00', loan_type='PERSONAL'):
+    return Loan.objects.create(
+        user=user, loan_type=loan_type, principal_amount=Decimal(principal), interest_rate=Decimal('14.00'),
+        loan_tenure=6, purpose='Test loan', status=status
+    )
+
+
+class LoanTransitionTests(TestCase):
+    def setUp(self):
+        self.service = BulkActionService()
+        self.user = make_user('borrower')
+        self.sent = []
+
+        def receiver(sender, **kwargs):
+            self.sent.append(kwargs)
+
+        loans_transitioned.connect(receiver, weak=False)
+        self.addCleanup(loans_transitioned.disconnect, receiver)
+
+    def transition(self, loans, target, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.service.transition_loans([loan.pk for loan in loans], target, **kwargs)
+
+    def test_only_rows_this_statement_changed_are_announced(self):
+        submitted = make_loan(self.user)
+        reviewed = make_loan(self.user, status='UNDER_REVIEW')
+        # Already approved (a second admin click) and past approval
+        approved = make_loan(self.user, status='APPROVED')
+        disbursed = make_loan(self.user, status='DISBURSED')
+
+        self.assertEqual(self.transition([submitted, reviewed, approved, disbursed], 'APPROVED'), 2)
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0]['status'], 'APPROVED')
+        self.assertEqual(set(self.sent[0]['loan_ids']), {submitted.pk, reviewed.pk})
+        self.assertEqual(Loan.objects.get(pk=disbursed.pk).status, 'DISBURSED')
+
+    def test_repeated_transition_changes_and_announces_nothing(self):
+        loan = make_loan(self.user)
+        self.transition([loan], 'APPROVED')
+        self.sent.clear()
+
+        self.assertEqual(self.transition([loan], 'APPROVED'), 0)
+        self.assertEqual(self.sent, [])
+
+    def test_approval_persists_the_balance_and_rejection_the_reason(self):
+        approved, rejected = make_loan(self.user), make_loan(self.user)
+        Loan.objects.filter(pk=approved.pk).update(remaining_balance=0)
+
+        self.transition([approved], 'APPROVED')
+        self.transition([rejected], 'REJECTED', reason='Incomplete documents')
+
+        approved.refresh_from_db()
+        rejected.refresh_from_db()
+        self.assertEqual(approved.remaining_balance, approved.total_amount)
+        self.assertIsNotNone(approved.approval_date)
+        self.assertEqual((rejected.status, rejected.rejected_reason), ('REJECTED', 'Incomplete documents'))
+
+    def test_disbursement_sets_a_due_date_only_where_missing(self):
+        due = timezone.now() + timedelta(days=90)
+        scheduled, unscheduled = make_loan(self.user, status='APPROVED'), make_loan(self.user, status='APPROVED')
+        Loan.objects.filter(pk=scheduled.pk).update(due_date=due)
+
+        self.assertEqual(self.transition([scheduled, unscheduled], 'DISBURSED'), 2)
+
+        scheduled.refresh_from_db()
+        unscheduled.refresh_from_db()
+        self.assertEqual(scheduled.due_date, due)
+        self.assertIsNotNone(unscheduled.due_date)
+        self.assertIsNotNone(unscheduled.disbursement_date)
+
+
+class EligibilityFilterTests(TestCase):
+    def setUp(self):
+        self.service = EligibilityService()
+        self.product = LoanProduct.objects.create(
+            product_code='SALARY', name='Salary advance', min_amount=Decimal('1000'), max_amount=Decimal('50000'),
+            min_tenure=1, max_tenure=12, interest_rate=Decimal('12.00'), min_income=Decimal('20000.00'),
+            min_employment_duration=6, min_credit_score=600
+        )
+        eligible = {'is_verified': True, 'kyc_status': 'APPROVED', 'is_active': True, 'is_staff': False}
+        # Each requirement missing, zero, just below, at and above its threshold, plus each status flag off
+        variants = [{}]
+        for field, below, at in (
+            ('monthly_income', Decimal('19999.99'), Decimal('20000.00')),
+            ('employment_duration', 5, 6),
+            ('credit_score', 599, 600),
+        ):
+            variants += [{field: value} for value in (None, 0, below, at, at + 1)]
+        variants += [{'is_verified': False}, {'kyc_status': 'PENDING'}, {'is_active': False}, {'is_staff': True}]
+        User.objects.bulk_create([
+            User(username=f'applicant{index}', email=f'applicant{index}@example.com', password='!',
+                 **{**eligible, **variant})
+            for index, variant in enumerate(variants)
+        ])
+        self.users = list(User.objects.filter(username__startswith='applicant'))
+
+    def test_filter_matches_the_per_user_check(self):
+        expected = {user.pk for user in self.users if self.product.is_user_eligible(user)}
+
+        self.assertEqual(set(self.service.eligible_users(self.product).values_list('pk', flat=True)), expected)
+        self.assertEqual(len(expected), len(self.users) - 7)
+
+    def test_active_loan_limit_matches_can_apply_for_loan(self):
+        borrower = User.objects.get(username='applicant0')
+        for _ in range(self.service.max_active_loans):
+            make_loan(borrower, status='APPROVED')
+
+        self.assertFalse(borrower.can_apply_for_loan)
+        self.assertFalse(self.service.eligible_users(self.product).filter(pk=borrower.pk).exists())
+
+    def test_refresh_withdraws_offers_of_users_who_no_longer_qualify(self):
+        self.service.refresh_product(self.product)
+        offered = set(LoanOffer.objects.values_list('user_id', flat=True))
+        leaver = User.objects.get(pk=min(offered))
+        User.objects.filter(pk=leaver.pk).update(kyc_status='REJECTED')
+
+        self.assertEqual(self.service.refresh_users([leaver.pk]), {'created': 0, 'deleted': 1})
+        self.assertEqual(set(LoanOffer.objects.values_list('user_id', flat=True)), offered - {leaver.pk})
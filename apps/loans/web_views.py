@@ -1,11 +1,14 @@
 """
 Web views for loan application and management
 """
+from decimal import Decimal
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.core.exceptions import ValidationError
+from apps.core.pagination import InvalidCursor, KeysetPaginator
 from .models import Loan
 from .forms import LoanApplicationForm, LoanProductForm
 
@@ -23,12 +26,12 @@ def loan_application(request):
                 loan.user = request.user
                 
                 # Set default values
-                loan.processing_fee = loan.principal_amount * 0.02  # 2% processing fee
-                loan.remaining_balance = loan.total_amount
+                loan.processing_fee = loan.principal_amount * Decimal('0.02')  # 2% processing fee
                 loan.status = 'SUBMITTED'
                 
-                # Validate and save
-                loan.full_clean()
+                # Validate and save (save() generates the reference and totals;
+                # remaining_balance is set when the loan is approved)
+                loan.full_clean(exclude=['loan_reference'])
                 loan.save()
                 
                 messages.success(
@@ -74,9 +77,14 @@ def loan_detail(request, loan_id):
 @login_required
 def my_loans(request):
     """List all loans for the current user"""
-    loans = Loan.objects.filter(user=request.user).order_by('-created_at')
+    paginator = KeysetPaginator(Loan.objects.filter(user=request.user))
+    try:
+        page = paginator.page(after=request.GET.get('cursor'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
     context = {
-        'loans': loans,
+        'loans': page,
+        'page': page,
         'page_title': 'My Loans'
     }
     return render(request, 'users/my_loans.html', context)
\ No newline at end of file
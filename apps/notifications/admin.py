@@ -5,13 +5,15 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from apps.core.admin_utils import LargeTableAdminMixin
 from .models import (
     NotificationTemplate, 
     Notification, 
     UserNotificationPreference,
     NotificationAnalytics,
     NotificationQueue,
-    NotificationLog
+    NotificationLog,
+    OutboxMessage
 )
 
 
@@ -52,7 +54,7 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = [
         'recipient_email',
         'subject_preview', 
@@ -72,6 +74,7 @@ class NotificationAdmin(admin.ModelAdmin):
         'created_at'
     ]
     search_fields = ['recipient__email', 'subject', 'message', 'provider_id']
+    list_select_related = ['recipient']
     readonly_fields = [
         'id', 'created_at', 'updated_at', 'sent_at', 
         'delivered_at', 'failed_at', 'retry_count'
@@ -154,6 +157,7 @@ class UserNotificationPreferenceAdmin(admin.ModelAdmin):
         'updated_at'
     ]
     search_fields = ['user__email']
+    list_select_related = ['user']
     readonly_fields = ['created_at', 'updated_at']
     
     def user_email(self, obj):
@@ -198,6 +202,7 @@ class NotificationQueueAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'priority', 'scheduled_for', 'created_at']
     search_fields = ['notification__recipient__email', 'notification__subject']
+    list_select_related = ['notification__recipient']
     readonly_fields = ['created_at', 'processed_at']
     
     def notification_recipient(self, obj):
@@ -210,7 +215,7 @@ class NotificationQueueAdmin(admin.ModelAdmin):
 
 
 @admin.register(NotificationLog)
-class NotificationLogAdmin(admin.ModelAdmin):
+class NotificationLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = [
         'level_badge',
         'message_preview',
@@ -219,6 +224,7 @@ class NotificationLogAdmin(admin.ModelAdmin):
     ]
     list_filter = ['level', 'created_at']
     search_fields = ['message', 'notification__recipient__email']
+    list_select_related = ['notification__recipient']
     readonly_fields = ['created_at']
     
     def level_badge(self, obj):
@@ -248,6 +254,48 @@ class NotificationLogAdmin(admin.ModelAdmin):
     notification_recipient.short_description = 'Notification'
 
 
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """
+    Admin interface for OutboxMessage model (read-only delivery queue)
+    """
+    list_display = [
+        'id',
+        'kind',
+        'channel',
+        'object_id',
+        'status',
+        'attempts',
+        'scheduled_for',
+        'created_at',
+        'sent_at'
+    ]
+    
+    list_filter = ['status', 'kind', 'channel', 'created_at']
+    
+    search_fields = ['=object_id']
+    
+    list_defer = ['payload']
+    
+    readonly_fields = [f.name for f in OutboxMessage._meta.fields]
+    
+    actions = ['requeue_messages']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def requeue_messages(self, request, queryset):
+        """Queue selected messages for delivery again"""
+        from apps.notifications.services.outbox_service import outbox_service
+        
+        queued = outbox_service.requeue(queryset)
+        self.message_user(request, f'{queued} messages queued for delivery.')
+    requeue_messages.short_description = 'Deliver selected messages again'
+
+
 # Custom admin site header
 admin.site.site_header = "FlexiFinance Notification System"
 admin.site.site_title = "Notifications Admin"
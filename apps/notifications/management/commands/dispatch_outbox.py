@@ -0,0 +1,26 @@
+"""
+Management command to deliver queued contact, support and newsletter submissions
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from apps.notifications.services.outbox_service import outbox_service
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox messages (submission emails and Supabase rows), retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new messages')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = outbox_service.dispatch_pending()
+            if any(totals.values()) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Outbox: {totals['sent']} sent, {totals['retried']} to retry, {totals['failed']} failed"
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('CONTACT', 'Contact Form'), ('SUPPORT', 'Support Request'), ('NEWSLETTER', 'Newsletter Subscription')], max_length=20)),
+                ('channel', models.CharField(choices=[('EMAIL', 'Email'), ('SUPABASE', 'Supabase')], max_length=20)),
+                ('object_id', models.CharField(help_text='Primary key of the local Contact or NewsletterSubscription', max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=15)),
+                ('attempts', models.IntegerField(default=0)),
+                ('scheduled_for', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Outbox Message',
+                'verbose_name_plural': 'Outbox Messages',
+                'db_table': 'notification_outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'scheduled_for'], name='notificatio_status_11296a_idx')],
+            },
+        ),
+    ]
@@ -343,4 +343,57 @@ class NotificationLog(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.get_level_display()}: {self.message[:50]}..."
\ No newline at end of file
+        return f"{self.get_level_display()}: {self.message[:50]}..."
+
+class OutboxMessage(models.Model):
+    """
+    Outbox Message
+    One delivery of a public form submission (contact, support, newsletter)
+    to one external channel, written with the submission and sent by the
+    outbox dispatcher
+    """
+    KIND_CHOICES = [
+        ('CONTACT', 'Contact Form'),
+        ('SUPPORT', 'Support Request'),
+        ('NEWSLETTER', 'Newsletter Subscription'),
+    ]
+
+    CHANNEL_CHOICES = [
+        ('EMAIL', 'Email'),
+        ('SUPABASE', 'Supabase'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    object_id = models.CharField(max_length=64, help_text='Primary key of the local Contact or NewsletterSubscription')
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    scheduled_for = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'notification_outbox'
+        verbose_name = 'Outbox Message'
+        verbose_name_plural = 'Outbox Messages'
+        ordering = ['id']
+        indexes = [
+            # Dispatcher claim scan
+            models.Index(fields=['status', 'scheduled_for']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id} via {self.get_channel_display()} - {self.get_status_display()}"
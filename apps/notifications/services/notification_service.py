@@ -10,6 +10,7 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.db.models import F
+from django.template import Context, Template
 
 from apps.notifications.models import (
     NotificationTemplate, 
@@ -129,6 +130,77 @@ class NotificationService:
             )
             raise
     
+    def send_bulk_notifications(self, notification_type, recipients, channel='EMAIL', priority='NORMAL'):
+        """
+        Create and queue one notification per recipient with a fixed number of queries
+        
+        Args:
+            notification_type: Type of notification (from NotificationTemplate.NOTIFICATION_TYPES)
+            recipients: List of (user, context) pairs; context is rendered into the template
+            channel: Delivery channel (EMAIL, SMS, PUSH, IN_APP)
+            priority: Priority level (LOW, NORMAL, HIGH, URGENT)
+            
+        Returns:
+            list: Created Notification instances
+        """
+        template = NotificationTemplate.objects.filter(
+            notification_type=notification_type,
+            is_active=True
+        ).first()
+        if not template:
+            logger.warning(f"No template found for notification type: {notification_type}")
+            return []
+        
+        preferences = {
+            preference.user_id: preference
+            for preference in UserNotificationPreference.objects.filter(
+                user_id__in=[user.id for user, _ in recipients]
+            )
+        }
+        subject_template = Template(template.subject_template)
+        message_template = Template(template.message_template)
+        html_template = Template(template.html_template) if template.html_template else None
+        
+        now = timezone.now()
+        notifications = []
+        for user, context in recipients:
+            if not self._preferences_allow(preferences.get(user.id), notification_type, channel):
+                continue
+            metadata = {key: str(value) for key, value in context.items() if isinstance(value, (str, int, float))}
+            context = Context({'user': user, 'user_name': user.get_full_name(), **context})
+            notifications.append(Notification(
+                template=template,
+                recipient=user,
+                subject=subject_template.render(context)[:200],
+                message=message_template.render(context),
+                html_content=html_template.render(context) if html_template else '',
+                channel=channel,
+                priority=priority,
+                scheduled_at=now,
+                metadata=metadata
+            ))
+        if not notifications:
+            return []
+        
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        priority_map = {'URGENT': 1, 'HIGH': 3, 'NORMAL': 5, 'LOW': 8}
+        NotificationQueue.objects.bulk_create([
+            NotificationQueue(
+                notification=notification,
+                priority=priority_map.get(priority, 5),
+                scheduled_for=now
+            )
+            for notification in notifications
+        ], batch_size=500)
+        NotificationTemplate.objects.filter(id=template.id).update(usage_count=F('usage_count') + len(notifications))
+        self._log_notification(
+            None,
+            'INFO',
+            f'Bulk notifications created: {len(notifications)} x {notification_type}',
+            details={'notification_type': notification_type, 'count': len(notifications)}
+        )
+        return notifications
+    
     def process_queue(self, batch_size=50):
         """
         Process notification queue and send pending notifications
@@ -277,32 +349,38 @@ class NotificationService:
         Check if user allows notifications of this type and channel
         """
         try:
-            preferences = user.notification_preferences
-            
-            # Check if user has disabled notifications for this channel
-            if channel == 'EMAIL' and not preferences.email_notifications:
-                return False
-            elif channel == 'SMS' and not preferences.sms_notifications:
-                return False
-            elif channel == 'PUSH' and not preferences.push_notifications:
-                return False
-            elif channel == 'IN_APP' and not preferences.in_app_notifications:
-                return False
-            
-            # Check notification type preference
-            if not preferences.get_preference(notification_type, channel):
-                return False
-            
-            # Check quiet hours
-            if self._in_quiet_hours(preferences):
-                return False
-            
-            return True
-            
+            return self._preferences_allow(user.notification_preferences, notification_type, channel)
         except UserNotificationPreference.DoesNotExist:
             # No preferences set, allow by default
             return True
     
+    def _preferences_allow(self, preferences, notification_type, channel):
+        """
+        Check a user's preferences against a notification type and channel
+        """
+        if preferences is None:
+            return True
+        
+        # Check if user has disabled notifications for this channel
+        if channel == 'EMAIL' and not preferences.email_notifications:
+            return False
+        elif channel == 'SMS' and not preferences.sms_notifications:
+            return False
+        elif channel == 'PUSH' and not preferences.push_notifications:
+            return False
+        elif channel == 'IN_APP' and not preferences.in_app_notifications:
+            return False
+        
+        # Check notification type preference
+        if not preferences.get_preference(notification_type, channel):
+            return False
+        
+        # Check quiet hours
+        if self._in_quiet_hours(preferences):
+            return False
+        
+        return True
+    
     def _in_quiet_hours(self, preferences):
         """
         Check if current time is within user's quiet hours
@@ -0,0 +1,223 @@
+"""
+Outbox Service for FlexiFinance
+Durable fan-out of contact, support and newsletter submissions to email and Supabase
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.notifications.models import OutboxMessage
+from apps.payments.services.resend_email_service import ResendEmailService
+from apps.payments.services.supabase_service import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+# Submission kind -> Supabase table and the unique column rows are merged on
+SUPABASE_TABLES = {
+    'CONTACT': ('contact_submissions', None),
+    'SUPPORT': ('contact_submissions', None),
+    'NEWSLETTER': ('newsletter_subscriptions', 'email'),
+}
+
+
+class OutboxService:
+    """
+    Outbox Service
+    A public form saves its row and one OutboxMessage per channel in the same
+    transaction and responds; nothing waits on Resend or Supabase. The
+    dispatcher claims messages with SKIP LOCKED, sends a batch's emails over
+    a small thread pool and its Supabase rows as one bulk insert per table
+    (split in halves when it fails, to isolate the bad rows), and
+    reschedules failures with exponential backoff
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'OUTBOX_CONFIG', {})
+        self.batch_size = config.get('BATCH_SIZE', 100)
+        self.email_concurrency = config.get('EMAIL_CONCURRENCY', 4)
+        self.max_attempts = config.get('MAX_ATTEMPTS', 8)
+        self.retry_delay = config.get('RETRY_DELAY_SECONDS', 30)
+        self.max_retry_delay = config.get('MAX_RETRY_DELAY_SECONDS', 3600)
+        self.claim_timeout = timedelta(seconds=config.get('CLAIM_TIMEOUT_SECONDS', 300))
+        self.channels = config.get('CHANNELS', {})
+        self.email_service = ResendEmailService()
+        self.supabase_service = SupabaseService()
+
+    def channels_for(self, kind):
+        """Channels a submission kind fans out to (Supabase only when configured)"""
+        channels = self.channels.get(kind, [])
+        if not settings.SUPABASE_URL:
+            channels = [channel for channel in channels if channel != 'SUPABASE']
+        return channels
+
+    def enqueue(self, kind, object_id, payload):
+        """
+        Record the deliveries of one submission
+
+        Call inside the transaction that saves the submission, so both are
+        kept or lost together
+
+        Args:
+            kind (str): 'CONTACT', 'SUPPORT' or 'NEWSLETTER'
+            object_id: Primary key of the local row
+            payload (dict): Submission data (contact_data for contact and
+                support, email/source for newsletter)
+
+        Returns:
+            int: Messages queued
+        """
+        messages = OutboxMessage.objects.bulk_create([
+            OutboxMessage(kind=kind, channel=channel, object_id=str(object_id), payload=payload)
+            for channel in self.channels_for(kind)
+        ])
+        return len(messages)
+
+    def claim_batch(self, limit=None):
+        """
+        Claim the next messages to deliver
+
+        Returns:
+            list: OutboxMessage rows, now PROCESSING
+        """
+        limit = limit or self.batch_size
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status='PENDING', scheduled_for__lte=now)
+                    | Q(status='PROCESSING', claimed_at__lt=now - self.claim_timeout)
+                )
+                .order_by('id')[:limit]
+            )
+            if messages:
+                OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+                    status='PROCESSING', claimed_at=now, attempts=F('attempts') + 1
+                )
+        for message in messages:
+            message.attempts += 1
+        return messages
+
+    def dispatch_batch(self, limit=None):
+        """
+        Claim and deliver one batch of messages
+
+        Returns:
+            dict: {'sent': n, 'retried': n, 'failed': n}
+        """
+        messages = self.claim_batch(limit)
+        emails = [message for message in messages if message.channel == 'EMAIL']
+        rows = [message for message in messages if message.channel == 'SUPABASE']
+
+        errors = {}
+        if emails:
+            with ThreadPoolExecutor(max_workers=self.email_concurrency, thread_name_prefix='outbox-email') as pool:
+                for message, error in zip(emails, pool.map(self._send_email, emails)):
+                    if error:
+                        errors[message.pk] = error
+        for (table, on_conflict), group in self._group_rows(rows).items():
+            self._insert_rows(table, on_conflict, group, errors)
+
+        return self._finish(messages, errors)
+
+    def _insert_rows(self, table, on_conflict, group, errors):
+        """
+        Insert a group's rows in one statement, bisecting on failure so only
+        the rows that also fail on their own are charged an attempt
+        """
+        data = []
+        for message in group:
+            try:
+                data.append((message, self._supabase_row(message)))
+            except Exception as e:
+                errors[message.pk] = f"Invalid payload: {e}"
+        if not data:
+            return
+        rows = [row for _, row in data]
+        if on_conflict:
+            # One statement may not merge into the same row twice
+            rows = list({row[on_conflict]: row for row in rows}.values())
+
+        result = self.supabase_service.bulk_insert(table, rows, on_conflict=on_conflict)
+        if result.get('success'):
+            return
+        group = [message for message, _ in data]
+        if len(group) == 1:
+            errors[group[0].pk] = result.get('error') or 'Supabase insert failed'
+            return
+        middle = len(group) // 2
+        self._insert_rows(table, on_conflict, group[:middle], errors)
+        self._insert_rows(table, on_conflict, group[middle:], errors)
+
+    def _send_email(self, message):
+        """Send one notification email; returns an error string or None"""
+        try:
+            result = self.email_service.send_contact_notification(message.payload)
+            if not result.get('success'):
+                return result.get('error') or 'Email send failed'
+            return None
+        except Exception as e:
+            return str(e)
+
+    def _group_rows(self, messages):
+        """Supabase messages by (table, conflict column), so each group is one insert"""
+        groups = {}
+        for message in messages:
+            groups.setdefault(SUPABASE_TABLES[message.kind], []).append(message)
+        return groups
+
+    def _supabase_row(self, message):
+        if message.kind == 'NEWSLETTER':
+            return self.supabase_service.newsletter_row(message.payload['email'], message.payload.get('source', 'website'))
+        return self.supabase_service.contact_row(message.payload)
+
+    def _finish(self, messages, errors):
+        """Mark delivered messages sent and reschedule or fail the rest"""
+        now = timezone.now()
+        sent = [message.pk for message in messages if message.pk not in errors]
+        failures = [message for message in messages if message.pk in errors]
+        retried = 0
+        for message in failures:
+            message.last_error = errors[message.pk]
+            if message.attempts >= self.max_attempts:
+                logger.error(f"Outbox message {message.pk} ({message.kind} via {message.channel}) gave up: {message.last_error}")
+                message.status = 'FAILED'
+            else:
+                delay = min(self.retry_delay * 2 ** (message.attempts - 1), self.max_retry_delay)
+                message.status = 'PENDING'
+                message.scheduled_for = now + timedelta(seconds=delay)
+                retried += 1
+        with transaction.atomic():
+            OutboxMessage.objects.filter(pk__in=sent).update(status='SENT', sent_at=now, last_error='')
+            OutboxMessage.objects.bulk_update(failures, ['status', 'scheduled_for', 'last_error'])
+        return {'sent': len(sent), 'retried': retried, 'failed': len(failures) - retried}
+
+    def dispatch_pending(self):
+        """
+        Deliver batches until nothing is claimable
+
+        Returns:
+            dict: Totals across batches
+        """
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        while True:
+            result = self.dispatch_batch()
+            for key in totals:
+                totals[key] += result[key]
+            if not any(result.values()):
+                return totals
+
+    def requeue(self, messages):
+        """Queue a queryset of messages for delivery again (in-flight messages are skipped)"""
+        return messages.exclude(status='PROCESSING').update(
+            status='PENDING', attempts=0, scheduled_for=timezone.now(), last_error='', sent_at=None
+        )
+
+
+# Global service instance
+outbox_service = OutboxService()
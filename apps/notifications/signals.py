@@ -2,12 +2,17 @@
 Django Signals for Notification System
 Automatically handles user preferences and notification events
 """
+import logging
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from apps.notifications.models import UserNotificationPreference, Notification
 from apps.notifications.services.notification_service import notification_service
+from apps.loans.models import Loan
+from apps.loans.signals import loans_transitioned
 
+logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
@@ -52,4 +57,34 @@ def setup_notification_signals():
     """
     Connect all notification signals
     """
-    pass  # Signals are connected via decorators above
\ No newline at end of file
+    pass  # Signals are connected via decorators above
+
+LOAN_STATUS_NOTIFICATIONS = {
+    'APPROVED': 'LOAN_APPROVAL',
+    'REJECTED': 'LOAN_REJECTION',
+    'DISBURSED': 'LOAN_DISBURSEMENT',
+}
+
+
+@receiver(loans_transitioned)
+def notify_loan_status_changes(sender, status, loan_ids, **kwargs):
+    """
+    Queue status notifications for a batch of loans in one pass
+    """
+    notification_type = LOAN_STATUS_NOTIFICATIONS.get(status)
+    if not notification_type:
+        return
+    
+    try:
+        loans = Loan.objects.filter(id__in=loan_ids).select_related('user')
+        notification_service.send_bulk_notifications(
+            notification_type,
+            [(loan.user, {
+                'loan': loan,
+                'loan_reference': loan.loan_reference,
+                'amount': loan.principal_amount,
+            }) for loan in loans]
+        )
+    except Exception as e:
+        # Notifications must never undo a committed status change
+        logger.error(f"Failed to queue {notification_type} notifications for {len(loan_ids)} loans: {e}")
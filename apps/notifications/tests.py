@@ -0,0 +1,34 @@
+"""
+Tests for the notifications app
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.notifications.models import OutboxMessage
+from apps.notifications.services.outbox_service import OutboxService
+
+
+def fake_bulk_insert(table, rows, on_conflict=None):
+    if any(row['email'] == 'bad@example.com' for row in rows):
+        return {'success': False, 'error': 'violates check constraint'}
+    return {'success': True}
+
+
+class OutboxDispatchTests(TestCase):
+    def setUp(self):
+        self.service = OutboxService()
+        emails = ['a@example.com', 'b@example.com', 'bad@example.com', 'c@example.com', 'd@example.com']
+        OutboxMessage.objects.bulk_create([
+            OutboxMessage(kind='NEWSLETTER', channel='SUPABASE', object_id=str(number), payload={'email': email})
+            for number, email in enumerate(emails)
+        ])
+
+    def test_failed_group_charges_only_the_bad_row(self):
+        with mock.patch.object(self.service.supabase_service, 'bulk_insert', side_effect=fake_bulk_insert):
+            result = self.service.dispatch_batch()
+
+        self.assertEqual(result, {'sent': 4, 'retried': 1, 'failed': 0})
+        retried = OutboxMessage.objects.get(status='PENDING')
+        self.assertEqual(retried.payload['email'], 'bad@example.com')
+        self.assertEqual(retried.last_error, 'violates check constraint')
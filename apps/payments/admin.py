@@ -1,14 +1,17 @@
 """
 Django admin configuration for Payments app
 """
+import json
 
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import MpesaTransaction, Payment, PaymentSchedule
+from apps.core.admin_utils import BulkActionAdminMixin, LargeTableAdminMixin
+from apps.payments.services.payment_state_service import payment_state_service
+from .models import FxRateSnapshot, MpesaTransaction, Payment, PaymentSchedule, ReconciliationRun, StripeWebhookEvent
 
 @admin.register(MpesaTransaction)
-class MpesaTransactionAdmin(admin.ModelAdmin):
+class MpesaTransactionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for MpesaTransaction model
     """
@@ -29,22 +32,26 @@ class MpesaTransactionAdmin(admin.ModelAdmin):
         'completed_at'
     ]
     
+    # '^' fields are prefix searches (btree), the rest use trigram indexes on PostgreSQL
     search_fields = [
         'user__first_name',
         'user__last_name',
         'user__email',
         'phone_number',
-        'mpesa_receipt',
-        'checkout_request_id',
-        'merchant_request_id'
+        '^mpesa_receipt',
+        '^checkout_request_id',
+        '^merchant_request_id'
     ]
     
+    list_select_related = ['user']
+    
     readonly_fields = [
         'id',
         'initiated_at',
         'completed_at',
         'updated_at',
-        'callback_received_at'
+        'callback_received_at',
+        'callback_payload_display'
     ]
     
     fieldsets = (
@@ -75,7 +82,7 @@ class MpesaTransactionAdmin(admin.ModelAdmin):
             'fields': (
                 'callback_received',
                 'callback_received_at',
-                'callback_data'
+                'callback_payload_display'
             )
         }),
         ('Timestamps', {
@@ -91,32 +98,37 @@ class MpesaTransactionAdmin(admin.ModelAdmin):
     
     def user_name(self, obj):
         """Display user name with link to user admin"""
-        url = reverse('admin:users_user_change', args=[obj.user.id])
+        url = reverse('admin:users_user_change', args=[obj.user_id])
         return format_html('<a href="{}">{}</a>', url, obj.user.get_full_name())
     user_name.short_description = 'User'
+    user_name.admin_order_field = 'user__last_name'
+    
+    def callback_payload_display(self, obj):
+        """Latest raw callback, decompressed from the archive"""
+        payload = obj.callback_payload
+        if payload is None:
+            return '-'
+        return format_html('<pre>{}</pre>', json.dumps(payload, indent=2))
+    callback_payload_display.short_description = 'Callback Data'
     
     def mark_as_completed(self, request, queryset):
         """Bulk action to mark transactions as completed"""
-        updated = 0
-        for transaction in queryset:
-            if transaction.status not in ['COMPLETED', 'FAILED']:
-                transaction.mark_completed()
-                updated += 1
+        updated = payment_state_service.transition(
+            queryset, 'COMPLETED', expected=['PENDING', 'PROCESSING'], result_code='0', result_desc='Success'
+        )
         self.message_user(request, f'Successfully marked {updated} transactions as completed.')
     mark_as_completed.short_description = 'Mark selected transactions as completed'
     
     def mark_as_failed(self, request, queryset):
         """Bulk action to mark transactions as failed"""
-        updated = 0
-        for transaction in queryset:
-            if transaction.status not in ['COMPLETED', 'FAILED']:
-                transaction.mark_failed(result_code='999', result_desc='Manual failure from admin')
-                updated += 1
+        updated = payment_state_service.transition(
+            queryset, 'FAILED', result_code='999', result_desc='Manual failure from admin'
+        )
         self.message_user(request, f'Successfully marked {updated} transactions as failed.')
     mark_as_failed.short_description = 'Mark selected transactions as failed'
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for Payment model
     """
@@ -141,15 +153,17 @@ class PaymentAdmin(admin.ModelAdmin):
     ]
     
     search_fields = [
-        'reference_number',
+        '^reference_number',
         'user__first_name',
         'user__last_name',
         'user__email',
         'phone_number',
-        'receipt_number',
-        'confirmation_code'
+        '^receipt_number',
+        '^confirmation_code'
     ]
     
+    list_select_related = ['user']
+    
     readonly_fields = [
         'id',
         'reference_number',
@@ -202,27 +216,20 @@ class PaymentAdmin(admin.ModelAdmin):
     
     def user_name(self, obj):
         """Display user name with link to user admin"""
-        url = reverse('admin:users_user_change', args=[obj.user.id])
+        url = reverse('admin:users_user_change', args=[obj.user_id])
         return format_html('<a href="{}">{}</a>', url, obj.user.get_full_name())
     user_name.short_description = 'User'
+    user_name.admin_order_field = 'user__last_name'
     
     def mark_as_completed(self, request, queryset):
         """Bulk action to mark payments as completed"""
-        updated = 0
-        for payment in queryset:
-            if payment.status not in ['COMPLETED', 'FAILED', 'REFUNDED']:
-                payment.mark_completed()
-                updated += 1
+        updated = payment_state_service.transition(queryset, 'COMPLETED', expected=['PENDING', 'PROCESSING'])
         self.message_user(request, f'Successfully marked {updated} payments as completed.')
     mark_as_completed.short_description = 'Mark selected payments as completed'
     
     def mark_as_failed(self, request, queryset):
         """Bulk action to mark payments as failed"""
-        updated = 0
-        for payment in queryset:
-            if payment.status not in ['COMPLETED', 'FAILED', 'REFUNDED']:
-                payment.mark_failed()
-                updated += 1
+        updated = payment_state_service.transition(queryset, 'FAILED')
         self.message_user(request, f'Successfully marked {updated} payments as failed.')
     mark_as_failed.short_description = 'Mark selected payments as failed'
     
@@ -249,7 +256,7 @@ class PaymentAdmin(admin.ModelAdmin):
     initiate_stk_push.short_description = 'Initiate STK Push for selected payments'
 
 @admin.register(PaymentSchedule)
-class PaymentScheduleAdmin(admin.ModelAdmin):
+class PaymentScheduleAdmin(BulkActionAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """
     Admin interface for PaymentSchedule model
     """
@@ -271,12 +278,14 @@ class PaymentScheduleAdmin(admin.ModelAdmin):
     ]
     
     search_fields = [
-        'payment__reference_number',
+        '^payment__reference_number',
         'payment__user__first_name',
         'payment__user__last_name',
         'payment__user__email'
     ]
     
+    list_select_related = ['payment']
+    
     readonly_fields = [
         'amount_remaining',
         'created_at',
@@ -287,9 +296,10 @@ class PaymentScheduleAdmin(admin.ModelAdmin):
     
     def payment_reference(self, obj):
         """Display payment reference with link"""
-        url = reverse('admin:payments_payment_change', args=[obj.payment.id])
+        url = reverse('admin:payments_payment_change', args=[obj.payment_id])
         return format_html('<a href="{}">{}</a>', url, obj.payment.reference_number)
     payment_reference.short_description = 'Payment Reference'
+    payment_reference.admin_order_field = 'payment__reference_number'
     
     def is_overdue_display(self, obj):
         """Display overdue status"""
@@ -301,26 +311,101 @@ class PaymentScheduleAdmin(admin.ModelAdmin):
     
     def mark_as_paid(self, request, queryset):
         """Bulk action to mark schedule items as paid"""
-        updated = 0
-        for schedule in queryset:
-            if schedule.status != 'PAID':
-                remaining_amount = schedule.amount_remaining
-                if remaining_amount > 0:
-                    schedule.mark_as_paid(remaining_amount)
-                    updated += 1
-        self.message_user(request, f'Successfully marked {updated} schedule items as paid.')
+        self.run_bulk_action(request, queryset, 'mark_payment_schedules_paid', 'marked as paid')
     mark_as_paid.short_description = 'Mark selected items as paid'
     
     def mark_as_overdue(self, request, queryset):
         """Bulk action to mark schedule items as overdue"""
-        updated = 0
-        from django.utils import timezone
-        today = timezone.now().date()
+        self.run_bulk_action(request, queryset, 'mark_payment_schedules_overdue', 'marked as overdue')
+    mark_as_overdue.short_description = 'Mark selected items as overdue'
+
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    """
+    Admin interface for ReconciliationRun model (read-only run history)
+    """
+    list_display = [
+        'source_name',
+        'status',
+        'dry_run',
+        'statement_rows',
+        'matched_by_receipt',
+        'matched_fuzzy',
+        'unmatched_statement_rows',
+        'unmatched_transactions',
+        'duplicates',
+        'amount_mismatches',
+        'corrected',
+        'started_at'
+    ]
+    
+    list_filter = ['status', 'dry_run', 'started_at']
+    
+    search_fields = ['source_name']
+    
+    readonly_fields = [f.name for f in ReconciliationRun._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    """
+    Admin interface for StripeWebhookEvent model (read-only inbox)
+    """
+    list_display = [
+        'id',
+        'event_type',
+        'payment_intent_id',
+        'status',
+        'attempts',
+        'received_at',
+        'processed_at'
+    ]
+    
+    list_filter = ['status', 'event_type', 'received_at']
+    
+    search_fields = ['=event_id', '=payment_intent_id']
+    
+    list_defer = ['payload']
+    
+    readonly_fields = [f.name for f in StripeWebhookEvent._meta.fields]
+    
+    actions = ['replay_events']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def replay_events(self, request, queryset):
+        """Queue selected events for processing again"""
+        from apps.payments.services.stripe_webhook_service import stripe_webhook_service
         
-        for schedule in queryset:
-            if schedule.due_date < today and schedule.status not in ['PAID']:
-                schedule.status = 'OVERDUE'
-                schedule.save(update_fields=['status'])
-                updated += 1
-        self.message_user(request, f'Successfully marked {updated} schedule items as overdue.')
-    mark_as_overdue.short_description = 'Mark selected items as overdue'
\ No newline at end of file
+        queued = stripe_webhook_service.requeue(queryset)
+        self.message_user(request, f'{queued} events queued for replay.')
+    replay_events.short_description = 'Replay selected events'
+
+
+@admin.register(FxRateSnapshot)
+class FxRateSnapshotAdmin(admin.ModelAdmin):
+    """
+    Admin interface for FxRateSnapshot model (read-only rate history)
+    """
+    list_display = ['currency', 'kes_rate', 'source', 'effective_at', 'created_at']
+    
+    list_filter = ['currency', 'source', 'effective_at']
+    
+    readonly_fields = [f.name for f in FxRateSnapshot._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
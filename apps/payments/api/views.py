@@ -4,6 +4,9 @@ Handles all M-Pesa API endpoints including callbacks
 """
 import json
 import logging
+import uuid
+from datetime import datetime
+from decimal import Decimal
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -15,8 +18,10 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
+from apps.core.pagination import InvalidCursor, KeysetPaginator, cached_count, parse_fields, parse_page_size
+from apps.payments.services.disbursement_service import disbursement_service
 from apps.payments.services.mpesa_service import MpesaService
-from apps.payments.models import Payment, MpesaTransaction
+from apps.payments.models import Payment, MpesaTransaction, apply_transition
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +41,7 @@ class MpesaCallbackView(APIView):
             # Get callback data
             callback_data = request.data if hasattr(request, 'data') else json.loads(request.body)
             
-            logger.info(f"Received M-Pesa STK Push callback: {callback_data}")
+            logger.debug("Received M-Pesa STK Push callback: %s", callback_data)
             
             # Process callback
             mpesa_service = MpesaService()
@@ -44,7 +49,7 @@ class MpesaCallbackView(APIView):
             
             if result['success']:
                 # Log successful callback processing
-                logger.info(f"Successfully processed callback: {result}")
+                logger.info("Processed M-Pesa callback for transaction %s", result.get('transaction_id'))
                 
                 # Return success response for M-Pesa
                 return Response({
@@ -74,6 +79,43 @@ class MpesaCallbackView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class MpesaB2CResultView(APIView):
+    """
+    M-Pesa B2C Result Handler
+    Receives disbursement results and queue timeouts (ResultURL / QueueTimeOutURL)
+    """
+    permission_classes = []  # No authentication required for callbacks
+    
+    def post(self, request):
+        """
+        Handle M-Pesa B2C result callback
+        """
+        try:
+            callback_data = request.data if hasattr(request, 'data') else json.loads(request.body)
+            result = disbursement_service.handle_result(
+                callback_data, queue_timeout=request.query_params.get('timeout') == '1'
+            )
+            
+            if result['success']:
+                return Response({
+                    "ResultCode": 0,
+                    "ResultDesc": "Accepted"
+                }, status=status.HTTP_200_OK)
+            
+            logger.error(f"Failed to process B2C result: {result}")
+            return Response({
+                "ResultCode": 1,
+                "ResultDesc": result['error']
+            }, status=status.HTTP_200_OK)
+                
+        except Exception as e:
+            logger.error(f"Unexpected error processing B2C result: {e}")
+            return Response({
+                "ResultCode": 1,
+                "ResultDesc": "Internal server error"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class MpesaValidationView(APIView):
     """
     M-Pesa Validation Endpoint
@@ -177,9 +219,7 @@ class InitiateSTKPushView(APIView):
             
             if result['success']:
                 # Update payment status
-                payment.phone_number = phone_number
-                payment.status = 'PROCESSING'
-                payment.save()
+                apply_transition(payment, 'PROCESSING', phone_number=phone_number)
                 
                 logger.info(f"STK Push initiated successfully for payment {payment.id}")
                 
@@ -274,17 +314,25 @@ class PaymentStatusView(APIView):
 class PaymentHistoryView(APIView):
     """
     API endpoint to get user's payment history
+    Keyset-paginated newest first; ``fields=`` limits the columns returned
     """
     permission_classes = [IsAuthenticated]
     
+    FIELDS = [
+        'id', 'payment_type', 'amount', 'currency', 'status', 'reference_number',
+        'phone_number', 'created_at', 'receipt_number', 'completed_at'
+    ]
+    
     def get(self, request):
         """
         Get user's payment history
+        
+        Query parameters: cursor / before (page cursors), per_page (capped),
+        fields (comma-separated), status, payment_type, include_total
         """
         try:
-            # Get query parameters
-            page = int(request.GET.get('page', 1))
-            per_page = int(request.GET.get('per_page', 20))
+            per_page = parse_page_size(request.GET.get('per_page'))
+            fields = parse_fields(request.GET.get('fields'), self.FIELDS)
             status_filter = request.GET.get('status')
             payment_type_filter = request.GET.get('payment_type')
             
@@ -298,54 +346,56 @@ class PaymentHistoryView(APIView):
             if payment_type_filter:
                 payments = payments.filter(payment_type=payment_type_filter)
             
-            # Order by creation date
-            payments = payments.order_by('-created_at')
-            
-            # Paginate
-            start = (page - 1) * per_page
-            end = start + per_page
-            payments_page = payments[start:end]
+            page = KeysetPaginator(payments, per_page).page(
+                after=request.GET.get('cursor'),
+                before=request.GET.get('before'),
+                fields=fields
+            )
             
             # Prepare response data
-            payments_data = []
-            for payment in payments_page:
-                payment_data = {
-                    'id': str(payment.id),
-                    'payment_type': payment.payment_type,
-                    'amount': float(payment.amount),
-                    'currency': payment.currency,
-                    'status': payment.status,
-                    'reference_number': payment.reference_number,
-                    'phone_number': payment.phone_number,
-                    'created_at': payment.created_at.isoformat(),
-                    'receipt_number': payment.receipt_number,
-                    'completed_at': payment.completed_at.isoformat() if payment.completed_at else None
-                }
-                payments_data.append(payment_data)
+            payments_data = [
+                {field: self._serialize(row[field]) for field in fields}
+                for row in page
+            ]
             
-            # Calculate pagination info
-            total_payments = payments.count()
-            total_pages = (total_payments + per_page - 1) // per_page
+            pagination = {
+                'per_page': per_page,
+                'has_next': page.has_next,
+                'next_cursor': page.next_cursor,
+                'has_previous': page.has_previous,
+                'previous_cursor': page.previous_cursor
+            }
+            if request.GET.get('include_total') in ('1', 'true'):
+                pagination['total_items'] = cached_count(payments)
             
             return Response({
                 'success': True,
                 'data': {
                     'payments': payments_data,
-                    'pagination': {
-                        'current_page': page,
-                        'per_page': per_page,
-                        'total_pages': total_pages,
-                        'total_items': total_payments
-                    }
+                    'pagination': pagination
                 }
             }, status=status.HTTP_200_OK)
             
+        except InvalidCursor as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error getting payment history: {e}")
             return Response({
                 'success': False,
                 'error': 'Internal server error'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def _serialize(self, value):
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value
 
 
 class TestMpesaView(APIView):
@@ -10,6 +10,7 @@ urlpatterns = [
     # M-Pesa callbacks (public endpoints)
     path('mpesa/callback/', views.MpesaCallbackView.as_view(), name='mpesa-callback'),
     path('mpesa/validate/', views.MpesaValidationView.as_view(), name='mpesa-validation'),
+    path('mpesa/b2c-callback/', views.MpesaB2CResultView.as_view(), name='mpesa-b2c-callback'),
     
     # Payment endpoints (authenticated)
     path('stk-push/', views.InitiateSTKPushView.as_view(), name='initiate-stk-push'),
@@ -0,0 +1,178 @@
+"""
+Local Daraja (M-Pesa API) stub for FlexiFinance
+Answers OAuth, STK Push and B2C requests and posts result callbacks, for end-to-end runs without Safaricom
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class DarajaStub:
+    """
+    In-process Daraja stub
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+        latency (float): Seconds added to every API response
+        callback_delay (float): Seconds before a result callback is posted
+        failure_rate (float): Share of B2C/STK requests whose result fails
+        seed (int): Random seed for reproducible failures
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, latency=0.0, callback_delay=0.5, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.callback_delay = callback_delay
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests_received = 0
+        self.callbacks_sent = 0
+        self._lock = threading.Lock()
+        self._callbacks = ThreadPoolExecutor(max_workers=8, thread_name_prefix='daraja-callback')
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='daraja-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._callbacks.shutdown(wait=True)
+
+    def _fails(self):
+        with self._lock:
+            self.requests_received += 1
+            return self.random.random() < self.failure_rate
+
+    def _post_callback(self, url, payload):
+        time.sleep(self.callback_delay)
+        try:
+            requests.post(url, json=payload, timeout=10)
+            with self._lock:
+                self.callbacks_sent += 1
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Daraja stub could not deliver callback to {url}: {e}")
+
+    def b2c(self, body, echo_originator_id=False):
+        conversation_id = f'AG_{uuid.uuid4().hex[:20].upper()}'
+        # Only v3 takes the caller's OriginatorConversationID; v1 assigns its own
+        originator_id = (echo_originator_id and body.get('OriginatorConversationID')) or uuid.uuid4().hex
+        receipt = uuid.uuid4().hex[:10].upper()
+        if self._fails():
+            result = {
+                'ResultType': 0, 'ResultCode': 2001, 'ResultDesc': 'The initiator information is invalid.',
+                'OriginatorConversationID': originator_id, 'ConversationID': conversation_id,
+                'TransactionID': receipt,
+            }
+        else:
+            result = {
+                'ResultType': 0, 'ResultCode': 0,
+                'ResultDesc': 'The service request is processed successfully.',
+                'OriginatorConversationID': originator_id, 'ConversationID': conversation_id,
+                'TransactionID': receipt,
+                'ResultParameters': {'ResultParameter': [
+                    {'Key': 'TransactionAmount', 'Value': body.get('Amount')},
+                    {'Key': 'TransactionReceipt', 'Value': receipt},
+                    {'Key': 'ReceiverPartyPublicName', 'Value': f"{body.get('PartyB')} - Stub Customer"},
+                    {'Key': 'B2CRecipientIsRegisteredCustomer', 'Value': 'Y'},
+                ]},
+            }
+        self._callbacks.submit(self._post_callback, body.get('ResultURL'), {'Result': result})
+        return {
+            'ConversationID': conversation_id,
+            'OriginatorConversationID': originator_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Accept the service request successfully.',
+        }
+
+    def stk_push(self, body):
+        merchant_request_id = f'{self.random.randint(10000, 99999)}-{uuid.uuid4().hex[:8]}'
+        checkout_request_id = f'ws_CO_{uuid.uuid4().hex[:20]}'
+        callback = {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+        }
+        if self._fails():
+            callback.update({'ResultCode': 1032, 'ResultDesc': 'Request cancelled by user'})
+        else:
+            callback.update({
+                'ResultCode': 0,
+                'ResultDesc': 'The service request is processed successfully.',
+                'CallbackMetadata': {'Item': [
+                    {'Name': 'Amount', 'Value': body.get('Amount')},
+                    {'Name': 'MpesaReceiptNumber', 'Value': uuid.uuid4().hex[:10].upper()},
+                    {'Name': 'TransactionDate', 'Value': int(time.strftime('%Y%m%d%H%M%S'))},
+                    {'Name': 'PhoneNumber', 'Value': body.get('PhoneNumber')},
+                ]},
+            })
+        self._callbacks.submit(self._post_callback, body.get('CallBackURL'), {'Body': {'stkCallback': callback}})
+        return {
+            'MerchantRequestID': merchant_request_id,
+            'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0',
+            'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(f"Daraja stub: {format % args}")
+
+            def _reply(self, status, payload):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/oauth/v1/generate':
+                    return self._reply(200, {'access_token': f'stub-{uuid.uuid4().hex}', 'expires_in': '3599'})
+                self._reply(404, {'errorMessage': 'Not found'})
+
+            def do_POST(self):
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self._reply(401, {'errorCode': '404.001.03', 'errorMessage': 'Invalid Access Token'})
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._reply(400, {'errorMessage': 'Invalid JSON'})
+
+                path = urlparse(self.path).path
+                if path in ('/mpesa/b2c/v1/paymentrequest', '/mpesa/b2c/v3/paymentrequest'):
+                    return self._reply(200, stub.b2c(body, echo_originator_id='/v3/' in path))
+                if path == '/mpesa/stkpush/v1/processrequest':
+                    return self._reply(200, stub.stk_push(body))
+                self._reply(404, {'errorMessage': 'Not found'})
+
+        return Handler
@@ -0,0 +1,106 @@
+"""
+Local FX rate provider stub for FlexiFinance
+Serves a drifting USD-based rates document, for exercising the HTTP FX source without a provider account
+"""
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Units per USD the stub starts from
+START_RATES = {
+    'KES': 132.50,
+    'EUR': 0.928,
+    'GBP': 0.802,
+    'CAD': 1.360,
+    'AUD': 1.512,
+}
+
+
+class FxRateStub:
+    """
+    In-process FX provider stub
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+        volatility (float): Relative standard deviation of each rate move
+        update_interval (float): Seconds between rate moves
+        latency (float): Seconds added to every response
+        seed (int): Random seed for a reproducible rate path
+    """
+
+    def __init__(self, host='127.0.0.1', port=8766, volatility=0.002, update_interval=60.0, latency=0.0, seed=None):
+        self.volatility = volatility
+        self.update_interval = update_interval
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.rates = dict(START_RATES)
+        self.requests_received = 0
+        self._lock = threading.Lock()
+        self._moved_at = time.time()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/latest'
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fx-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def latest(self):
+        """Rates document, moving every rate once per elapsed update interval"""
+        with self._lock:
+            self.requests_received += 1
+            now = time.time()
+            while now - self._moved_at >= self.update_interval:
+                self._moved_at += self.update_interval
+                for code in self.rates:
+                    self.rates[code] *= 1 + self.random.gauss(0, self.volatility)
+            return {
+                'base': 'USD',
+                'timestamp': int(self._moved_at),
+                'rates': {code: round(rate, 6) for code, rate in self.rates.items()},
+            }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(f"FX stub: {format % args}")
+
+            def _reply(self, status, payload):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/latest':
+                    return self._reply(200, stub.latest())
+                self._reply(404, {'error': 'Not found'})
+
+        return Handler
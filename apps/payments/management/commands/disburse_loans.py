@@ -0,0 +1,35 @@
+"""
+Management command to disburse approved loans via M-Pesa B2C
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from apps.payments.services.disbursement_service import disbursement_service
+
+
+class Command(BaseCommand):
+    help = 'Disburse approved loans in batches via M-Pesa B2C (rate-limited, within the daily float cap)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Loans claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for newly approved loans')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {'cancelled': 0, 'prepared': 0, 'accepted': 0, 'rejected': 0, 'unknown': 0, 'disbursed': 0}
+            while True:
+                result = disbursement_service.run_batch(options['batch_size'])
+                for key in totals:
+                    totals[key] += result[key]
+                if not result['prepared']:
+                    break
+            if totals['prepared'] or totals['disbursed'] or totals['cancelled'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Disbursements: {totals['prepared']} prepared, {totals['accepted']} accepted, "
+                    f"{totals['rejected']} rejected, {totals['unknown']} awaiting an unknown outcome; "
+                    f"{totals['disbursed']} loans marked disbursed; {totals['cancelled']} unsent disbursements cancelled"
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
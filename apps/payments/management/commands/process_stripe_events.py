@@ -0,0 +1,35 @@
+"""
+Management command to process the Stripe webhook inbox
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.services.stripe_webhook_service import stripe_webhook_service
+
+
+class Command(BaseCommand):
+    help = 'Process recorded Stripe webhook events in order per PaymentIntent, or replay an inbox id range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replay-from', type=int, help='Queue events from this inbox id again before processing')
+        parser.add_argument('--replay-to', type=int, help='Last inbox id to replay (latest when omitted)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        if options['replay_to'] is not None and options['replay_from'] is None:
+            raise CommandError('--replay-to needs --replay-from')
+        if options['replay_from'] is not None:
+            queued = stripe_webhook_service.replay(options['replay_from'], options['replay_to'])
+            self.stdout.write(f'{queued} events queued for replay')
+
+        while True:
+            totals = stripe_webhook_service.process_pending()
+            if any(totals.values()) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Stripe events: {totals['processed']} processed, {totals['ignored']} ignored, "
+                    f"{totals['retried']} to retry, {totals['failed']} failed"
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
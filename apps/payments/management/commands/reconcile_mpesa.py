@@ -0,0 +1,34 @@
+"""
+Management command to reconcile an M-Pesa statement file against recorded transactions
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.services.reconciliation_service import reconciliation_service
+
+
+class Command(BaseCommand):
+    help = 'Reconcile an M-Pesa statement CSV against MpesaTransaction, reporting and correcting differences'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path to the statement CSV')
+        parser.add_argument('--dry-run', action='store_true', help='Report only; do not correct transactions')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Statement file encoding')
+
+    def handle(self, *args, **options):
+        path = options['statement']
+        if not os.path.exists(path):
+            raise CommandError(f'Statement file not found: {path}')
+
+        with open(path, newline='', encoding=options['encoding']) as handle:
+            run = reconciliation_service.reconcile(handle, source_name=os.path.basename(path), dry_run=options['dry_run'])
+
+        if run.status == 'FAILED':
+            raise CommandError(f'Reconciliation failed: {run.error_message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.statement_rows} statement lines, {run.transactions_checked} transactions: '
+            f'{run.matched_by_receipt} matched by receipt, {run.matched_fuzzy} fuzzy, '
+            f'{run.unmatched_statement_rows} unmatched lines, {run.unmatched_transactions} unmatched transactions, '
+            f'{run.duplicates} duplicates, {run.amount_mismatches} amount mismatches, {run.corrected} corrected'
+        ))
+        self.stdout.write(f'Report: {run.report_path}')
@@ -0,0 +1,26 @@
+"""
+Management command to refresh FX rates and store snapshots
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from apps.payments.services.fx_service import fx_rate_service
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates from the configured FX source and snapshot the ones that changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between refreshes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            rates = fx_rate_service.refresh()
+            self.stdout.write(self.style.SUCCESS(
+                f"FX rates ({fx_rate_service.source.name}): "
+                + ', '.join(f'{code} {rate:.4f}' for code, rate in sorted(rates.items()) if code != 'KES')
+            ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+"""
+Management command to run a local Daraja (M-Pesa API) stub
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.daraja_stub import DarajaStub
+
+
+class Command(BaseCommand):
+    help = 'Serve a local Daraja stub (OAuth, STK Push, B2C with result callbacks); set MPESA_BASE_URL to its URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each API response')
+        parser.add_argument('--callback-delay', type=float, default=0.5, help='Seconds before result callbacks')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of requests whose result fails')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible failures')
+
+    def handle(self, *args, **options):
+        stub = DarajaStub(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            callback_delay=options['callback_delay'],
+            failure_rate=options['failure_rate'],
+            seed=options['seed']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Daraja stub listening on {stub.url}'))
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
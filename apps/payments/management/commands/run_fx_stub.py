@@ -0,0 +1,34 @@
+"""
+Management command to run a local FX rate provider stub
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.fx_stub import FxRateStub
+
+
+class Command(BaseCommand):
+    help = 'Serve a local FX rate provider stub; set FX_SOURCE=http and FX_URL to its URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--volatility', type=float, default=0.002, help='Relative size of each rate move')
+        parser.add_argument('--update-interval', type=float, default=60.0, help='Seconds between rate moves')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each response')
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible rate path')
+
+    def handle(self, *args, **options):
+        stub = FxRateStub(
+            host=options['host'],
+            port=options['port'],
+            volatility=options['volatility'],
+            update_interval=options['update_interval'],
+            latency=options['latency'],
+            seed=options['seed']
+        )
+        self.stdout.write(self.style.SUCCESS(f'FX stub listening on {stub.url}'))
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
@@ -0,0 +1,32 @@
+"""
+Management command to run a local Resend API stub
+"""
+from django.core.management.base import BaseCommand
+from apps.payments.resend_stub import ResendStub
+
+
+class Command(BaseCommand):
+    help = 'Serve a local Resend API stub; set RESEND_API_URL to its URL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8768)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to each response')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of sends answered with a 500')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible failures')
+
+    def handle(self, *args, **options):
+        stub = ResendStub(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            seed=options['seed']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Resend stub listening on {stub.url}'))
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
@@ -0,0 +1,32 @@
+"""
+Management command to load-test the Stripe webhook endpoint with signed synthetic events
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.payments.stripe_event_generator import StripeEventGenerator
+
+
+class Command(BaseCommand):
+    help = 'Post signed synthetic Stripe events at a webhook URL and report acknowledgement latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/payments/webhooks/stripe/')
+        parser.add_argument('--events', type=int, default=1000, help='Distinct events to generate')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duplicate-rate', type=float, default=0.05, help='Share of events delivered twice')
+        parser.add_argument('--secret', help='Signing secret (STRIPE_WEBHOOK_SECRET by default)')
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible stream')
+
+    def handle(self, *args, **options):
+        secret = options['secret'] or settings.STRIPE_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError('No signing secret: set STRIPE_WEBHOOK_SECRET or pass --secret')
+
+        generator = StripeEventGenerator(secret, seed=options['seed'], duplicate_rate=options['duplicate_rate'])
+        result = generator.run(options['url'], options['events'], concurrency=options['concurrency'])
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(result['statuses'].items(), key=str))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['deliveries']} deliveries in {result['seconds']:.1f}s ({result['per_second']:.0f}/s); "
+            f"ack p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, p99 {result['p99_ms']:.1f}ms"
+        ))
+        self.stdout.write(f'Responses: {statuses}')
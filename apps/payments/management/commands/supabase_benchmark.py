@@ -0,0 +1,64 @@
+"""
+Management command to benchmark SupabaseService against a local PostgREST stub
+"""
+import time
+import uuid
+
+import requests
+from django.core.management.base import BaseCommand
+from apps.payments.services.supabase_service import SupabaseService
+from apps.payments.supabase_stub import SupabaseStub
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row unpooled Supabase calls with pooled bulk calls against a local PostgREST stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Contact submissions to write, update and read')
+        parser.add_argument('--latency', type=float, default=0.002, help='Seconds the stub adds to each response')
+
+    def handle(self, *args, **options):
+        stub = SupabaseStub(port=0, latency=options['latency']).start()
+        try:
+            service = SupabaseService()
+            service.supabase_url = stub.url
+            rows = [
+                service.contact_row({
+                    'name': f'Benchmark {n}',
+                    'email': f'benchmark{n}@example.com',
+                    'message': uuid.uuid4().hex,
+                })
+                for n in range(options['rows'])
+            ]
+
+            self.stdout.write(f"{len(rows)} rows, {options['latency'] * 1000:.1f} ms stub latency")
+            self._report('per-row, new connection each', stub, lambda: self._per_row(service, stub.url, rows))
+            stub.tables.clear()
+            self._report('pooled bulk', stub, lambda: self._bulk(service, rows))
+        finally:
+            stub.stop()
+
+    def _report(self, label, stub, run):
+        stub.reset_counters()
+        started = time.perf_counter()
+        read = run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {elapsed:.2f}s, {stub.requests_received} requests, '
+            f'{stub.connections_opened} connections, {read} rows read back'
+        ))
+
+    def _per_row(self, service, url, rows):
+        """The access pattern SupabaseService had before pooling and bulk calls"""
+        base = f'{url}/rest/v1/contact_submissions'
+        for row in rows:
+            requests.post(base, headers=service.headers, json=row, timeout=10)
+        for submission_id in range(1, len(rows) + 1):
+            requests.patch(f'{base}?id=eq.{submission_id}', headers=service.headers, json={'status': 'read'}, timeout=10)
+        return len(requests.get(base, headers=service.headers, params={'limit': len(rows)}, timeout=10).json())
+
+    def _bulk(self, service, rows):
+        service.bulk_insert('contact_submissions', rows)
+        ids = [row['id'] for row in service.iter_contact_submissions()]
+        service.update_submissions_status(ids, 'read')
+        return sum(1 for _ in service.iter_contact_submissions(status='read'))
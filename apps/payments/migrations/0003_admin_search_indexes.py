@@ -0,0 +1,26 @@
+# Trigram/prefix indexes backing admin search_fields (PostgreSQL only)
+
+from django.db import migrations
+
+from apps.core.search_indexes import search_index_operations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("payments", "0002_initial"),
+    ]
+
+    operations = search_index_operations([
+        ('payments_reference_prefix', 'payments', 'reference_number', 'prefix'),
+        ('payments_receipt_prefix', 'payments', 'receipt_number', 'prefix'),
+        ('payments_confirmation_prefix', 'payments', 'confirmation_code', 'prefix'),
+        ('payments_phone_trgm', 'payments', 'phone_number', 'trigram'),
+        ('mpesa_tx_receipt_prefix', 'mpesa_transactions', 'mpesa_receipt', 'prefix'),
+        ('mpesa_tx_checkout_prefix', 'mpesa_transactions', 'checkout_request_id', 'prefix'),
+        ('mpesa_tx_merchant_prefix', 'mpesa_transactions', 'merchant_request_id', 'prefix'),
+        ('mpesa_tx_phone_trgm', 'mpesa_transactions', 'phone_number', 'trigram'),
+    ])
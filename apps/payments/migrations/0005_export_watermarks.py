@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=50)),
+                ('feed', models.CharField(default='default', max_length=50)),
+                ('exported_until', models.DateTimeField(blank=True, help_text='Rows changed up to this time have been exported', null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_row_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Export Watermark',
+                'verbose_name_plural': 'Export Watermarks',
+                'db_table': 'export_watermarks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mpesatransaction',
+            index=models.Index(fields=['updated_at'], name='mpesa_trans_updated_3b12c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='payments_updated_d0f223_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='exportwatermark',
+            unique_together={('dataset', 'feed')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0011_loan_decisions'),
+        ('payments', '0005_export_watermarks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='loan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payments', to='loans.loan'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['loan', 'payment_type', 'status'], name='payments_loan_id_16671e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_type', 'created_at'], name='payments_payment_227baf_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:27
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_payment_loan_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='RUNNING', max_length=20)),
+                ('dry_run', models.BooleanField(default=False)),
+                ('period_start', models.DateTimeField(blank=True, null=True)),
+                ('period_end', models.DateTimeField(blank=True, null=True)),
+                ('statement_rows', models.PositiveIntegerField(default=0)),
+                ('transactions_checked', models.PositiveIntegerField(default=0)),
+                ('matched_by_receipt', models.PositiveIntegerField(default=0)),
+                ('matched_fuzzy', models.PositiveIntegerField(default=0)),
+                ('unmatched_statement_rows', models.PositiveIntegerField(default=0)),
+                ('unmatched_transactions', models.PositiveIntegerField(default=0)),
+                ('duplicates', models.PositiveIntegerField(default=0)),
+                ('amount_mismatches', models.PositiveIntegerField(default=0)),
+                ('corrected', models.PositiveIntegerField(default=0)),
+                ('report_path', models.CharField(blank=True, max_length=500)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'M-Pesa Reconciliation Run',
+                'verbose_name_plural': 'M-Pesa Reconciliation Runs',
+                'db_table': 'mpesa_reconciliation_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
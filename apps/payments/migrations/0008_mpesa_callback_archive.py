@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+from apps.core.migration_operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # mpesa_transactions takes callbacks throughout; its indexes are changed
+    # CONCURRENTLY, which cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('payments', '0007_mpesa_reconciliation_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MpesaCallbackArchive',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('callback_type', models.CharField(choices=[('STK', 'STK Push Result'), ('B2C', 'B2C Result'), ('C2B', 'C2B Confirmation')], max_length=10)),
+                ('payload', models.BinaryField()),
+                ('payload_size', models.PositiveIntegerField(default=0)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='callback_archives', to='payments.mpesatransaction')),
+            ],
+            options={
+                'verbose_name': 'M-Pesa Callback Archive',
+                'verbose_name_plural': 'M-Pesa Callback Archive',
+                'db_table': 'mpesa_callback_archive',
+                'indexes': [models.Index(fields=['received_at'], name='mpesa_callb_receive_0b8ac1_idx')],
+            },
+        ),
+        RemoveIndexConcurrently(
+            model_name='mpesatransaction',
+            name='mpesa_trans_mpesa_r_4ee2a3_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='mpesatransaction',
+            name='mpesa_trans_checkou_3d1894_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='mpesatransaction',
+            name='mpesa_trans_merchan_580806_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='mpesatransaction',
+            name='mpesa_trans_status_797175_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='mpesatransaction',
+            index=models.Index(fields=['initiated_at'], name='mpesa_trans_initiat_60c15a_idx'),
+        ),
+    ]
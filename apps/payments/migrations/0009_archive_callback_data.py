@@ -0,0 +1,78 @@
+# Moves MpesaTransaction.callback_data into mpesa_callback_archive in small
+# batches. Each batch is its own short transaction touching only its rows,
+# so callbacks keep landing on the table while the move runs.
+
+import json
+import zlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def callback_type(data):
+    if isinstance(data, dict) and 'Result' in data:
+        return 'B2C'
+    if isinstance(data, dict) and 'Body' in data:
+        return 'STK'
+    return 'C2B'
+
+
+def archive_callback_data(apps, schema_editor):
+    MpesaTransaction = apps.get_model('payments', 'MpesaTransaction')
+    MpesaCallbackArchive = apps.get_model('payments', 'MpesaCallbackArchive')
+
+    last_pk = None
+    while True:
+        batch = MpesaTransaction.objects.filter(callback_data__isnull=False).order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', 'callback_data', 'callback_received_at', 'updated_at')[:BATCH_SIZE])
+        if not rows:
+            return
+        archives = []
+        for pk, data, received_at, updated_at in rows:
+            raw = json.dumps(data, separators=(',', ':'), default=str).encode()
+            archives.append(MpesaCallbackArchive(
+                transaction_id=pk, callback_type=callback_type(data),
+                payload=zlib.compress(raw, 6), payload_size=len(raw), received_at=received_at or updated_at
+            ))
+        with transaction.atomic():
+            MpesaCallbackArchive.objects.bulk_create(archives)
+            MpesaTransaction.objects.filter(pk__in=[row[0] for row in rows]).update(callback_data=None)
+        last_pk = rows[-1][0]
+
+
+def restore_callback_data(apps, schema_editor):
+    MpesaTransaction = apps.get_model('payments', 'MpesaTransaction')
+    MpesaCallbackArchive = apps.get_model('payments', 'MpesaCallbackArchive')
+
+    last_pk = 0
+    while True:
+        rows = list(
+            MpesaCallbackArchive.objects.filter(pk__gt=last_pk, transaction__isnull=False)
+            .order_by('pk').values_list('pk', 'transaction_id', 'payload')[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        with transaction.atomic():
+            # Later archive rows overwrite earlier ones, leaving the latest callback
+            for _, transaction_id, payload in rows:
+                MpesaTransaction.objects.filter(pk=transaction_id).update(
+                    callback_data=json.loads(zlib.decompress(bytes(payload)))
+                )
+            MpesaCallbackArchive.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('payments', '0008_mpesa_callback_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(archive_callback_data, restore_callback_data),
+    ]
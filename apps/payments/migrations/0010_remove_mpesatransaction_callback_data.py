@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_archive_callback_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='mpesatransaction',
+            name='callback_data',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_remove_mpesatransaction_callback_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('payment_intent_id', models.CharField(blank=True, default='', max_length=255)),
+                ('stripe_created', models.BigIntegerField(default=0)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('PROCESSED', 'Processed'), ('IGNORED', 'Ignored'), ('FAILED', 'Failed')], default='PENDING', max_length=15)),
+                ('attempts', models.IntegerField(default=0)),
+                ('scheduled_for', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Stripe Webhook Event',
+                'verbose_name_plural': 'Stripe Webhook Events',
+                'db_table': 'stripe_webhook_events',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'scheduled_for'], name='stripe_webh_status_630a66_idx'), models.Index(fields=['payment_intent_id', 'stripe_created'], name='stripe_webh_payment_8a5449_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_stripe_webhook_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('currency', models.CharField(max_length=3)),
+                ('kes_rate', models.DecimalField(decimal_places=8, help_text='KES per unit of currency', max_digits=18)),
+                ('source', models.CharField(max_length=50)),
+                ('effective_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'FX Rate Snapshot',
+                'verbose_name_plural': 'FX Rate Snapshots',
+                'db_table': 'fx_rate_snapshots',
+                'ordering': ['-effective_at'],
+                'unique_together': {('currency', 'effective_at')},
+            },
+        ),
+    ]
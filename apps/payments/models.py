@@ -5,7 +5,10 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from decimal import Decimal
+import json
 import uuid
+import zlib
 
 User = get_user_model()
 
@@ -50,9 +53,8 @@ class MpesaTransaction(models.Model):
     result_code = models.CharField(max_length=10, null=True, blank=True)
     result_desc = models.CharField(max_length=255, null=True, blank=True)
     
-    # Callback data
+    # Callback data (raw payloads are kept in MpesaCallbackArchive)
     callback_received = models.BooleanField(default=False)
-    callback_data = models.JSONField(null=True, blank=True)
     callback_received_at = models.DateTimeField(null=True, blank=True)
     
     # Timestamps
@@ -65,73 +67,213 @@ class MpesaTransaction(models.Model):
         verbose_name = 'M-Pesa Transaction'
         verbose_name_plural = 'M-Pesa Transactions'
         ordering = ['-initiated_at']
+        # mpesa_receipt, checkout_request_id and merchant_request_id are
+        # already indexed by their unique constraints
         indexes = [
-            models.Index(fields=['mpesa_receipt']),
-            models.Index(fields=['checkout_request_id']),
-            models.Index(fields=['merchant_request_id']),
-            models.Index(fields=['status']),
             models.Index(fields=['user', 'status']),
+            # Admin ordering and statement reconciliation periods
+            models.Index(fields=['initiated_at']),
+            # Incremental finance exports
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return f"{self.transaction_type} - KES {self.amount} - {self.phone_number}"
     
+    @property
+    def callback_payload(self):
+        """Most recent raw callback payload, read from the archive"""
+        archive = self.callback_archives.order_by('-received_at', '-id').first()
+        return archive.data if archive else None
+    
     def mark_completed(self, mpesa_receipt=None, result_code='0', result_desc='Success'):
-        """Mark transaction as completed"""
-        self.status = 'COMPLETED'
-        self.completed_at = timezone.now()
+        """Mark transaction as completed (no-op unless the state machine allows it)"""
+        values = {'result_code': result_code, 'result_desc': result_desc}
         if mpesa_receipt:
-            self.mpesa_receipt = mpesa_receipt
-        self.result_code = result_code
-        self.result_desc = result_desc
-        self.save(update_fields=['status', 'completed_at', 'mpesa_receipt', 'result_code', 'result_desc'])
+            values['mpesa_receipt'] = mpesa_receipt
+        return apply_transition(self, 'COMPLETED', **values)
     
     def mark_failed(self, result_code=None, result_desc=None):
-        """Mark transaction as failed"""
-        self.status = 'FAILED'
-        self.completed_at = timezone.now()
+        """Mark transaction as failed (no-op unless the state machine allows it)"""
+        values = {}
         if result_code:
-            self.result_code = result_code
+            values['result_code'] = result_code
         if result_desc:
-            self.result_desc = result_desc
-        self.save(update_fields=['status', 'completed_at', 'result_code', 'result_desc'])
+            values['result_desc'] = result_desc
+        return apply_transition(self, 'FAILED', **values)
     
     def process_callback(self, callback_data):
-        """Process M-Pesa callback data"""
-        self.callback_received = True
-        self.callback_received_at = timezone.now()
-        self.callback_data = callback_data
+        """
+        Process M-Pesa STK callback data
         
-        if 'Body' in callback_data and 'stkCallback' in callback_data['Body']:
-            stk_callback = callback_data['Body']['stkCallback']
-            
-            # Extract transaction details
-            self.result_code = str(stk_callback.get('ResultCode', ''))
-            self.result_desc = stk_callback.get('ResultDesc', '')
-            self.checkout_request_id = stk_callback.get('CheckoutRequestID', '')
-            
-            # Extract metadata
-            if 'CallbackMetadata' in stk_callback:
-                metadata = stk_callback['CallbackMetadata']
-                for item in metadata.get('Item', []):
-                    if item.get('Name') == 'MpesaReceiptNumber':
-                        self.mpesa_receipt = item.get('Value')
-                    elif item.get('Name') == 'TransactionDate':
-                        # Parse transaction date if needed
-                        pass
-            
-            # Update status based on result code
-            if self.result_code == '0':
-                self.status = 'COMPLETED'
-                self.completed_at = timezone.now()
-            else:
-                self.status = 'FAILED'
-                self.completed_at = timezone.now()
+        Returns:
+            bool: True if the callback moved the transaction (False for repeats)
+        """
+        received_at = timezone.now()
+        MpesaCallbackArchive.record(self.pk, 'STK', callback_data, received_at=received_at)
         
-        self.save(update_fields=[
-            'callback_received', 'callback_received_at', 'callback_data',
-            'result_code', 'result_desc', 'checkout_request_id', 'mpesa_receipt', 'status', 'completed_at'
-        ])
+        if 'Body' not in callback_data or 'stkCallback' not in callback_data['Body']:
+            return False
+        stk_callback = callback_data['Body']['stkCallback']
+        
+        # Extract transaction details
+        values = {
+            'callback_received': True,
+            'callback_received_at': received_at,
+            'result_code': str(stk_callback.get('ResultCode', '')),
+            'result_desc': (stk_callback.get('ResultDesc') or '')[:255],
+        }
+        
+        # Extract metadata
+        for item in stk_callback.get('CallbackMetadata', {}).get('Item', []):
+            if item.get('Name') == 'MpesaReceiptNumber' and item.get('Value'):
+                values['mpesa_receipt'] = item['Value']
+            elif item.get('Name') == 'Amount' and item.get('Value'):
+                values['amount'] = Decimal(str(item['Value']))
+        
+        # Update status based on result code
+        return apply_transition(self, 'COMPLETED' if values['result_code'] == '0' else 'FAILED', **values)
+
+
+def apply_transition(instance, target, **values):
+    """
+    Move one Payment or MpesaTransaction through the payment state machine
+    and mirror the change on the instance
+    
+    Returns:
+        bool: True if the row was in a status that allows the transition
+    """
+    from apps.payments.services.payment_state_service import FINAL_STATUSES, payment_state_service
+    
+    model = type(instance)
+    stamp = timezone.now()
+    moved = payment_state_service.transition(model.objects.filter(pk=instance.pk), target, updated_at=stamp, **values)
+    if moved:
+        instance.status = target
+        instance.updated_at = stamp
+        if target in FINAL_STATUSES[model]:
+            instance.completed_at = stamp
+        for field, value in values.items():
+            setattr(instance, field, value)
+    return bool(moved)
+
+
+class MpesaCallbackArchive(models.Model):
+    """
+    M-Pesa Callback Archive
+    Append-only store of raw callback payloads as zlib-compressed JSON,
+    keeping them off the hot mpesa_transactions rows. Rows are never
+    updated; the extracted fields live on the transaction
+    """
+    
+    CALLBACK_TYPES = [
+        ('STK', 'STK Push Result'),
+        ('B2C', 'B2C Result'),
+        ('C2B', 'C2B Confirmation'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    # No database constraint: archived payloads outlive deleted transactions
+    transaction = models.ForeignKey(
+        MpesaTransaction, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='callback_archives'
+    )
+    callback_type = models.CharField(max_length=10, choices=CALLBACK_TYPES)
+    payload = models.BinaryField()
+    payload_size = models.PositiveIntegerField(default=0)
+    received_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'mpesa_callback_archive'
+        verbose_name = 'M-Pesa Callback Archive'
+        verbose_name_plural = 'M-Pesa Callback Archive'
+        indexes = [
+            # Retention sweeps
+            models.Index(fields=['received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.callback_type} callback - {self.received_at}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Callback archive rows are append-only')
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def compress(data):
+        """Compact JSON, zlib-compressed; returns (payload, raw size)"""
+        raw = json.dumps(data, separators=(',', ':'), default=str).encode()
+        return zlib.compress(raw, 6), len(raw)
+    
+    @property
+    def data(self):
+        return json.loads(zlib.decompress(bytes(self.payload)))
+    
+    @classmethod
+    def build(cls, transaction_id, callback_type, data, received_at=None):
+        """Unsaved archive row (for bulk_create)"""
+        payload, size = cls.compress(data)
+        return cls(
+            transaction_id=transaction_id, callback_type=callback_type, payload=payload,
+            payload_size=size, received_at=received_at or timezone.now()
+        )
+    
+    @classmethod
+    def record(cls, transaction_id, callback_type, data, received_at=None):
+        """Archive one callback payload"""
+        archive = cls.build(transaction_id, callback_type, data, received_at)
+        archive.save()
+        return archive
+
+
+class StripeWebhookEvent(models.Model):
+    """
+    Stripe Webhook Event
+    Inbox of verified Stripe events, one row per event id. The webhook only
+    records the event; processing happens in the background, in order per
+    PaymentIntent. The auto-increment id gives replayable ranges
+    """
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('IGNORED', 'Ignored'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payment_intent_id = models.CharField(max_length=255, blank=True, default='')
+    # Stripe's event creation time (unix seconds), the order within a PaymentIntent
+    stripe_created = models.BigIntegerField(default=0)
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    scheduled_for = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'stripe_webhook_events'
+        verbose_name = 'Stripe Webhook Event'
+        verbose_name_plural = 'Stripe Webhook Events'
+        ordering = ['-id']
+        indexes = [
+            # Worker claims
+            models.Index(fields=['status', 'scheduled_for']),
+            # Per-PaymentIntent ordering
+            models.Index(fields=['payment_intent_id', 'stripe_created']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} - {self.event_id}"
 
 
 class Payment(models.Model):
@@ -183,6 +325,15 @@ class Payment(models.Model):
         related_name='payment'
     )
     
+    # Loan this payment disburses or repays
+    loan = models.ForeignKey(
+        'loans.Loan',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payments'
+    )
+    
     # Phone number for payments
     phone_number = models.CharField(max_length=15)
     
@@ -208,6 +359,13 @@ class Payment(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['payment_type']),
+            # Keyset pagination of payment history (newest first)
+            models.Index(fields=['user', 'created_at', 'id']),
+            # Incremental finance exports
+            models.Index(fields=['updated_at']),
+            # Disbursement engine: open attempts per loan and today's float usage
+            models.Index(fields=['loan', 'payment_type', 'status']),
+            models.Index(fields=['payment_type', 'created_at']),
         ]
     
     def __str__(self):
@@ -222,17 +380,13 @@ class Payment(models.Model):
         return self.reference_number
     
     def mark_completed(self, receipt_number=None):
-        """Mark payment as completed"""
-        self.status = 'COMPLETED'
-        self.completed_at = timezone.now()
-        if receipt_number:
-            self.receipt_number = receipt_number
-        self.save(update_fields=['status', 'completed_at', 'receipt_number'])
+        """Mark payment as completed (no-op unless the state machine allows it)"""
+        values = {'receipt_number': receipt_number} if receipt_number else {}
+        return apply_transition(self, 'COMPLETED', **values)
     
     def mark_failed(self):
-        """Mark payment as failed"""
-        self.status = 'FAILED'
-        self.save(update_fields=['status'])
+        """Mark payment as failed (no-op unless the state machine allows it)"""
+        return apply_transition(self, 'FAILED')
     
     def initiate_stk_push(self):
         """Initiate STK Push for this payment"""
@@ -267,8 +421,7 @@ class Payment(models.Model):
             mpesa_transaction.checkout_request_id = result.get('checkout_request_id')
             mpesa_transaction.save(update_fields=['merchant_request_id', 'checkout_request_id'])
             
-            self.status = 'PROCESSING'
-            self.save(update_fields=['status'])
+            apply_transition(self, 'PROCESSING')
             
             return {
                 'success': True,
@@ -346,4 +499,99 @@ class PaymentSchedule(models.Model):
         elif self.is_overdue:
             self.status = 'OVERDUE'
         
-        self.save(update_fields=['amount_paid', 'status'])
\ No newline at end of file
+        self.save(update_fields=['amount_paid', 'status'])
+
+
+class ExportWatermark(models.Model):
+    """
+    Export Watermark
+    High-water mark of an incremental finance export feed
+    """
+    
+    dataset = models.CharField(max_length=50)
+    feed = models.CharField(max_length=50, default='default')
+    exported_until = models.DateTimeField(null=True, blank=True, help_text="Rows changed up to this time have been exported")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_row_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'export_watermarks'
+        verbose_name = 'Export Watermark'
+        verbose_name_plural = 'Export Watermarks'
+        unique_together = ['dataset', 'feed']
+    
+    def __str__(self):
+        return f"{self.dataset}/{self.feed} @ {self.exported_until}"
+
+
+class ReconciliationRun(models.Model):
+    """
+    M-Pesa Reconciliation Run
+    Summary of one statement file reconciled against MpesaTransaction;
+    row-level findings are written to the report file
+    """
+    
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    dry_run = models.BooleanField(default=False)
+    
+    # Statement coverage
+    period_start = models.DateTimeField(null=True, blank=True)
+    period_end = models.DateTimeField(null=True, blank=True)
+    
+    # Counts
+    statement_rows = models.PositiveIntegerField(default=0)
+    transactions_checked = models.PositiveIntegerField(default=0)
+    matched_by_receipt = models.PositiveIntegerField(default=0)
+    matched_fuzzy = models.PositiveIntegerField(default=0)
+    unmatched_statement_rows = models.PositiveIntegerField(default=0)
+    unmatched_transactions = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    amount_mismatches = models.PositiveIntegerField(default=0)
+    corrected = models.PositiveIntegerField(default=0)
+    
+    report_path = models.CharField(max_length=500, blank=True)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'mpesa_reconciliation_runs'
+        verbose_name = 'M-Pesa Reconciliation Run'
+        verbose_name_plural = 'M-Pesa Reconciliation Runs'
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.source_name} ({self.status})"
+
+
+class FxRateSnapshot(models.Model):
+    """
+    FX Rate Snapshot
+    KES value of one unit of a currency from a given moment on; a payment
+    converts with the latest snapshot taken at or before it was created
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    currency = models.CharField(max_length=3)
+    kes_rate = models.DecimalField(max_digits=18, decimal_places=8, help_text="KES per unit of currency")
+    source = models.CharField(max_length=50)
+    effective_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'fx_rate_snapshots'
+        verbose_name = 'FX Rate Snapshot'
+        verbose_name_plural = 'FX Rate Snapshots'
+        unique_together = ['currency', 'effective_at']
+        ordering = ['-effective_at']
+    
+    def __str__(self):
+        return f"1 {self.currency} = {self.kes_rate} KES @ {self.effective_at}"
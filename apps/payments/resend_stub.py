@@ -0,0 +1,103 @@
+"""
+Local Resend API stub for FlexiFinance
+Accepts email sends and domain lookups, for benchmarks and runs without Resend
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class ResendStub:
+    """
+    In-process Resend stub
+
+    POST /emails answers 200 with an id (or 500 for the failing share) and
+    keeps the sent messages; GET /domains answers an empty list
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+        latency (float): Seconds added to every response
+        failure_rate (float): Share of sends answered with a 500
+        seed (int): Random seed for reproducible failures
+    """
+
+    def __init__(self, host='127.0.0.1', port=8768, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.sent = []
+        self.requests_received = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='resend-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send(self, message):
+        """Record a send; returns (status, body)"""
+        with self._lock:
+            self.requests_received += 1
+            if self.random.random() < self.failure_rate:
+                return 500, {'name': 'internal_server_error', 'message': 'Stub failure'}
+            self.sent.append(message)
+        return 200, {'id': str(uuid.uuid4())}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(f"Resend stub: {format % args}")
+
+            def _reply(self, status, payload):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/domains':
+                    return self._reply(200, {'data': []})
+                self._reply(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    message = json.loads(self.rfile.read(length) or b'null')
+                except ValueError:
+                    return self._reply(422, {'message': 'Invalid JSON'})
+                if self.path.rstrip('/') != '/emails':
+                    return self._reply(404, {'message': 'Not found'})
+                self._reply(*stub.send(message))
+
+        return Handler
@@ -0,0 +1,449 @@
+"""
+Disbursement Service for FlexiFinance
+Bulk M-Pesa B2C disbursement of approved loans under a rate limit and daily float cap
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, Func, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.loans.models import Loan
+from apps.loans.services.bulk_action_service import bulk_action_service
+from apps.payments.models import MpesaCallbackArchive, MpesaTransaction, Payment
+from apps.payments.services.mpesa_service import MpesaService
+from apps.payments.services.payment_state_service import payment_state_service
+
+logger = logging.getLogger(__name__)
+
+# Disbursement payments that are in flight or done (a loan with one is not picked again)
+OPEN_STATUSES = ['PENDING', 'PROCESSING', 'COMPLETED']
+
+# Statuses a result callback may settle (a failed or cancelled disbursement
+# may already have been retried, so a late success is left to reconciliation)
+IN_FLIGHT_STATUSES = ['PENDING', 'PROCESSING']
+
+# First key of the per-day advisory lock on the disbursement float
+FLOAT_LOCK_NAMESPACE = 0x46464446  # 'FFDF'
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly at a fixed rate per second"""
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DisbursementService:
+    """
+    Disbursement Service
+    Approved loans are claimed in batches and their DISBURSEMENT Payment and
+    MpesaTransaction rows created with bulk_create before any money moves.
+    B2C requests are then sent from a thread pool (HTTP only; all database
+    writes happen set-wise afterwards). Result callbacks are matched on
+    Daraja's ConversationID (or on our own OriginatorConversationID where
+    Daraja echoes it) and applied exactly once, and completed disbursements
+    move their loans to DISBURSED through the bulk transition path
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DISBURSEMENT_CONFIG', {})
+        self.batch_size = config.get('BATCH_SIZE', 200)
+        self.concurrency = config.get('CONCURRENCY', 8)
+        self.rate_per_second = config.get('RATE_PER_SECOND', 10)
+        self.daily_float_cap = Decimal(str(config.get('DAILY_FLOAT_CAP', 5000000)))
+        self.max_attempts = config.get('MAX_ATTEMPTS', 3)
+        self.unsent_timeout = config.get('UNSENT_TIMEOUT_SECONDS', 600)
+        self.mpesa_service = MpesaService()
+
+    def lock_float(self):
+        """
+        Serialize float accounting for today until the current transaction ends
+
+        Without it two batches could both read the same float used and together
+        overshoot the cap. Takes a transaction-scoped advisory lock keyed on the
+        date on PostgreSQL; SQLite already serializes writing transactions
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(%s, %s)',
+                    [FLOAT_LOCK_NAMESPACE, timezone.localdate().toordinal()]
+                )
+
+    def float_used_today(self):
+        """KES committed to disbursements created today (pending, in flight or paid)"""
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), dt_time.min))
+        return Payment.objects.filter(
+            payment_type='DISBURSEMENT', created_at__gte=start, status__in=OPEN_STATUSES
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+
+    def claimable_loans(self):
+        """
+        Approved loans with no open disbursement and retries left, row-locked
+        (skipping rows another worker holds), oldest approval first
+
+        Must be evaluated inside a transaction
+        """
+        open_disbursement = Payment.objects.filter(
+            loan=OuterRef('pk'), payment_type='DISBURSEMENT', status__in=OPEN_STATUSES
+        )
+        # A correlated count rather than a join + Count: PostgreSQL rejects
+        # FOR UPDATE on a query with GROUP BY
+        failed_disbursements = Payment.objects.filter(
+            loan=OuterRef('pk'), payment_type='DISBURSEMENT', status='FAILED'
+        ).order_by().annotate(count=Func(F('pk'), function='COUNT', output_field=IntegerField())).values('count')
+        return (
+            Loan.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('user')
+            .filter(status='APPROVED')
+            .exclude(Exists(open_disbursement))
+            .alias(failed_attempts=Coalesce(Subquery(failed_disbursements), 0))
+            .filter(failed_attempts__lt=self.max_attempts)
+            .order_by('approval_date')
+        )
+
+    def prepare_batch(self, limit=None):
+        """
+        Claim approved loans and create their disbursement rows
+
+        Loans are taken oldest approval first until the batch is full or the
+        next loan would exceed today's remaining float
+
+        Returns:
+            list: MpesaTransaction rows created (status PENDING)
+        """
+        limit = limit or self.batch_size
+        with transaction.atomic():
+            # Held until the disbursements below are committed, so the next
+            # batch sees them in its float used
+            self.lock_float()
+            remaining_float = self.daily_float_cap - self.float_used_today()
+            if remaining_float <= 0:
+                return []
+
+            loans = list(self.claimable_loans()[:limit])
+
+            now = timezone.now()
+            transactions, payments = [], []
+            for loan in loans:
+                # The processing fee is deducted from the amount sent
+                amount = loan.principal_amount - (loan.processing_fee or Decimal('0.00'))
+                if amount > remaining_float:
+                    break
+                remaining_float -= amount
+                mpesa_transaction = MpesaTransaction(
+                    user_id=loan.user_id,
+                    transaction_type='DISBURSEMENT',
+                    amount=amount,
+                    phone_number=loan.user.phone_number,
+                    # For B2C, merchant_request_id holds our OriginatorConversationID
+                    merchant_request_id=f'FFD-{uuid.uuid4().hex}',
+                    status='PENDING',
+                    initiated_at=now
+                )
+                transactions.append(mpesa_transaction)
+                payment = Payment(
+                    user_id=loan.user_id,
+                    loan=loan,
+                    payment_type='DISBURSEMENT',
+                    amount=amount,
+                    description=f'Disbursement of loan {loan.loan_reference}',
+                    phone_number=loan.user.phone_number,
+                    mpesa_transaction=mpesa_transaction,
+                    metadata={'loan_reference': loan.loan_reference},
+                    created_at=now
+                )
+                payment.generate_reference_number()
+                payments.append(payment)
+
+            MpesaTransaction.objects.bulk_create(transactions)
+            Payment.objects.bulk_create(payments)
+        if transactions:
+            logger.info(f"Prepared {len(transactions)} disbursements ({self.daily_float_cap - remaining_float} KES of today's float used)")
+        return transactions
+
+    def submit(self, transactions):
+        """
+        Send B2C requests concurrently and record the responses set-wise
+
+        The batch is moved to PROCESSING before any request goes out, so a
+        row still PENDING was never sent (see sweep_unsent). Only a
+        definitive rejection from Daraja fails a disbursement (and lets its
+        loan be retried). When the outcome is unknown (timeout or
+        lost connection after sending) the money may already be on its way,
+        so the rows stay PROCESSING until reconciliation (or a result
+        callback that can be matched to them) settles them
+
+        Returns:
+            dict: {'accepted': n, 'rejected': n, 'unknown': n}
+        """
+        if not transactions:
+            return {'accepted': 0, 'rejected': 0, 'unknown': 0}
+
+        with transaction.atomic():
+            claimed = set(payment_state_service.transition_returning(
+                MpesaTransaction.objects.filter(pk__in=[mpesa_transaction.pk for mpesa_transaction in transactions]),
+                'PROCESSING', expected='PENDING'
+            ))
+            payment_state_service.transition(
+                Payment.objects.filter(mpesa_transaction__in=claimed), 'PROCESSING', expected='PENDING'
+            )
+        # Rows the sweep cancelled in the meantime are not sent
+        transactions = [mpesa_transaction for mpesa_transaction in transactions if mpesa_transaction.pk in claimed]
+
+        limiter = RateLimiter(self.rate_per_second)
+
+        def send(mpesa_transaction):
+            limiter.wait()
+            return self.mpesa_service.b2c_payment(
+                phone_number=mpesa_transaction.phone_number,
+                amount=mpesa_transaction.amount,
+                remarks='Loan disbursement',
+                occasion=mpesa_transaction.merchant_request_id,
+                originator_conversation_id=mpesa_transaction.merchant_request_id
+            )
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='b2c') as pool:
+            results = list(pool.map(send, transactions))
+
+        accepted, rejected, unknown, failures = [], [], [], []
+        for mpesa_transaction, result in zip(transactions, results):
+            if result.get('unknown'):
+                mpesa_transaction.result_desc = f"Outcome unknown: {result.get('error') or 'no response'}"[:255]
+                unknown.append(mpesa_transaction)
+            elif result.get('success'):
+                # For B2C, checkout_request_id holds Daraja's ConversationID
+                mpesa_transaction.checkout_request_id = result.get('conversation_id')
+                accepted.append(mpesa_transaction)
+            else:
+                failures.append((mpesa_transaction.pk, 'FAILED', {
+                    'result_desc': (result.get('error') or 'B2C request failed')[:255],
+                }))
+                rejected.append(mpesa_transaction.pk)
+
+        with transaction.atomic():
+            payment_state_service.transition_many(MpesaTransaction, failures)
+            MpesaTransaction.objects.bulk_update(accepted, ['checkout_request_id'])
+            # Not over the description of a result that already closed the row
+            MpesaTransaction.objects.filter(status='PROCESSING').bulk_update(unknown, ['result_desc'])
+            payment_state_service.transition(Payment.objects.filter(mpesa_transaction__in=rejected), 'FAILED')
+        if transactions:
+            self.apply_early_results(min(mpesa_transaction.initiated_at for mpesa_transaction in transactions))
+        if unknown:
+            logger.warning(f"{len(unknown)} B2C disbursements have an unknown outcome; held in PROCESSING for their result")
+        logger.info(f"B2C disbursements submitted: {len(accepted)} accepted, {len(rejected)} rejected, {len(unknown)} unknown")
+        return {'accepted': len(accepted), 'rejected': len(rejected), 'unknown': len(unknown)}
+
+    def sweep_unsent(self):
+        """
+        Cancel disbursements that were prepared but never sent
+
+        prepare_batch() commits PENDING rows before submit() runs, so a crash
+        in between would otherwise hold their loans and today's float for
+        good. submit() moves rows to PROCESSING before sending anything, so a
+        row still PENDING after UNSENT_TIMEOUT_SECONDS was never sent.
+        Cancelling rather than failing it frees the loan without using up one
+        of its attempts
+
+        Returns:
+            int: Disbursements cancelled
+        """
+        cutoff = timezone.now() - timedelta(seconds=self.unsent_timeout)
+        with transaction.atomic():
+            transaction_ids = payment_state_service.transition_returning(
+                MpesaTransaction.objects.filter(
+                    transaction_type='DISBURSEMENT', checkout_request_id__isnull=True, initiated_at__lt=cutoff
+                ),
+                'CANCELLED', expected='PENDING', result_desc='Never sent'
+            )
+            if transaction_ids:
+                payment_state_service.transition(
+                    Payment.objects.filter(mpesa_transaction__in=transaction_ids), 'CANCELLED', expected='PENDING'
+                )
+        if transaction_ids:
+            logger.warning(f"Cancelled {len(transaction_ids)} disbursements that were prepared but never sent")
+        return len(transaction_ids)
+
+    def handle_result(self, callback_data, archive_unmatched=True, queue_timeout=False):
+        """
+        Apply a B2C result (or queue timeout) callback
+
+        Idempotent: only a transaction still in flight is updated, so a
+        repeated callback is acknowledged without changing anything. A
+        queue timeout only says Daraja has not processed the request yet,
+        so it is recorded without failing the disbursement (failing it would
+        release the loan for a second payment while the first may still go
+        through)
+
+        Args:
+            callback_data (dict): Callback body
+            archive_unmatched (bool): Keep a result no transaction matches yet
+                (it may have beaten submit() to recording the ConversationID)
+            queue_timeout (bool): The callback came to the QueueTimeOutURL
+
+        Returns:
+            dict: {'success': bool, 'duplicate': bool, ...}
+        """
+        result = callback_data.get('Result') if isinstance(callback_data, dict) else None
+        if not result:
+            return {'success': False, 'error': 'Invalid callback format'}
+
+        originator_id = result.get('OriginatorConversationID')
+        conversation_id = result.get('ConversationID')
+        if not (originator_id or conversation_id):
+            # Never look a transaction up by a missing id (that would be an IS NULL filter)
+            return {'success': False, 'error': 'Invalid callback format'}
+        # The v1 API ignores the OriginatorConversationID we send and reports
+        # one of its own, so the ConversationID from the response is the
+        # reliable key; ours only matches where Daraja echoes it back
+        lookup = Q()
+        if originator_id:
+            lookup |= Q(merchant_request_id=originator_id)
+        if conversation_id:
+            lookup |= Q(checkout_request_id=conversation_id)
+        result_code = str(result.get('ResultCode', ''))
+        parameters = {
+            item.get('Key'): item.get('Value')
+            for item in (result.get('ResultParameters') or {}).get('ResultParameter', [])
+        }
+        receipt = parameters.get('TransactionReceipt') or result.get('TransactionID') or None
+
+        now = timezone.now()
+        target = 'COMPLETED' if result_code == '0' else 'FAILED'
+        values = {
+            'result_code': result_code,
+            'result_desc': (result.get('ResultDesc') or '')[:255],
+            'callback_received': True,
+            'callback_received_at': now,
+        }
+        if result_code == '0' and receipt:
+            values['mpesa_receipt'] = receipt
+
+        matches = MpesaTransaction.objects.filter(lookup, transaction_type='DISBURSEMENT')
+        with transaction.atomic():
+            if queue_timeout:
+                timed_out = list(matches.filter(status__in=IN_FLIGHT_STATUSES).values_list('pk', flat=True))
+                MpesaTransaction.objects.filter(pk__in=timed_out).update(
+                    result_code=result_code, result_desc=f"Queue timeout: {values['result_desc']}"[:255], updated_at=now
+                )
+                MpesaCallbackArchive.objects.bulk_create([
+                    MpesaCallbackArchive.build(transaction_id, 'B2C', callback_data, now) for transaction_id in timed_out
+                ])
+                if timed_out:
+                    logger.warning(f"B2C queue timeout for {originator_id or conversation_id}; held in PROCESSING for its result")
+                return {'success': True, 'duplicate': not timed_out, 'result_code': result_code}
+
+            transaction_ids = payment_state_service.transition_returning(
+                matches, target, expected=IN_FLIGHT_STATUSES, **values
+            )
+            if not transaction_ids:
+                closed = list(matches.values_list('pk', 'status'))
+                if not closed:
+                    logger.error(f"B2C result for unknown transaction {originator_id or conversation_id}")
+                    if archive_unmatched:
+                        MpesaCallbackArchive.record(None, 'B2C', callback_data, now)
+                    return {'success': False, 'error': 'Transaction not found'}
+                if target == 'COMPLETED' and any(status != 'COMPLETED' for _, status in closed):
+                    # The loan may already have been paid again; never settle this automatically
+                    logger.error(
+                        f"B2C success {receipt} for closed disbursement {originator_id or conversation_id}; "
+                        f"needs reconciliation"
+                    )
+                    MpesaCallbackArchive.objects.bulk_create([
+                        MpesaCallbackArchive.build(transaction_id, 'B2C', callback_data, now)
+                        for transaction_id, status in closed if status != 'COMPLETED'
+                    ])
+                    return {'success': True, 'duplicate': False, 'conflict': True, 'receipt_number': receipt}
+                return {'success': True, 'duplicate': True}
+
+            MpesaCallbackArchive.objects.bulk_create([
+                MpesaCallbackArchive.build(transaction_id, 'B2C', callback_data, now) for transaction_id in transaction_ids
+            ])
+            payments = Payment.objects.filter(mpesa_transaction__in=transaction_ids)
+            if result_code == '0':
+                payment_state_service.transition(
+                    payments, 'COMPLETED', expected=IN_FLIGHT_STATUSES, receipt_number=receipt
+                )
+                loan_ids = list(payments.exclude(loan=None).values_list('loan_id', flat=True))
+                self.advance_disbursed_loans(loan_ids)
+            else:
+                payment_state_service.transition(payments, 'FAILED')
+        return {'success': True, 'duplicate': False, 'result_code': result_code, 'receipt_number': receipt}
+
+    def apply_early_results(self, since):
+        """
+        Re-apply B2C results that arrived before their ConversationID was recorded
+
+        Args:
+            since (datetime): Only results received from this time on
+
+        Returns:
+            int: Results applied
+        """
+        early = list(MpesaCallbackArchive.objects.filter(
+            transaction=None, callback_type='B2C', received_at__gte=since
+        ).values_list('pk', flat=True))
+        applied = 0
+        for archive in MpesaCallbackArchive.objects.filter(pk__in=early).iterator():
+            if self.handle_result(archive.data, archive_unmatched=False)['success']:
+                applied += 1
+        if applied:
+            logger.info(f"Applied {applied} B2C results that arrived before their request was recorded")
+        return applied
+
+    def advance_disbursed_loans(self, loan_ids=None):
+        """
+        Move approved loans whose disbursement completed to DISBURSED
+
+        Args:
+            loan_ids (list): Only these loans (all with a completed disbursement otherwise)
+
+        Returns:
+            int: Loans transitioned
+        """
+        paid = Payment.objects.filter(payment_type='DISBURSEMENT', status='COMPLETED', loan__status='APPROVED')
+        if loan_ids is not None:
+            paid = paid.filter(loan_id__in=loan_ids)
+        ids = list(paid.values_list('loan_id', flat=True).distinct())
+        if not ids:
+            return 0
+        return bulk_action_service.transition_loans(ids, 'DISBURSED')
+
+    def run_batch(self, limit=None):
+        """
+        One engine cycle: cancel abandoned batches, prepare, submit, then sweep
+        completed disbursements
+
+        Returns:
+            dict: {'cancelled': n, 'prepared': n, 'accepted': n, 'rejected': n, 'unknown': n, 'disbursed': n}
+        """
+        cancelled = self.sweep_unsent()
+        transactions = self.prepare_batch(limit)
+        result = self.submit(transactions)
+        result['cancelled'] = cancelled
+        result['prepared'] = len(transactions)
+        result['disbursed'] = self.advance_disbursed_loans()
+        return result
+
+
+# Global service instance
+disbursement_service = DisbursementService()
@@ -0,0 +1,335 @@
+"""
+FX Rate Service for FlexiFinance
+Cached exchange rates from a pluggable source, triangulated through KES, with historical snapshots
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from apps.payments.models import FxRateSnapshot
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = 'KES'
+CENTS = Decimal('0.01')
+
+# A failed refresh keeps the current rates this long before the next attempt
+RETRY_SECONDS = 30
+
+
+def parse_rates(payload):
+    """
+    KES value of each currency from a rates document
+
+    The document follows the usual provider shape, units of each currency
+    per one unit of base: {"base": "USD", "timestamp": 1700000000,
+    "rates": {"KES": 132.5, "EUR": 0.92}}. A non-KES base must quote KES
+
+    Returns:
+        tuple: ({currency: Decimal KES per unit}, effective_at)
+    """
+    base = (payload.get('base') or BASE_CURRENCY).upper()
+    quotes = {code.upper(): Decimal(str(rate)) for code, rate in payload['rates'].items()}
+    quotes[base] = Decimal('1')
+    kes_per_base = quotes[BASE_CURRENCY]
+    rates = {code: kes_per_base / rate for code, rate in quotes.items() if rate > 0}
+    rates[BASE_CURRENCY] = Decimal('1')
+
+    timestamp = payload.get('timestamp')
+    effective_at = datetime.fromtimestamp(timestamp, dt_timezone.utc) if timestamp else timezone.now()
+    return rates, effective_at
+
+
+class StaticRateSource:
+    """Fixed KES rates from settings"""
+    name = 'static'
+
+    def __init__(self, rates):
+        self.rates = rates
+
+    def fetch(self):
+        rates = {code.upper(): Decimal(str(rate)) for code, rate in self.rates.items()}
+        rates[BASE_CURRENCY] = Decimal('1')
+        return rates, timezone.now()
+
+
+class FileRateSource:
+    """Rates document read from a local JSON file"""
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path, encoding='utf-8') as handle:
+            return parse_rates(json.load(handle))
+
+
+class HttpRateSource:
+    """Rates document fetched from an HTTP provider (or the local FX stub)"""
+    name = 'http'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self):
+        response = self.session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return parse_rates(response.json())
+
+
+class FxRateService:
+    """
+    FX Rate Service
+    Rates are held in process as KES per unit of each currency, so any pair
+    converts through KES with one division. Within TTL_SECONDS the cached
+    rates are served as they are; up to STALE_SECONDS they are still served
+    while one background thread refreshes them, and only older (or missing)
+    rates make a caller wait on the source. Each change of rate is stored as
+    an FxRateSnapshot, which is what historical payments convert with
+    """
+
+    def __init__(self, source=None):
+        config = getattr(settings, 'FX_CONFIG', {})
+        self.ttl = config.get('TTL_SECONDS', 300)
+        self.stale = max(config.get('STALE_SECONDS', 3600), self.ttl)
+        self.fallback_rates = config.get('FALLBACK_RATES', {})
+        self.source = source or self._build_source(config)
+        self._lock = threading.Lock()
+        self._rates = None
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._stored = None
+
+    def _build_source(self, config):
+        source = config.get('SOURCE', 'static')
+        if source == 'file':
+            return FileRateSource(config['FILE_PATH'])
+        if source == 'http':
+            return HttpRateSource(config['URL'], config.get('TIMEOUT_SECONDS', 5))
+        return StaticRateSource(self.fallback_rates)
+
+    def rates(self):
+        """
+        Current KES value of each known currency
+
+        Returns:
+            dict: {currency: Decimal KES per unit}, including KES itself
+        """
+        rates, age = self._rates, time.monotonic() - self._fetched_at
+        if rates is not None and age < self.ttl:
+            return rates
+        if rates is not None and age < self.stale:
+            self._refresh_in_background()
+            return rates
+        return self.refresh()
+
+    def refresh(self):
+        """
+        Load rates from the source now and snapshot any that changed
+
+        A failing source leaves the cached rates (or the fallback rates)
+        in place
+
+        Returns:
+            dict: Current rates
+        """
+        try:
+            rates, effective_at = self.source.fetch()
+        except (OSError, ValueError, KeyError, ArithmeticError, requests.exceptions.RequestException) as e:
+            logger.warning(f"FX rate refresh from {self.source.name} source failed: {e}")
+            with self._lock:
+                if self._rates is None:
+                    self._rates = StaticRateSource(self.fallback_rates).fetch()[0]
+                self._fetched_at = time.monotonic() - self.ttl + min(RETRY_SECONDS, self.ttl)
+                return self._rates
+
+        try:
+            self._record(rates, effective_at)
+        except Exception as e:
+            logger.error(f"Could not store FX rate snapshots: {e}")
+        with self._lock:
+            self._rates = rates
+            self._fetched_at = time.monotonic()
+        return rates
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+                connections.close_all()
+
+        threading.Thread(target=run, name='fx-refresh', daemon=True).start()
+
+    def _record(self, rates, effective_at):
+        """Store a snapshot for every currency whose rate differs from its latest one"""
+        if self._stored is None:
+            self._stored = {}
+            for code in rates:
+                latest = FxRateSnapshot.objects.filter(currency=code).values_list('kes_rate', flat=True).first()
+                if latest is not None:
+                    self._stored[code] = latest
+
+        quantum = Decimal('0.00000001')
+        changed = {
+            code: rate.quantize(quantum) for code, rate in rates.items()
+            if code != BASE_CURRENCY and self._stored.get(code) != rate.quantize(quantum)
+        }
+        if not changed:
+            return
+        FxRateSnapshot.objects.bulk_create([
+            FxRateSnapshot(currency=code, kes_rate=rate, source=self.source.name, effective_at=effective_at)
+            for code, rate in changed.items()
+        ], ignore_conflicts=True)
+        self._stored.update(changed)
+        logger.info(f"Stored FX snapshots for {', '.join(sorted(changed))} from {self.source.name} source")
+
+    def rate_at(self, currency, at):
+        """
+        KES per unit of a currency as of a past moment
+
+        Uses the latest snapshot taken at or before at, or the current rate
+        when no snapshot is that old
+
+        Returns:
+            Decimal: KES per unit
+        """
+        currency = currency.upper()
+        if currency == BASE_CURRENCY:
+            return Decimal('1')
+        snapshot = FxRateSnapshot.objects.filter(
+            currency=currency, effective_at__lte=at
+        ).values_list('kes_rate', flat=True).first()
+        if snapshot is not None:
+            return snapshot
+        return self._kes_rate(self.rates(), currency)
+
+    def _kes_rate(self, rates, currency):
+        try:
+            return rates[currency]
+        except KeyError:
+            raise ValueError(f"No exchange rate for {currency}")
+
+    def get_rate(self, from_currency, to_currency, at=None):
+        """
+        Exchange rate between two currencies, triangulated through KES
+
+        Args:
+            from_currency (str): Source currency
+            to_currency (str): Target currency
+            at (datetime): Use the rates that applied then (current rates when None)
+
+        Returns:
+            Decimal: Units of to_currency per unit of from_currency
+
+        Raises:
+            ValueError: If either currency has no rate
+        """
+        from_currency, to_currency = from_currency.upper(), to_currency.upper()
+        if from_currency == to_currency:
+            return Decimal('1')
+        if at is not None:
+            return self.rate_at(from_currency, at) / self.rate_at(to_currency, at)
+        rates = self.rates()
+        return self._kes_rate(rates, from_currency) / self._kes_rate(rates, to_currency)
+
+    def convert(self, amount, from_currency, to_currency, at=None):
+        """
+        Convert an amount, rounded to cents
+
+        Returns:
+            Decimal: Converted amount
+        """
+        if from_currency.upper() == to_currency.upper():
+            return amount
+        rate = self.get_rate(from_currency, to_currency, at)
+        return (Decimal(amount) * rate).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+    def convert_many(self, amounts, currencies, to_currency, at=None):
+        """
+        Convert a column of amounts at once (for reports)
+
+        Rates are looked up once per currency; with at, each currency's
+        snapshot history for the covered period is loaded in one query and
+        matched to the rows with a binary search
+
+        Args:
+            amounts (sequence): Amounts
+            currencies (str or sequence): One currency for all rows, or one per row
+            to_currency (str): Target currency
+            at (sequence): Per-row datetimes to convert as of (current rates when None)
+
+        Returns:
+            numpy.ndarray: Converted amounts as floats, rounded to cents
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if isinstance(currencies, str):
+            currencies = [currencies] * len(amounts)
+        codes, inverse = np.unique(np.char.upper(np.asarray(currencies, dtype='U3')), return_inverse=True)
+        times = None
+        if at is not None:
+            at = list(at)
+            times = np.array([moment.timestamp() for moment in at], dtype=np.float64)
+            period = (min(at), max(at))
+
+        def kes_values(code, rows):
+            count = int(rows.sum())
+            if code == BASE_CURRENCY:
+                return np.ones(count)
+            current = float(self._kes_rate(self.rates(), code))
+            history = self._history(code, *period) if times is not None else None
+            if history is None:
+                return np.full(count, current)
+            stamps, rates = history
+            positions = np.searchsorted(stamps, times[rows], side='right') - 1
+            # Rows older than every snapshot take the current rate, as in rate_at
+            return np.where(positions >= 0, rates[np.clip(positions, 0, None)], current)
+
+        values = np.empty(len(amounts), dtype=np.float64)
+        for index, code in enumerate(codes):
+            rows = inverse == index
+            values[rows] = kes_values(str(code), rows)
+        values /= kes_values(to_currency.upper(), np.ones(len(amounts), dtype=bool))
+        return np.round(amounts * values, 2)
+
+    def _history(self, currency, start, end):
+        """
+        Snapshot series covering [start, end]: the last snapshot before start and all after it
+
+        Returns:
+            tuple or None: (timestamps, rates) as float arrays, oldest first
+        """
+        first = FxRateSnapshot.objects.filter(
+            currency=currency, effective_at__lte=start
+        ).values_list('effective_at', flat=True).first() or start
+        series = list(FxRateSnapshot.objects.filter(
+            currency=currency, effective_at__gte=first, effective_at__lte=end
+        ).order_by('effective_at').values_list('effective_at', 'kes_rate'))
+        if not series:
+            return None
+        return (
+            np.array([moment.timestamp() for moment, _ in series], dtype=np.float64),
+            np.array([float(rate) for _, rate in series], dtype=np.float64),
+        )
+
+
+# Global service instance
+fx_rate_service = FxRateService()
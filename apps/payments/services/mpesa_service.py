@@ -10,8 +10,11 @@ from datetime import datetime
 from django.conf import settings
 from django.urls import reverse
 from urllib.parse import urlencode
+import threading
 import time
 
+from apps.core.services.metrics_service import metrics_service
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,17 +31,36 @@ class MpesaService:
         self.shortcode = settings.MPESA_CONFIG.get('SHORTCODE')
         self.environment = settings.MPESA_CONFIG.get('ENVIRONMENT', 'sandbox')
         
-        if self.environment == 'production':
+        self.timeout = settings.MPESA_CONFIG.get('REQUEST_TIMEOUT', 30)
+        
+        if settings.MPESA_CONFIG.get('BASE_URL'):
+            # Local Daraja stub or another non-Safaricom endpoint
+            self.base_url = settings.MPESA_CONFIG['BASE_URL'].rstrip('/')
+        elif self.environment == 'production':
             self.base_url = 'https://api.safaricom.co.ke'
-            self.oauth_url = 'https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
         else:
             self.base_url = 'https://sandbox.safaricom.co.ke'
-            self.oauth_url = 'https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials'
+        self.oauth_url = f'{self.base_url}/oauth/v1/generate?grant_type=client_credentials'
+        
+        # Access tokens are valid for an hour; concurrent B2C workers share one
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
     
     def get_access_token(self):
         """
-        Generate M-Pesa access token
+        Generate M-Pesa access token (cached until shortly before it expires)
         """
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            token, expires_in = self._request_access_token()
+            if token:
+                self._token = token
+                self._token_expires_at = time.monotonic() + max(int(expires_in) - 60, 0)
+            return token
+    
+    def _request_access_token(self):
         try:
             # Create credentials string
             credentials = f"{self.consumer_key}:{self.consumer_secret}"
@@ -48,18 +70,19 @@ class MpesaService:
                 'Authorization': f'Basic {encoded_credentials}'
             }
             
-            response = requests.get(self.oauth_url, headers=headers)
+            with metrics_service.external_call('mpesa', 'oauth'):
+                response = requests.get(self.oauth_url, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
-            return data['access_token']
+            return data['access_token'], data.get('expires_in', 3599)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to get M-Pesa access token: {e}")
-            return None
+            return None, 0
         except KeyError as e:
             logger.error(f"Invalid token response: {e}")
-            return None
+            return None, 0
     
     def initiate_stk_push(self, phone_number, amount, reference, description, callback_url=None):
         """
@@ -107,9 +130,11 @@ class MpesaService:
             
             # Make request to M-Pesa
             stk_push_url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
-            response = requests.post(stk_push_url, json=data, headers=headers)
+            with metrics_service.external_call('mpesa', 'stk_push'):
+                response = requests.post(stk_push_url, json=data, headers=headers)
             
-            logger.info(f"STK Push request sent: {data}")
+            logger.info("STK Push request sent for %s (KES %s)", reference, amount)
+            logger.debug("STK Push payload: %s", data)
             
             if response.status_code == 200:
                 result = response.json()
@@ -148,7 +173,7 @@ class MpesaService:
         This is called when M-Pesa sends payment confirmation
         """
         try:
-            logger.info(f"Processing M-Pesa callback: {callback_data}")
+            logger.debug("Processing M-Pesa callback: %s", callback_data)
             
             if 'Body' not in callback_data or 'stkCallback' not in callback_data['Body']:
                 logger.error("Invalid callback data format")
@@ -173,37 +198,14 @@ class MpesaService:
                 logger.error(f"Transaction not found for checkout_request_id: {checkout_request_id}")
                 return {'success': False, 'error': 'Transaction not found'}
             
-            # Process callback
-            transaction.process_callback(callback_data)
-            
-            # Extract payment details from callback
-            amount = None
-            receipt_number = None
-            transaction_date = None
-            
-            if 'CallbackMetadata' in stk_callback:
-                metadata = stk_callback['CallbackMetadata']
-                for item in metadata.get('Item', []):
-                    item_name = item.get('Name', '')
-                    item_value = item.get('Value', '')
-                    
-                    if item_name == 'Amount':
-                        amount = item_value
-                    elif item_name == 'MpesaReceiptNumber':
-                        receipt_number = item_value
-                    elif item_name == 'TransactionDate':
-                        transaction_date = item_value
-            
-            # Update transaction with extracted data
-            if amount:
-                try:
-                    transaction.amount = float(amount)
-                except (ValueError, TypeError):
-                    pass
-            
-            transaction.save()
-            
-            logger.info(f"Processed callback for transaction {transaction.id}: {result_desc}")
+            # Process callback (a repeated callback finds the transaction already final)
+            if not transaction.process_callback(callback_data):
+                logger.info(f"Callback for transaction {transaction.id} left it unchanged ({transaction.status})")
+                return {'success': True, 'duplicate': True, 'transaction_id': str(transaction.id)}
+            amount = transaction.amount
+            receipt_number = transaction.mpesa_receipt
+            
+            logger.info("Processed callback for transaction %s: %s", transaction.id, result_desc)
             
             # Trigger any post-payment processing
             self._post_payment_processing(transaction)
@@ -242,9 +244,12 @@ class MpesaService:
         """
         Get the appropriate callback URL
         """
+        if callback_type == 'b2c' and settings.MPESA_CONFIG.get('B2C_RESULT_URL'):
+            return settings.MPESA_CONFIG['B2C_RESULT_URL']
+        
         # Get the base URL from settings or request
-        from django.contrib.sites.models import Site
         try:
+            from django.contrib.sites.models import Site
             current_site = Site.objects.get_current()
             base_url = f"https://{current_site.domain}"
         except:
@@ -265,18 +270,21 @@ class MpesaService:
         Handle post-payment processing
         This can be extended to trigger additional actions
         """
+        from apps.payments.models import Payment
+        from apps.payments.services.payment_state_service import payment_state_service
+        
         try:
-            # Update payment status if linked to a payment
-            if hasattr(transaction, 'payment') and transaction.payment:
-                payment = transaction.payment
-                
-                if transaction.status == 'COMPLETED':
-                    payment.mark_completed(transaction.mpesa_receipt)
-                    
+            # Move the linked payment in the same way (one conditional UPDATE)
+            payments = Payment.objects.filter(mpesa_transaction=transaction)
+            if transaction.status == 'COMPLETED':
+                moved = payment_state_service.transition_returning(
+                    payments, 'COMPLETED', receipt_number=transaction.mpesa_receipt
+                )
+                for payment in Payment.objects.filter(pk__in=moved):
                     # Trigger any business logic
                     self._handle_successful_payment(payment)
-                elif transaction.status == 'FAILED':
-                    payment.mark_failed()
+            elif transaction.status == 'FAILED':
+                payment_state_service.transition(payments, 'FAILED')
             
             # Log the transaction
             logger.info(f"Processed payment transaction {transaction.id} with status {transaction.status}")
@@ -313,8 +321,10 @@ class MpesaService:
         """
         Handle loan disbursement processing
         """
-        # This would integrate with loan models
-        # Update loan status, etc.
+        from apps.payments.services.disbursement_service import disbursement_service
+        
+        if payment.loan_id:
+            disbursement_service.advance_disbursed_loans([payment.loan_id])
         logger.info(f"Processing loan disbursement for payment {payment.id}")
     
     def _send_payment_notifications(self, payment):
@@ -361,7 +371,8 @@ class MpesaService:
             
             # Make status query request
             status_url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
-            response = requests.post(status_url, json=data, headers=headers)
+            with metrics_service.external_call('mpesa', 'stk_query'):
+                response = requests.post(status_url, json=data, headers=headers)
             
             if response.status_code == 200:
                 result = response.json()
@@ -382,10 +393,23 @@ class MpesaService:
             logger.error(f"Error querying transaction status: {e}")
             return {'success': False, 'error': str(e)}
     
-    def b2c_payment(self, phone_number, amount, remarks, occasion=None):
+    def b2c_payment(self, phone_number, amount, remarks, occasion=None, originator_conversation_id=None):
         """
         Send B2C payment (for loan disbursements)
+        
+        Args:
+            originator_conversation_id (str): Our id for the request. The v1
+                endpoint does not take it and reports an id of its own in the
+                response and result callback, so results are matched on the
+                returned ConversationID
+
+        Returns:
+            dict: success, or an error; 'unknown': True when the request may
+                have reached Daraja (timeout or lost connection after sending,
+                5xx, unreadable response), so the payment must not be retried
+                until its result callback or reconciliation settles it
         """
+        sent = False
         try:
             access_token = self.get_access_token()
             if not access_token:
@@ -408,10 +432,13 @@ class MpesaService:
                 "PartyA": self.shortcode,
                 "PartyB": clean_phone,
                 "Remarks": remarks,
-                "QueueTimeOutURL": callback_url,
+                # Marked so a queue timeout is not mistaken for a failed payment
+                "QueueTimeOutURL": f"{callback_url}{'&' if '?' in callback_url else '?'}timeout=1",
                 "ResultURL": callback_url,
                 "Occasion": occasion or remarks
             }
+            if originator_conversation_id:
+                data["OriginatorConversationID"] = originator_conversation_id
             
             headers = {
                 'Authorization': f'Bearer {access_token}',
@@ -419,8 +446,16 @@ class MpesaService:
             }
             
             b2c_url = f"{self.base_url}/mpesa/b2c/v1/paymentrequest"
-            response = requests.post(b2c_url, json=data, headers=headers)
+            sent = True
+            with metrics_service.external_call('mpesa', 'b2c'):
+                response = requests.post(b2c_url, json=data, headers=headers, timeout=self.timeout)
             
+            if response.status_code >= 500:
+                return {
+                    'success': False,
+                    'unknown': True,
+                    'error': f"B2C request failed with status {response.status_code}"
+                }
             if response.status_code == 200:
                 result = response.json()
                 
@@ -428,6 +463,7 @@ class MpesaService:
                     return {
                         'success': True,
                         'conversation_id': result.get('ConversationID'),
+                        'originator_conversation_id': result.get('OriginatorConversationID', originator_conversation_id),
                         'reference_id': result.get('ReferenceData', {}).get('ReferenceItem', [{}])[0].get('Reference'),
                         'response_description': result.get('ResponseDescription')
                     }
@@ -442,6 +478,10 @@ class MpesaService:
                     'error': f"B2C request failed with status {response.status_code}"
                 }
                 
-        except Exception as e:
+        except requests.exceptions.ConnectTimeout as e:
+            # Never connected, so nothing was sent
             logger.error(f"B2C payment error: {e}")
-            return {'success': False, 'error': str(e)}
\ No newline at end of file
+            return {'success': False, 'error': str(e)}
+        except Exception as e:
+            logger.error(f"B2C payment error{' (outcome unknown)' if sent else ''}: {e}")
+            return {'success': False, 'unknown': sent, 'error': str(e)}
\ No newline at end of file
@@ -3,13 +3,25 @@ Unified Payment Service for FlexiFinance
 Handles multiple payment methods: M-PESA and Stripe
 """
 import logging
-from decimal import Decimal
+from .fx_service import fx_rate_service
 from .mpesa_service import MpesaService
+from .payment_state_service import payment_state_service
 from .stripe_service import StripeService
 from django.conf import settings
+from apps.payments.models import Payment
 
 logger = logging.getLogger(__name__)
 
+# Display symbols by currency code
+CURRENCY_SYMBOLS = {
+    'usd': '$',
+    'eur': '€',
+    'gbp': '£',
+    'cad': 'C$',
+    'aud': 'A$',
+    'kes': 'KSh'
+}
+
 
 class PaymentService:
     """
@@ -100,14 +112,26 @@ class PaymentService:
         """
         Process Stripe payment
         
+        Creates the PaymentIntent and records a PENDING card payment carrying
+        its id as the confirmation code, which the webhook handlers settle
+        
         Args:
             amount (Decimal): Payment amount
             currency (str): Payment currency
-            **kwargs: Additional parameters
+            **kwargs: Additional parameters (user is required; loan and
+                payment_type describe what is being paid)
             
         Returns:
             dict: Stripe payment result
         """
+        user = kwargs.get('user')
+        if user is None:
+            return {
+                'success': False,
+                'payment_method': 'stripe',
+                'error': 'A user is required for card payments'
+            }
+        
         try:
             # Create payment intent
             metadata = kwargs.get('metadata', {})
@@ -124,9 +148,26 @@ class PaymentService:
             )
             
             if result.get('success'):
+                payment = Payment(
+                    user=user,
+                    loan=kwargs.get('loan'),
+                    payment_type=kwargs.get('payment_type', 'REPAYMENT'),
+                    amount=amount,
+                    currency=currency.upper(),
+                    description=metadata['description'],
+                    payment_method='STRIPE',
+                    status='PENDING',
+                    phone_number=user.phone_number or '',
+                    confirmation_code=result['payment_intent_id'],
+                    metadata=metadata
+                )
+                payment.generate_reference_number()
+                payment.save()
+                
                 return {
                     'success': True,
                     'payment_method': 'stripe',
+                    'payment_id': str(payment.id),
                     'client_secret': result.get('client_secret'),
                     'payment_intent_id': result.get('payment_intent_id'),
                     'status': result.get('status'),
@@ -194,50 +235,28 @@ class PaymentService:
         Returns:
             str: Formatted amount
         """
-        # Use Stripe service for formatting if available
-        try:
-            return self.stripe_service.format_amount(amount, currency)
-        except:
-            # Fallback formatting
-            currency_symbols = {
-                'usd': '$',
-                'eur': '€',
-                'gbp': '£',
-                'cad': 'C$',
-                'aud': 'A$',
-                'kes': 'KSh'
-            }
-            
-            symbol = currency_symbols.get(currency.lower(), currency.upper())
-            return f"{symbol}{amount:.2f}"
+        symbol = CURRENCY_SYMBOLS.get(currency.lower(), currency.upper())
+        return f"{symbol}{amount:.2f}"
     
-    def get_conversion_rate(self, from_currency, to_currency):
+    def get_conversion_rate(self, from_currency, to_currency, at=None):
         """
         Get exchange rate between currencies
-        In production, this would fetch real-time rates from an API
+        Rates come from the cached FX service and are triangulated through KES
         
         Args:
             from_currency (str): Source currency
             to_currency (str): Target currency
+            at (datetime): Use the rate that applied then (current rate when None)
             
         Returns:
             Decimal: Exchange rate (1 unit of from_currency equals X units of to_currency)
+            
+        Raises:
+            ValueError: If either currency has no rate
         """
-        # Simplified exchange rates - in production, use a real API
-        rates = {
-            ('usd', 'kes'): Decimal('132.50'),
-            ('eur', 'kes'): Decimal('142.80'),
-            ('gbp', 'kes'): Decimal('165.20'),
-            ('kes', 'usd'): Decimal('0.0075'),
-            ('kes', 'eur'): Decimal('0.0070'),
-            ('kes', 'gbp'): Decimal('0.0060'),
-            ('usd', 'eur'): Decimal('1.08'),
-            ('eur', 'usd'): Decimal('0.93'),
-        }
-        
-        return rates.get((from_currency.lower(), to_currency.lower()), Decimal('1'))
+        return fx_rate_service.get_rate(from_currency, to_currency, at)
     
-    def convert_amount(self, amount, from_currency, to_currency):
+    def convert_amount(self, amount, from_currency, to_currency, at=None):
         """
         Convert amount between currencies
         
@@ -245,15 +264,25 @@ class PaymentService:
             amount (Decimal): Amount to convert
             from_currency (str): Source currency
             to_currency (str): Target currency
+            at (datetime): Convert with the rate that applied then (current rate when None)
             
         Returns:
-            Decimal: Converted amount
+            Decimal: Converted amount, rounded to cents
         """
-        if from_currency.lower() == to_currency.lower():
-            return amount
+        return fx_rate_service.convert(amount, from_currency, to_currency, at)
+    
+    def convert_payment(self, payment, to_currency):
+        """
+        Convert a payment with the rate that applied when it was created
         
-        rate = self.get_conversion_rate(from_currency, to_currency)
-        return amount * rate
+        Args:
+            payment (Payment): Payment to convert
+            to_currency (str): Target currency
+            
+        Returns:
+            Decimal: Converted amount
+        """
+        return fx_rate_service.convert(payment.amount, payment.currency, to_currency, at=payment.created_at)
     
     def validate_payment_method(self, payment_method, currency):
         """
@@ -291,14 +320,18 @@ class PaymentService:
             # Log the callback
             logger.info(f"Processing M-PESA callback: {transaction_id}")
             
-            # Here you would typically:
-            # 1. Update payment record in database
-            # 2. Update loan/payment status
-            # 3. Send notifications
-            # 4. Update user balance
-            
-            # For now, we'll just log and return success
-            payment_status = 'completed' if status == '0' else 'failed'
+            # The account reference is the payment's reference number
+            succeeded = str(status) == '0'
+            payment_status = 'completed' if succeeded else 'failed'
+            updated = 0
+            if reference:
+                payments = Payment.objects.filter(reference_number=reference)
+                if succeeded:
+                    updated = payment_state_service.transition(
+                        payments, 'COMPLETED', receipt_number=transaction_id, confirmation_code=transaction_id
+                    )
+                else:
+                    updated = payment_state_service.transition(payments, 'FAILED')
             
             return {
                 'success': True,
@@ -306,6 +339,7 @@ class PaymentService:
                 'status': payment_status,
                 'amount': amount,
                 'phone_number': phone_number,
+                'payments_updated': updated,
                 'message': 'M-PESA callback processed successfully'
             }
             
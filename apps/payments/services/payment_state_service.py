@@ -0,0 +1,159 @@
+"""
+Payment State Service for FlexiFinance
+Declarative status transitions for Payment and MpesaTransaction, applied with conditional UPDATEs
+"""
+import logging
+
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from apps.payments.models import MpesaTransaction, Payment
+
+logger = logging.getLogger(__name__)
+
+# Target payment status -> statuses it may be reached from (a failed payment
+# may be retried, and a failed attempt can still be settled later, e.g. by a
+# Stripe retry or reconciliation)
+PAYMENT_TRANSITIONS = {
+    'PROCESSING': ['PENDING', 'FAILED'],
+    'COMPLETED': ['PENDING', 'PROCESSING', 'FAILED'],
+    'FAILED': ['PENDING', 'PROCESSING'],
+    'CANCELLED': ['PENDING', 'PROCESSING', 'FAILED'],
+    'REFUNDED': ['COMPLETED'],
+}
+
+# Target M-Pesa transaction status -> statuses it may be reached from
+MPESA_TRANSITIONS = {
+    'PROCESSING': ['PENDING'],
+    'COMPLETED': ['PENDING', 'PROCESSING', 'FAILED'],
+    'FAILED': ['PENDING', 'PROCESSING'],
+    'CANCELLED': ['PENDING', 'PROCESSING'],
+}
+
+TRANSITIONS = {
+    Payment: PAYMENT_TRANSITIONS,
+    MpesaTransaction: MPESA_TRANSITIONS,
+}
+
+# Statuses that close a row (completed_at is stamped on reaching them)
+FINAL_STATUSES = {
+    Payment: ['COMPLETED'],
+    MpesaTransaction: ['COMPLETED', 'FAILED', 'CANCELLED'],
+}
+
+
+class PaymentStateService:
+    """
+    Payment State Service
+    The single place payment and M-Pesa statuses change. A transition is one
+    UPDATE ... WHERE status IN (<allowed sources>), so concurrent callbacks,
+    retries and workers need no row locks: whichever statement lands first
+    wins and the rest match no rows. Batches of transitions with per-row
+    values (receipts, conversation ids) go out as one CASE update
+    """
+
+    def sources(self, model, target, expected=None):
+        """
+        Statuses a row may be in to move to target
+
+        Args:
+            model: Payment or MpesaTransaction
+            target (str): Target status
+            expected (str or list): Narrow the allowed sources further
+
+        Raises:
+            ValueError: If the model has no transition to target
+        """
+        allowed = TRANSITIONS.get(model, {}).get(target)
+        if allowed is None:
+            raise ValueError(f"Unsupported {model.__name__} transition: {target}")
+        if expected is not None:
+            expected = [expected] if isinstance(expected, str) else list(expected)
+            allowed = [status for status in allowed if status in expected]
+        return allowed
+
+    def transition(self, queryset, target, expected=None, **values):
+        """
+        Move every row of a queryset that allows it to target
+
+        Args:
+            queryset (QuerySet): Payment or MpesaTransaction rows
+            target (str): Target status
+            expected (str or list): Only rows currently in these statuses
+            **values: Other fields to set in the same statement
+
+        Returns:
+            int: Rows transitioned
+        """
+        model = queryset.model
+        stamp = values.pop('updated_at', None) or timezone.now()
+        values = {'status': target, 'updated_at': stamp, **values}
+        if target in FINAL_STATUSES[model]:
+            values.setdefault('completed_at', stamp)
+        return queryset.filter(status__in=self.sources(model, target, expected)).update(**values)
+
+    def transition_returning(self, queryset, target, expected=None, **values):
+        """
+        Like transition, but return the primary keys of the rows it moved
+
+        updated_at carries this statement's timestamp, which identifies the
+        rows it changed (as in BulkActionService.transition_loans)
+
+        Returns:
+            list: Primary keys transitioned
+        """
+        stamp = timezone.now()
+        if not self.transition(queryset, target, expected, updated_at=stamp, **values):
+            return []
+        return list(queryset.filter(status=target, updated_at=stamp).values_list('pk', flat=True))
+
+    def transition_many(self, model, transitions, expected=None):
+        """
+        Apply many transitions, each with its own target and values, in one UPDATE
+
+        Args:
+            model: Payment or MpesaTransaction
+            transitions (list): (pk, target, values) tuples
+            expected (str or list): Only rows currently in these statuses
+
+        Returns:
+            int: Rows transitioned
+        """
+        if not transitions:
+            return 0
+        stamp = timezone.now()
+        by_target = {}
+        fields = set()
+        for pk, target, values in transitions:
+            by_target.setdefault(target, []).append(pk)
+            fields.update(values)
+
+        allowed = Q()
+        for target, pks in by_target.items():
+            allowed |= Q(pk__in=pks, status__in=self.sources(model, target, expected))
+
+        updates = {
+            'status': Case(
+                *[When(pk__in=pks, then=Value(target)) for target, pks in by_target.items()],
+                default=F('status')
+            ),
+            'updated_at': stamp,
+        }
+        final = [target for target in by_target if target in FINAL_STATUSES[model]]
+        if final and 'completed_at' not in fields:
+            updates['completed_at'] = Case(
+                *[When(pk__in=by_target[target], then=Value(stamp)) for target in final],
+                default=F('completed_at')
+            )
+        for field in fields:
+            output_field = model._meta.get_field(field)
+            updates[field] = Case(
+                *[When(pk=pk, then=Value(values[field], output_field=output_field))
+                  for pk, _, values in transitions if field in values],
+                default=F(field)
+            )
+        return model.objects.filter(allowed).update(**updates)
+
+
+# Global service instance
+payment_state_service = PaymentStateService()
@@ -0,0 +1,371 @@
+"""
+Reconciliation Service for FlexiFinance
+Streams M-Pesa statement files and reconciles them against MpesaTransaction
+"""
+import csv
+import logging
+import os
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.models import MpesaTransaction, Payment, ReconciliationRun
+from apps.payments.services.payment_state_service import payment_state_service
+
+logger = logging.getLogger(__name__)
+
+# Statement column -> accepted header spellings (matched case-insensitively)
+COLUMNS = {
+    'receipt': ['receipt no.', 'receipt no', 'receipt', 'transid', 'transaction id'],
+    'completed_at': ['completion time', 'completed time', 'transtime', 'transaction time'],
+    'status': ['transaction status', 'status'],
+    'paid_in': ['paid in', 'paid_in', 'credit'],
+    'withdrawn': ['withdrawn', 'paid out', 'debit'],
+    'amount': ['amount', 'transamount'],
+    'party': ['other party info', 'msisdn', 'phone', 'phone number'],
+}
+
+TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d.%m.%Y %H:%M:%S', '%Y%m%d%H%M%S']
+
+REPORT_COLUMNS = [
+    'issue', 'receipt', 'transaction_id', 'statement_amount', 'transaction_amount', 'phone',
+    'statement_time', 'transaction_time', 'statement_status', 'transaction_status', 'action',
+]
+
+# Transaction statuses a completed statement line may correct
+CORRECTABLE_STATUSES = ['PENDING', 'PROCESSING', 'FAILED']
+
+
+def normalize_phone(value):
+    """Last nine digits of a Kenyan MSISDN ('' when missing or masked)"""
+    value = (value or '').split('-')[0].strip()
+    if '*' in value:
+        return ''
+    digits = ''.join(filter(str.isdigit, value))
+    return digits[-9:] if len(digits) >= 9 else ''
+
+
+class StatementIndex:
+    """
+    Statement lines held column-wise (compact arrays) with two hash indexes:
+    receipt -> line, and (phone, amount in cents, time bucket) -> lines.
+    Lines whose receipt belongs to a transaction are marked held and never
+    matched fuzzily
+    """
+
+    def __init__(self, window_seconds):
+        self.window = window_seconds
+        self.receipts = []
+        self.phones = []
+        self.statuses = []
+        self.cents = array('q')
+        self.times = array('d')
+        self.matched = bytearray()
+        self.held = bytearray()
+        self.by_receipt = {}
+        self.by_key = {}
+        self.duplicate_lines = []
+
+    def __len__(self):
+        return len(self.receipts)
+
+    def add(self, receipt, phone, cents, timestamp, status):
+        line = len(self.receipts)
+        self.receipts.append(receipt)
+        self.phones.append(phone)
+        self.statuses.append(status)
+        self.cents.append(cents)
+        self.times.append(timestamp)
+        self.matched.append(0)
+        self.held.append(0)
+        if receipt:
+            if receipt in self.by_receipt:
+                self.duplicate_lines.append(line)
+                self.matched[line] = 1  # reported as a duplicate, never matched
+                return
+            self.by_receipt[receipt] = line
+        if phone:
+            self.by_key.setdefault((phone, cents, int(timestamp // self.window)), []).append(line)
+
+    def find_fuzzy(self, phone, cents, timestamp):
+        """Closest unmatched, unheld line with this phone and amount within the window"""
+        if not phone:
+            return None
+        bucket = int(timestamp // self.window)
+        best, best_gap = None, None
+        for candidate_bucket in (bucket - 1, bucket, bucket + 1):
+            for line in self.by_key.get((phone, cents, candidate_bucket), ()):
+                gap = abs(self.times[line] - timestamp)
+                if not self.matched[line] and not self.held[line] and gap <= self.window and (best_gap is None or gap < best_gap):
+                    best, best_gap = line, gap
+        return best
+
+
+class ReconciliationService:
+    """
+    Reconciliation Service
+    The statement is read once, line by line, into a StatementIndex; the
+    transactions in the statement's period are then streamed from the
+    database in chunks and probed against the index in two passes: every
+    receipt match first, then phone + amount + time window for the rest
+    against lines no transaction holds the receipt of. Findings are written to a CSV report as
+    they are found and status corrections are applied per chunk with
+    bulk_update, so a month of millions of lines runs in constant queries
+    per chunk
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'RECONCILIATION_CONFIG', {})
+        self.chunk_size = config.get('CHUNK_SIZE', 10000)
+        self.window = timedelta(minutes=config.get('MATCH_WINDOW_MINUTES', 10))
+        self.report_dir = config.get('REPORT_DIR', os.path.join(settings.BASE_DIR, 'exports', 'reconciliation'))
+
+    def load_statement(self, handle):
+        """
+        Stream a statement CSV into an index
+
+        Args:
+            handle: Open text file (header row first)
+
+        Returns:
+            StatementIndex
+        """
+        index = StatementIndex(self.window.total_seconds())
+        reader = csv.reader(handle)
+        header = next(reader, None)
+        if not header:
+            raise ValueError('Statement file is empty')
+        positions = self._column_positions(header)
+        if 'receipt' not in positions or 'completed_at' not in positions:
+            raise ValueError('Statement needs receipt and completion time columns')
+
+        def cell(row, name):
+            position = positions.get(name)
+            return row[position].strip() if position is not None and position < len(row) else ''
+
+        tz = timezone.get_current_timezone()
+        for row in reader:
+            if not row:
+                continue
+            completed_at = self._parse_time(cell(row, 'completed_at'), tz)
+            if completed_at is None:
+                continue
+            amount = self._parse_amount(cell(row, 'paid_in')) or self._parse_amount(cell(row, 'withdrawn')) \
+                or self._parse_amount(cell(row, 'amount'))
+            index.add(
+                cell(row, 'receipt').upper(),
+                normalize_phone(cell(row, 'party')),
+                int(abs(amount) * 100),
+                completed_at.timestamp(),
+                (cell(row, 'status') or 'Completed').upper()
+            )
+        return index
+
+    def reconcile(self, handle, source_name='statement', dry_run=False):
+        """
+        Reconcile a statement file and store a ReconciliationRun
+
+        Args:
+            handle: Open statement CSV
+            source_name (str): File name recorded on the run
+            dry_run (bool): Report only, without correcting transactions
+
+        Returns:
+            ReconciliationRun
+        """
+        run = ReconciliationRun.objects.create(source_name=source_name, dry_run=dry_run)
+        os.makedirs(self.report_dir, exist_ok=True)
+        run.report_path = os.path.join(self.report_dir, f'reconciliation_{run.started_at:%Y%m%d_%H%M%S}_{run.pk.hex[:8]}.csv')
+        try:
+            index = self.load_statement(handle)
+            run.statement_rows = len(index)
+            if len(index):
+                run.period_start = datetime.fromtimestamp(min(index.times), tz=dt_timezone.utc)
+                run.period_end = datetime.fromtimestamp(max(index.times), tz=dt_timezone.utc)
+            with open(run.report_path, 'w', newline='') as report_file:
+                report = csv.writer(report_file)
+                report.writerow(REPORT_COLUMNS)
+                self._join(index, run, report, dry_run)
+            run.status = 'COMPLETED'
+        except Exception as e:
+            logger.error(f"Reconciliation of {source_name} failed: {e}")
+            run.status = 'FAILED'
+            run.error_message = str(e)
+        run.completed_at = timezone.now()
+        run.save()
+        logger.info(
+            f"Reconciled {source_name}: {run.statement_rows} lines, {run.matched_by_receipt} by receipt, "
+            f"{run.matched_fuzzy} fuzzy, {run.unmatched_statement_rows} unmatched lines, "
+            f"{run.unmatched_transactions} unmatched transactions, {run.corrected} corrected"
+        )
+        return run
+
+    def _join(self, index, run, report, dry_run):
+        if not len(index):
+            return
+        # Transactions are initiated before they complete, so look back a day
+        queryset = MpesaTransaction.objects.filter(
+            initiated_at__gte=run.period_start - timedelta(days=1),
+            initiated_at__lte=run.period_end + self.window
+        ).order_by('pk').values_list(
+            'id', 'mpesa_receipt', 'phone_number', 'amount', 'status', 'initiated_at', 'completed_at'
+        )
+        corrections = []
+
+        # Receipt matches first, so a fuzzy match never takes a line that a
+        # transaction streamed later would have matched exactly
+        for row in queryset.iterator(chunk_size=self.chunk_size):
+            run.transactions_checked += 1
+            receipt = row[1]
+            line = index.by_receipt.get(receipt.upper()) if receipt else None
+            if line is None:
+                continue
+            if index.matched[line]:
+                # A second transaction claims a receipt already matched
+                run.duplicates += 1
+                self._write(report, 'DUPLICATE_MATCH', index, line, row, 'none')
+                continue
+            run.matched_by_receipt += 1
+            self._compare(index, line, row, run, report, corrections, dry_run)
+
+        self._hold_receipts(index)
+
+        for row in queryset.iterator(chunk_size=self.chunk_size):
+            tx_id, receipt, phone, amount, status, initiated_at, completed_at = row
+            if receipt and receipt.upper() in index.by_receipt:
+                continue
+            tx_time = (completed_at or initiated_at).timestamp()
+            line = index.find_fuzzy(normalize_phone(phone), int(amount * 100), tx_time)
+            if line is None:
+                in_period = run.period_start.timestamp() <= tx_time <= run.period_end.timestamp()
+                if in_period and status == 'COMPLETED':
+                    run.unmatched_transactions += 1
+                    self._write(report, 'UNMATCHED_TRANSACTION', None, None, row, 'none')
+                continue
+            run.matched_fuzzy += 1
+            self._compare(index, line, row, run, report, corrections, dry_run)
+        run.corrected += self._apply(corrections, dry_run)
+
+        for line in index.duplicate_lines:
+            run.duplicates += 1
+            self._write(report, 'DUPLICATE_STATEMENT_LINE', index, line, None, 'none')
+        for line, matched in enumerate(index.matched):
+            if not matched:
+                run.unmatched_statement_rows += 1
+                self._write(report, 'UNMATCHED_STATEMENT_LINE', index, line, None, 'none')
+
+    def _hold_receipts(self, index):
+        """Hold unmatched lines whose receipt a transaction outside the period already carries"""
+        receipts = [receipt for line, receipt in enumerate(index.receipts) if receipt and not index.matched[line]]
+        for start in range(0, len(receipts), self.chunk_size):
+            for receipt in MpesaTransaction.objects.filter(
+                mpesa_receipt__in=receipts[start:start + self.chunk_size]
+            ).values_list('mpesa_receipt', flat=True):
+                line = index.by_receipt.get(receipt.upper())
+                if line is not None:
+                    index.held[line] = 1
+
+    def _compare(self, index, line, row, run, report, corrections, dry_run):
+        """Record a matched line against its transaction, queueing any correction"""
+        tx_id, receipt, _, amount, status, _, _ = row
+        index.matched[line] = 1
+
+        if index.cents[line] != int(amount * 100):
+            run.amount_mismatches += 1
+            self._write(report, 'AMOUNT_MISMATCH', index, line, row, 'none')
+            return
+
+        settled = index.statuses[line] == 'COMPLETED'
+        if settled and (status in CORRECTABLE_STATUSES or (not receipt and index.receipts[line])):
+            corrections.append((tx_id, index.receipts[line] or receipt, index.times[line], status))
+            if status in CORRECTABLE_STATUSES:
+                self._write(report, 'STATUS_CORRECTED', index, line, row, 'dry-run' if dry_run else 'marked completed')
+            else:
+                self._write(report, 'RECEIPT_ADDED', index, line, row, 'dry-run' if dry_run else 'receipt recorded')
+        elif not settled and status == 'COMPLETED':
+            self._write(report, 'STATUS_MISMATCH', index, line, row, 'none')
+
+        if len(corrections) >= self.chunk_size:
+            run.corrected += self._apply(corrections, dry_run)
+            corrections.clear()
+
+    def _apply(self, corrections, dry_run):
+        if dry_run or not corrections:
+            return 0
+        receipts = [receipt for _, receipt, _, _ in corrections if receipt]
+        with transaction.atomic():
+            # A receipt already held by another transaction is not copied (mpesa_receipt is unique)
+            taken = set(
+                MpesaTransaction.objects.filter(mpesa_receipt__in=receipts)
+                .exclude(pk__in=[tx_id for tx_id, _, _, _ in corrections]).values_list('mpesa_receipt', flat=True)
+            )
+            transitions, receipt_only = [], []
+            for tx_id, receipt, timestamp, status in corrections:
+                receipt = receipt if receipt and receipt not in taken else None
+                if status in CORRECTABLE_STATUSES:
+                    values = {
+                        'completed_at': datetime.fromtimestamp(timestamp, tz=dt_timezone.utc),
+                        'result_desc': 'Reconciled against M-Pesa statement',
+                    }
+                    if receipt:
+                        values['mpesa_receipt'] = receipt
+                    transitions.append((tx_id, 'COMPLETED', values))
+                elif receipt:
+                    receipt_only.append(MpesaTransaction(pk=tx_id, mpesa_receipt=receipt))
+
+            corrected = payment_state_service.transition_many(MpesaTransaction, transitions, expected=CORRECTABLE_STATUSES)
+            MpesaTransaction.objects.bulk_update(receipt_only, ['mpesa_receipt'], batch_size=1000)
+            payment_state_service.transition(
+                Payment.objects.filter(mpesa_transaction__in=[tx_id for tx_id, _, _ in transitions]), 'COMPLETED'
+            )
+        return corrected + len(receipt_only)
+
+    def _write(self, report, issue, index, line, row, action):
+        statement = ['', '', '', ''] if line is None else [
+            index.receipts[line],
+            Decimal(index.cents[line]).scaleb(-2),
+            datetime.fromtimestamp(index.times[line], tz=dt_timezone.utc).isoformat(),
+            index.statuses[line],
+        ]
+        if row is None:
+            tx_id = tx_amount = tx_time = tx_status = phone = ''
+        else:
+            tx_id, _, phone, tx_amount, tx_status, initiated_at, completed_at = row
+            tx_time = (completed_at or initiated_at).isoformat()
+        report.writerow([
+            issue, statement[0] or (row[1] if row else ''), tx_id, statement[1], tx_amount,
+            phone or (index.phones[line] if line is not None else ''), statement[2], tx_time,
+            statement[3], tx_status, action,
+        ])
+
+    def _column_positions(self, header):
+        normalized = [column.strip().lower() for column in header]
+        positions = {}
+        for name, spellings in COLUMNS.items():
+            for spelling in spellings:
+                if spelling in normalized:
+                    positions[name] = normalized.index(spelling)
+                    break
+        return positions
+
+    def _parse_time(self, value, tz):
+        for time_format in TIME_FORMATS:
+            try:
+                return timezone.make_aware(datetime.strptime(value, time_format), tz)
+            except ValueError:
+                continue
+        return None
+
+    def _parse_amount(self, value):
+        try:
+            return Decimal(value.replace(',', '')) if value else Decimal('0')
+        except InvalidOperation:
+            return Decimal('0')
+
+
+# Global service instance
+reconciliation_service = ReconciliationService()
@@ -10,6 +10,8 @@ from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
 from django.utils.html import strip_tags
 
+from apps.core.services.metrics_service import metrics_service
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,7 +29,9 @@ class ResendEmailService:
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
-        self.base_url = 'https://api.resend.com/emails'
+        self.api_url = getattr(settings, 'RESEND_API_URL', 'https://api.resend.com').rstrip('/')
+        self.base_url = f'{self.api_url}/emails'
+        self.timeout = getattr(settings, 'RESEND_TIMEOUT', 10)
     
     def send_email(self, to_email, subject, html_content, text_content=None, from_email=None, from_name=None):
         """
@@ -55,11 +59,13 @@ class ResendEmailService:
             if text_content:
                 email_data['text'] = text_content
             
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=email_data
-            )
+            with metrics_service.external_call('resend', 'send_email'):
+                response = requests.post(
+                    self.base_url,
+                    headers=self.headers,
+                    json=email_data,
+                    timeout=self.timeout
+                )
             
             if response.status_code == 200:
                 result = response.json()
@@ -466,10 +472,12 @@ Need help? Contact us at support@flexifinance.com
         try:
             # Try to send a test email to verify service connectivity
             # In a real implementation, you might ping the API or send a test email
-            response = requests.get(
-                'https://api.resend.com/domains',
-                headers=self.headers
-            )
+            with metrics_service.external_call('resend', 'domains'):
+                response = requests.get(
+                    f'{self.api_url}/domains',
+                    headers=self.headers,
+                    timeout=self.timeout
+                )
             return response.status_code in [200, 401]  # 401 is okay (invalid API key but service reachable)
         except Exception as e:
             logger.error(f"Resend health check failed: {e}")
@@ -2,12 +2,16 @@
 Stripe Payment Service for FlexiFinance
 Handles international card payments and Stripe API interactions
 """
-# import stripe  # Commented out for development - stripe not installed
 import logging
 from django.conf import settings
 from decimal import Decimal
 import json
 
+try:
+    import stripe
+except ImportError:  # Card payments need the stripe package; M-Pesa works without it
+    stripe = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +23,8 @@ class StripeService:
     
     def __init__(self):
         # Configure Stripe API
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        if stripe is not None:
+            stripe.api_key = settings.STRIPE_SECRET_KEY
         
     def create_payment_intent(self, amount, currency='usd', metadata=None):
         """
@@ -298,12 +303,15 @@ class StripeService:
         Returns:
             dict or None: Verified event data or None if verification failed
         """
+        if stripe is None:
+            logger.error("Stripe webhook received but the stripe package is not installed")
+            return None
         try:
             event = stripe.Webhook.construct_event(
                 payload, signature, settings.STRIPE_WEBHOOK_SECRET
             )
             return event
-        except stripe.error.SignatureVerificationError:
+        except (stripe.error.SignatureVerificationError, ValueError):
             logger.error("Stripe webhook signature verification failed")
             return None
     
@@ -318,21 +326,16 @@ class StripeService:
             dict: Processing result
         """
         try:
-            logger.info(f"Processing successful payment: {payment_intent.id}")
+            logger.info(f"Processing successful payment: {payment_intent['id']}")
             
-            # Here you would typically:
-            # 1. Update payment status in database
-            # 2. Update loan/payment records
-            # 3. Send confirmation emails
-            # 4. Update user balance
-            
-            # For now, just log the success
+            updated = self._update_payments(payment_intent['id'], 'COMPLETED')
             return {
                 'success': True,
-                'payment_intent_id': payment_intent.id,
-                'amount': payment_intent.amount,
-                'currency': payment_intent.currency,
-                'status': payment_intent.status,
+                'payment_intent_id': payment_intent['id'],
+                'amount': payment_intent.get('amount'),
+                'currency': payment_intent.get('currency'),
+                'status': payment_intent.get('status'),
+                'payments_updated': updated,
                 'message': 'Payment success processed'
             }
             
@@ -354,20 +357,16 @@ class StripeService:
             dict: Processing result
         """
         try:
-            logger.warning(f"Processing failed payment: {payment_intent.id}")
-            
-            # Here you would typically:
-            # 1. Update payment status in database
-            # 2. Update loan/payment records
-            # 3. Send failure notification emails
-            # 4. Log the failure reason
+            logger.warning(f"Processing failed payment: {payment_intent['id']}")
             
+            updated = self._update_payments(payment_intent['id'], 'FAILED')
             return {
                 'success': True,
-                'payment_intent_id': payment_intent.id,
-                'amount': payment_intent.amount,
-                'currency': payment_intent.currency,
-                'status': payment_intent.status,
+                'payment_intent_id': payment_intent['id'],
+                'amount': payment_intent.get('amount'),
+                'currency': payment_intent.get('currency'),
+                'status': payment_intent.get('status'),
+                'payments_updated': updated,
                 'last_payment_error': payment_intent.get('last_payment_error', {}),
                 'message': 'Payment failure processed'
             }
@@ -390,19 +389,16 @@ class StripeService:
             dict: Processing result
         """
         try:
-            logger.info(f"Processing canceled payment: {payment_intent.id}")
-            
-            # Here you would typically:
-            # 1. Update payment status in database
-            # 2. Update loan/payment records
-            # 3. Send cancellation notification
+            logger.info(f"Processing canceled payment: {payment_intent['id']}")
             
+            updated = self._update_payments(payment_intent['id'], 'CANCELLED')
             return {
                 'success': True,
-                'payment_intent_id': payment_intent.id,
-                'amount': payment_intent.amount,
-                'currency': payment_intent.currency,
-                'status': payment_intent.status,
+                'payment_intent_id': payment_intent['id'],
+                'amount': payment_intent.get('amount'),
+                'currency': payment_intent.get('currency'),
+                'status': payment_intent.get('status'),
+                'payments_updated': updated,
                 'message': 'Payment cancellation processed'
             }
             
@@ -413,6 +409,21 @@ class StripeService:
                 'error': str(e)
             }
     
+    def _update_payments(self, payment_intent_id, status):
+        """
+        Move open card payments for a PaymentIntent to a final status
+
+        Card payments carry the PaymentIntent id as their confirmation code;
+        the payment state machine leaves payments already final alone, so
+        repeated events are no-ops
+        """
+        from apps.payments.models import Payment
+        from apps.payments.services.payment_state_service import payment_state_service
+        
+        return payment_state_service.transition(
+            Payment.objects.filter(payment_method='STRIPE', confirmation_code=payment_intent_id), status
+        )
+    
     def check_payment_status(self, payment_intent_id):
         """
         Check the status of a payment intent
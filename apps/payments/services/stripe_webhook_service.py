@@ -0,0 +1,201 @@
+"""
+Stripe Webhook Service for FlexiFinance
+Durable, deduplicated inbox for Stripe events with ordered background processing
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from apps.payments.models import StripeWebhookEvent
+from apps.payments.services.stripe_service import StripeService
+
+logger = logging.getLogger(__name__)
+
+# Event type -> StripeService handler (other types are recorded and ignored)
+HANDLERS = {
+    'payment_intent.succeeded': 'handle_payment_success',
+    'payment_intent.payment_failed': 'handle_payment_failure',
+    'payment_intent.canceled': 'handle_payment_canceled',
+}
+
+# Events that still have to run before a later event for the same PaymentIntent
+UNFINISHED_STATUSES = ['PENDING', 'PROCESSING']
+
+
+class StripeWebhookService:
+    """
+    Stripe Webhook Service
+    The webhook verifies the signature and inserts the event keyed on its
+    Stripe id (ON CONFLICT DO NOTHING), so Stripe's retries are absorbed and
+    the response goes out without running any handler. Workers claim events
+    with SKIP LOCKED, taking for each PaymentIntent only the oldest event not
+    yet finished, which keeps per-intent order across any number of workers
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'STRIPE_WEBHOOK_CONFIG', {})
+        self.batch_size = config.get('BATCH_SIZE', 200)
+        self.max_attempts = config.get('MAX_ATTEMPTS', 5)
+        self.retry_delay = config.get('RETRY_DELAY_SECONDS', 30)
+        self.claim_timeout = timedelta(seconds=config.get('CLAIM_TIMEOUT_SECONDS', 300))
+        self.stripe_service = StripeService()
+
+    def receive(self, payload, signature):
+        """
+        Verify and record one webhook delivery
+
+        Args:
+            payload (bytes): Raw request body
+            signature (str): Stripe-Signature header
+
+        Returns:
+            str or None: Event id, or None when verification failed
+        """
+        if not self.stripe_service.verify_webhook(payload, signature):
+            return None
+        event = json.loads(payload)
+        data_object = (event.get('data') or {}).get('object') or {}
+        if data_object.get('object') == 'payment_intent':
+            payment_intent_id = data_object.get('id') or ''
+        else:
+            payment_intent_id = data_object.get('payment_intent') or ''
+
+        StripeWebhookEvent.objects.bulk_create([StripeWebhookEvent(
+            event_id=event['id'],
+            event_type=event.get('type', ''),
+            payment_intent_id=payment_intent_id,
+            stripe_created=event.get('created') or 0,
+            payload=event
+        )], ignore_conflicts=True)
+        return event['id']
+
+    def claim_batch(self, limit=None):
+        """
+        Claim the next events to process
+
+        Returns:
+            list: StripeWebhookEvent rows, now PROCESSING
+        """
+        limit = limit or self.batch_size
+        now = timezone.now()
+        earlier_unfinished = StripeWebhookEvent.objects.filter(
+            payment_intent_id=OuterRef('payment_intent_id'), status__in=UNFINISHED_STATUSES
+        ).filter(
+            Q(stripe_created__lt=OuterRef('stripe_created'))
+            | Q(stripe_created=OuterRef('stripe_created'), id__lt=OuterRef('id'))
+        )
+        with transaction.atomic():
+            events = list(
+                StripeWebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status='PENDING', scheduled_for__lte=now)
+                    | Q(status='PROCESSING', claimed_at__lt=now - self.claim_timeout)
+                )
+                .filter(Q(payment_intent_id='') | ~Exists(earlier_unfinished))
+                .order_by('id')[:limit]
+            )
+            if events:
+                StripeWebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                    status='PROCESSING', claimed_at=now, attempts=F('attempts') + 1
+                )
+        for event in events:
+            event.attempts += 1
+        return events
+
+    def process_batch(self, limit=None):
+        """
+        Claim and process one batch of events
+
+        Returns:
+            dict: {'processed': n, 'ignored': n, 'retried': n, 'failed': n}
+        """
+        events = self.claim_batch(limit)
+        processed, ignored, failures = [], [], []
+        for event in events:
+            handler = HANDLERS.get(event.event_type)
+            if handler is None:
+                ignored.append(event.pk)
+                continue
+            try:
+                result = getattr(self.stripe_service, handler)(event.payload['data']['object'])
+                if not result.get('success'):
+                    raise RuntimeError(result.get('error') or 'Handler failed')
+                processed.append(event.pk)
+            except Exception as e:
+                logger.error(f"Stripe event {event.event_id} ({event.event_type}) failed: {e}")
+                failures.append((event, str(e)))
+
+        now = timezone.now()
+        retried = 0
+        with transaction.atomic():
+            StripeWebhookEvent.objects.filter(pk__in=processed).update(status='PROCESSED', processed_at=now, last_error='')
+            StripeWebhookEvent.objects.filter(pk__in=ignored).update(status='IGNORED', processed_at=now)
+            for event, error in failures:
+                event.last_error = error
+                if event.attempts >= self.max_attempts:
+                    event.status = 'FAILED'
+                    event.processed_at = now
+                else:
+                    event.status = 'PENDING'
+                    event.scheduled_for = now + timedelta(seconds=self.retry_delay * event.attempts)
+                    retried += 1
+            StripeWebhookEvent.objects.bulk_update(
+                [event for event, _ in failures], ['status', 'last_error', 'scheduled_for', 'processed_at']
+            )
+        return {
+            'processed': len(processed),
+            'ignored': len(ignored),
+            'retried': retried,
+            'failed': len(failures) - retried,
+        }
+
+    def process_pending(self):
+        """
+        Process batches until nothing is claimable
+
+        Returns:
+            dict: Totals across batches
+        """
+        totals = {'processed': 0, 'ignored': 0, 'retried': 0, 'failed': 0}
+        while True:
+            result = self.process_batch()
+            for key in totals:
+                totals[key] += result[key]
+            if not any(result.values()):
+                return totals
+
+    def replay(self, from_id, to_id=None):
+        """
+        Queue an inbox id range for processing again
+
+        Handlers only move payments that are still open, so replaying
+        already-processed events is safe
+
+        Args:
+            from_id (int): First inbox id (inclusive)
+            to_id (int): Last inbox id (inclusive, open-ended when None)
+
+        Returns:
+            int: Events queued
+        """
+        events = StripeWebhookEvent.objects.filter(id__gte=from_id)
+        if to_id is not None:
+            events = events.filter(id__lte=to_id)
+        queued = self.requeue(events)
+        logger.info(f"Queued {queued} Stripe events for replay (ids {from_id}-{to_id or 'latest'})")
+        return queued
+
+    def requeue(self, events):
+        """Queue a queryset of events for processing again (in-flight events are skipped)"""
+        return events.exclude(status='PROCESSING').update(
+            status='PENDING', attempts=0, scheduled_for=timezone.now(), last_error='', processed_at=None
+        )
+
+
+# Global service instance
+stripe_webhook_service = StripeWebhookService()
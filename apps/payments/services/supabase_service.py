@@ -1,22 +1,78 @@
 """
 Supabase Service for FlexiFinance
-Handles database operations and contact form submissions
+Handles database operations and contact form submissions over a pooled PostgREST client
 """
 import logging
+import threading
+from itertools import islice
+
 import requests
-import json
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apps.core.services.metrics_service import metrics_service
 
 logger = logging.getLogger(__name__)
 
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Process-wide pooled session for PostgREST requests
+
+    Keeps up to POOL_SIZE keep-alive connections to Supabase, so calls after
+    the first skip the TCP and TLS handshakes. Reads are retried on
+    connection errors and gateway errors; writes are only retried when the
+    connection could not be opened
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                config = getattr(settings, 'SUPABASE_CONFIG', {})
+                retry = Retry(
+                    total=config.get('READ_RETRIES', 2),
+                    backoff_factor=0.2,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'HEAD']),
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=config.get('POOL_SIZE', 10),
+                    pool_maxsize=config.get('POOL_SIZE', 10),
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def chunked(rows, size):
+    """Consecutive lists of at most size items"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 
 class SupabaseService:
     """
     Supabase Integration Service
-    Provides database operations for contact forms and additional data
+    Provides database operations for contact forms and additional data.
+    Requests share one pooled session and are bounded by a connect and a
+    read timeout; reads page through tables with Range headers and writes
+    send many rows per request
     """
     
     def __init__(self):
+        config = getattr(settings, 'SUPABASE_CONFIG', {})
         self.supabase_url = settings.SUPABASE_URL
         self.supabase_key = settings.SUPABASE_ANON_KEY
         self.headers = {
@@ -25,6 +81,188 @@ class SupabaseService:
             'Content-Type': 'application/json',
             'Prefer': 'return=representation'
         }
+        self.timeout = (config.get('CONNECT_TIMEOUT_SECONDS', 3), config.get('READ_TIMEOUT_SECONDS', 10))
+        self.page_size = config.get('PAGE_SIZE', 1000)
+        self.chunk_size = config.get('BULK_CHUNK_SIZE', 500)
+        self.session = get_session()
+    
+    def _request(self, method, table, headers=None, **kwargs):
+        """
+        Send one PostgREST request for a table
+        
+        Args:
+            method (str): HTTP method
+            table (str): Table name
+            headers (dict): Headers added to (or overriding) the defaults
+            **kwargs: params, json, ... as for requests
+            
+        Returns:
+            requests.Response: Response
+        """
+        with metrics_service.external_call('supabase', f'{method} {table}'):
+            return self.session.request(
+                method,
+                f"{self.supabase_url}/rest/v1/{table}",
+                headers=dict(self.headers, **(headers or {})),
+                timeout=self.timeout,
+                **kwargs
+            )
+    
+    def contact_row(self, contact_data):
+        """
+        contact_submissions row for a contact form submission
+        
+        Args:
+            contact_data (dict): Contact form data (see submit_contact_form)
+            
+        Returns:
+            dict: Row data
+        """
+        return {
+            'name': contact_data.get('name', ''),
+            'email': contact_data.get('email', ''),
+            'phone': contact_data.get('phone', ''),
+            'subject': contact_data.get('subject', 'General Inquiry'),
+            'message': contact_data.get('message', ''),
+            'source': contact_data.get('source', 'website'),
+            'status': 'new',
+            'created_at': contact_data.get('created_at', 'now()'),
+            'ip_address': contact_data.get('ip_address', ''),
+            'user_agent': contact_data.get('user_agent', '')
+        }
+    
+    def newsletter_row(self, email, source='website'):
+        """newsletter_subscriptions row for a subscription"""
+        return {
+            'email': email,
+            'source': source,
+            'subscribed_at': 'now()',
+            'active': True
+        }
+    
+    def iter_rows(self, table, params=None, page_size=None):
+        """
+        Every row matching a query, fetched page by page with Range headers
+        
+        Args:
+            table (str): Table name
+            params (dict): PostgREST filters (e.g. {'status': 'eq.new'});
+                rows are ordered by id unless params sets order
+            page_size (int): Rows per request
+            
+        Yields:
+            dict: Rows
+            
+        Raises:
+            requests.exceptions.RequestException: If a page cannot be fetched
+        """
+        page_size = page_size or self.page_size
+        params = dict(params or {})
+        params.setdefault('order', 'id.asc')
+        start = 0
+        while True:
+            response = self._request('GET', table, params=params, headers={
+                'Range-Unit': 'items',
+                'Range': f'{start}-{start + page_size - 1}',
+                'Prefer': 'count=none'
+            })
+            if response.status_code == 416:
+                # Range starts past the last row
+                return
+            response.raise_for_status()
+            rows = response.json()
+            yield from rows
+            start += len(rows)
+            # Content-Range is "<first>-<last>/<total or *>"
+            total = response.headers.get('Content-Range', '').partition('/')[2]
+            if len(rows) < page_size or (total.isdigit() and start >= int(total)):
+                return
+    
+    def bulk_insert(self, table, rows, on_conflict=None):
+        """
+        Insert many rows, BULK_CHUNK_SIZE rows per request (PostgREST accepts a JSON array)
+        
+        Args:
+            table (str): Table name
+            rows (list): Row dicts, all with the same keys
+            on_conflict (str): Unique column(s); matching rows are updated instead
+            
+        Returns:
+            dict: Insert result
+        """
+        headers = {'Prefer': 'return=minimal'}
+        params = {}
+        if on_conflict:
+            headers['Prefer'] += ',resolution=merge-duplicates'
+            params['on_conflict'] = on_conflict
+        written = 0
+        try:
+            for chunk in chunked(rows, self.chunk_size):
+                response = self._request('POST', table, headers=headers, params=params, json=chunk)
+                if not response.ok:
+                    logger.error(f"Supabase bulk insert into {table} failed: {response.status_code} - {response.text}")
+                    return {
+                        'success': False,
+                        'count': written,
+                        'error': f'Failed to insert rows: {response.status_code}'
+                    }
+                written += len(chunk)
+            logger.info(f"Inserted {written} rows into Supabase {table}")
+            return {'success': True, 'count': written}
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Supabase bulk insert into {table} error: {e}")
+            return {
+                'success': False,
+                'count': written,
+                'error': str(e)
+            }
+    
+    def bulk_upsert(self, table, rows, on_conflict='id'):
+        """
+        Insert or update many rows, matched on a unique column
+        
+        Rows may carry different values each, which makes this the bulk
+        form of a per-row PATCH
+            
+        Returns:
+            dict: Upsert result
+        """
+        return self.bulk_insert(table, rows, on_conflict=on_conflict)
+    
+    def bulk_patch(self, table, ids, values, key='id'):
+        """
+        Set the same values on many rows, BULK_CHUNK_SIZE ids per request
+        
+        Args:
+            table (str): Table name
+            ids (list): Key values of the rows to change
+            values (dict): Column values to set
+            key (str): Column the ids refer to
+            
+        Returns:
+            dict: Patch result
+        """
+        written = 0
+        try:
+            for chunk in chunked(ids, self.chunk_size):
+                params = {key: f"in.({','.join(str(value) for value in chunk)})"}
+                response = self._request('PATCH', table, headers={'Prefer': 'return=minimal'}, params=params, json=values)
+                if not response.ok:
+                    logger.error(f"Supabase bulk patch of {table} failed: {response.status_code} - {response.text}")
+                    return {
+                        'success': False,
+                        'count': written,
+                        'error': f'Failed to update rows: {response.status_code}'
+                    }
+                written += len(chunk)
+            return {'success': True, 'count': written}
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Supabase bulk patch of {table} error: {e}")
+            return {
+                'success': False,
+                'count': written,
+                'error': str(e)
+            }
     
     def submit_contact_form(self, contact_data):
         """
@@ -43,24 +281,9 @@ class SupabaseService:
             dict: Submission result
         """
         try:
-            data = {
-                'name': contact_data.get('name', ''),
-                'email': contact_data.get('email', ''),
-                'phone': contact_data.get('phone', ''),
-                'subject': contact_data.get('subject', 'General Inquiry'),
-                'message': contact_data.get('message', ''),
-                'source': contact_data.get('source', 'website'),
-                'status': 'new',
-                'created_at': contact_data.get('created_at', 'now()'),
-                'ip_address': contact_data.get('ip_address', ''),
-                'user_agent': contact_data.get('user_agent', '')
-            }
+            data = self.contact_row(contact_data)
             
-            response = requests.post(
-                f"{self.supabase_url}/rest/v1/contact_submissions",
-                headers=self.headers,
-                json=data
-            )
+            response = self._request('POST', 'contact_submissions', json=data)
             
             if response.status_code == 201:
                 result = response.json()
@@ -76,7 +299,7 @@ class SupabaseService:
                     'success': False,
                     'error': f'Failed to submit form: {response.status_code}'
                 }
-                
+        
         except Exception as e:
             logger.error(f"Contact form submission error: {e}")
             return {
@@ -84,44 +307,37 @@ class SupabaseService:
                 'error': str(e)
             }
     
+    def iter_contact_submissions(self, status=None):
+        """
+        Every contact submission, optionally with one status, oldest first
+            
+        Yields:
+            dict: Submission rows
+        """
+        params = {'status': f'eq.{status}'} if status else {}
+        return self.iter_rows('contact_submissions', params)
+    
     def get_contact_submissions(self, limit=50, status=None):
         """
         Retrieve contact form submissions
         
         Args:
-            limit (int): Maximum number of submissions
+            limit (int): Maximum number of submissions (None for all of them)
             status (str): Filter by status
             
         Returns:
             dict: Contact submissions
         """
         try:
-            url = f"{self.supabase_url}/rest/v1/contact_submissions"
-            params = {'limit': limit}
-            
-            if status:
-                params['status'] = f'eq.{status}'
-            
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params
-            )
-            
-            if response.status_code == 200:
-                submissions = response.json()
-                return {
-                    'success': True,
-                    'submissions': submissions,
-                    'count': len(submissions)
-                }
-            else:
-                logger.error(f"Failed to get submissions: {response.status_code}")
-                return {
-                    'success': False,
-                    'error': f'Failed to retrieve submissions: {response.status_code}'
-                }
-                
+            params = {'status': f'eq.{status}'} if status else {}
+            page_size = min(limit, self.page_size) if limit else None
+            submissions = list(islice(self.iter_rows('contact_submissions', params, page_size), limit))
+            return {
+                'success': True,
+                'submissions': submissions,
+                'count': len(submissions)
+            }
+        
         except Exception as e:
             logger.error(f"Get submissions error: {e}")
             return {
@@ -140,33 +356,24 @@ class SupabaseService:
         Returns:
             dict: Update result
         """
-        try:
-            data = {'status': status}
-            response = requests.patch(
-                f"{self.supabase_url}/rest/v1/contact_submissions?id=eq.{submission_id}",
-                headers=self.headers,
-                json=data
-            )
+        result = self.update_submissions_status([submission_id], status)
+        if result['success']:
+            logger.info(f"Submission status updated: {submission_id} -> {status}")
+            result['message'] = 'Status updated successfully'
+        return result
+    
+    def update_submissions_status(self, submission_ids, status):
+        """
+        Update the status of many contact submissions at once
+        
+        Args:
+            submission_ids (list): Submission IDs
+            status (str): New status
             
-            if response.status_code == 204:
-                logger.info(f"Submission status updated: {submission_id} -> {status}")
-                return {
-                    'success': True,
-                    'message': 'Status updated successfully'
-                }
-            else:
-                logger.error(f"Status update failed: {response.status_code}")
-                return {
-                    'success': False,
-                    'error': f'Failed to update status: {response.status_code}'
-                }
-                
-        except Exception as e:
-            logger.error(f"Status update error: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        Returns:
+            dict: Update result
+        """
+        return self.bulk_patch('contact_submissions', submission_ids, {'status': status})
     
     def store_user_feedback(self, user_id, feedback_type, content, rating=None):
         """
@@ -190,11 +397,7 @@ class SupabaseService:
                 'created_at': 'now()'
             }
             
-            response = requests.post(
-                f"{self.supabase_url}/rest/v1/user_feedback",
-                headers=self.headers,
-                json=data
-            )
+            response = self._request('POST', 'user_feedback', json=data)
             
             if response.status_code == 201:
                 result = response.json()
@@ -209,7 +412,7 @@ class SupabaseService:
                     'success': False,
                     'error': f'Failed to store feedback: {response.status_code}'
                 }
-                
+        
         except Exception as e:
             logger.error(f"Feedback storage error: {e}")
             return {
@@ -229,18 +432,9 @@ class SupabaseService:
             dict: Subscription result
         """
         try:
-            data = {
-                'email': email,
-                'source': source,
-                'subscribed_at': 'now()',
-                'active': True
-            }
+            data = self.newsletter_row(email, source)
             
-            response = requests.post(
-                f"{self.supabase_url}/rest/v1/newsletter_subscriptions",
-                headers=self.headers,
-                json=data
-            )
+            response = self._request('POST', 'newsletter_subscriptions', json=data)
             
             if response.status_code == 201:
                 logger.info(f"Newsletter subscription created: {email}")
@@ -254,7 +448,7 @@ class SupabaseService:
                     'success': False,
                     'error': f'Failed to create subscription: {response.status_code}'
                 }
-                
+        
         except Exception as e:
             logger.error(f"Newsletter subscription error: {e}")
             return {
@@ -262,37 +456,36 @@ class SupabaseService:
                 'error': str(e)
             }
     
+    def iter_newsletter_subscriptions(self):
+        """
+        Every active newsletter subscription, oldest first
+            
+        Yields:
+            dict: Subscription rows
+        """
+        return self.iter_rows('newsletter_subscriptions', {'active': 'eq.true'})
+    
     def get_newsletter_subscriptions(self, limit=100):
         """
         Get newsletter subscriptions
         
         Args:
-            limit (int): Maximum number of subscriptions
+            limit (int): Maximum number of subscriptions (None for all of them)
             
         Returns:
             dict: Subscriptions data
         """
         try:
-            response = requests.get(
-                f"{self.supabase_url}/rest/v1/newsletter_subscriptions",
-                headers=self.headers,
-                params={'limit': limit, 'active': 'eq.true'}
-            )
-            
-            if response.status_code == 200:
-                subscriptions = response.json()
-                return {
-                    'success': True,
-                    'subscriptions': subscriptions,
-                    'count': len(subscriptions)
-                }
-            else:
-                logger.error(f"Failed to get subscriptions: {response.status_code}")
-                return {
-                    'success': False,
-                    'error': f'Failed to retrieve subscriptions: {response.status_code}'
-                }
-                
+            page_size = min(limit, self.page_size) if limit else None
+            subscriptions = list(islice(
+                self.iter_rows('newsletter_subscriptions', {'active': 'eq.true'}, page_size), limit
+            ))
+            return {
+                'success': True,
+                'subscriptions': subscriptions,
+                'count': len(subscriptions)
+            }
+        
         except Exception as e:
             logger.error(f"Get subscriptions error: {e}")
             return {
@@ -303,18 +496,14 @@ class SupabaseService:
     def health_check(self):
         """
         Check Supabase service health
-        
+            
         Returns:
             bool: True if service is healthy
         """
         try:
             # Try to make a simple request to check connectivity
-            response = requests.get(
-                f"{self.supabase_url}/rest/v1/contact_submissions",
-                headers=self.headers,
-                params={'limit': 1}
-            )
+            response = self._request('GET', 'contact_submissions', params={'limit': 1})
             return response.status_code in [200, 404]  # 404 is okay if table doesn't exist
         except Exception as e:
             logger.error(f"Supabase health check failed: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,156 @@
+"""
+Synthetic Stripe webhook load generator for FlexiFinance
+Builds signed PaymentIntent event streams and posts them at a webhook endpoint, for local load tests
+"""
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Lifecycles a generated PaymentIntent goes through (created is ignored by the inbox)
+LIFECYCLES = [
+    (['payment_intent.created', 'payment_intent.succeeded'], 0.80),
+    (['payment_intent.created', 'payment_intent.payment_failed', 'payment_intent.succeeded'], 0.10),
+    (['payment_intent.created', 'payment_intent.payment_failed'], 0.05),
+    (['payment_intent.created', 'payment_intent.canceled'], 0.05),
+]
+
+FINAL_STATUS = {
+    'payment_intent.created': 'requires_payment_method',
+    'payment_intent.succeeded': 'succeeded',
+    'payment_intent.payment_failed': 'requires_payment_method',
+    'payment_intent.canceled': 'canceled',
+}
+
+
+class StripeEventGenerator:
+    """
+    Signed Stripe event generator
+
+    Args:
+        secret (str): Webhook signing secret (STRIPE_WEBHOOK_SECRET of the target)
+        seed (int): Random seed for reproducible streams
+        duplicate_rate (float): Share of events delivered a second time, as Stripe retries do
+    """
+
+    def __init__(self, secret, seed=None, duplicate_rate=0.05):
+        self.secret = secret
+        self.duplicate_rate = duplicate_rate
+        self.random = random.Random(seed)
+
+    def sign(self, payload, timestamp=None):
+        """Stripe-Signature header for a payload (scheme v1)"""
+        timestamp = int(timestamp or time.time())
+        signed = f'{timestamp}.'.encode() + payload
+        signature = hmac.new(self.secret.encode(), signed, hashlib.sha256).hexdigest()
+        return f't={timestamp},v1={signature}'
+
+    def event(self, event_type, payment_intent_id, amount, created):
+        """Serialized event body"""
+        return json.dumps({
+            'id': f'evt_{uuid.UUID(int=self.random.getrandbits(128)).hex[:24]}',
+            'object': 'event',
+            'type': event_type,
+            'created': created,
+            'livemode': False,
+            'data': {'object': {
+                'id': payment_intent_id,
+                'object': 'payment_intent',
+                'amount': amount,
+                'currency': 'usd',
+                'status': FINAL_STATUS[event_type],
+            }},
+        }).encode()
+
+    def stream(self, n_events):
+        """
+        Interleaved event bodies for many PaymentIntents
+
+        Each intent's events have increasing created times, but deliveries
+        of different intents are mixed and some are repeated
+
+        Returns:
+            list: Payload bytes, in delivery order
+        """
+        lifecycles, weights = zip(*LIFECYCLES)
+        now = int(time.time())
+        sequences = []
+        total = 0
+        while total < n_events:
+            steps = self.random.choices(lifecycles, weights)[0]
+            intent_id = f'pi_{uuid.UUID(int=self.random.getrandbits(128)).hex[:24]}'
+            amount = self.random.randint(5, 500) * 100
+            sequences.append([
+                self.event(event_type, intent_id, amount, now + position)
+                for position, event_type in enumerate(steps)
+            ])
+            total += len(steps)
+
+        deliveries = []
+        active = []
+        pending = list(reversed(sequences))
+        while (pending or active) and len(deliveries) < n_events:
+            # Keep a few dozen intents in flight at once and deliver from them at random
+            while pending and len(active) < 50:
+                active.append(pending.pop())
+            sequence = self.random.choice(active)
+            payload = sequence.pop(0)
+            deliveries.append(payload)
+            if self.random.random() < self.duplicate_rate:
+                deliveries.append(payload)
+            if not sequence:
+                active.remove(sequence)
+        return deliveries
+
+    def run(self, url, n_events, concurrency=16, timeout=10):
+        """
+        Post a generated stream and measure acknowledgement latency
+
+        Returns:
+            dict: Counts by HTTP status, throughput and p50/p95/p99 latency (ms)
+        """
+        deliveries = self.stream(n_events)
+        local = threading.local()
+        lock = threading.Lock()
+        latencies = []
+        statuses = {}
+
+        def post(payload):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                response = local.session.post(url, data=payload, timeout=timeout, headers={
+                    'Content-Type': 'application/json',
+                    'Stripe-Signature': self.sign(payload),
+                })
+                status = response.status_code
+            except requests.exceptions.RequestException:
+                status = 'error'
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='stripe-load') as pool:
+            list(pool.map(post, deliveries))
+        elapsed = time.perf_counter() - started
+
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'deliveries': len(deliveries),
+            'statuses': statuses,
+            'seconds': elapsed,
+            'per_second': len(deliveries) / elapsed if elapsed else 0,
+            'p50_ms': cuts[49],
+            'p95_ms': cuts[94],
+            'p99_ms': cuts[98],
+        }
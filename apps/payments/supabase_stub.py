@@ -0,0 +1,210 @@
+"""
+Local PostgREST (Supabase REST) stub for FlexiFinance
+In-memory tables behind the subset of PostgREST that SupabaseService uses, for benchmarks and runs without Supabase
+"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def _matches(row, filters):
+    """Whether a row passes eq./in. filters"""
+    for column, expression in filters.items():
+        operator, _, operand = expression.partition('.')
+        value = str(row.get(column)).lower() if isinstance(row.get(column), bool) else str(row.get(column))
+        if operator == 'eq' and value != operand:
+            return False
+        if operator == 'in' and value not in operand.strip('()').split(','):
+            return False
+    return True
+
+
+class SupabaseStub:
+    """
+    In-process PostgREST stub
+
+    Supports GET with eq/in filters, order, limit/offset and Range
+    pagination; POST of one row or an array, with on_conflict upserts; and
+    PATCH by filter. Connections are kept alive (HTTP/1.1) and counted, so
+    clients that pool connections can be told apart from those that do not
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+        latency (float): Seconds added to every response
+    """
+
+    def __init__(self, host='127.0.0.1', port=8767, latency=0.0):
+        self.latency = latency
+        self.tables = {}
+        self.requests_received = 0
+        self.connections_opened = 0
+        self._next_id = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='supabase-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests_received = 0
+            self.connections_opened = 0
+
+    def select(self, table, params, range_header):
+        """
+        Rows for a GET
+
+        Returns:
+            tuple: (status, rows, Content-Range)
+        """
+        params = dict(params)
+        order = params.pop('order', 'id.asc')
+        limit = params.pop('limit', None)
+        offset = int(params.pop('offset', 0))
+        params.pop('select', None)
+        column, _, direction = order.partition('.')
+        with self._lock:
+            rows = [row for row in self.tables.get(table, []) if _matches(row, params)]
+        rows.sort(key=lambda row: row.get(column) or 0, reverse=direction == 'desc')
+
+        start, end = offset, len(rows) - 1
+        if limit is not None:
+            end = min(end, offset + int(limit) - 1)
+        if range_header:
+            first, _, last = range_header.partition('-')
+            start = offset + int(first)
+            end = min(end, offset + int(last)) if last else end
+        if start > 0 and start >= len(rows):
+            return 416, [], f'*/{len(rows)}'
+        page = rows[start:end + 1]
+        content_range = f'{start}-{start + len(page) - 1}/*' if page else '*/*'
+        return (206 if range_header and len(page) < len(rows) else 200), page, content_range
+
+    def insert(self, table, rows, on_conflict=None):
+        """Insert rows, or update the existing row with the same on_conflict value"""
+        with self._lock:
+            stored = self.tables.setdefault(table, [])
+            index = {row.get(on_conflict): row for row in stored} if on_conflict else {}
+            written = []
+            for row in rows:
+                existing = index.get(row.get(on_conflict)) if on_conflict else None
+                if existing is not None:
+                    existing.update(row)
+                    written.append(existing)
+                    continue
+                row = dict(row)
+                if 'id' not in row:
+                    self._next_id[table] = self._next_id.get(table, 0) + 1
+                    row['id'] = self._next_id[table]
+                stored.append(row)
+                if on_conflict:
+                    index[row.get(on_conflict)] = row
+                written.append(row)
+            return written
+
+    def update(self, table, params, values):
+        """Apply values to every row passing the filters"""
+        with self._lock:
+            rows = [row for row in self.tables.get(table, []) if _matches(row, params)]
+            for row in rows:
+                row.update(values)
+            return rows
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections_opened += 1
+
+            def log_message(self, format, *args):
+                logger.debug(f"Supabase stub: {format % args}")
+
+            def _reply(self, status, payload=None, headers=None):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _parse(self):
+                with stub._lock:
+                    stub.requests_received += 1
+                url = urlparse(self.path)
+                if not url.path.startswith('/rest/v1/'):
+                    return None, None
+                return url.path[len('/rest/v1/'):], dict(parse_qsl(url.query))
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'null')
+
+            def _representation(self):
+                return 'return=representation' in (self.headers.get('Prefer') or '')
+
+            def do_GET(self):
+                table, params = self._parse()
+                if table is None:
+                    return self._reply(404, {'message': 'Not found'})
+                status, rows, content_range = stub.select(table, params, self.headers.get('Range'))
+                self._reply(status, rows, {'Content-Range': content_range})
+
+            def do_POST(self):
+                table, params = self._parse()
+                if table is None:
+                    return self._reply(404, {'message': 'Not found'})
+                try:
+                    body = self._body()
+                except ValueError:
+                    return self._reply(400, {'message': 'Invalid JSON'})
+                rows = body if isinstance(body, list) else [body]
+                merge = 'resolution=merge-duplicates' in (self.headers.get('Prefer') or '')
+                written = stub.insert(table, rows, params.get('on_conflict') if merge else None)
+                self._reply(201, written if self._representation() else None)
+
+            def do_PATCH(self):
+                table, params = self._parse()
+                if table is None:
+                    return self._reply(404, {'message': 'Not found'})
+                try:
+                    values = self._body()
+                except ValueError:
+                    return self._reply(400, {'message': 'Invalid JSON'})
+                rows = stub.update(table, params, values)
+                if self._representation():
+                    return self._reply(200, rows)
+                self._reply(204)
+
+        return Handler
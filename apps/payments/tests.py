@@ -0,0 +1,533 @@
+"""
+Tests for the payments app
+"""
+import io
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import requests
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.loans.models import Loan
+from apps.payments.models import FxRateSnapshot, MpesaTransaction, Payment, StripeWebhookEvent
+from apps.payments.services.disbursement_service import DisbursementService
+from apps.payments.services.fx_service import FxRateService, parse_rates
+from apps.payments.services.mpesa_service import MpesaService
+from apps.payments.services.payment_service import PaymentService
+from apps.payments.services.payment_state_service import PaymentStateService
+from apps.payments.services.reconciliation_service import ReconciliationService
+from apps.payments.services.stripe_webhook_service import StripeWebhookService
+from apps.users.models import User
+
+
+def make_user(username, phone):
+    return User.objects.create_user(username=username, email=f'{username}@example.com', password='x', phone_number=phone)
+
+
+def make_loan(user, status='APPROVED', principal='10000.00'):
+    return Loan.objects.create(
+        user=user, loan_type='PERSONAL', principal_amount=Decimal(principal), interest_rate=Decimal('14.00'),
+        loan_tenure=6, purpose='Test loan', status=status, approval_date=timezone.now()
+    )
+
+
+def make_payment(loan, status, payment_type='DISBURSEMENT', **fields):
+    return Payment.objects.create(
+        user=loan.user, loan=loan, payment_type=payment_type, amount=loan.principal_amount,
+        phone_number=loan.user.phone_number, status=status, **fields
+    )
+
+
+class PaymentStateTests(TestCase):
+    def setUp(self):
+        self.service = PaymentStateService()
+        self.loan = make_loan(make_user('borrower', '254700000001'))
+
+    def status(self, payment):
+        payment.refresh_from_db()
+        return payment.status
+
+    def test_completion_is_stamped_and_not_reopened(self):
+        payment = make_payment(self.loan, 'PROCESSING')
+
+        self.assertEqual(self.service.transition(Payment.objects.filter(pk=payment.pk), 'COMPLETED'), 1)
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.completed_at)
+        for target in ('PROCESSING', 'FAILED', 'CANCELLED'):
+            self.assertEqual(self.service.transition(Payment.objects.filter(pk=payment.pk), target), 0, target)
+        self.assertEqual(self.status(payment), 'COMPLETED')
+
+    def test_only_completed_payments_are_refunded(self):
+        pending = make_payment(self.loan, 'PENDING')
+        completed = make_payment(self.loan, 'COMPLETED')
+
+        self.assertEqual(self.service.transition(Payment.objects.all(), 'REFUNDED'), 1)
+        self.assertEqual((self.status(pending), self.status(completed)), ('PENDING', 'REFUNDED'))
+
+    def test_expected_narrows_the_allowed_sources(self):
+        failed = make_payment(self.loan, 'FAILED')
+
+        self.assertEqual(self.service.transition(Payment.objects.all(), 'COMPLETED', expected='PROCESSING'), 0)
+        self.assertEqual(self.status(failed), 'FAILED')
+
+    def test_unknown_target_is_an_error(self):
+        with self.assertRaises(ValueError):
+            self.service.transition(MpesaTransaction.objects.all(), 'REFUNDED')
+
+    def test_batch_applies_each_row_its_own_target_and_values(self):
+        user = self.loan.user
+        rows = [
+            MpesaTransaction.objects.create(
+                user=user, transaction_type='DISBURSEMENT', amount=Decimal('100.00'), phone_number=user.phone_number,
+                status=status
+            ) for status in ('PENDING', 'PENDING', 'COMPLETED')
+        ]
+
+        moved = self.service.transition_many(MpesaTransaction, [
+            (rows[0].pk, 'PROCESSING', {'checkout_request_id': 'AG_1'}),
+            (rows[1].pk, 'FAILED', {'result_desc': 'Rejected'}),
+            (rows[2].pk, 'FAILED', {'result_desc': 'Too late'}),
+        ])
+
+        self.assertEqual(moved, 2)
+        for row in rows:
+            row.refresh_from_db()
+        self.assertEqual((rows[0].status, rows[0].checkout_request_id, rows[0].completed_at), ('PROCESSING', 'AG_1', None))
+        self.assertEqual((rows[1].status, rows[1].result_desc), ('FAILED', 'Rejected'))
+        self.assertIsNotNone(rows[1].completed_at)
+        self.assertEqual((rows[2].status, rows[2].result_desc), ('COMPLETED', None))
+
+
+class ClaimableLoansTests(TestCase):
+    def setUp(self):
+        self.service = DisbursementService()
+        self.user = make_user('borrower', '254700000001')
+
+    def test_locked_selection_has_no_group_by(self):
+        # PostgreSQL rejects FOR UPDATE together with GROUP BY
+        sql = str(self.service.claimable_loans().query).upper()
+        self.assertNotIn('GROUP BY', sql)
+        self.assertNotIn('HAVING', sql)
+
+    def test_skips_loans_out_of_attempts_or_with_open_disbursement(self):
+        fresh = make_loan(self.user)
+        retried = make_loan(self.user)
+        exhausted = make_loan(self.user)
+        in_flight = make_loan(self.user)
+        make_payment(retried, 'FAILED')
+        for _ in range(self.service.max_attempts):
+            make_payment(exhausted, 'FAILED')
+        make_payment(in_flight, 'PROCESSING')
+        make_loan(self.user, status='SUBMITTED')
+
+        with transaction.atomic():
+            claimed = set(self.service.claimable_loans().values_list('pk', flat=True))
+        self.assertEqual(claimed, {fresh.pk, retried.pk})
+
+
+class DisbursementOutcomeTests(TestCase):
+    def setUp(self):
+        self.service = DisbursementService()
+        self.loan = make_loan(make_user('borrower', '254700000001'))
+
+    def _submit(self, result):
+        transactions = self.service.prepare_batch()
+        with mock.patch.object(self.service.mpesa_service, 'b2c_payment', return_value=result):
+            return self.service.submit(transactions)
+
+    def test_unknown_outcome_stays_open_and_is_not_resent(self):
+        summary = self._submit({'success': False, 'unknown': True, 'error': 'Read timed out'})
+
+        self.assertEqual(summary, {'accepted': 0, 'rejected': 0, 'unknown': 1})
+        self.assertEqual(MpesaTransaction.objects.get().status, 'PROCESSING')
+        self.assertEqual(Payment.objects.get().status, 'PROCESSING')
+        with transaction.atomic():
+            self.assertFalse(self.service.claimable_loans().exists())
+
+    def test_definitive_rejection_fails_and_allows_a_retry(self):
+        summary = self._submit({'success': False, 'error': 'The initiator information is invalid.'})
+
+        self.assertEqual(summary['rejected'], 1)
+        self.assertEqual(Payment.objects.get().status, 'FAILED')
+        with transaction.atomic():
+            self.assertEqual(list(self.service.claimable_loans()), [self.loan])
+
+    def test_result_callback_is_matched_on_the_conversation_id(self):
+        # v1 reports an OriginatorConversationID of its own, not the one we sent
+        self._submit({'success': True, 'conversation_id': 'AG_1', 'originator_conversation_id': 'daraja-1'})
+
+        with mock.patch.object(self.service, 'advance_disbursed_loans'):
+            result = self.service.handle_result({'Result': {
+                'ResultCode': 0, 'ResultDesc': 'OK', 'OriginatorConversationID': 'daraja-1',
+                'ConversationID': 'AG_1', 'TransactionID': 'RCP123',
+            }})
+
+        self.assertFalse(result['duplicate'])
+        self.assertEqual(Payment.objects.get().status, 'COMPLETED')
+
+    def test_queue_timeout_does_not_release_the_loan(self):
+        self._submit({'success': True, 'conversation_id': 'AG_1'})
+
+        response = self.client.post(
+            reverse('payments:mpesa-b2c-callback') + '?timeout=1',
+            {'Result': {'ResultCode': 1, 'ResultDesc': 'Request timed out', 'ConversationID': 'AG_1'}},
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.json()['ResultCode'], 0)
+        self.assertEqual(Payment.objects.get().status, 'PROCESSING')
+        with transaction.atomic():
+            self.assertFalse(self.service.claimable_loans().exists())
+
+    def test_late_success_does_not_complete_a_failed_disbursement(self):
+        self._submit({'success': True, 'conversation_id': 'AG_1'})
+        self.service.handle_result({'Result': {'ResultCode': 2001, 'ConversationID': 'AG_1'}})
+
+        result = self.service.handle_result({'Result': {'ResultCode': 0, 'ConversationID': 'AG_1', 'TransactionID': 'RCP1'}})
+
+        self.assertTrue(result['conflict'])
+        self.assertEqual(MpesaTransaction.objects.get().status, 'FAILED')
+        self.assertEqual(Payment.objects.get().status, 'FAILED')
+        self.assertEqual(Loan.objects.get().status, 'APPROVED')
+
+    def test_result_ahead_of_the_recorded_conversation_id_is_applied(self):
+        transactions = self.service.prepare_batch()
+        early = {'Result': {'ResultCode': 0, 'OriginatorConversationID': 'daraja-1', 'ConversationID': 'AG_1'}}
+        self.assertFalse(self.service.handle_result(early)['success'])
+
+        with mock.patch.object(self.service.mpesa_service, 'b2c_payment', return_value={
+            'success': True, 'conversation_id': 'AG_1'
+        }):
+            self.service.submit(transactions)
+
+        self.assertEqual(Payment.objects.get().status, 'COMPLETED')
+        self.assertEqual(Loan.objects.get().status, 'DISBURSED')
+
+    def test_result_without_ids_is_rejected(self):
+        self._submit({'success': True, 'conversation_id': None})
+
+        response = self.client.post(
+            reverse('payments:mpesa-b2c-callback'), {'Result': {'ResultCode': 0}}, content_type='application/json'
+        )
+
+        self.assertEqual(response.json()['ResultDesc'], 'Invalid callback format')
+        self.assertEqual(Payment.objects.get().status, 'PROCESSING')
+        self.assertEqual(Loan.objects.get().status, 'APPROVED')
+
+
+class UnsentDisbursementTests(TestCase):
+    def setUp(self):
+        self.service = DisbursementService()
+        self.loan = make_loan(make_user('borrower', '254700000001'))
+        self.service.prepare_batch()
+
+    def test_abandoned_batch_is_cancelled_and_the_loan_released(self):
+        MpesaTransaction.objects.update(initiated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.service.sweep_unsent(), 1)
+        self.assertEqual(Payment.objects.get().status, 'CANCELLED')
+        self.assertEqual(self.service.float_used_today(), Decimal('0.00'))
+        with transaction.atomic():
+            self.assertEqual(list(self.service.claimable_loans()), [self.loan])
+
+    def test_recent_and_sent_disbursements_are_left_alone(self):
+        self.assertEqual(self.service.sweep_unsent(), 0)
+        with mock.patch.object(self.service.mpesa_service, 'b2c_payment', return_value={
+            'success': False, 'unknown': True, 'error': 'Read timed out'
+        }):
+            self.service.submit(list(MpesaTransaction.objects.all()))
+        MpesaTransaction.objects.update(initiated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.service.sweep_unsent(), 0)
+        self.assertEqual(Payment.objects.get().status, 'PROCESSING')
+
+
+class B2CTransportErrorTests(TestCase):
+    def setUp(self):
+        self.mpesa = MpesaService()
+        patcher = mock.patch.object(self.mpesa, 'get_access_token', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _pay(self, **post):
+        with mock.patch('apps.payments.services.mpesa_service.requests.post', **post):
+            return self.mpesa.b2c_payment('254700000001', 1000, 'Loan disbursement', originator_conversation_id='FFD-1')
+
+    def test_read_timeout_is_unknown(self):
+        self.assertTrue(self._pay(side_effect=requests.exceptions.ReadTimeout('timed out')).get('unknown'))
+
+    def test_server_error_is_unknown(self):
+        self.assertTrue(self._pay(return_value=mock.Mock(status_code=503)).get('unknown'))
+
+    def test_connect_timeout_is_a_failure(self):
+        self.assertFalse(self._pay(side_effect=requests.exceptions.ConnectTimeout('no route')).get('unknown'))
+
+    def test_rejection_is_a_failure(self):
+        response = mock.Mock(status_code=200, json=lambda: {'ResponseCode': '1', 'ResponseDescription': 'Rejected'})
+        result = self._pay(return_value=response)
+        self.assertFalse(result['success'])
+        self.assertFalse(result.get('unknown'))
+
+
+class FloatCapTests(TestCase):
+    def test_batch_stops_at_the_remaining_float(self):
+        service = DisbursementService()
+        service.daily_float_cap = Decimal('25000.00')
+        user = make_user('borrower', '254700000001')
+        make_payment(make_loan(user), 'PROCESSING')
+        make_loan(user)
+        make_loan(user)
+
+        self.assertEqual(len(service.prepare_batch()), 1)
+        self.assertEqual(service.float_used_today(), Decimal('20000.00'))
+
+
+class StripePaymentTests(TestCase):
+    def setUp(self):
+        self.user = make_user('carduser', '254700000002')
+        self.webhooks = StripeWebhookService()
+        payments = PaymentService()
+        intent = {'success': True, 'client_secret': 'secret', 'payment_intent_id': 'pi_1', 'status': 'requires_payment_method'}
+        with mock.patch.object(payments.stripe_service, 'create_payment_intent', return_value=intent):
+            self.result = payments.process_payment('stripe', Decimal('25.00'), 'usd', user=self.user)
+
+    def deliver(self, event_id, event_type, created):
+        StripeWebhookEvent.objects.create(
+            event_id=event_id, event_type=event_type, payment_intent_id='pi_1', stripe_created=created,
+            payload={'id': event_id, 'type': event_type, 'data': {'object': {'id': 'pi_1', 'object': 'payment_intent'}}}
+        )
+
+    def payment(self):
+        return Payment.objects.get(confirmation_code='pi_1')
+
+    def test_intent_creation_records_a_pending_card_payment(self):
+        payment = self.payment()
+        self.assertEqual(self.result['payment_id'], str(payment.id))
+        self.assertEqual((payment.payment_method, payment.status, payment.currency), ('STRIPE', 'PENDING', 'USD'))
+
+    def test_success_completes_the_payment(self):
+        self.deliver('evt_1', 'payment_intent.succeeded', 100)
+
+        self.assertEqual(self.webhooks.process_pending()['processed'], 1)
+        self.assertEqual(self.payment().status, 'COMPLETED')
+
+    def test_out_of_order_delivery_is_applied_in_stripe_order(self):
+        # The first card was declined and a retry succeeded, but the
+        # success arrives first
+        self.deliver('evt_2', 'payment_intent.succeeded', 200)
+        self.deliver('evt_1', 'payment_intent.payment_failed', 100)
+
+        self.assertEqual([event.event_id for event in self.webhooks.claim_batch()], ['evt_1'])
+        StripeWebhookEvent.objects.update(status='PENDING')
+        self.webhooks.process_pending()
+        self.assertEqual(self.payment().status, 'COMPLETED')
+
+    def test_late_failure_does_not_undo_a_completed_payment(self):
+        self.deliver('evt_2', 'payment_intent.succeeded', 200)
+        self.webhooks.process_pending()
+        self.deliver('evt_1', 'payment_intent.payment_failed', 100)
+
+        self.webhooks.process_pending()
+        self.assertEqual(self.payment().status, 'COMPLETED')
+
+    def test_replayed_events_are_no_ops(self):
+        self.deliver('evt_1', 'payment_intent.succeeded', 100)
+        self.webhooks.process_pending()
+        completed_at = self.payment().completed_at
+
+        self.webhooks.replay(StripeWebhookEvent.objects.get().pk)
+        self.assertEqual(self.webhooks.process_pending()['processed'], 1)
+        payment = self.payment()
+        self.assertEqual((payment.status, payment.completed_at), ('COMPLETED', completed_at))
+
+
+class ReconciliationMatchingTests(TestCase):
+    def setUp(self):
+        self.user = make_user('payer', '254711000001')
+        self.when = timezone.localtime().replace(microsecond=0) - timedelta(hours=1)
+        report_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(report_dir.cleanup)
+        with override_settings(RECONCILIATION_CONFIG={'REPORT_DIR': report_dir.name}):
+            self.service = ReconciliationService()
+
+    def transaction(self, number, receipt=None, minutes=0, status='PENDING'):
+        return MpesaTransaction.objects.create(
+            id=uuid.UUID(int=number), user=self.user, transaction_type='REPAYMENT', amount=Decimal('500.00'),
+            phone_number='254711000001', mpesa_receipt=receipt, status=status,
+            initiated_at=self.when + timedelta(minutes=minutes)
+        )
+
+    def reconcile(self, *lines):
+        statement = ['Receipt No.,Completion Time,Transaction Status,Paid In,Other Party Info']
+        statement += [f"{receipt},{(self.when + timedelta(minutes=minutes)):%Y-%m-%d %H:%M:%S},Completed,500.00,254711000001 - Payer"
+                      for receipt, minutes in lines]
+        return self.service.reconcile(io.StringIO('\n'.join(statement)))
+
+    def test_receipt_matches_win_over_earlier_fuzzy_candidates(self):
+        # The receiptless transaction streams first and is closest in time to
+        # the line the second transaction holds the receipt of
+        unreceipted = self.transaction(1, minutes=1)
+        receipted = self.transaction(2, receipt='RCP2', minutes=5)
+
+        run = self.reconcile(('RCP1', 8), ('RCP2', 1))
+
+        self.assertEqual((run.matched_by_receipt, run.matched_fuzzy, run.duplicates), (1, 1, 0))
+        unreceipted.refresh_from_db()
+        receipted.refresh_from_db()
+        self.assertEqual((unreceipted.mpesa_receipt, unreceipted.status), ('RCP1', 'COMPLETED'))
+        self.assertEqual(receipted.status, 'COMPLETED')
+
+    def test_line_held_by_a_transaction_outside_the_period_is_not_matched_fuzzily(self):
+        self.transaction(1, receipt='RCP1', minutes=-3 * 24 * 60, status='COMPLETED')
+        unreceipted = self.transaction(2, minutes=1)
+
+        run = self.reconcile(('RCP1', 0))
+
+        self.assertEqual(run.matched_fuzzy, 0)
+        unreceipted.refresh_from_db()
+        self.assertEqual(unreceipted.status, 'PENDING')
+
+
+class PaymentHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('historian', '254700000004')
+        self.client.force_login(self.user)
+        self.url = reverse('payments:payment-history')
+        loan = make_loan(self.user)
+        now = timezone.now().replace(microsecond=123456)
+        # Three rows share a timestamp, so ties must be broken on the id
+        stamps = [now, now, now, now - timedelta(minutes=1), now - timedelta(minutes=2)]
+        payments = [make_payment(loan, 'COMPLETED', payment_type='REPAYMENT') for _ in stamps]
+        for payment, stamp in zip(payments, stamps):
+            Payment.objects.filter(pk=payment.pk).update(created_at=stamp)
+        self.newest_first = [
+            str(pk) for pk in Payment.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)
+        ]
+
+    def page(self, **params):
+        response = self.client.get(self.url, {'per_page': 2, 'fields': 'id', **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        return [row['id'] for row in data['payments']], data['pagination']
+
+    def test_cursors_walk_every_row_once_in_both_directions(self):
+        pages, ids, pagination = [], [], {'next_cursor': None}
+        while True:
+            page_ids, pagination = self.page(**({'cursor': pagination['next_cursor']} if pages else {}))
+            pages.append(page_ids)
+            ids += page_ids
+            if not pagination['has_next']:
+                break
+        self.assertEqual(ids, self.newest_first)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+
+        back = []
+        while pagination['has_previous']:
+            page_ids, pagination = self.page(before=pagination['previous_cursor'])
+            back.insert(0, page_ids)
+        self.assertEqual(back, pages[:-1])
+
+    def test_fields_select_the_returned_columns(self):
+        response = self.client.get(self.url, {'fields': 'amount,status'})
+        self.assertEqual(set(response.json()['data']['payments'][0]), {'amount', 'status'})
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'fields': 'id,password'}, {'per_page': 'ten'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class FixedRateSource:
+    name = 'test'
+
+    def __init__(self, **rates):
+        self.rates = {code: Decimal(rate) for code, rate in rates.items()}
+
+    def fetch(self):
+        return {'KES': Decimal('1'), **self.rates}, timezone.now()
+
+
+class FxRateTests(TestCase):
+    def setUp(self):
+        self.source = FixedRateSource(USD='130', EUR='143')
+        self.service = FxRateService(source=self.source)
+        self.now = timezone.now()
+
+    def snapshot(self, rate, days_ago):
+        FxRateSnapshot.objects.create(
+            currency='USD', kes_rate=Decimal(rate), source='test', effective_at=self.now - timedelta(days=days_ago)
+        )
+
+    def test_pairs_are_triangulated_through_kes(self):
+        self.assertEqual(self.service.get_rate('usd', 'KES'), Decimal('130'))
+        self.assertEqual(self.service.get_rate('EUR', 'USD'), Decimal('143') / Decimal('130'))
+        self.assertEqual(self.service.convert(Decimal('100'), 'USD', 'EUR'), Decimal('90.91'))
+        with self.assertRaises(ValueError):
+            self.service.get_rate('USD', 'JPY')
+
+    def test_provider_quotes_are_turned_into_kes_values(self):
+        rates, _ = parse_rates({'base': 'USD', 'rates': {'KES': 130, 'EUR': 0.5}})
+        self.assertEqual((rates['USD'], rates['EUR'], rates['KES']), (Decimal('130'), Decimal('260'), Decimal('1')))
+
+    def test_history_uses_the_snapshot_in_force_at_the_time(self):
+        self.snapshot('120', days_ago=10)
+        self.snapshot('125', days_ago=5)
+
+        self.assertEqual(self.service.rate_at('USD', self.now - timedelta(days=7)), Decimal('120'))
+        self.assertEqual(self.service.rate_at('USD', self.now - timedelta(days=5)), Decimal('125'))
+        # Older than every snapshot: the current rate
+        self.assertEqual(self.service.rate_at('USD', self.now - timedelta(days=30)), Decimal('130'))
+        self.assertEqual(
+            self.service.convert(Decimal('10'), 'USD', 'KES', at=self.now - timedelta(days=7)), Decimal('1200.00')
+        )
+
+    def test_column_conversion_matches_row_by_row(self):
+        self.snapshot('120', days_ago=10)
+        self.snapshot('125', days_ago=5)
+        moments = [self.now - timedelta(days=days) for days in (30, 7, 5, 1)]
+        amounts = [Decimal('10.00'), Decimal('20.00'), Decimal('30.00'), Decimal('40.00')]
+        currencies = ['USD', 'USD', 'KES', 'USD']
+
+        converted = self.service.convert_many(amounts, currencies, 'KES', at=moments)
+
+        expected = [
+            float(self.service.convert(amount, currency, 'KES', at=moment))
+            for amount, currency, moment in zip(amounts, currencies, moments)
+        ]
+        self.assertEqual(list(converted), expected)
+
+    def test_only_changed_rates_are_snapshotted(self):
+        self.service.refresh()
+        self.service.refresh()
+        self.assertEqual(FxRateSnapshot.objects.count(), 2)
+
+        self.source.rates['USD'] = Decimal('131')
+        self.service.refresh()
+        self.assertEqual(list(FxRateSnapshot.objects.filter(currency='USD').values_list('kes_rate', flat=True)),
+                         [Decimal('131'), Decimal('130')])
+
+
+class ExportDatasetViewTests(TestCase):
+    def setUp(self):
+        staff = make_user('finance', '254700000003')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+        self.url = reverse('payments_web:export_dataset', args=['loans'])
+
+    def test_invalid_dates_are_rejected(self):
+        for params in ({'start': 'yesterday'}, {'end': '2026-02-30'}, {'start': '2026-03-02', 'end': '2026-03-01'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_valid_range_streams_csv(self):
+        response = self.client.get(self.url, {'start': '2026-03-01', 'end': '2026-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'id,'))
@@ -8,12 +8,14 @@ from .web.views import (
     mpesa_callback,
     mpesa_validation,
     stripe_webhook,
-    payment_status_check
+    payment_status_check,
+    export_dataset
 )
 
 __all__ = [
     'mpesa_callback',
     'mpesa_validation', 
     'stripe_webhook',
-    'payment_status_check'
+    'payment_status_check',
+    'export_dataset'
 ]
\ No newline at end of file
@@ -3,18 +3,24 @@ Payment webhook views for FlexiFinance
 Handles M-PESA callbacks and Stripe webhooks
 """
 
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 import logging
 import json
+import tempfile
 from datetime import datetime
 
 # Import payment services
 from apps.payments.services.mpesa_service import MpesaService
 from apps.payments.services.stripe_service import StripeService
+from apps.payments.services.stripe_webhook_service import stripe_webhook_service
 from apps.payments.services.payment_service import PaymentService
+from apps.payments.services.export_service import DATASETS, FORMATS, export_service
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +31,7 @@ def mpesa_callback(request):
     try:
         # Log the callback data for debugging
         callback_data = json.loads(request.body)
-        logger.info(f"M-PESA Callback received: {callback_data}")
+        logger.debug("M-PESA Callback received: %s", callback_data)
         
         # Extract transaction details
         transaction_id = callback_data.get('TransID', '')
@@ -112,66 +118,21 @@ def mpesa_validation(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def stripe_webhook(request):
-    """Handle Stripe webhooks for payment status updates"""
+    """
+    Record a Stripe webhook event and acknowledge it
+    
+    Events are processed in the background (process_stripe_events), so
+    Stripe gets its 200 as soon as the event is stored
+    """
     try:
-        # Get the raw payload and signature
-        payload = request.body
-        sig_header = request.META.get('HTTP_STRIPE_SIGNATURE', '')
-        
-        # Verify webhook signature
-        stripe_service = StripeService()
-        event = stripe_service.verify_webhook(payload, sig_header)
-        
-        if not event:
-            logger.error("Invalid Stripe webhook signature")
+        event_id = stripe_webhook_service.receive(request.body, request.META.get('HTTP_STRIPE_SIGNATURE', ''))
+        if event_id is None:
             return HttpResponse(status=400)
-        
-        # Log the event
-        logger.info(f"Stripe webhook received: {event['type']}")
-        
-        # Handle different event types
-        event_type = event['type']
-        
-        if event_type == 'payment_intent.succeeded':
-            # Payment succeeded
-            payment_intent = event['data']['object']
-            result = stripe_service.handle_payment_success(payment_intent)
-            
-            if result['success']:
-                logger.info(f"Stripe payment succeeded: {payment_intent['id']}")
-            else:
-                logger.error(f"Failed to process Stripe payment success: {result.get('error')}")
-        
-        elif event_type == 'payment_intent.payment_failed':
-            # Payment failed
-            payment_intent = event['data']['object']
-            result = stripe_service.handle_payment_failure(payment_intent)
-            
-            if result['success']:
-                logger.info(f"Stripe payment failed processed: {payment_intent['id']}")
-            else:
-                logger.error(f"Failed to process Stripe payment failure: {result.get('error')}")
-        
-        elif event_type == 'payment_intent.canceled':
-            # Payment canceled
-            payment_intent = event['data']['object']
-            result = stripe_service.handle_payment_canceled(payment_intent)
-            
-            if result['success']:
-                logger.info(f"Stripe payment canceled processed: {payment_intent['id']}")
-            else:
-                logger.error(f"Failed to process Stripe payment cancellation: {result.get('error')}")
-        
-        else:
-            logger.info(f"Unhandled Stripe event type: {event_type}")
-        
+        logger.debug(f"Stripe webhook recorded: {event_id}")
         return HttpResponse(status=200)
         
-    except stripe_service.stripe.error.SignatureVerificationError:
-        logger.error("Stripe webhook signature verification failed")
-        return HttpResponse(status=400)
     except Exception as e:
-        logger.error(f"Error processing Stripe webhook: {str(e)}")
+        logger.error(f"Error recording Stripe webhook: {str(e)}")
         return HttpResponse(status=500)
 
 @csrf_exempt
@@ -228,4 +189,60 @@ def payment_status_check(request, provider, transaction_id):
         return JsonResponse({
             'success': False,
             'error': 'Internal server error'
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@login_required
+@require_http_methods(["GET"])
+def export_dataset(request, dataset):
+    """Stream a finance export (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    if dataset not in DATASETS:
+        return JsonResponse({'error': f'Unknown dataset: {dataset}'}, status=404)
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return JsonResponse({'error': f'Unsupported format: {export_format}'}, status=400)
+
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            # parse_date returns None for malformed input and raises for impossible dates
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            return JsonResponse({'error': f'Invalid {name} date: {value} (expected YYYY-MM-DD)'}, status=400)
+    start, end = dates['start'], dates['end']
+    if start and end and start > end:
+        return JsonResponse({'error': 'start must not be after end'}, status=400)
+    feed = request.GET.get('feed')
+    queryset, high_watermark = export_service.build_queryset(
+        dataset, start=start, end=end, statuses=request.GET.getlist('status'), feed=feed
+    )
+    filename = f"{dataset}-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+    logger.info(f"Finance export {dataset} ({export_format}, feed={feed}) requested by {request.user.email}")
+
+    def on_complete(rows):
+        # The watermark only moves once the whole export has been produced
+        if feed:
+            export_service.advance_watermark(dataset, feed, high_watermark, rows)
+
+    if export_format == 'parquet':
+        # Parquet footers are written last, so the file is built on disk and then streamed
+        try:
+            handle = tempfile.TemporaryFile()
+            rows = export_service.write_parquet(dataset, queryset, handle)
+        except RuntimeError as e:
+            return JsonResponse({'error': str(e)}, status=501)
+        on_complete(rows)
+        handle.seek(0)
+        return FileResponse(handle, as_attachment=True, filename=filename, content_type='application/vnd.apache.parquet')
+
+    response = StreamingHttpResponse(
+        export_service.iter_csv(dataset, queryset, on_complete=on_complete),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
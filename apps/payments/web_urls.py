@@ -18,4 +18,7 @@ urlpatterns = [
     
     # Payment status check
     path('status/<str:provider>/<str:transaction_id>/', views.payment_status_check, name='payment_status'),
+    
+    # Finance exports (staff only)
+    path('exports/<str:dataset>/', views.export_dataset, name='export_dataset'),
 ]
\ No newline at end of file
@@ -3,9 +3,11 @@ Admin configuration for User model
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
 from django.utils import timezone
 from django import forms
 from .models import User
+from .signals import users_changed
 import logging
 
 logger = logging.getLogger(__name__)
@@ -132,28 +134,37 @@ class UserAdmin(BaseUserAdmin):
     
     def verify_users(self, request, queryset):
         """Bulk verify users"""
-        count = queryset.filter(is_verified=False).update(
+        selected = queryset.filter(is_verified=False)
+        user_ids = list(selected.values_list('pk', flat=True))
+        count = selected.update(
             is_verified=True,
             verification_date=timezone.now()
         )
+        transaction.on_commit(lambda: users_changed.send(sender=User, user_ids=user_ids, fields=['is_verified']))
         self.message_user(request, f'{count} users verified successfully.')
     verify_users.short_description = "Verify selected users"
     
     def approve_kyc(self, request, queryset):
         """Bulk approve KYC"""
-        count = queryset.filter(kyc_status__in=['PENDING', 'REJECTED']).update(
+        selected = queryset.filter(kyc_status__in=['PENDING', 'REJECTED'])
+        user_ids = list(selected.values_list('pk', flat=True))
+        count = selected.update(
             kyc_status='APPROVED',
             is_verified=True,
             verification_date=timezone.now()
         )
+        transaction.on_commit(lambda: users_changed.send(sender=User, user_ids=user_ids, fields=['kyc_status', 'is_verified']))
         self.message_user(request, f'{count} KYC applications approved successfully.')
     approve_kyc.short_description = "Approve KYC for selected users"
     
     def reject_kyc(self, request, queryset):
         """Bulk reject KYC"""
-        count = queryset.filter(kyc_status__in=['PENDING', 'APPROVED']).update(
+        selected = queryset.filter(kyc_status__in=['PENDING', 'APPROVED'])
+        user_ids = list(selected.values_list('pk', flat=True))
+        count = selected.update(
             kyc_status='REJECTED'
         )
+        transaction.on_commit(lambda: users_changed.send(sender=User, user_ids=user_ids, fields=['kyc_status']))
         self.message_user(request, f'{count} KYC applications rejected.')
     reject_kyc.short_description = "Reject KYC for selected users"
     
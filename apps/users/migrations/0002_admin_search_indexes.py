@@ -0,0 +1,22 @@
+# Trigram/prefix indexes backing admin search_fields (PostgreSQL only)
+
+from django.db import migrations
+
+from apps.core.search_indexes import search_index_operations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = search_index_operations([
+        ('users_email_trgm', 'users', 'email', 'trigram'),
+        ('users_first_name_trgm', 'users', 'first_name', 'trigram'),
+        ('users_last_name_trgm', 'users', 'last_name', 'trigram'),
+        ('users_phone_number_trgm', 'users', 'phone_number', 'trigram'),
+    ])
@@ -3,7 +3,7 @@ User model signals for FlexiFinance
 Email verification and KYC workflow
 """
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.mail import send_mail
@@ -17,6 +17,10 @@ import logging
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Sent with sender=User, user_ids (list), fields (list) after set-wise updates
+# (queryset.update / bulk_update) that bypass post_save
+users_changed = Signal()
+
 
 @receiver(post_save, sender=User)
 def user_created_or_updated(sender, instance, created, **kwargs):
@@ -166,14 +170,10 @@ def send_verification_email(user):
         token = user.email_verification_token
         
         logger.info(f"Generating verification URL for user {user.username}")
-        logger.info(f"User ID (encoded): {uid}")
-        logger.info(f"Token: {token[:10]}...")
         
         verification_url = reverse('dashboard:verify_email', kwargs={'uidb64': uid, 'token': token})
         full_verification_url = f"http://127.0.0.1:8000{verification_url}"
         
-        logger.info(f"Generated verification URL: {full_verification_url}")
-        
         # Prepare email context
         context = {
             'user': user,
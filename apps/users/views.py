@@ -13,6 +13,8 @@ from django.views import View
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from django.db import models
+from apps.core.pagination import InvalidCursor, KeysetPaginator
+from apps.loans.services.credit_scoring_service import credit_scoring_service
 from apps.users.forms import (
     UserProfileForm, UserCreationForm,
     IdentityForm, ContactForm, EmploymentForm, EmergencyContactForm
@@ -48,16 +50,11 @@ def dashboard(request):
     
     current_balance = max(0, total_borrowed - total_paid)
     
-    # Calculate credit score (simplified logic)
-    approved_loans = user_loans.filter(status__in=['APPROVED', 'DISBURSED', 'ACTIVE', 'COMPLETED']).count()
-    rejected_loans = user_loans.filter(status='REJECTED').count()
-    
-    # Simple credit score calculation (300-850 range)
-    base_score = 300
-    if approved_loans > 0:
-        score = min(850, base_score + (approved_loans * 100) - (rejected_loans * 50))
-    else:
-        score = base_score + 100  # New user gets base score
+    # Credit score (300-850) maintained by the credit scoring service; users
+    # not yet reached by the nightly batch are scored on first visit
+    score = request.user.credit_score
+    if score is None:
+        score = credit_scoring_service.recompute_user(request.user)
     
     credit_score_percentage = round((score - 300) / 550 * 100)
     
@@ -511,25 +508,28 @@ def my_loans(request):
     """User loans view"""
     from apps.loans.models import Loan
     
-    # Query loans for the current user
-    user_loans = Loan.objects.filter(user=request.user).order_by('-created_at')
+    # Query loans for the current user, one keyset page at a time
+    user_loans = Loan.objects.filter(user=request.user)
+    paginator = KeysetPaginator(user_loans)
+    try:
+        page = paginator.page(after=request.GET.get('cursor'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
     
-    # Calculate statistics
-    total_applications = user_loans.count()
-    approved = user_loans.filter(status__in=['APPROVED', 'DISBURSED', 'ACTIVE', 'COMPLETED']).count()
-    pending = user_loans.filter(status__in=['DRAFT', 'SUBMITTED', 'UNDER_REVIEW']).count()
-    rejected = user_loans.filter(status='REJECTED').count()
+    # Calculate statistics in a single query
+    stats = user_loans.aggregate(
+        total_applications=models.Count('id'),
+        approved=models.Count('id', filter=models.Q(status__in=['APPROVED', 'DISBURSED', 'ACTIVE', 'COMPLETED'])),
+        pending=models.Count('id', filter=models.Q(status__in=['DRAFT', 'SUBMITTED', 'UNDER_REVIEW'])),
+        rejected=models.Count('id', filter=models.Q(status='REJECTED'))
+    )
     
     context = {
         'user': request.user,
         'page_title': 'My Loans',
-        'loans': user_loans,
-        'stats': {
-            'total_applications': total_applications,
-            'approved': approved,
-            'pending': pending,
-            'rejected': rejected
-        }
+        'loans': page,
+        'page': page,
+        'stats': stats
     }
     return render(request, 'users/my_loans.html', context)
 
@@ -75,6 +75,8 @@ INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS must be first
+    'apps.core.middleware.RequestIdMiddleware',  # Request id on every log line
+    'apps.core.middleware.RequestMetricsMiddleware',  # Times everything below it
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -291,7 +293,7 @@ EMAIL_TIMEOUT = 30
 # =============================================================================
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'apps.core.cache.MetricsLocMemCache',  # LocMemCache with hit/miss metrics
         'LOCATION': 'flexifinance-cache',
         'KEY_PREFIX': 'flexifinance',
         'OPTIONS': {
@@ -375,6 +377,26 @@ MPESA_CONFIG = {
     
     'INITIATOR_NAME': config('MPESA_INITIATOR_NAME', default='FlexiFinance'),
     'ENVIRONMENT': config('MPESA_ENVIRONMENT', default='sandbox'),  # sandbox or production
+    
+    # Point at a local Daraja stub (run_daraja_stub) instead of Safaricom, e.g. http://127.0.0.1:8765
+    'BASE_URL': config('MPESA_BASE_URL', default=''),
+    # B2C ResultURL/QueueTimeOutURL; defaults to /api/v1/payments/mpesa/b2c-callback/ on the current site
+    'B2C_RESULT_URL': config('MPESA_B2C_RESULT_URL', default=''),
+    'REQUEST_TIMEOUT': config('MPESA_REQUEST_TIMEOUT', default=30, cast=int),
+}
+
+DISBURSEMENT_CONFIG = {
+    # Bulk B2C disbursement of approved loans (disburse_loans command)
+    'BATCH_SIZE': config('DISBURSEMENT_BATCH_SIZE', default=200, cast=int),
+    'CONCURRENCY': config('DISBURSEMENT_CONCURRENCY', default=8, cast=int),
+    # B2C requests per second across all workers
+    'RATE_PER_SECOND': config('DISBURSEMENT_RATE_PER_SECOND', default=10, cast=float),
+    # KES that may leave the B2C float per calendar day
+    'DAILY_FLOAT_CAP': config('DISBURSEMENT_DAILY_FLOAT_CAP', default=5000000, cast=int),
+    # Loans whose B2C attempts failed this many times are left for manual handling
+    'MAX_ATTEMPTS': 3,
+    # Disbursements still PENDING (never sent) after this long are cancelled and their loans released
+    'UNSENT_TIMEOUT_SECONDS': 600,
 }
 
 # Security Configuration
@@ -402,44 +424,50 @@ CSRF_TRUSTED_ORIGINS = [
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+    'filters': {
+        'request_id': {
+            '()': 'apps.core.log_handlers.RequestIdFilter',
         },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+        'debug_sampling': {
+            '()': 'apps.core.log_handlers.SamplingFilter',
+            # Fraction of DEBUG records kept; INFO and above are never sampled
+            'rate': config('LOG_DEBUG_SAMPLE_RATE', default=1.0, cast=float),
         },
     },
     'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
-            'formatter': 'verbose',
-        },
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
+        # Records are queued on the calling thread; a listener thread redacts
+        # phone numbers and tokens and writes JSON lines to the log file.
+        # Worker processes share the file, so rotate it with logrotate (no
+        # copytruncate needed), or set LOG_FILE empty to log to the console only
+        'queue': {
+            '()': 'apps.core.log_handlers.QueueLogHandler',
+            'filename': config('LOG_FILE', default=str(BASE_DIR / 'logs' / 'django.log')) or None,
+            'file_level': config('LOG_FILE_LEVEL', default='INFO'),
+            'console_format': config('LOG_CONSOLE_FORMAT', default='text'),  # 'json' on hosted platforms
+            'queue_size': 10000,
+            'filters': ['request_id', 'debug_sampling'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
-            'propagate': True,
+            'propagate': False,
         },
         'flexifinance': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
-            'propagate': True,
+            'propagate': False,
         },
         'mpesa': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
-            'propagate': True,
+            'propagate': False,
+        },
+        'apps': {
+            'handlers': ['queue'],
+            'level': config('APPS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
         },
     },
 }
@@ -510,6 +538,34 @@ RISK_CONFIG = {
     },
 }
 
+CREDIT_SCORING_CONFIG = {
+    # compute_credit_scores command and incremental recompute after repayments
+    'CHUNK_SIZE': config('CREDIT_SCORING_CHUNK_SIZE', default=10000, cast=int),
+    # Installments this many days late count as severe delinquencies
+    'SEVERE_DAYS_PAST_DUE': 30,
+    'WEIGHTS': {
+        'payment_history': 0.35,
+        'delinquency': 0.25,
+        'utilization': 0.20,
+        'history_depth': 0.10,
+        'defaults': 0.10,
+    },
+}
+
+DECISION_CONFIG = {
+    # Automated decisioning of submitted applications (decide_loans command)
+    'BATCH_SIZE': config('DECISION_BATCH_SIZE', default=500, cast=int),
+    'POLL_INTERVAL_SECONDS': 10,
+    # Applications should be decided within this long of submission
+    'SLA_SECONDS': config('DECISION_SLA_SECONDS', default=300, cast=int),
+    # Larger applications always go to manual review
+    'AUTO_APPROVE_MAX_AMOUNT': config('AUTO_APPROVE_MAX_AMOUNT', default=100000, cast=int),
+    # DocumentType.required_for purposes whose required types must be approved
+    'REQUIRED_DOCUMENT_PURPOSES': ['KYC', 'LOAN_APPLICATION'],
+    # Rules evaluated for every application, in order
+    'RULES': ['kyc', 'product_limits', 'credit_score', 'debt_to_income', 'documents', 'auto_approve_limit'],
+}
+
 # Notification Configuration
 NOTIFICATION_CONFIG = {
     'EMAIL_TEMPLATES_DIR': BASE_DIR / 'templates' / 'emails',
@@ -525,6 +581,35 @@ DOCUMENT_CONFIG = {
     'ALLOWED_EXTENSIONS': ['.pdf', '.jpg', '.jpeg', '.png'],
     'ENCRYPTION_ENABLED': True,
     'AUTO_DELETE_DAYS': 365,
+    # Downloads: 'django' streams from storage, 'nginx' uses X-Accel-Redirect,
+    # 'apache' uses X-Sendfile. PROTECTED_MEDIA_PREFIX must be an internal
+    # location on the web server that aliases MEDIA_ROOT.
+    'DOWNLOAD_BACKEND': config('DOCUMENT_DOWNLOAD_BACKEND', default='django'),
+    'PROTECTED_MEDIA_PREFIX': '/protected/',
+    'DOWNLOAD_CHUNK_SIZE': 64 * 1024,
+    # Download counters and access log events are buffered and flushed every
+    # N seconds or N pending entries
+    'ACCESS_FLUSH_INTERVAL': 5,
+    'ACCESS_FLUSH_THRESHOLD': 500,
+    # Access logs older than N whole months are rolled into gzip CSV archives
+    'ACCESS_LOG_RETENTION_MONTHS': 6,
+    'ACCESS_LOG_ARCHIVE_DIR': BASE_DIR / 'archives' / 'access_logs',
+    'ACCESS_LOG_QUERY_DAYS': 30,  # Default window for admin/analytics queries
+    # Analytics page window; closed days come from DocumentDailySummary
+    # (materialize_document_analytics), later days are aggregated live
+    'ANALYTICS_WINDOW_DAYS': 30,
+    # Resumable uploads: chunks stream into UPLOAD_TEMP_DIR, finished files are
+    # stored once per SHA-256 under CONTENT_STORE_PREFIX
+    'UPLOAD_CHUNK_SIZE': 1024 * 1024,  # 1MB
+    'UPLOAD_SESSION_TTL_HOURS': 24,
+    'UPLOAD_TEMP_DIR': MEDIA_ROOT / 'uploads' / 'parts',
+    'CONTENT_STORE_PREFIX': 'documents/sha256',
+    # Background processing (previews, text extraction) in a process pool
+    'PROCESSING_ENABLED': config('DOCUMENT_PROCESSING_ENABLED', default=True, cast=bool),
+    'PROCESSING_WORKERS': config('DOCUMENT_PROCESSING_WORKERS', default=2, cast=int),
+    'THUMBNAIL_SIZE': (256, 256),
+    'PREVIEW_SIZE': (1024, 1024),
+    'TEXT_EXCERPT_LENGTH': 2000,
 }
 
 # Business Logic Configuration
@@ -542,6 +627,40 @@ ANALYTICS_CONFIG = {
     'FACEBOOK_PIXEL_ID': config('FACEBOOK_PIXEL_ID', default=''),
 }
 
+# Admin Configuration
+EXPORT_CONFIG = {
+    # Finance exports (export_finance_data command and /payments/exports/<dataset>/)
+    'CHUNK_SIZE': config('EXPORT_CHUNK_SIZE', default=5000, cast=int),
+    'OUTPUT_DIR': config('EXPORT_OUTPUT_DIR', default=str(BASE_DIR / 'exports')),
+    # Incremental feeds stop this far behind now so in-flight transactions are not skipped
+    'WATERMARK_LAG_SECONDS': 60,
+}
+
+RECONCILIATION_CONFIG = {
+    # M-Pesa statement reconciliation (reconcile_mpesa command)
+    'CHUNK_SIZE': config('RECONCILIATION_CHUNK_SIZE', default=10000, cast=int),
+    # Rows without a shared receipt match on phone + amount within this window
+    'MATCH_WINDOW_MINUTES': 10,
+    'REPORT_DIR': config('RECONCILIATION_REPORT_DIR', default=str(BASE_DIR / 'exports' / 'reconciliation')),
+}
+
+PAGINATION_CONFIG = {
+    # Keyset-paginated lists (payment history API, my loans, documents)
+    'DEFAULT_PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': config('PAGINATION_MAX_PAGE_SIZE', default=100, cast=int),
+    # Optional totals are cached apart from the pages
+    'TOTAL_COUNT_CACHE_TIMEOUT': 300,
+}
+
+ADMIN_CONFIG = {
+    # Changelists on PostgreSQL report planner estimates instead of COUNT(*)
+    # once a result set is at least this large
+    'ESTIMATED_COUNT_THRESHOLD': 100000,
+    # Bulk actions on larger selections run as background jobs
+    'BULK_ACTION_SYNC_LIMIT': config('BULK_ACTION_SYNC_LIMIT', default=500, cast=int),
+    'BULK_ACTION_BATCH_SIZE': config('BULK_ACTION_BATCH_SIZE', default=1000, cast=int),
+}
+
 # Development tools
 if DEBUG:
     # Debug toolbar - DISABLED TO PREVENT IMPORT ERRORS
@@ -614,19 +733,127 @@ STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
+STRIPE_WEBHOOK_CONFIG = {
+    # Background processing of the webhook inbox (process_stripe_events command)
+    'BATCH_SIZE': config('STRIPE_WEBHOOK_BATCH_SIZE', default=200, cast=int),
+    'MAX_ATTEMPTS': 5,
+    # Retry delay grows linearly with the attempt number
+    'RETRY_DELAY_SECONDS': 30,
+    # Events claimed longer ago than this (crashed worker) are claimed again
+    'CLAIM_TIMEOUT_SECONDS': 300,
+}
+
+FX_CONFIG = {
+    # Exchange rates for multi-currency conversion (fx_service, refresh_fx_rates command)
+    # Source: 'static' (FALLBACK_RATES), 'file' (FILE_PATH) or 'http' (URL)
+    'SOURCE': config('FX_SOURCE', default='static'),
+    'FILE_PATH': config('FX_FILE_PATH', default=str(BASE_DIR / 'fx_rates.json')),
+    'URL': config('FX_URL', default=''),
+    'TIMEOUT_SECONDS': 5,
+    # Rates are fresh for TTL_SECONDS; up to STALE_SECONDS old they are still
+    # served while a background refresh runs
+    'TTL_SECONDS': config('FX_TTL_SECONDS', default=300, cast=int),
+    'STALE_SECONDS': config('FX_STALE_SECONDS', default=3600, cast=int),
+    # KES per unit of currency, used when no source has answered yet
+    'FALLBACK_RATES': {
+        'USD': '132.50',
+        'EUR': '142.80',
+        'GBP': '165.20',
+        'CAD': '97.40',
+        'AUD': '87.60',
+    },
+}
+
+OUTBOX_CONFIG = {
+    # Delivery of contact/support/newsletter submissions (dispatch_outbox command)
+    'BATCH_SIZE': config('OUTBOX_BATCH_SIZE', default=100, cast=int),
+    # Notification emails sent at once per batch
+    'EMAIL_CONCURRENCY': config('OUTBOX_EMAIL_CONCURRENCY', default=4, cast=int),
+    'MAX_ATTEMPTS': 8,
+    # Retry delay doubles with each attempt, up to MAX_RETRY_DELAY_SECONDS
+    'RETRY_DELAY_SECONDS': 30,
+    'MAX_RETRY_DELAY_SECONDS': 3600,
+    # Messages claimed longer ago than this (crashed dispatcher) are claimed again
+    'CLAIM_TIMEOUT_SECONDS': 300,
+    # Channels each submission kind fans out to (Supabase only when SUPABASE_URL is set)
+    'CHANNELS': {
+        'CONTACT': ['EMAIL', 'SUPABASE'],
+        'SUPPORT': ['EMAIL', 'SUPABASE'],
+        'NEWSLETTER': ['SUPABASE'],
+    },
+}
+
+HEALTH_CONFIG = {
+    # Background dependency probes behind /health/, /health/live/ and /health/ready/
+    'INTERVAL_SECONDS': config('HEALTH_INTERVAL_SECONDS', default=15, cast=int),
+    'PROBE_TIMEOUT_SECONDS': 3,
+    # Readiness fails when the last probe round is older than this
+    'STALE_AFTER_SECONDS': 60,
+    # Dependencies whose failure takes the instance out of rotation
+    'CRITICAL': ['database', 'cache'],
+    # Probe latencies kept per dependency for the percentiles
+    'LATENCY_WINDOW': 100,
+}
+
+METRICS_CONFIG = {
+    # Request metrics (RequestMetricsMiddleware) served at /metrics/ in the Prometheus text format
+    'ENABLED': config('METRICS_ENABLED', default=True, cast=bool),
+    # Directory every worker process writes its series to, summed per scrape; set it under a
+    # prefork server (gunicorn/uWSGI) and empty it when the server starts. Unset: per process
+    'MULTIPROCESS_DIR': config('METRICS_MULTIPROCESS_DIR', default=''),
+    # Longest a worker's file may lag behind its own counts
+    'FLUSH_SECONDS': 5,
+    # Bearer token for /metrics/ and /metrics/slow/; without one only staff may read them
+    'TOKEN': config('METRICS_TOKEN', default=''),
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'QUERY_BUCKETS': (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    'EXTERNAL_LATENCY_BUCKETS': (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    # Requests at least this slow are counted and sampled with their SQL
+    'SLOW_REQUEST_MS': config('METRICS_SLOW_REQUEST_MS', default=500, cast=int),
+    'SLOW_SAMPLE_RATE': 1.0,
+    'SLOW_SAMPLE_SIZE': 50,
+    # Statements kept per request for slow samples (all are counted)
+    'MAX_CAPTURED_QUERIES': 200,
+}
+
+BENCHMARK_CONFIG = {
+    # run_benchmarks: generated users are named <PREFIX>-0000001 ...
+    'PREFIX': 'bench',
+    'SCALE': config('BENCHMARK_SCALE', default='small'),
+    'SEED': 42,
+    # Users generated per transaction
+    'BLOCK_SIZE': 500,
+    # One JSON file per run, named <timestamp>-<commit>.json
+    'RESULTS_DIR': BASE_DIR / 'benchmarks' / 'results',
+}
+
 # =============================================================================
 # SUPABASE CONFIGURATION
 # =============================================================================
 SUPABASE_URL = config('SUPABASE_URL', default='')
 SUPABASE_ANON_KEY = config('SUPABASE_ANON_KEY', default='')
 SUPABASE_SERVICE_KEY = config('SUPABASE_SERVICE_KEY', default='')
+SUPABASE_CONFIG = {
+    # PostgREST client (SupabaseService): one pooled session per process
+    'POOL_SIZE': config('SUPABASE_POOL_SIZE', default=10, cast=int),
+    'CONNECT_TIMEOUT_SECONDS': config('SUPABASE_CONNECT_TIMEOUT', default=3, cast=float),
+    'READ_TIMEOUT_SECONDS': config('SUPABASE_READ_TIMEOUT', default=10, cast=float),
+    # Reads (GET) are retried on connection errors and 502/503/504
+    'READ_RETRIES': 2,
+    # Rows per Range-paginated read and per bulk write request
+    'PAGE_SIZE': 1000,
+    'BULK_CHUNK_SIZE': 500,
+}
 
 # =============================================================================
 # RESEND EMAIL CONFIGURATION
 # =============================================================================
 RESEND_API_KEY = config('RESEND_API_KEY', default='')
+# Point at a local stub (run_resend_stub) for benchmarks and offline runs
+RESEND_API_URL = config('RESEND_API_URL', default='https://api.resend.com')
 FROM_EMAIL = config('FROM_EMAIL', default='noreply@flexifinance.com')
 FROM_NAME = config('FROM_NAME', default='FlexiFinance')
+RESEND_TIMEOUT = config('RESEND_TIMEOUT', default=10, cast=int)
 
 # =============================================================================
 # RAILWAY DEPLOYMENT CONFIGURATION
@@ -100,6 +100,10 @@ urlpatterns = [
     # Health check endpoints
     path('health/', include('apps.core.health_urls')),
     
+    # Prometheus metrics and slow-request samples
+    path('metrics/', views.metrics, name='metrics'),
+    path('metrics/slow/', views.slow_requests, name='slow_requests'),
+    
 
 ]
 